@@ -0,0 +1,116 @@
+"""
+Compact storage of the consensus statistics of a family alignment.
+
+Only plain numpy arrays are stored (no pickled objects), so the data does not depend on the Alignment or model
+classes, and each array is only decompressed when it is read.
+"""
+from alignment.models import AlignmentConsensus
+from common.definitions import AMINO_ACIDS, AMINO_ACID_GROUPS
+
+from io import BytesIO
+
+import numpy as np
+
+
+# increase when the stored arrays change, older data is then rebuilt from the alignment
+CONSENSUS_FORMAT_VERSION = 1
+
+
+def conservation_interval(percentage):
+    # the intervals are defined as 0-10, where 0 is 0-9, 1 is 10-19 etc. Used for colors.
+    percentage = str(percentage)
+    if len(percentage) == 1:
+        return '0'
+    return percentage[:-1]
+
+
+class ConsensusData:
+    """Consensus sequence, amino acid counts and feature counts per generic number of an alignment"""
+
+    def __init__(self, arrays):
+        # dict or numpy NpzFile, the latter reads the arrays on first access
+        self.arrays = arrays
+        self.num_proteins = int(arrays['num_proteins'])
+
+    @classmethod
+    def from_alignment(cls, a):
+        """Collect the statistics of an Alignment, calculate_statistics has to be called first"""
+        segments, generic_numbers, consensus, forced_consensus, conservation, ties = [], [], [], [], [], []
+        aa_counts = []
+        for segment, s in a.consensus.items():
+            for gn, c in s.items():
+                segments.append(segment)
+                generic_numbers.append(gn)
+                consensus.append(c[0])
+                forced_consensus.append(a.forced_consensus[segment][gn])
+                conservation.append(c[2])
+                ties.append(c[3])
+                counts = a.aa_count[segment][gn]
+                aa_counts.append([counts.get(aa, 0) for aa in AMINO_ACIDS])
+
+        aa_counts = np.array(aa_counts, dtype=np.int32).reshape(-1, len(AMINO_ACIDS))
+        # feature counts are the sums of the counts of their amino acids
+        membership = np.array([[aa in members for members in AMINO_ACID_GROUPS.values()] for aa in AMINO_ACIDS],
+            dtype=np.int32)
+
+        return cls({
+            'version': np.array(CONSENSUS_FORMAT_VERSION),
+            'num_proteins': np.array(len(a.unique_proteins)),
+            'amino_acids': np.array(list(AMINO_ACIDS.keys())),
+            'features': np.array(list(AMINO_ACID_GROUPS.keys())),
+            'segments': np.array(segments, dtype=str),
+            'generic_numbers': np.array(generic_numbers, dtype=str),
+            'consensus': np.array(consensus, dtype=str),
+            'forced_consensus': np.array(forced_consensus, dtype=str),
+            'conservation': np.array(conservation, dtype=np.int16),
+            'ties': np.array(ties, dtype=str),
+            'aa_counts': aa_counts,
+            'feature_counts': aa_counts.dot(membership),
+            })
+
+    @classmethod
+    def loads(cls, data):
+        """Returns None for data of another format version"""
+        arrays = np.load(BytesIO(bytes(data)), allow_pickle=False)
+        if int(arrays['version']) != CONSENSUS_FORMAT_VERSION:
+            return None
+        return cls(arrays)
+
+    def dumps(self):
+        f = BytesIO()
+        np.savez_compressed(f, **{k: self.arrays[k] for k in self.arrays})
+        return f.getvalue()
+
+    def conserved_residues(self, min_conservation=60):
+        """Consensus residues conserved in at least min_conservation percent of the proteins,
+        {generic number: [amino acid, conservation interval]}"""
+        generic_numbers = self.arrays['generic_numbers'].tolist()
+        consensus = self.arrays['consensus'].tolist()
+        conservation = self.arrays['conservation']
+        return {generic_numbers[i]: [consensus[i], conservation_interval(conservation[i])]
+            for i in np.flatnonzero(conservation >= min_conservation)}
+
+    def conservation(self):
+        """Consensus residue, conservation interval and amino acid counts and frequencies for each generic number
+        (in the x notation), {generic number: [amino acid, conservation interval, {amino acid: (count, freq)}]}"""
+        amino_acids = self.arrays['amino_acids'].tolist()
+        consensus = self.arrays['consensus'].tolist()
+        conservation = self.arrays['conservation']
+        aa_counts = self.arrays['aa_counts']
+
+        result = {}
+        for i, gn in enumerate(self.arrays['generic_numbers'].tolist()):
+            if 'x' not in gn:
+                continue
+            counts = {amino_acids[j]: (int(aa_counts[i][j]), round(int(aa_counts[i][j]) / self.num_proteins, 3))
+                for j in np.flatnonzero(aa_counts[i])}
+            result[gn] = [consensus[i], conservation_interval(conservation[i]), counts]
+        return result
+
+
+def get_consensus(slug):
+    """Stored consensus data of a family, None if it is not built"""
+    try:
+        return ConsensusData.loads(AlignmentConsensus.objects.values_list('consensus', flat=True).get(slug=slug))
+    except (AlignmentConsensus.DoesNotExist, ValueError, KeyError, OSError):
+        return None
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alignment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='alignmentconsensus',
+            name='alignment',
+        ),
+        migrations.RemoveField(
+            model_name='alignmentconsensus',
+            name='gn_consensus',
+        ),
+        migrations.AddField(
+            model_name='alignmentconsensus',
+            name='consensus',
+            field=models.BinaryField(default=b''),
+            preserve_default=False,
+        ),
+    ]
@@ -4,5 +4,4 @@ from django.db import models
 
 class AlignmentConsensus(models.Model):
     slug = models.SlugField(max_length=100, unique=True)
-    alignment = models.BinaryField()
-    gn_consensus = models.BinaryField(blank=True) # Store conservation calculation for each GN
\ No newline at end of file
+    consensus = models.BinaryField() # consensus statistics, see alignment.consensus.ConsensusData
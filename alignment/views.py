@@ -32,8 +32,6 @@ import itertools
 import json
 import numpy as np
 import os
-import xlsxwriter
-import xlrd
 
 
 class TargetSelection(AbsTargetSelection):
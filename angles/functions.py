@@ -0,0 +1,178 @@
+"""
+NumPy implementations of the per-residue geometry of build_structure_angles. Every function works on whole
+coordinate arrays of a chain at once, missing atoms are NaN. Values match the Biopython (Polypeptide,
+HSExposureCB, calc_angle, calc_dihedral) and scikit-learn (PCA) implementations used before.
+"""
+import numpy as np
+
+
+STANDARD_AMINO_ACIDS = {'ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE', 'LEU', 'LYS', 'MET',
+    'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL'}
+
+# maximum CA-CA distance of connected residues, as Bio.PDB.CaPPBuilder
+PEPTIDE_BOND_CA_DISTANCE = 4.3
+
+
+def atom_coordinates(residues, atom_names):
+    """Coordinates (residues x 3) of one atom per residue, atom_names is a name or a list with a name per residue.
+    NaN where the atom is missing"""
+    if isinstance(atom_names, str):
+        atom_names = [atom_names] * len(residues)
+    coords = np.full((len(residues), 3), np.nan)
+    for i, (residue, name) in enumerate(zip(residues, atom_names)):
+        if name in residue:
+            coords[i] = residue[name].get_coord()
+    return coords
+
+def rotate(vectors, axes, theta):
+    """Rotates vectors around axes (both n x 3) by theta radians (Rodrigues), as Bio.PDB.rotaxis"""
+    axes = axes / np.linalg.norm(axes, axis=1)[:, None]
+    return (vectors * np.cos(theta) + np.cross(axes, vectors) * np.sin(theta)
+        + axes * np.einsum('ij,ij->i', axes, vectors)[:, None] * (1 - np.cos(theta)))
+
+def pseudo_cb(n, ca, c):
+    """Pseudo CB positions (for glycine) from the backbone, the N rotated around CA-C by -120 degrees"""
+    return rotate(n - ca, c - ca, -np.pi * 120.0 / 180.0) + ca
+
+def vector_angles(v1, v2):
+    """Angles (radians) between the rows of v1 and v2"""
+    cos = np.einsum('ij,ij->i', v1, v2) / (np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1))
+    return np.arccos(np.clip(cos, -1, 1))
+
+def bond_angles(a, b, c):
+    """Angles a-b-c (radians) for each row, as Bio.PDB.calc_angle"""
+    return vector_angles(a - b, c - b)
+
+def dihedrals(a, b, c, d):
+    """Dihedral angles a-b-c-d (radians) for each row, as Bio.PDB.calc_dihedral"""
+    ab = a - b
+    cb = c - b
+    db = d - c
+    u = np.cross(ab, cb)
+    v = np.cross(db, cb)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        angle = vector_angles(u, v)
+        sign = np.where(vector_angles(cb, np.cross(u, v)) > 0.001, -1, 1)
+    return angle * sign
+
+def backbone_angles(n, ca, c):
+    """phi, psi, theta (CA angle of three consecutive residues), tau (CA dihedral of four consecutive residues)
+    and the N-CA-C angle of a list of residues, as Bio.PDB.Polypeptide. NaN where they are not defined"""
+    length = len(ca)
+    phi = np.full(length, np.nan)
+    psi = np.full(length, np.nan)
+    theta = np.full(length, np.nan)
+    tau = np.full(length, np.nan)
+    with np.errstate(invalid='ignore'):
+        phi[1:] = dihedrals(c[:-1], n[1:], ca[1:], c[1:])
+        psi[:-1] = dihedrals(n[:-1], ca[:-1], c[:-1], n[1:])
+        if length > 2:
+            theta[1:-1] = bond_angles(ca[:-2], ca[1:-1], ca[2:])
+        if length > 3:
+            tau[2:-1] = dihedrals(ca[:-3], ca[1:-2], ca[2:-1], ca[3:])
+        tau_angle = bond_angles(n, ca, c)
+    # Polypeptide gives no phi and psi for residues without a complete backbone
+    incomplete = np.isnan(np.hstack([n, ca, c])).any(axis=1)
+    phi[incomplete] = np.nan
+    psi[incomplete] = np.nan
+    return phi, psi, theta, tau, tau_angle
+
+def peptide_segments(residues, ca):
+    """Segment number of each residue, connected standard amino acids as built by Bio.PDB.CaPPBuilder.
+    -1 for residues that are not part of a peptide (of at least two residues)"""
+    accepted = np.array([r.get_resname().upper() in STANDARD_AMINO_ACIDS for r in residues]) & ~np.isnan(ca[:, 0])
+    with np.errstate(invalid='ignore'):
+        connected = (accepted[:-1] & accepted[1:]
+            & (np.linalg.norm(ca[1:] - ca[:-1], axis=1) < PEPTIDE_BOND_CA_DISTANCE))
+    segments = np.full(len(residues), -1)
+    segment = -1
+    for i in np.flatnonzero(connected):
+        if segments[i] == -1:
+            segment += 1
+            segments[i] = segment
+        segments[i + 1] = segment
+    return segments
+
+def half_sphere_exposure(ca, cb, radius=12.0, counted=None):
+    """HSE-up and HSE-down: the number of CA atoms within radius of each CA on the side of the CA-CB vector and
+    on the opposite side, as Bio.PDB.HSExposureCB. counted masks the residues whose CA atoms are counted"""
+    if counted is None:
+        counted = ~np.isnan(ca[:, 0])
+    distances = ca[None, :, :] - ca[:, None, :]
+    with np.errstate(invalid='ignore'):
+        within = (np.linalg.norm(distances, axis=2) < radius) & counted[None, :]
+        np.fill_diagonal(within, False)
+        up = np.einsum('ijk,ik->ij', distances, cb - ca) > 0
+    return (within & up).sum(axis=1), (within & ~up).sum(axis=1)
+
+def chain_half_sphere_exposure(chain, radius=12.0):
+    """{residue number: (HSE-up, HSE-down)} of a Biopython chain, for the residues HSExposureCB assigns"""
+    residues = chain.get_list()
+    ca = atom_coordinates(residues, 'CA')
+    cb = atom_coordinates(residues, 'CB')
+    glycines = np.array([r.get_resname() == 'GLY' for r in residues], dtype=bool)
+    if glycines.any():
+        cb[glycines] = pseudo_cb(atom_coordinates(residues, 'N')[glycines], ca[glycines],
+            atom_coordinates(residues, 'C')[glycines])
+
+    in_peptide = peptide_segments(residues, ca) >= 0
+    up, down = half_sphere_exposure(ca, cb, radius, in_peptide)
+    assigned = in_peptide & ~np.isnan(cb[:, 0])
+    return {residues[i].id[1]: (int(up[i]), int(down[i])) for i in np.flatnonzero(assigned)}
+
+
+class AxisPCA:
+    """Principal component analysis of coordinates with the interface and the sign convention of
+    sklearn.decomposition.PCA before version 1.5 (full SVD, the largest value in each column of U is positive)"""
+
+    def fit(self, X):
+        self.fit_transform(X)
+        return self
+
+    def fit_transform(self, X):
+        X = np.asarray(X, dtype=float)
+        self.mean_ = X.mean(axis=0)
+        u, s, vt = np.linalg.svd(X - self.mean_, full_matrices=False)
+        signs = np.sign(u[np.argmax(np.abs(u), axis=0), range(u.shape[1])])
+        u *= signs
+        vt *= signs[:, None]
+        self.components_ = vt
+        return u * s
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=float) - self.mean_).dot(self.components_.T)
+
+    def inverse_transform(self, X):
+        return np.asarray(X, dtype=float).dot(self.components_) + self.mean_
+
+
+def axis_line(pca, coords, reverse=False):
+    """Fits pca to the coordinates and returns two points on the first principal component, one unit apart and
+    pointing away from the first coordinate (towards it when reverse)"""
+    if ((not reverse) if pca.fit_transform(coords)[0][0] < 0 else reverse):
+        return pca.inverse_transform(np.asarray([[0,0,0],[1,0,0]]))
+    else:
+        return pca.inverse_transform(np.asarray([[0,0,0],[-1,0,0]]))
+
+def axis_angles(b, c):
+    """Clockwise angles (degrees) around the x axis between -b and c - b, both in PCA coordinates"""
+    ba = -b[:, 1:3]
+    bc = (c - b)[:, 1:3]
+    return np.degrees(np.arctan2(ba[:,0]*bc[:,1] - ba[:,1]*bc[:,0], np.einsum('ij,ij->i', ba, bc)))
+
+def a_angles(ca, helix_pca, pca):
+    """Angles of the CA atoms of a helix around the center axis, measured from the helix axis point of the
+    residue (the orthogonal projection of the mean of three consecutive CA atoms)"""
+    mean = (np.roll(np.vstack((ca, ca[0])), 1, axis=0)[:-1] + ca + np.roll(np.vstack((ca, ca[-1])), -1, axis=0)[:-1])/3
+    axis_points = helix_pca.transform(ca)
+    axis_points[:,1:] = helix_pca.transform(mean)[:,1:]
+    axis_points = helix_pca.inverse_transform(axis_points)
+    return axis_angles(pca.transform(axis_points), pca.transform(ca))
+
+def b_angles(ca, cb, pca):
+    """Angles between the CA-CB vectors and the center axis"""
+    return axis_angles(pca.transform(ca), pca.transform(cb))
+
+def axis_distances(ca, pca):
+    """Shortest distances of the CA atoms to the center axis"""
+    return np.sqrt(np.sum(np.power(pca.transform(ca)[:,1:], 2), axis=1))
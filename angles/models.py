@@ -4,7 +4,6 @@ import math, cmath
 from django.contrib.postgres.aggregates import ArrayAgg
 from structure.models import Structure
 import time
-from scipy.stats import circmean, circstd
 import numpy as np
 from collections import Counter
 
@@ -149,11 +148,13 @@ def get_angle_averages(pdbs,s_lookup,normalized = False, standard_deviation = Fa
     return group_angles
 
 def radial_average(L):
+    from scipy.stats import circmean
     # r = round(math.degrees(cmath.phase(sum(cmath.rect(1, math.radians(float(d))) for d in L)/len(L))),2)
     scipy = circmean(L, -180, 180)
     return scipy
 
 def radial_stddev(L):
+    from scipy.stats import circstd
     scipy = circstd(L, 360,0)
     return scipy
 
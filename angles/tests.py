@@ -1,3 +1,133 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+import Bio.PDB as pdb
+from Bio.PDB.Atom import Atom
+from Bio.PDB.Chain import Chain
+from Bio.PDB.Residue import Residue
+import numpy as np
+
+from angles.functions import (AxisPCA, a_angles, atom_coordinates, axis_distances, axis_line, b_angles,
+    backbone_angles, bond_angles, chain_half_sphere_exposure, dihedrals, pseudo_cb)
+
+
+def make_helix(length=30, gap_after=20, glycines=(5, 24)):
+    """A chain with an ideal CA helix and randomly placed N, C, O and CB atoms, broken in two peptides"""
+    rng = np.random.RandomState(0)
+    chain = Chain('A')
+    for i in range(1, length + 1):
+        resname = 'GLY' if i in glycines else 'ALA'
+        residue = Residue((' ', i, ' '), resname, '')
+        ca = np.array([2.3 * np.cos(np.radians(100 * i)), 2.3 * np.sin(np.radians(100 * i)), 1.5 * i])
+        if i > gap_after:
+            ca[2] += 10
+        coords = {'CA': ca}
+        for name in ['N', 'C', 'O'] + ([] if i in glycines else ['CB']):
+            direction = rng.normal(size=3)
+            coords[name] = ca + 1.5 * direction / np.linalg.norm(direction)
+        for serial, (name, coord) in enumerate(coords.items()):
+            residue.add(Atom(name, np.array(coord, dtype='f'), 0.0, 1.0, ' ', name, serial, name[0]))
+        chain.add(residue)
+    return chain
+
+
+# the loop and scikit-learn implementations of build_structure_angles these functions replace
+def sklearn_pca(X):
+    """scikit-learn PCA with the sign convention of the versions build_structure_angles ran with (before 1.5),
+    where the largest value of each column of U is positive"""
+    from sklearn.decomposition import PCA
+    pca = PCA().fit(X)
+    u = pca.transform(X)
+    pca.components_ *= np.sign(u[np.argmax(np.abs(u), axis=0), range(u.shape[1])])[:, None]
+    return pca
+
+def old_pca_line(pca, h, r=0):
+    if ((not r) if pca.fit_transform(h)[0][0] < 0 else r):
+        return pca.inverse_transform(np.asarray([[0,0,0],[1,0,0]]))
+    else:return pca.inverse_transform(np.asarray([[0,0,0],[-1,0,0]]))
+
+def old_calc_angle(b, c):
+    ba = -b
+    bc = c + ba
+    ba[:,0] = 0
+    ba = ba[:,1:3]
+    bc = bc[:,1:3]
+    return np.degrees(np.arctan2(ba[:,0]*bc[:,1]-ba[:,1]*bc[:,0], np.einsum('ij,ij->i', ba, bc)))
+
+def old_axes_calc(h, p, pca):
+    a = (np.roll(np.vstack((h,h[0])),1,axis=0)[:-1] + h + np.roll(np.vstack((h,h[-1])),-1,axis=0)[:-1])/3
+    b = p.transform(h)
+    b[:,1:] = p.transform(a)[:,1:]
+    b = p.inverse_transform(b)
+    return old_calc_angle(pca.transform(b),pca.transform(h))
+
+
+class BackboneTest(SimpleTestCase):
+    """Per residue angles match the Biopython calculations"""
+
+    def setUp(self):
+        self.chain = make_helix()
+        self.residues = self.chain.get_list()
+        self.n, self.ca, self.c = [atom_coordinates(self.residues, name) for name in ['N', 'CA', 'C']]
+
+    def test_angles(self):
+        r = self.residues
+        self.assertAlmostEqual(bond_angles(self.n[:1], self.ca[:1], self.c[:1])[0],
+            pdb.calc_angle(r[0]['N'].get_vector(), r[0]['CA'].get_vector(), r[0]['C'].get_vector()), places=5)
+        self.assertAlmostEqual(dihedrals(self.ca[:1], self.ca[1:2], self.ca[2:3], self.ca[3:4])[0],
+            pdb.calc_dihedral(*[r[i]['CA'].get_vector() for i in range(4)]), places=5)
+
+    def test_polypeptide(self):
+        for pp in pdb.CaPPBuilder().build_peptides(self.chain):
+            residues = list(pp)
+            n, ca, c = [atom_coordinates(residues, name) for name in ['N', 'CA', 'C']]
+            phi, psi, theta, tau, tau_angle = backbone_angles(n, ca, c)
+            expected_phi, expected_psi = zip(*pp.get_phi_psi_list())
+            np.testing.assert_allclose(phi, np.array(expected_phi, dtype=float), atol=1e-5)
+            np.testing.assert_allclose(psi, np.array(expected_psi, dtype=float), atol=1e-5)
+            np.testing.assert_allclose(theta[1:-1], pp.get_theta_list(), atol=1e-5)
+            np.testing.assert_allclose(tau[2:-1], pp.get_tau_list(), atol=1e-5)
+
+    def test_pseudo_cb(self):
+        glycine = self.residues[4]
+        a = glycine['CA'].get_vector()
+        rot = pdb.rotaxis(-np.pi*120.0/180.0, glycine['C'].get_vector() - a)
+        expected = ((glycine['N'].get_vector() - a).left_multiply(rot) + a).get_array()
+        np.testing.assert_allclose(pseudo_cb(self.n[4:5], self.ca[4:5], self.c[4:5])[0], expected, atol=1e-4)
+
+    def test_half_sphere_exposure(self):
+        pdb.HSExposureCB(self.chain)
+        expected = {r.id[1]: (r.xtra['EXP_HSE_B_U'], r.xtra['EXP_HSE_B_D']) for r in self.residues
+            if 'EXP_HSE_B_U' in r.xtra}
+        self.assertEqual(chain_half_sphere_exposure(self.chain), expected)
+
+
+class AxisTest(SimpleTestCase):
+    """Helix axes and the angles around them match the scikit-learn implementation"""
+
+    def setUp(self):
+        residues = make_helix(gap_after=30).get_list()
+        self.ca = atom_coordinates(residues, 'CA')
+        self.cb = atom_coordinates(residues, 'CB')
+        self.cb[np.isnan(self.cb)] = self.ca[np.isnan(self.cb)] + 1
+
+    def test_pca(self):
+        from sklearn.decomposition import PCA
+        pca, sk_pca = AxisPCA(), sklearn_pca(self.ca)
+        np.testing.assert_allclose(pca.fit_transform(self.ca), sk_pca.transform(self.ca), atol=1e-6)
+        np.testing.assert_allclose(pca.components_, sk_pca.components_, atol=1e-6)
+        points = np.asarray([[0,0,0],[1,0,0]])
+        np.testing.assert_allclose(pca.inverse_transform(points), sk_pca.inverse_transform(points), atol=1e-6)
+        for reverse in [False, True]:
+            np.testing.assert_allclose(axis_line(AxisPCA(), self.ca[:10], reverse),
+                old_pca_line(PCA(), self.ca[:10], reverse), atol=1e-6)
+
+    def test_angles(self):
+        helix = self.ca[:15]
+        pca, sk_pca = AxisPCA().fit(self.ca), sklearn_pca(self.ca)
+        helix_pca, sk_helix_pca = AxisPCA().fit(helix), sklearn_pca(helix)
+        np.testing.assert_allclose(a_angles(helix, helix_pca, pca), old_axes_calc(helix, sk_helix_pca, sk_pca),
+            atol=1e-4)
+        np.testing.assert_allclose(b_angles(self.ca, self.cb, pca),
+            old_calc_angle(sk_pca.transform(self.ca), sk_pca.transform(self.cb)), atol=1e-4)
+        np.testing.assert_allclose(axis_distances(self.ca, pca),
+            np.sqrt(np.sum(np.power(sk_pca.transform(self.ca)[:,1:],2), axis = 1)), atol=1e-6)
@@ -11,17 +11,12 @@ from structure.models import Structure
 from residue.models import Residue
 from angles.models import ResidueAngle as Angle
 
-import Bio.PDB
 import copy
 import io
 import math
 import cmath
 from collections import OrderedDict
 import numpy as np
-from sklearn.decomposition import PCA
-from numpy.core.umath_tests import inner1d
-import freesasa
-import scipy.stats as stats
 
 def angleAnalysis(request):
     """
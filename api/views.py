@@ -4,12 +4,13 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, FileUploadParser
 from rest_framework.renderers import JSONRenderer
 from django.template.loader import render_to_string
-from django.db.models import Q
 from django.conf import settings
 
 from interaction.models import ResidueFragmentInteraction
 from mutation.models import MutationRaw
 from protein.models import Protein, ProteinConformation, ProteinFamily, Species, ProteinSegment
+from protein.functions import get_family_index
+from residue.functions import get_numbering_table
 from residue.models import Residue, ResidueGenericNumber, ResidueNumberingScheme, ResidueGenericNumberEquivalent
 from structure.models import Structure
 from structure.assign_generic_numbers_gpcr import GenericNumbering
@@ -33,9 +34,6 @@ from collections import OrderedDict
 import coreapi
 from urllib.parse import urlparse
 from urllib.parse import urljoin
-from rest_framework import renderers, response, schemas
-from rest_framework.decorators import api_view, renderer_classes
-from rest_framework import response, schemas
 from rest_framework_swagger.views import get_swagger_view
 
 schema_view = get_swagger_view(title='GPCRdb API')
@@ -94,9 +92,12 @@ class ProteinFamilyChildrenList(generics.ListAPIView):
     serializer_class = ProteinFamilySerializer
 
     def get_queryset(self):
-        family = self.kwargs.get('slug')
-        queryset = ProteinFamily.objects.all().prefetch_related("parent")
-        return queryset.filter(parent__slug=family)
+        family_index = get_family_index()
+        try:
+            family = family_index.get(slug=self.kwargs.get('slug'))
+        except ProteinFamily.DoesNotExist:
+            return []
+        return family_index.children[family.id]
 
 
 class ProteinFamilyDescendantList(generics.ListAPIView):
@@ -110,8 +111,7 @@ class ProteinFamilyDescendantList(generics.ListAPIView):
 
     def get_queryset(self):
         family = self.kwargs.get('slug')
-        queryset = ProteinFamily.objects.all().prefetch_related("parent")
-        return queryset.filter(Q(slug__startswith=family) & ~Q(slug=family))
+        return sorted(get_family_index().descendants(family), key=lambda f: f.id)
 
 
 class ProteinsInFamilyList(generics.ListAPIView):
@@ -126,8 +126,9 @@ class ProteinsInFamilyList(generics.ListAPIView):
     def get_queryset(self):
         queryset = Protein.objects.all()
         family = self.kwargs.get('slug')
+        families = [f.id for f in get_family_index().descendants(family, include_self=True)]
 
-        return queryset.filter(sequence_type__slug='wt', family__slug__startswith=family)\
+        return queryset.filter(sequence_type__slug='wt', family__in=families)\
                     .prefetch_related('family', 'species', 'source', 'residue_numbering_scheme', 'genes')
 
 
@@ -158,12 +159,40 @@ class ResiduesList(generics.ListAPIView):
     """
 
     serializer_class = ResidueSerializer
+    alternative_generic_numbers = False
 
     def get_queryset(self):
         queryset = Residue.objects.all()
         #protein_conformation__protein__sequence_type__slug='wt',
         return queryset.filter(
-            protein_conformation__protein__entry_name=self.kwargs.get('entry_name')).prefetch_related('display_generic_number','protein_segment','alternative_generic_numbers')
+            protein_conformation__protein__entry_name=self.kwargs.get('entry_name'))
+
+    def list(self, request, *args, **kwargs):
+        # the alternative generic numbers are rendered from the numbering table of the receptor class
+        protein = Protein.objects.filter(entry_name=self.kwargs.get('entry_name')).values_list('pk',
+            'family__slug').first()
+        if protein is None:
+            return Response([])
+        protein_id, family_slug = protein
+        numbering_table = get_numbering_table(family_slug[:3])
+        schemes = list(ResidueNumberingScheme.objects.order_by('pk').values_list('slug', 'short_name'))
+
+        residues = []
+        for sequence_number, amino_acid, segment, gn, display_gn in self.get_queryset().values_list(
+            'sequence_number', 'amino_acid', 'protein_segment__slug', 'generic_number__label',
+            'display_generic_number__label'):
+            residue = OrderedDict([('sequence_number', sequence_number), ('amino_acid', amino_acid),
+                ('protein_segment', segment), ('display_generic_number', display_gn)])
+            if self.alternative_generic_numbers:
+                residue['alternative_generic_numbers'] = []
+                if gn is not None:
+                    for slug, short_name in schemes:
+                        label = numbering_table.label(gn, slug, protein_id)
+                        if label is not None:
+                            residue['alternative_generic_numbers'].append(
+                                OrderedDict([('scheme', short_name), ('label', label)]))
+            residues.append(residue)
+        return Response(residues)
 
 
 class ResiduesExtendedList(ResiduesList):
@@ -174,6 +203,7 @@ class ResiduesExtendedList(ResiduesList):
     """
 
     serializer_class = ResidueExtendedSerializer
+    alternative_generic_numbers = True
 
 
 class SpeciesList(generics.ListAPIView):
@@ -8,6 +8,7 @@ from protein.models import (Protein, ProteinGProtein,ProteinGProteinPair, Protei
         ProteinSequenceType, Species, Gene, ProteinSource, ProteinSegment)
 
 from residue.models import (ResidueNumberingScheme, ResidueGenericNumber, Residue, ResidueGenericNumberEquivalent)
+from residue.functions import reset_generic_number_index
 
 from signprot.models import SignprotComplex
 
@@ -49,6 +50,8 @@ class Command(BaseBuild):
 		self.build_scheme()
 		self.get_segments()
 		self.build_residues()
+		# generic numbers have changed, drop the in-memory index
+		reset_generic_number_index()
 
 	def build_scheme(self):
 		self.scheme, created = ResidueNumberingScheme.objects.get_or_create(slug='ecd', short_name='ECD', name='Class B GPCR Extracellular domain', parent=None)
@@ -47,22 +47,25 @@ class Command(BaseCommand):
             ['build_ligands_from_cache', {'proc': options['proc'], 'test_run': options['test']}],
             ['build_ligand_assays', {'proc': options['proc'], 'test_run': options['test']}],
             ['build_mutant_data', {'proc': options['proc'], 'test_run': options['test']}],
+            ['build_mutation_summary'],
             ['build_protein_sets'],
             ['build_consensus_sequences', {'proc': options['proc']}],
             ['build_g_proteins'],
+            ['build_coupling_matrix'],
             ['build_arrestins'],
             ['build_signprot_complex'],
             ['build_g_protein_structures'],
             ['build_drugs'],
             ['build_nhs'],
-            ['build_mutational_landscape'],
             ['build_residue_sets'],
+            ['build_mutational_landscape'],
             ['build_dynamine_annotation', {'proc': options['proc']}],
             ['build_blast_database'],
             ['build_complex_interactions'],
             # ['build_homology_models', ['--update', '-z'], {'proc': options['proc'], 'test_run': options['test']}],
             ['build_text'],
             ['build_release_notes'],
+            ['warm_cache', {'proc': options['proc']}],
         ]
 
         for c in commands:
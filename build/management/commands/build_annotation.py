@@ -263,6 +263,7 @@ class Command(BaseBuild):
         # print(data)
         counter = 0
         lacking = []
+        residue_builder = BulkResidueBuilder(self.schemes)
         while count.value<len(self.pconfs):
             with lock:
                 p = self.pconfs[count.value]
@@ -413,8 +414,6 @@ class Command(BaseBuild):
             pconf = p
             # print(pconf)
             al = []
-            bulk = []
-            bulk_alt = []
 
             current = time.time()
 
@@ -436,21 +435,11 @@ class Command(BaseBuild):
 
                 # print("\t",res)
 
-                bulk_info = create_or_update_residue(pconf, segment, self.schemes,res,b_and_c)
-                bulk.append(bulk_info[0])
-                bulk_alt.append(bulk_info[1])
+                residue_builder.add_residue(pconf, segment, res, b_and_c)
 
                 al.append(res)
 
-            bulked = Residue.objects.bulk_create(bulk)
-            rs = Residue.objects.filter(protein_conformation=pconf).order_by('sequence_number')
-
-            ThroughModel = Residue.alternative_generic_numbers.through
-            bulk = []
-            for i,res in enumerate(rs):
-                for alt in bulk_alt[i]:
-                    bulk.append(ThroughModel(residue_id=res.pk, residuegenericnumber_id=alt.pk))
-            ThroughModel.objects.bulk_create(bulk)
+            rs = residue_builder.write()
             end = time.time()
             diff = round(end - current,1)
             self.logger.info('{} {} residues ({}) {}s alignment {}'.format(p.protein.entry_name,len(rs),human_ortholog,diff,aligned_gn_mismatch_gap))
@@ -8,6 +8,7 @@ from common.models import WebResource, WebLink
 from protein.models import (Protein, ProteinConformation, ProteinState, ProteinFamily, ProteinAlias, ProteinSequenceType, Species, Gene, ProteinSource, ProteinSegment)
 
 from residue.models import (ResidueNumberingScheme, ResidueGenericNumber, Residue, ResidueGenericNumberEquivalent)
+from residue.functions import reset_generic_number_index
 
 from signprot.models import SignprotStructure
 import pandas as pd
@@ -53,6 +54,9 @@ class Command(BaseCommand):
         # add residues
         self.add_can_residues()
 
+        # generic numbers have changed, drop the in-memory index
+        reset_generic_number_index()
+
         # except Exception as msg:
         #     print(msg)
         #     self.logger.error(msg)
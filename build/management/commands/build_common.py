@@ -6,6 +6,7 @@ from protein.models import (ProteinSegment, ProteinAnomaly, ProteinAnomalyType,
     ProteinAnomalyRule)
 from ligand.models import Ligand, LigandProperities, LigandType, LigandRole
 from residue.models import ResidueGenericNumber, ResidueNumberingScheme
+from residue.functions import reset_generic_number_index
 from news.models import News
 
 import logging
@@ -42,6 +43,9 @@ class Command(BaseCommand):
                 print(msg)
                 self.logger.error(msg)
 
+        # generic numbers have changed, drop the in-memory index
+        reset_generic_number_index()
+
     def create_resources(self):
         self.logger.info('CREATING RESOURCES')
         self.logger.info('Parsing file ' + self.resource_source_file)
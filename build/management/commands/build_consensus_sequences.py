@@ -8,10 +8,10 @@ from residue.functions import *
 from protein.models import Protein, ProteinConformation, ProteinFamily, ProteinSegment, ProteinSequenceType
 from common.alignment import Alignment
 from alignment.models import AlignmentConsensus
+from alignment.consensus import ConsensusData, get_consensus
 
 import os
 import yaml
-import pickle
 
 class Command(BuildHumanProteins):
     help = 'Builds consensus sequences for human proteins in all families'
@@ -105,14 +105,16 @@ class Command(BuildHumanProteins):
             a.calculate_statistics()
 
             try:
-                # Save alignment
-                AlignmentConsensus.objects.create(slug=family.slug, alignment=pickle.dumps(a))
-
-                # Load alignment to ensure it works
-                a = pickle.loads(AlignmentConsensus.objects.get(slug=family.slug).alignment)
-                self.logger.info('Succesfully pickled {}'.format(family))
-            except:
-                self.logger.error('Failed pickle for {}'.format(family))
+                # Save consensus statistics
+                AlignmentConsensus.objects.create(slug=family.slug,
+                    consensus=ConsensusData.from_alignment(a).dumps())
+
+                # Load consensus to ensure it works
+                if get_consensus(family.slug) is None:
+                    raise ValueError('Stored consensus could not be read')
+                self.logger.info('Succesfully stored consensus for {}'.format(family))
+            except Exception as msg:
+                self.logger.error('Failed storing consensus for {} {}'.format(family, msg))
 
             self.logger.info('Completed building alignment for {}'.format(family))
 
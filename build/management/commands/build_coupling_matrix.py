@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from signprot.couplings import CouplingMatrix
+
+import logging
+
+
+class Command(BaseCommand):
+    help = 'Builds the coupling matrix of the receptors and G proteins from the coupling data'
+
+    logger = logging.getLogger(__name__)
+
+    def handle(self, *args, **options):
+        self.logger.info('CREATING COUPLING MATRIX')
+        matrix = CouplingMatrix.from_database()
+        matrix.save()
+        self.logger.info('COMPLETED COUPLING MATRIX, {} receptors, {} G protein families, {} subunits'.format(
+            len(matrix.receptors), len(matrix.families), len(matrix.subunits)))
@@ -10,6 +10,7 @@ from protein.models import (Protein, ProteinGProtein,ProteinGProteinPair, Protei
         ProteinSequenceType, Species, Gene, ProteinSource, ProteinSegment)
 
 from residue.models import (ResidueNumberingScheme, ResidueGenericNumber, Residue, ResidueGenericNumberEquivalent)
+from residue.functions import reset_generic_number_index
 
 from signprot.models import SignprotStructure, SignprotBarcode, SignprotComplex
 import pandas as pd
@@ -174,6 +175,9 @@ class Command(BaseCommand):
                 print(exc_type, fname, exc_tb.tb_lineno)
                 self.logger.error(msg)
 
+        # residues and generic numbers have changed, drop the in-memory index
+        reset_generic_number_index()
+
     def add_other_subunits(self):
         beta_fam, created = ProteinFamily.objects.get_or_create(slug='100_002', name='Beta', parent=ProteinFamily.objects.get(name='G-Protein'))
         gigsgt, created = ProteinFamily.objects.get_or_create(slug='100_002_001', name='G(I)/G(S)/G(T)', parent=beta_fam)
@@ -46,6 +46,9 @@ class Command(BaseBuild):
             print(msg)
             self.logger.error(msg)
 
+        # residues have changed, drop the in-memory generic number index
+        reset_generic_number_index()
+
     def main_func(self, positions, iteration):
         # pconfs
         if not positions[1]:
@@ -9,7 +9,7 @@ from protein.models import Protein
 from ligand.models import Ligand, LigandProperities, LigandRole, LigandType, ChemblAssay, AssayExperiment
 from ligand.models import LigandVendorLink, LigandVendors
 from ligand.functions import get_or_make_ligand
-from common.tools import fetch_from_web_api
+from common.tools import fetch_from_web_api, prefetch_from_web_api
 from collections import defaultdict
 import requests
 from optparse import make_option
@@ -303,6 +303,8 @@ class Command(BaseBuild):
     ##call pubchem service to find cids for chembl
     def find_cid(self, chembl_mol_ids, chembl_cid_dict):
         notfound = set()
+        prefetch_from_web_api('https://www.ebi.ac.uk/unichem/rest/src_compound_id_all/$index/1/22',
+            [chembl_mol_id for chembl_mol_id in chembl_mol_ids if chembl_mol_id not in chembl_cid_dict])
         for chembl_mol_id in chembl_mol_ids:
             
             if chembl_mol_id not in chembl_cid_dict.keys():
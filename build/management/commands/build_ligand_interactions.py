@@ -0,0 +1,78 @@
+from django.conf import settings
+
+from build.management.commands.base_build import Command as BaseBuild
+from interaction.views import parsecalculation
+from structure.models import Structure
+
+import logging
+import os
+import time
+import yaml
+
+
+class Command(BaseBuild):
+    help = 'Calculate the ligand interactions of all crystal structures in-process, one structure per process at a time'
+
+    logger = logging.getLogger(__name__)
+
+    # source file directory
+    structure_data_dir = os.sep.join([settings.DATA_DIR, 'structure_data', 'structures'])
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--proc',
+            type=int,
+            action='store',
+            dest='proc',
+            default=1,
+            help='Number of processes to run')
+        parser.add_argument('-s', '--structure',
+            type=str,
+            action='store',
+            dest='structure',
+            nargs='+',
+            help='PDB codes of the structures to calculate, all when not given')
+
+    def handle(self, *args, **options):
+        structures = Structure.objects.filter(pdb_data__isnull=False).exclude(refined=True)
+        if options['structure']:
+            structures = structures.filter(pdb_code__index__in=[s.upper() for s in options['structure']])
+        self.structures = list(structures.select_related('pdb_code').order_by('pdb_code__index'))
+        self.peptide_chains = self.get_peptide_chains()
+        self.prepare_input(options['proc'], self.structures)
+        self.logger.info('Finished calculating ligand interactions for {} structures'.format(len(self.structures)))
+
+    def get_peptide_chains(self):
+        """Chain of the peptide ligand per PDB code, from the structure annotation as in build_structures"""
+        peptide_chains = {}
+        for source_file in os.listdir(self.structure_data_dir):
+            source_file_path = os.sep.join([self.structure_data_dir, source_file])
+            if not os.path.isfile(source_file_path) or source_file[0] == '.':
+                continue
+            with open(source_file_path, 'r') as f:
+                sd = yaml.load(f)
+            if 'pdb' not in sd or 'ligand' not in sd or not sd['ligand'] or sd['ligand'] == 'None':
+                continue
+            ligands = sd['ligand'] if isinstance(sd['ligand'], list) else [sd['ligand']]
+            # the last annotated ligand decides, as in build_structures
+            peptide_chains[sd['pdb']] = ligands[-1]['chain'] if 'chain' in ligands[-1] else ''
+        return peptide_chains
+
+    def main_func(self, positions, iteration, count, lock):
+        from interaction.calculation import calculate_interactions
+
+        while count.value < len(self.structures):
+            with lock:
+                s = self.structures[count.value]
+                count.value += 1
+                self.logger.info('Calculating ligand interactions for {} ({} out of {})'.format(s.pdb_code.index,
+                    count.value, len(self.structures)))
+
+            pdb_code = s.pdb_code.index
+            try:
+                current = time.time()
+                results = calculate_interactions(pdb_code, s.pdb_data.pdb, self.peptide_chains.get(pdb_code, ''))
+                parsecalculation(pdb_code, False, results=results)
+                self.logger.info('Interaction calculations done for {}. {} seconds.'.format(pdb_code,
+                    round(time.time() - current, 1)))
+            except Exception as msg:
+                self.logger.error('Error with ligand interactions for {}: {}'.format(pdb_code, msg))
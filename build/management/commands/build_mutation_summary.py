@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from interaction.models import ResidueFragmentInteraction
+from mutation.models import MutationExperiment, MutationCoverage, MutationPositionSummary
+
+import logging
+
+
+# interaction types that are not counted as ligand contacts
+IGNORED_INTERACTION_TYPES = ['polar_backbone', 'acc']
+
+def foldchange_between(low, high=None):
+    # absolute fold change in [low, high)
+    q = Q(foldchange__gte=low) | Q(foldchange__lte=-low)
+    if high:
+        q &= Q(foldchange__lt=high, foldchange__gt=-high)
+    return q
+
+
+class Command(BaseCommand):
+    help = 'Builds the mutation and ligand interaction counts per receptor family and per generic number'
+
+    logger = logging.getLogger(__name__)
+
+    def handle(self, *args, **options):
+        try:
+            self.purge_data()
+            self.create_coverage()
+            self.create_position_summary()
+        except Exception as msg:
+            print(msg)
+            self.logger.error(msg)
+
+    def purge_data(self):
+        MutationCoverage.objects.all().delete()
+        MutationPositionSummary.objects.all().delete()
+
+    def create_coverage(self):
+        self.logger.info('CREATING MUTATION COVERAGE')
+        coverage = {}
+
+        mutations = MutationExperiment.objects.values(family_id=F('protein__family_id')).annotate(
+            mutations=Count('id'),
+            mutations_annotated=Count('id', filter=Q(exp_func__isnull=False) | ~Q(foldchange=0)
+                | Q(exp_qual__isnull=False) | Q(ligand__isnull=False)))
+        for m in mutations:
+            coverage[m['family_id']] = MutationCoverage(family_id=m['family_id'], mutations=m['mutations'],
+                mutations_annotated=m['mutations_annotated'])
+
+        interactions = ResidueFragmentInteraction.objects.filter(structure_ligand_pair__annotated=True).exclude(
+            interaction_type__slug__in=IGNORED_INTERACTION_TYPES).values(
+            family_id=F('structure_ligand_pair__structure__protein_conformation__protein__parent__family_id')).annotate(
+            interactions=Count('id'))
+        for i in interactions:
+            if i['family_id'] not in coverage:
+                coverage[i['family_id']] = MutationCoverage(family_id=i['family_id'])
+            coverage[i['family_id']].interactions = i['interactions']
+
+        MutationCoverage.objects.bulk_create(coverage.values())
+        self.logger.info('COMPLETED MUTATION COVERAGE, {} families'.format(len(coverage)))
+
+    def create_position_summary(self):
+        self.logger.info('CREATING MUTATION POSITION SUMMARY')
+        summary = {}
+
+        mutations = MutationExperiment.objects.exclude(residue__generic_number=None).values('protein_id',
+            generic_number_id=F('residue__generic_number_id')).annotate(
+            mutations=Count('id'),
+            mutations_ligand=Count('id', filter=Q(ligand__isnull=False)),
+            foldchange_below_2=Count('id', filter=Q(foldchange__gt=-2, foldchange__lt=2) & ~Q(foldchange=0)),
+            foldchange_2_5=Count('id', filter=foldchange_between(2, 5)),
+            foldchange_5_10=Count('id', filter=foldchange_between(5, 10)),
+            foldchange_above_10=Count('id', filter=foldchange_between(10)))
+        for m in mutations:
+            summary[(m['protein_id'], m['generic_number_id'])] = MutationPositionSummary(**m)
+
+        # interactions are counted on the wild type protein of the structure
+        interactions = ResidueFragmentInteraction.objects.filter(structure_ligand_pair__annotated=True).exclude(
+            rotamer__residue__generic_number=None).values(
+            protein_id=F('rotamer__residue__protein_conformation__protein__parent_id'),
+            generic_number_id=F('rotamer__residue__generic_number_id')).annotate(
+            interactions=Count('id', filter=~Q(interaction_type__slug__in=IGNORED_INTERACTION_TYPES)),
+            interaction_structures=Count('rotamer__structure', distinct=True))
+        for i in interactions:
+            key = (i['protein_id'], i['generic_number_id'])
+            if key not in summary:
+                summary[key] = MutationPositionSummary(protein_id=key[0], generic_number_id=key[1])
+            summary[key].interactions = i['interactions']
+            summary[key].interaction_structures = i['interaction_structures']
+
+        MutationPositionSummary.objects.bulk_create(summary.values(), batch_size=5000)
+        self.logger.info('COMPLETED MUTATION POSITION SUMMARY, {} positions'.format(len(summary)))
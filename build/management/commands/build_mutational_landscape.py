@@ -7,6 +7,7 @@ from protein.models import (Protein, ProteinGProtein,ProteinGProteinPair, Protei
         ProteinSequenceType, Species, Gene, ProteinSource, ProteinSegment)
 from residue.models import (ResidueNumberingScheme, ResidueGenericNumber, Residue, ResidueGenericNumberEquivalent)
 from mutational_landscape.models import NaturalMutations, CancerMutations, DiseaseMutations, PTMs
+from mutational_landscape.summary import VariantSummary
 
 import pandas as pd
 import numpy as np
@@ -41,6 +42,7 @@ class Command(BaseCommand):
             self.create_natural_mutations()
             # self.create_cancer_mutations()
             # self.create_disease_mutations()
+            self.create_variant_summary()
         except Exception as msg:
             print(msg)
             self.logger.error(msg)
@@ -116,6 +118,14 @@ class Command(BaseCommand):
 
         self.logger.info('COMPLETED CREATING NATURAL MUTATIONS')
 
+    def create_variant_summary(self):
+        # the functional sites of the variants need the residue sets of build_residue_sets
+        self.logger.info('CREATING VARIANT SUMMARY')
+        summary = VariantSummary.from_database()
+        summary.save()
+        self.logger.info('COMPLETED VARIANT SUMMARY, {} receptors, {} variants'.format(len(summary.receptors),
+            len(summary.arrays['variant_receptor'])))
+
     def create_cancer_mutations(self, filenames=False):
         self.logger.info('CREATING CANCER MUTATIONS')
 
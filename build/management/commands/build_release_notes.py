@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
 from common.models import ReleaseNotes, ReleaseStatistics, ReleaseStatisticsType
+from common.release import write_release_version
 from protein.models import Protein, Species
 from ligand.models import Ligand
 from structure.models import Structure, StructureModel, StructureComplexModel
@@ -27,6 +28,10 @@ class Command(BaseCommand):
             print(msg)
             self.logger.error(msg)
 
+        # stamp the new data release, invalidates cached pages and ETags
+        version = write_release_version()
+        self.logger.info('Data release version {}'.format(version))
+
     def create_release_notes(self):
         self.logger.info('CREATING RELEASE NOTES')
 
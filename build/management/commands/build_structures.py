@@ -25,7 +25,7 @@ from structure.assign_generic_numbers_gpcr import GenericNumbering
 from ligand.models import Ligand, LigandType, LigandRole, LigandProperities
 from interaction.models import *
 from interaction.views import runcalculation,parsecalculation
-from residue.functions import dgn
+from residue.functions import dgn, reset_generic_number_index
 
 import logging
 import os
@@ -147,6 +147,9 @@ class Command(BaseBuild):
             print(msg)
             self.logger.error(msg)
 
+        # residues and generic numbers have changed, drop the in-memory index
+        reset_generic_number_index()
+
     def purge_structures(self):
         Structure.objects.all().delete()
         ResidueFragmentInteraction.objects.all().delete()
@@ -1500,9 +1503,9 @@ class Command(BaseBuild):
                             mypath = '/tmp/interactions/results/' + sd['pdb'] + '/output'
                             # if not os.path.isdir(mypath):
                             #     #Only run calcs, if not already in temp
-                            runcalculation(sd['pdb'],peptide_chain)
+                            results = runcalculation(sd['pdb'],peptide_chain)
 
-                            parsecalculation(sd['pdb'],False)
+                            parsecalculation(sd['pdb'],False,results=results)
                             end = time.time()
                             diff = round(end - current,1)
                             self.logger.info('Interaction calculations done for {}. {} seconds.'.format(
@@ -1513,9 +1516,9 @@ class Command(BaseBuild):
                                 mypath = '/tmp/interactions/results/' + sd['pdb'] + '/output'
                                 # if not os.path.isdir(mypath):
                                 #     #Only run calcs, if not already in temp
-                                runcalculation(sd['pdb'],peptide_chain)
+                                results = runcalculation(sd['pdb'],peptide_chain)
 
-                                parsecalculation(sd['pdb'],False)
+                                parsecalculation(sd['pdb'],False,results=results)
                                 end = time.time()
                                 diff = round(end - current,1)
                                 self.logger.info('Interaction calculations done (again) for {}. {} seconds.'.format(
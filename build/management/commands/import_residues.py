@@ -4,6 +4,7 @@ from django.db import connection
 
 from protein.models import Protein, ProteinConformation, ProteinSegment
 from residue.models import Residue, ResidueGenericNumber, ResidueNumberingScheme
+from residue.functions import reset_generic_number_index
 
 import Bio.PDB.Polypeptide as polypeptide
 from optparse import make_option
@@ -44,6 +45,9 @@ class Command(BaseCommand):
         # create residue records for all proteins
         self.create_residues(args)
 
+        # generic numbers have changed, drop the in-memory index
+        reset_generic_number_index()
+
     def truncate_residue_tables(self):
         cursor = connection.cursor()
         
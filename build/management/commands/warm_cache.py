@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.utils.module_loading import import_string
+
+from multiprocessing import Pool
+
+import datetime
+import logging
+import os
+import time
+import yaml
+
+
+def warm_entry(entry, host):
+    """Compute a single manifest entry, returns (key, status, seconds)"""
+    start = time.time()
+    if isinstance(entry, dict):
+        key = entry['function']
+        try:
+            import_string(entry['function'])(*entry.get('args', []), **entry.get('kwargs', {}))
+            status = 'OK'
+        except Exception as msg:
+            status = 'ERROR {}'.format(msg)
+        if entry.get('args'):
+            key = '{}({})'.format(key, ', '.join([str(a) for a in entry['args']]))
+    else:
+        key = entry
+        try:
+            response = Client(HTTP_HOST=host).get(entry)
+            status = response.status_code
+        except Exception as msg:
+            status = 'ERROR {}'.format(msg)
+    return key, status, round(time.time() - start, 2)
+
+def _warm_entry(args):
+    return warm_entry(*args)
+
+
+class Command(BaseCommand):
+    help = 'Precomputes the cached heavy pages and calculations after a build'
+
+    logger = logging.getLogger(__name__)
+
+    manifest_file = os.sep.join([settings.DATA_DIR, 'cache_warming.yaml'])
+
+    # used when there is no manifest in the data directory
+    # strings are requested as URLs, dicts are imported and called with the given arguments
+    default_manifest = [
+        '/mutations/coverage',
+        '/drugs/drugstatistics',
+        '/drugs/drugbrowser',
+        '/drugs/drugmapping',
+        '/structure/',
+        '/structure/statistics',
+        '/signprot/couplings',
+        '/signprot/statistics',
+        '/mutational_landscape/statistics',
+        '/mutational_landscape/economicburden',
+        {'function': 'contactnetwork.views.get_class_pair_conservation', 'args': ['001']},
+        {'function': 'protein.functions.get_search_index'},
+    ] + ['/alignment/render/{}/'.format(c) for c in ['001', '002', '003', '004', '005', '006']] \
+      + [{'function': 'residue.functions.get_numbering_table', 'args': [c]}
+        for c in ['001', '002', '003', '004', '005', '006']]
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--proc',
+            type=int,
+            action='store',
+            dest='proc',
+            default=1,
+            help='Number of processes to run')
+        parser.add_argument('-m', '--manifest',
+            action='store',
+            dest='manifest',
+            default=False,
+            help='YAML file with the list of URLs and functions to precompute')
+        parser.add_argument('--host',
+            action='store',
+            dest='host',
+            default='localhost',
+            help='Host name used for the requests, must match the public host as it is part of the page cache keys')
+        parser.add_argument('--clear',
+            action='store_true',
+            dest='clear',
+            default=False,
+            help='Clear the cache before warming it')
+
+    def handle(self, *args, **options):
+        manifest = self.read_manifest(options['manifest'])
+
+        if options['clear']:
+            cache.clear()
+            self.logger.info('Cache cleared')
+
+        self.logger.info('WARMING CACHE WITH {} ENTRIES'.format(len(manifest)))
+        start = time.time()
+
+        # close the connection before forking, each worker opens its own
+        connection.close()
+        jobs = [(entry, options['host']) for entry in manifest]
+        with Pool(max(1, min(options['proc'], len(jobs)))) as pool:
+            results = []
+            for key, status, seconds in pool.imap_unordered(_warm_entry, jobs):
+                print('{} {} {}s'.format(key, status, seconds))
+                self.logger.info('Warmed {} {} in {}s'.format(key, status, seconds))
+                results.append((key, status, seconds))
+
+        with open(os.path.join(settings.BASE_DIR, "logs/cache_warming.log"), "a") as text_file:
+            now = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+            for key, status, seconds in sorted(results, key=lambda x: -x[2]):
+                text_file.write('%s %s %s %s\n' % (now, seconds, status, key))
+
+        self.logger.info('COMPLETED WARMING CACHE in {}s'.format(round(time.time() - start, 2)))
+
+    def read_manifest(self, filename):
+        if not filename:
+            if not os.path.isfile(self.manifest_file):
+                return self.default_manifest
+            filename = self.manifest_file
+
+        if not os.path.isfile(filename):
+            raise CommandError('Manifest {} does not exist'.format(filename))
+        with open(filename, 'r') as f:
+            manifest = yaml.load(f)
+        if not isinstance(manifest, list):
+            raise CommandError('Manifest {} should contain a list of URLs and functions'.format(filename))
+        return manifest
@@ -0,0 +1,5 @@
+from build.management.commands.build_coupling_matrix import Command as BuildCouplingMatrix
+
+
+class Command(BuildCouplingMatrix):
+    pass
@@ -5,7 +5,7 @@ from django.conf import settings
 
 from protein.models import Protein, ProteinConformation, ProteinAnomaly, ProteinState, ProteinSegment
 from residue.models import Residue
-from residue.functions import dgn, ggn
+from residue.functions import dgn, ggn, translate_generic_numbers
 from structure.models import *
 from structure.functions import HSExposureCB, PdbStateIdentifier, update_template_source, StructureSeqNumOverwrite
 from common.alignment import AlignedReferenceTemplate, GProteinAlignment
@@ -2145,9 +2145,10 @@ class HomologyModeling(object):
                     continue
                 first_gn = list_keys[0]
                 first_temp = self.template_source[seg][first_gn][0]
+                translated = translate_generic_numbers([gn for gn in list_keys if 'x' in gn], self.prot_conf)
                 if 'x' in first_gn:
                     try:
-                        first_seqnum = Residue.objects.get(protein_conformation=self.prot_conf,display_generic_number__label=dgn(list_keys[0],self.prot_conf)).sequence_number
+                        first_seqnum = translated[first_gn].sequence_number
                     except:
                         try:
                             first_seqnum = int(list_keys[0])
@@ -2161,7 +2162,9 @@ class HomologyModeling(object):
                 for gn, res in resis.items():
                     key = gn
                     if 'x' in gn:
-                        seq_num = Residue.objects.get(protein_conformation=self.prot_conf,display_generic_number__label=dgn(gn,self.prot_conf)).sequence_number
+                        if translated[gn] is None:
+                            raise Residue.DoesNotExist('No residue with generic number {} in {}'.format(gn, self.prot_conf))
+                        seq_num = translated[gn].sequence_number
                         curr_seqnum = seq_num
                     elif self.complex and first_gn!=None and len(first_gn.split('.'))==3:
                         seq_num = Residue.objects.get(protein_conformation=self.signprot_protconf,display_generic_number__label=gn).sequence_number
@@ -0,0 +1,5 @@
+from build.management.commands.build_ligand_interactions import Command as BuildLigandInteractions
+
+
+class Command(BuildLigandInteractions):
+    pass
@@ -0,0 +1,5 @@
+from build.management.commands.build_mutation_summary import Command as BuildMutationSummary
+
+
+class Command(BuildMutationSummary):
+    pass
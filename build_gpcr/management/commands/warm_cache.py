@@ -0,0 +1,5 @@
+from build.management.commands.warm_cache import Command as WarmCache
+
+
+class Command(WarmCache):
+    pass
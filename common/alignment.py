@@ -12,8 +12,7 @@ from common.definitions import *
 from protein.models import Protein, ProteinConformation, ProteinState, ProteinSegment, ProteinFusionProtein, ProteinFamily
 from residue.models import Residue
 from residue.models import ResidueGenericNumber, ResidueGenericNumberEquivalent
-from residue.models import ResidueNumberingScheme
-from residue.functions import dgn, ggn
+from residue.functions import ggn, get_numbering_scheme, translate_generic_numbers
 from structure.models import Structure, Rotamer
 # from structure.functions import StructureSeqNumOverwrite
 from signprot.models import SignprotComplex
@@ -21,7 +20,6 @@ from signprot.models import SignprotComplex
 from collections import OrderedDict
 from copy import deepcopy
 from operator import itemgetter
-from Bio.SubsMat import MatrixInfo
 
 import hashlib
 import logging
@@ -55,7 +53,7 @@ class Alignment:
         self.features_combo = []
         self.feature_stats = []
         self.feat_consensus = OrderedDict()
-        self.default_numbering_scheme = ResidueNumberingScheme.objects.get(slug=settings.DEFAULT_NUMBERING_SCHEME)
+        self.default_numbering_scheme = get_numbering_scheme(settings.DEFAULT_NUMBERING_SCHEME)
         self.states = [settings.DEFAULT_PROTEIN_STATE] # inactive, active etc
         self.use_residue_groups = False
         self.ignore_alternative_residue_numbering_schemes = False # set to true if no numbering is to be displayed
@@ -1177,6 +1175,7 @@ class Alignment:
 
     def pairwise_similarity(self, protein_1, protein_2):
         """Calculate the identity, similarity and similarity score between a pair of proteins"""
+        from Bio.SubsMat import MatrixInfo
         identityscore = 0
         similarityscore = 0
         totalcount = 0
@@ -1217,6 +1216,7 @@ class Alignment:
     def pairwise_similarity_normalized(self, protein_1, protein_2):
         """Calculate the identity, similarity and similarity score between a pair of proteins but delete gaps and normalize. Used for finding closest
            receptor homologue with crystal structure."""
+        from Bio.SubsMat import MatrixInfo
         identities = OrderedDict()
         similarities = OrderedDict()
         similarity_scores = OrderedDict()
@@ -1550,13 +1550,11 @@ class AlignedReferenceTemplate(Alignment):
             else:
                 temp_length, temp_length1, temp_length2 = [],[],[]
                 try:
-                    alt_last_gn = Residue.objects.get(protein_conformation=struct.protein_conformation,
-                                                      display_generic_number__label=dgn(last_before_gn,
-                                                                                        struct.protein_conformation))
-                    alt_first_gn= Residue.objects.get(protein_conformation=struct.protein_conformation,
-                                                      display_generic_number__label=dgn(first_after_gn,
-                                                                                        struct.protein_conformation))
-                    temp_length = alt_first_gn.sequence_number-alt_last_gn.sequence_number-1
+                    flanks = translate_generic_numbers([last_before_gn, first_after_gn], struct.protein_conformation)
+                    if None in flanks.values():
+                        raise Residue.DoesNotExist('Loop flanks {} and {} not in {}'.format(last_before_gn,
+                            first_after_gn, struct.protein_conformation))
+                    temp_length = flanks[first_after_gn].sequence_number-flanks[last_before_gn].sequence_number-1
                     alt_seq = Residue.objects.filter(protein_conformation=struct.protein_conformation, protein_segment__slug=self.segment_labels[0])
                     if self.segment_labels[0]=='ECL2' and ref_ECL2!=None:
                         alt_ECL2 = self.ECL2_slicer(alt_seq)
@@ -0,0 +1,271 @@
+"""
+Benchmarks of the hot paths on the synthetic data of generate_benchmark_data, run by run_benchmarks.
+
+A benchmark of size N runs on the first N synthetic receptors and their structures. Its state is prepared untimed
+before every repeat, then run(state) is timed and its SQL queries counted. Each run is appended to the history in
+BENCHMARK_DIR together with the commit it measured, the baseline holds the last saved result of each benchmark and
+size that later runs are compared with.
+"""
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from angles.models import get_angle_averages
+from common.alignment import Alignment, cache_alignments
+from common.synthetic_data import BENCHMARK_FAMILY, HELICES, benchmark_pdb_codes, benchmark_receptors
+from contactnetwork.cube import compute_interactions
+from contactnetwork.distances import Distances
+from protein.models import ProteinSegment
+from seqsign.sequence_signature import SequenceSignature, SignatureMatch
+
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+
+import csv
+import json
+import os
+import statistics
+import subprocess
+import time
+
+
+# median time increase over the baseline, as fraction, that counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+BenchmarkData = namedtuple('BenchmarkData', ['size', 'receptors', 'pdb_codes'])
+
+
+def benchmark_dir():
+    return getattr(settings, 'BENCHMARK_DIR', os.sep.join([settings.BASE_DIR, 'benchmarks']))
+
+def baseline_file():
+    return os.sep.join([benchmark_dir(), 'baseline.json'])
+
+def history_file():
+    return os.sep.join([benchmark_dir(), 'history.jsonl'])
+
+def current_commit():
+    """Short hash of the checked out commit, with '+' appended if the tree has changes, '' outside of git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return commit + ('+' if changes else '')
+
+def benchmark_data(size):
+    receptors = benchmark_receptors()[:size]
+    return BenchmarkData(len(receptors), receptors, benchmark_pdb_codes(receptors))
+
+def result_key(result):
+    return '{}@{}'.format(result['benchmark'], result['size'])
+
+
+class Benchmark:
+
+    def __init__(self, name, run, prepare=None, min_receptors=1, min_structures=0):
+        self.name = name
+        self.run = run
+        self.prepare = prepare
+        self.min_receptors = min_receptors
+        self.min_structures = min_structures
+
+    def applicable(self, data):
+        return len(data.receptors) >= self.min_receptors and len(data.pdb_codes) >= self.min_structures
+
+    def measure(self, data, repeat=5):
+        """Median and fastest time in seconds and the number of SQL queries of a run"""
+        times = []
+        for i in range(repeat):
+            state = self.prepare(data) if self.prepare else data
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                self.run(state)
+                times.append(time.perf_counter() - start)
+        return {'benchmark': self.name, 'size': data.size, 'structures': len(data.pdb_codes), 'repeat': repeat,
+            'median': statistics.median(times), 'min': min(times), 'queries': len(queries.captured_queries)}
+
+
+BENCHMARKS = OrderedDict()
+
+def benchmark(name, prepare=None, min_receptors=1, min_structures=0):
+    """Registers the decorated function as the timed part of a benchmark"""
+    def register(run):
+        BENCHMARKS[name] = Benchmark(name, run, prepare, min_receptors, min_structures)
+        return run
+    return register
+
+
+def helix_segments():
+    return list(ProteinSegment.objects.filter(slug__in=HELICES, proteinfamily='GPCR'))
+
+def loaded_alignment(data):
+    alignment = Alignment()
+    alignment.load_proteins(data.receptors)
+    alignment.load_segments(helix_segments())
+    # timings of a cached alignment would not show changes of build_alignment
+    cache_alignments.delete('ALIGNMENTS_' + alignment.get_hash())
+    return alignment
+
+def built_alignment(data):
+    alignment = loaded_alignment(data)
+    alignment.build_alignment()
+    return alignment
+
+def signature_match(data):
+    """SignatureMatch of the first half of the receptors against the second half, as in the signature tool"""
+    half = len(data.receptors) // 2
+    positive, negative = data.receptors[:half], data.receptors[half:]
+    signature = SequenceSignature()
+    signature.setup_alignments(helix_segments(), positive, negative)
+    signature.calculate_signature()
+    session_data = signature.prepare_session_data()
+    return SignatureMatch(session_data['common_positions'], session_data['numbering_schemes'],
+        session_data['common_segments'], session_data['diff_matrix'], positive, negative, cutoff=0)
+
+def loaded_distances(data):
+    distances = Distances()
+    distances.load_pdbs(data.pdb_codes)
+    return distances
+
+
+@benchmark('alignment.build_alignment', prepare=loaded_alignment)
+def run_build_alignment(alignment):
+    alignment.build_alignment()
+
+@benchmark('alignment.calculate_statistics', prepare=built_alignment)
+def run_calculate_statistics(alignment):
+    alignment.calculate_statistics()
+
+@benchmark('alignment.calculate_similarity_matrix', prepare=built_alignment)
+def run_calculate_similarity_matrix(alignment):
+    alignment.calculate_similarity_matrix()
+
+@benchmark('seqsign.score_protein_class', prepare=signature_match, min_receptors=2)
+def run_score_protein_class(match):
+    match.score_protein_class(BENCHMARK_FAMILY)
+
+@benchmark('distances.get_distance_matrix', prepare=loaded_distances, min_structures=2)
+def run_get_distance_matrix(distances):
+    distances.get_distance_matrix(cache_enabled=False)
+
+@benchmark('cube.compute_interactions', min_structures=1)
+def run_compute_interactions(data):
+    for pdb_code in data.pdb_codes:
+        compute_interactions(pdb_code)
+
+@benchmark('angles.get_angle_averages', min_structures=1)
+def run_get_angle_averages(data):
+    get_angle_averages(data.pdb_codes, None)
+
+
+def api_client():
+    # a host the site accepts, the default 'testserver' is only allowed by the test runner
+    host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'testserver')
+    return Client(HTTP_HOST=host, HTTP_ACCEPT='application/json')
+
+def api_benchmark(name, path):
+    """Registers a GET of path, formatted with the entry names of the receptors (entry_name is the first)"""
+    def run(data):
+        entry_names = [r.entry_name for r in data.receptors]
+        response = api_client().get(path.format(entry_name=entry_names[0], entry_names=','.join(entry_names),
+            family=BENCHMARK_FAMILY))
+        if response.status_code != 200:
+            raise RuntimeError('{} returned {}'.format(name, response.status_code))
+    BENCHMARKS[name] = Benchmark(name, run)
+
+api_benchmark('api.protein', '/services/protein/{entry_name}/')
+api_benchmark('api.residues', '/services/residues/{entry_name}/')
+api_benchmark('api.alignment_protein', '/services/alignment/protein/{entry_names}/')
+api_benchmark('api.structure', '/services/structure/')
+api_benchmark('api.proteinfamily_proteins', '/services/proteinfamily/proteins/{family}/')
+
+
+def run_benchmarks(sizes, names=None, repeat=5):
+    """Results of the benchmarks (all if names is not set) at each size, skipping sizes a benchmark has too few
+    receptors or structures for"""
+    results = []
+    for size in sizes:
+        data = benchmark_data(size)
+        for name, bench in BENCHMARKS.items():
+            if (names is None or name in names) and bench.applicable(data):
+                results.append(bench.measure(data, repeat))
+    return results
+
+def load_baseline(filename=None):
+    try:
+        with open(filename or baseline_file()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(results, filename=None):
+    """Stores the results as baseline, keeping the baseline of benchmarks and sizes that did not run"""
+    filename = filename or baseline_file()
+    baseline = load_baseline(filename)
+    baseline.update({result_key(r): r for r in results})
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    os.replace(filename + '.tmp', filename)
+
+def append_history(results, commit, filename=None):
+    filename = filename or history_file()
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    with open(filename, 'a') as f:
+        for result in results:
+            f.write(json.dumps(dict(result, commit=commit, time=timestamp), sort_keys=True) + '\n')
+
+def load_history(filename=None):
+    try:
+        with open(filename or history_file()) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """(result, baseline result) of the results that are more than tolerance slower than their baseline or that run
+    more SQL queries"""
+    slower = []
+    for result in results:
+        base = baseline.get(result_key(result))
+        if base and (result['median'] > base['median'] * (1 + tolerance) or result['queries'] > base['queries']):
+            slower.append((result, base))
+    return slower
+
+def scaling_curves(results):
+    """Median time of each benchmark by size, as OrderedDict of benchmark to sorted [(size, median)]"""
+    curves = OrderedDict()
+    for result in results:
+        curves.setdefault(result['benchmark'], {})[result['size']] = result['median']
+    return OrderedDict((name, sorted(points.items())) for name, points in curves.items())
+
+def write_scaling_csv(results, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['benchmark', 'size', 'structures', 'median', 'min', 'queries'])
+        for r in sorted(results, key=lambda r: (r['benchmark'], r['size'])):
+            writer.writerow([r['benchmark'], r['size'], r['structures'], r['median'], r['min'], r['queries']])
+
+def plot_scaling(results, filename):
+    """Log-log plot of the median time of each benchmark by the number of receptors"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(9, 6))
+    for name, points in scaling_curves(results).items():
+        sizes, medians = zip(*points)
+        axes.plot(sizes, medians, marker='o', label=name)
+    axes.set_xscale('log')
+    axes.set_yscale('log')
+    axes.set_xlabel('Receptors (N)')
+    axes.set_ylabel('Median time (s)')
+    axes.legend(fontsize='small')
+    figure.tight_layout()
+    figure.savefig(filename)
+    plt.close(figure)
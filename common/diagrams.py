@@ -1,5 +1,8 @@
-﻿from math import cos, sin, tan, pi, sqrt, pow
+﻿from django.core.cache import cache
+
+from math import cos, sin, tan, pi, sqrt, pow
 import string, time, math, random
+import hashlib
 
 def uniqid(prefix='', more_entropy=False):
     m = time.time()
@@ -14,6 +17,25 @@ def uniqid(prefix='', more_entropy=False):
     return uniqid
 
 class Diagram:
+    # attributes holding the computed layout, these only depend on the residues and are cached
+    geometry_attributes = ()
+
+    def geometry_key(self, residue_data):
+        residue_hash = hashlib.md5(repr(residue_data).encode('utf-8')).hexdigest()
+        return 'diagram_geometry_{}_{}'.format(self.type, residue_hash)
+
+    def load_geometry(self, key):
+        geometry = cache.get(key)
+        if geometry is None:
+            return False
+        for attribute, value in geometry.items():
+            setattr(self, attribute, value)
+        return True
+
+    def save_geometry(self, key):
+        geometry = {attribute: getattr(self, attribute) for attribute in self.geometry_attributes}
+        cache.set(key, geometry, 60*60*24*30)
+
     def create(self, content,sizex,sizey,name, nobuttons):
         #diagram_js = self.diagramJS()
         if nobuttons=='gprotein' or nobuttons=='arrestin':
@@ -12,6 +12,8 @@ from datetime import datetime
 
 class DrawSnakePlot(Diagram):
 
+    geometry_attributes = ('output', 'traceoutput', 'helixoutput', 'TBCoords', 'high', 'low', 'maxY', 'maxX')
+
     def __init__(self, residue_list, protein_class,protein_name, nobuttons = None):
         self.nobuttons = nobuttons
         self.type = 'snakeplot'
@@ -104,6 +106,11 @@ class DrawSnakePlot(Diagram):
         self.traceoutput = ""
         self.helixoutput = ""
 
+        # the layout only depends on the residues, reuse it if this receptor was drawn before
+        geometry_key = self.geometry_key([self.family, self.segments])
+        if self.load_geometry(geometry_key):
+            return
+
         for i in range(1,8):
             try:
                 self.helixoutput += self.drawSnakePlotHelix(i)
@@ -130,6 +137,8 @@ class DrawSnakePlot(Diagram):
         self.drawSnakePlotLoops()
         self.drawSnakePlotTerminals()
 
+        self.save_geometry(geometry_key)
+
     def __str__(self):
 
         self.output_final = "<g id=snake transform='translate(0, " + str(-self.low+ self.offsetY) + ")'>" + self.traceoutput+self.output+self.helixoutput+self.drawToolTip() + "</g>"; #for resizing height
@@ -896,6 +905,7 @@ class DrawHelixBox(Diagram):
     plot_data['Class C']['helixTopResidues'] = [0, 34, 61, 26, 61, 38, 57, 35]
     plot_data['Class C']['rotation'] = [0, 170, 200, 290, 145, 250, 210, 310] # in degrees
 
+    geometry_attributes = ('output', )
 
     def __init__(self, residue_list, protein_class,protein_name, nobuttons = None):
         self.nobuttons = nobuttons
@@ -924,6 +934,18 @@ class DrawHelixBox(Diagram):
 
                 segment_lists[r.segment_slug].append(r)
 
+        # the layout only depends on the residues, reuse it if this receptor was drawn before
+        residue_data = [self.family]
+        for slug, residues in segment_lists.items():
+            for r in residues:
+                residue_data.append([slug, r.amino_acid, r.sequence_number,
+                    r.generic_number.label if r.generic_number else getattr(r, 'family_generic_number', ''),
+                    r.display_generic_number.label if r.display_generic_number else '',
+                    getattr(r, 'frequency', '')])
+        geometry_key = self.geometry_key(residue_data)
+        if self.load_geometry(geometry_key):
+            return
+
         for i in range(1,len(self.plot_data[self.family]['coordinates'])):
             try:
                 self.residuelist = segment_lists['TM'+str(i)]
@@ -941,6 +963,8 @@ class DrawHelixBox(Diagram):
                 print('failed helix',i,msg)
                 pass
 
+        self.save_geometry(geometry_key)
+
     def __str__(self):
         return mark_safe(self.create(self.output+self.drawToolTip(),595,430,"helixbox", self.nobuttons))
 
@@ -0,0 +1,168 @@
+"""
+Streaming Excel and CSV exports.
+
+Workbooks are written by xlsxwriter into a temporary file, in constant_memory mode only the current row of a
+worksheet is kept in memory, and the file is sent to the client in chunks. In constant_memory mode the cells of a
+worksheet have to be written row by row, cells of a row before the current one are dropped by xlsxwriter.
+Exports that are built by one request and downloaded by the next (the construct tool) are kept in EXPORT_DIR until
+they are downloaded, instead of being passed through the cache.
+"""
+from django.conf import settings
+from django.http import FileResponse, Http404, StreamingHttpResponse
+
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# stored exports not downloaded within this many seconds are removed
+EXPORT_MAX_AGE = 3600
+
+EXPORT_TOKEN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def format_key(properties):
+    return json.dumps(properties, sort_keys=True)
+
+_workbook_class = []
+
+def workbook_class():
+    """xlsxwriter.Workbook that returns the same Format for equal properties. xlsxwriter keeps every Format until the
+    workbook is closed, one per cell for colored alignments. The Formats are shared and must not be changed"""
+    if not _workbook_class:
+        import xlsxwriter
+
+        class ExportWorkbook(xlsxwriter.Workbook):
+
+            def __init__(self, filename=None, options=None):
+                self.shared_formats = {}
+                super().__init__(filename, options)
+
+            def add_format(self, properties=None):
+                if properties is None:
+                    return super().add_format()
+                key = format_key(properties)
+                if key not in self.shared_formats:
+                    self.shared_formats[key] = super().add_format(properties)
+                return self.shared_formats[key]
+
+        _workbook_class.append(ExportWorkbook)
+    return _workbook_class[0]
+
+def open_workbook(output, constant_memory=True):
+    """Workbook writing to output (a file name or binary file), without constant_memory the cells can be written in
+    any order but are kept in memory until the workbook is closed"""
+    return workbook_class()(output, {'constant_memory': constant_memory, 'in_memory': False})
+
+def file_response(f, filename, content_type=XLSX_CONTENT_TYPE):
+    """Streams the open file f from its start as attachment, the file is closed when the response is"""
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    response = FileResponse(f, as_attachment=True, filename=filename, content_type=content_type)
+    response['Content-Length'] = size
+    return response
+
+def excel_response(filename, write, constant_memory=True):
+    """Streams the workbook that write(workbook) fills"""
+    output = tempfile.TemporaryFile()
+    try:
+        workbook = open_workbook(output, constant_memory)
+        write(workbook)
+        workbook.close()
+    except Exception:
+        output.close()
+        raise
+    return file_response(output, filename)
+
+def write_table(worksheet, headers, rows, start_row=0, header_format=None):
+    """Writes the header row and the rows (sequences of values, or dicts by header) row by row.
+    Returns the next free row"""
+    worksheet.write_row(start_row, 0, headers, header_format)
+    row = start_row + 1
+    for values in rows:
+        if isinstance(values, dict):
+            values = [values[h] for h in headers]
+        worksheet.write_row(row, 0, values)
+        row += 1
+    return row
+
+def table_excel_response(filename, headers, rows, worksheet_name=None):
+    """Streams a workbook of one worksheet with the headers and the rows, see write_table"""
+    return excel_response(filename, lambda workbook: write_table(workbook.add_worksheet(worksheet_name), headers,
+        rows))
+
+
+class Echo:
+    """File-like object returning what is written to it, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+def csv_response(filename, headers, rows):
+    """Streams the headers and the rows (sequences of values, or dicts by header) as CSV, rows can be a generator"""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(headers)
+        for values in rows:
+            if isinstance(values, dict):
+                values = [values[h] for h in headers]
+            yield writer.writerow(values)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+    return response
+
+
+def export_dir():
+    return getattr(settings, 'EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'gpcrdb_exports'))
+
+def remove_expired_exports(directory):
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            # downloaded or removed by another process meanwhile
+            pass
+
+def store_excel(write, constant_memory=True):
+    """Writes the workbook that write(workbook) fills to EXPORT_DIR. Returns the token to download it with"""
+    directory = export_dir()
+    os.makedirs(directory, exist_ok=True)
+    remove_expired_exports(directory)
+    token = uuid.uuid4().hex
+    path = os.path.join(directory, token + '.xlsx')
+    try:
+        workbook = open_workbook(path + '.tmp', constant_memory)
+        write(workbook)
+        workbook.close()
+    except Exception:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+    # renamed when complete, a download never reads a partial file
+    os.replace(path + '.tmp', path)
+    return token
+
+def stored_excel_response(token, filename):
+    """Streams the export stored by store_excel, once: the file is removed when it is opened"""
+    if not EXPORT_TOKEN.match(token):
+        raise Http404('Unknown export')
+    path = os.path.join(export_dir(), token + '.xlsx')
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404('Export expired or already downloaded')
+    response = file_response(f, filename)
+    # removed after FileResponse read its size, the open file stays readable until the response closes it
+    os.remove(path)
+    return response
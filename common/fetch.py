@@ -0,0 +1,201 @@
+"""
+Fetching from web APIs for the build commands.
+
+Downloads run in a thread pool with a rate limit per host and a requests Session (reused connections) per thread.
+Every response is kept in a persistent store without expiry: an index file per URL (the SHA-256 of the URL) points
+to the response body, which is stored once under the SHA-256 of its content.
+
+settings.WEB_FETCH_MODE selects how the store is used:
+    'online'  serve from the store, download and store what is missing (default)
+    'refresh' always download and update the store
+    'replay'  serve only from the store and never use the network, to run builds and tests offline against a
+              recorded snapshot of the store
+"""
+from django.conf import settings
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+
+FETCH_MODES = ('online', 'refresh', 'replay')
+
+# requests per second, hosts without a limit get DEFAULT_RATE_LIMIT
+RATE_LIMITS = {
+    'pubchem.ncbi.nlm.nih.gov': 5,
+    'eutils.ncbi.nlm.nih.gov': 3,
+    'rest.ensembl.org': 15,
+    'www.ebi.ac.uk': 10,
+    'www.uniprot.org': 10,
+    'www.rcsb.org': 10,
+    'files.rcsb.org': 10,
+    'www.guidetopharmacology.org': 5,
+    }
+DEFAULT_RATE_LIMIT = 10
+
+# responses that will not change on a retry, stored like successful ones
+FINAL_STATUSES = (200, 400, 404)
+
+
+class ResponseStore:
+    """Content-addressed store of the responses, safe for concurrent writers"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, kind, digest):
+        return os.sep.join([self.directory, kind, digest[:2], digest])
+
+    def write(self, path, data):
+        # written to a temporary file and renamed, so that readers never see partial files
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, url):
+        """(status, body) of a stored response, None if the URL is not in the store"""
+        try:
+            with open(self.path('index', self.digest(url.encode('utf-8'))), 'r') as f:
+                entry = json.load(f)
+            with open(self.path('content', entry['content']), 'rb') as f:
+                return entry['status'], f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, url, status, body):
+        content = self.digest(body)
+        content_path = self.path('content', content)
+        if not os.path.isfile(content_path):
+            self.write(content_path, body)
+        entry = {'url': url, 'status': status, 'content': content, 'fetched': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self.write(self.path('index', self.digest(url.encode('utf-8'))), json.dumps(entry).encode('utf-8'))
+
+
+class RateLimiter:
+    """Spaces the requests to each host by the inverse of its rate limit, shared by all threads"""
+
+    def __init__(self, rates, default_rate):
+        self.rates = rates
+        self.default_rate = default_rate
+        self.next_request = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_request.get(host, now))
+            self.next_request[host] = start + 1.0 / self.rates.get(host, self.default_rate)
+        if start > now:
+            time.sleep(start - now)
+
+
+class WebFetcher:
+
+    def __init__(self, store_dir=None, mode=None, threads=None, rate_limits=None, max_tries=5, timeout=60):
+        self.logger = logging.getLogger('build')
+        self.store = ResponseStore(store_dir or getattr(settings, 'WEB_FETCH_STORE_DIR',
+            os.sep.join([settings.BUILD_CACHE_DIR, 'web_responses'])))
+        self.mode = mode or getattr(settings, 'WEB_FETCH_MODE', 'online')
+        if self.mode not in FETCH_MODES:
+            raise ValueError('Unknown fetch mode {}, use one of {}'.format(self.mode, ', '.join(FETCH_MODES)))
+        self.threads = threads or getattr(settings, 'WEB_FETCH_THREADS', 8)
+        rates = dict(RATE_LIMITS, **(rate_limits or getattr(settings, 'WEB_FETCH_RATE_LIMITS', {})))
+        self.rate_limiter = RateLimiter(rates, DEFAULT_RATE_LIMIT)
+        self.max_tries = max_tries
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def session(self):
+        # one session per thread, requests sessions are not thread safe
+        if not hasattr(self.local, 'session'):
+            import requests
+            self.local.session = requests.Session()
+            self.local.session.headers['User-Agent'] = 'GPCRdb build (info@gpcrdb.org)'
+        return self.local.session
+
+    def request(self, url):
+        """(status, body) of one download attempt, raises OSError on connection errors"""
+        if urlparse(url).scheme not in ('http', 'https'):
+            # e.g. ftp, which requests does not support
+            try:
+                with urlopen(url, timeout=self.timeout) as response:
+                    return 200, response.read()
+            except HTTPError as e:
+                return e.code, b''
+        import requests
+        try:
+            response = self.session().get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise OSError(e)
+        return response.status_code, response.content
+
+    def download(self, url):
+        """Downloads with retries, (status, body) or (None, None) when all tries fail"""
+        host = urlparse(url).netloc
+        for tries in range(self.max_tries):
+            if tries:
+                self.logger.warning('Failed fetching {}, retrying'.format(url))
+                time.sleep(min(2 ** tries, 60))
+            self.rate_limiter.wait(host)
+            try:
+                status, body = self.request(url)
+            except (OSError, URLError):
+                # also catches 101 network is unreachable
+                continue
+            if status in FINAL_STATUSES:
+                return status, body
+        self.logger.error('Failed fetching {} {} times, giving up'.format(url, self.max_tries))
+        return None, None
+
+    def fetch(self, url, store=True):
+        """(status, body) of the URL from the store or the web, (None, None) when it is not available.
+        Without store the response store is neither read nor written (replay mode still never downloads)"""
+        if self.mode == 'replay' or (store and self.mode != 'refresh'):
+            stored = self.store.get(url) if store else None
+            if stored is not None:
+                self.logger.info('Fetched {} from the response store'.format(url))
+                return stored
+            if self.mode == 'replay':
+                self.logger.error('{} is not in the response store (replay mode)'.format(url))
+                return None, None
+
+        self.logger.info('Fetching {}'.format(url))
+        status, body = self.download(url)
+        if status is not None and store:
+            try:
+                self.store.put(url, status, body)
+            except OSError as e:
+                # e.g. a read-only or full BUILD_CACHE_DIR, the response is still returned
+                self.logger.warning('Could not store the response of {}: {}'.format(url, e))
+        return status, body
+
+    def fetch_many(self, urls):
+        """{url: (status, body)}, downloaded concurrently"""
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            return dict(zip(urls, executor.map(self.fetch, urls)))
+
+
+_fetcher = {'pid': None, 'fetcher': None}
+
+def get_fetcher():
+    """The WebFetcher of this process (connections are not shared with forked build processes)"""
+    if _fetcher['fetcher'] is None or _fetcher['pid'] != os.getpid():
+        _fetcher['fetcher'] = WebFetcher()
+        _fetcher['pid'] = os.getpid()
+    return _fetcher['fetcher']
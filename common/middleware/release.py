@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from common.release import add_release_headers, release_conditional_response
+
+
+class ReleaseConditionalGetMiddleware:
+    """Answers conditional GET requests for data derived views (marked with common.release.release_conditional,
+    and everything under RELEASE_CONDITIONAL_PREFIXES) with ETag and Last-Modified from the data release"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(getattr(settings, 'RELEASE_CONDITIONAL_PREFIXES', ()))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if getattr(request, 'release_conditional', False) and response.status_code == 200:
+            add_release_headers(request, response)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if not (getattr(view_func, 'release_conditional', False) or request.path.startswith(self.prefixes)):
+            return None
+
+        request.release_conditional = True
+        response = release_conditional_response(request)
+        if response is not None:
+            add_release_headers(request, response)
+        return response
@@ -2,6 +2,9 @@ from django.conf import settings
 from django.http import HttpResponse
 from django.db import connection
 
+from common.query_profile import DEFAULT_REPEAT_LIMIT, record_queries
+from common.request_profile import profiling_mode, RequestProfiler
+
 import time,datetime,os
 
 import uuid
@@ -22,7 +25,23 @@ class StatsMiddleware:
         text_file.write('%s %s %s START %s %s\n' % (datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),request.META.get('REMOTE_ADDR'),request_id, request.method, request.path ))
         text_file.close()
 
-        response = self.get_response(request)
+        # on demand: samples or cProfiles the request, see common/request_profile.py
+        mode = profiling_mode(request)
+        profiler = RequestProfiler(mode, request_id) if mode else None
+        if profiler:
+            profiler.start()
+
+        # opt-in: records every SQL statement with its call stack
+        if getattr(settings, 'QUERY_PROFILING', False):
+            with record_queries() as recorder:
+                response = self.get_response(request)
+        else:
+            recorder = None
+            response = self.get_response(request)
+
+        if profiler:
+            profiler.stop()
+            profiler.save(request, response.status_code)
 
         # Code to be executed for each request/response after
         # the view is called.
@@ -31,9 +50,22 @@ class StatsMiddleware:
             print(request.path,"Time to execute", round(total,2), "SQL queries",len(connection.queries))
 
         text_file = open(os.path.join(settings.BASE_DIR, "logs/stats.log"), "a")
-        text_file.write('%s %s %s %s %s\n' % (datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), round(total,2),request.META.get('REMOTE_ADDR'), request.method, request.path ))
+        if recorder:
+            # view name, number of queries and total database time in ms appended
+            view_name = getattr(request.resolver_match, 'view_name', None) or '-'
+            text_file.write('%s %s %s %s %s %s %s %s\n' % (datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), round(total,2),request.META.get('REMOTE_ADDR'), request.method, request.path, view_name, recorder.count, round(recorder.duration*1000,1) ))
+        else:
+            text_file.write('%s %s %s %s %s\n' % (datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), round(total,2),request.META.get('REMOTE_ADDR'), request.method, request.path ))
         text_file.close()
 
+        if recorder:
+            repeat_limit = getattr(settings, 'QUERY_REPEAT_LIMIT', DEFAULT_REPEAT_LIMIT)
+            if recorder.repeated(repeat_limit):
+                # N+1 candidates: the same statement shape run from the same line again and again
+                text_file = open(os.path.join(settings.BASE_DIR, "logs/stats_queries.log"), "a")
+                text_file.write('%s %s %s %s\n%s\n' % (datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), request.method, request.path, view_name, recorder.report(repeat_limit) ))
+                text_file.close()
+
         text_file = open(os.path.join(settings.BASE_DIR, "logs/stats_start_stop.log"), "a")
         text_file.write('%s %s %s FINISH %s %s %s\n' % (datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),request.META.get('REMOTE_ADDR'),request_id, round(total,2), request.method, request.path ))
         text_file.close()
@@ -6,7 +6,8 @@ from django.db.models import Count
 
 from interaction.models import ResidueFragmentInteraction, StructureLigandInteraction
 from ligand.models import AssayExperiment
-from protein.models import Protein, ProteinFamily
+from protein.models import Protein
+from protein.functions import get_family_index
 from structure.models import Structure
 
 import json
@@ -197,7 +198,10 @@ class PhylogeneticTreeGenerator(object):
             'leaf_offset': 30
             }
 
-        self.families = ProteinFamily.objects.all().prefetch_related('parent')
+        self.family_index = get_family_index()
+        self.families = self.family_index.families
+        # branches without SWISSPROT receptors have no leaves
+        self.sources = [self.family_index.source_ids.get('SWISSPROT')]
         for family in self.families:
             if family.slug == '000':
                 self.lookup[0]['000'] = family
@@ -264,6 +268,9 @@ class PhylogeneticTreeGenerator(object):
             return 'Black'
 
 
+    def has_receptors(self, family):
+        return self.family_index.protein_count(family, sources=self.sources) > 0
+
     def get_tree_data(self, family):
         """
         Prepare data for coverage diagram. Iterative aproach.
@@ -293,7 +300,7 @@ class PhylogeneticTreeGenerator(object):
             children = OrderedDict()
             if lvl+1 in self.SORTED_BRANCHES:
                 for slug, node in sorted(self.lookup[lvl+1].items(), key=lambda y: y[1].name.lower()):
-                    if node.parent.slug.startswith(family.slug):
+                    if node.parent.slug.startswith(family.slug) and self.has_receptors(node):
                         name = node.name.replace('receptors','').replace('<sub>',' ').replace('</sub>','').strip()
                         children[slug] = PhylogeneticTreeNode(name, self.get_color(node.slug))
                         
@@ -301,7 +308,7 @@ class PhylogeneticTreeGenerator(object):
                             self.d3_options['branch_length'][lvl] = name
             else:
                 for slug, node in self.lookup[lvl+1].items():
-                    if node.parent.slug.startswith(family.slug):
+                    if node.parent.slug.startswith(family.slug) and self.has_receptors(node):
                         name = node.name.replace('receptors','').replace('<sub>',' ').replace('</sub>','').strip()
                         children[slug] = PhylogeneticTreeNode(name, self.get_color(node.slug))
 
@@ -348,6 +355,6 @@ class PhylogeneticTreeGenerator(object):
                                     })
         
         for slug, branch in coverage.children.items():
-            branch.children = self.get_coverage_tree(self.families.get(slug=slug), deepcopy(coverage)).children
+            branch.children = self.get_coverage_tree(self.family_index.get(slug=slug), deepcopy(coverage)).children
 
         return coverage
\ No newline at end of file
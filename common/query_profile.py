@@ -0,0 +1,117 @@
+"""
+Opt-in SQL instrumentation without an external service.
+
+QueryRecorder records every statement run on the database connections with its duration and the project frames
+of its call stack, and groups the statements by shape (the SQL with all values replaced) and call site to find
+queries run once per object in a loop (N+1). StatsMiddleware uses it for each request if QUERY_PROFILING is set,
+QueryBudgetMixin in tests.
+"""
+from django.conf import settings
+from django.db import connections
+
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager, ExitStack
+
+import os
+import re
+import time
+import traceback
+
+
+# times a statement of the same shape may run from the same call site before it is reported as repeated
+DEFAULT_REPEAT_LIMIT = 5
+
+# project frames stored with each statement, innermost last
+STACK_DEPTH = 8
+
+RecordedQuery = namedtuple('RecordedQuery', ['sql', 'shape', 'duration', 'stack'])
+RepeatedQuery = namedtuple('RepeatedQuery', ['shape', 'call_site', 'count', 'duration', 'stack'])
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def query_shape(sql):
+    """The statement with its values and value lists replaced by %s, equal for the queries of a loop"""
+    shape = STRING_LITERAL.sub('%s', sql)
+    shape = NUMBER_LITERAL.sub('%s', shape)
+    return VALUE_LIST.sub('(%s)', shape)
+
+def project_stack():
+    """The calling frames in the project, outside of installed packages and this module, as 'file:line function'"""
+    base_dir = os.path.abspath(settings.BASE_DIR) + os.sep
+    frames = []
+    for frame in traceback.extract_stack()[:-1]:
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(base_dir) and 'site-packages' not in filename and filename != os.path.abspath(__file__):
+            frames.append('{}:{} {}'.format(filename[len(base_dir):], frame.lineno, frame.name))
+    return frames[-STACK_DEPTH:]
+
+
+class QueryRecorder:
+    """Execute wrapper (see connection.execute_wrapper) that records the statements it runs"""
+
+    def __init__(self, capture_stacks=True):
+        self.capture_stacks = capture_stacks
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append(RecordedQuery(sql, query_shape(sql), duration,
+                project_stack() if self.capture_stacks else []))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(q.duration for q in self.queries)
+
+    def repeated(self, limit=DEFAULT_REPEAT_LIMIT):
+        """Statements of the same shape run more than limit times from the same call site, most frequent first"""
+        groups = OrderedDict()
+        for query in self.queries:
+            call_site = query.stack[-1] if query.stack else ''
+            groups.setdefault((query.shape, call_site), []).append(query)
+        repeated = [RepeatedQuery(shape, call_site, len(queries), sum(q.duration for q in queries), queries[0].stack)
+            for (shape, call_site), queries in groups.items() if len(queries) > limit]
+        return sorted(repeated, key=lambda r: -r.count)
+
+    def report(self, limit=DEFAULT_REPEAT_LIMIT):
+        lines = ['{} queries in {:.1f} ms'.format(self.count, self.duration * 1000)]
+        for r in self.repeated(limit):
+            lines.append('{} x {:.1f} ms at {}: {}'.format(r.count, r.duration * 1000, r.call_site or 'unknown',
+                r.shape[:300]))
+            lines.extend('    ' + frame for frame in r.stack)
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries(capture_stacks=True):
+    """Records the statements run on all database connections of this thread while in the block"""
+    recorder = QueryRecorder(capture_stacks)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryBudgetMixin:
+    """Query budget assertions for django.test.TestCase classes"""
+
+    def assertQueryBudget(self, url, max_queries, repeat_limit=DEFAULT_REPEAT_LIMIT, **extra):
+        """GETs url and fails if it runs more than max_queries statements or any statement shape more than
+        repeat_limit times from the same call site. Returns the response"""
+        with record_queries() as recorder:
+            response = self.client.get(url, **extra)
+        self.assertLess(response.status_code, 400, '{} returned {}'.format(url, response.status_code))
+        if recorder.count > max_queries or recorder.repeated(repeat_limit):
+            self.fail('{} exceeds its budget of {} queries:\n{}'.format(url, max_queries,
+                recorder.report(repeat_limit)))
+        return response
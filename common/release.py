@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from io import BytesIO
+
+import datetime
+import hashlib
+import numpy as np
+import os
+import time
+
+
+# how often (seconds) a running process checks the stamp file for a new release
+RELEASE_CHECK_INTERVAL = 5
+
+_release = {'version': None, 'checked': 0}
+_release_arrays = {}
+
+
+def release_version_file():
+    return os.sep.join([settings.BUILD_DATA_DIR, 'release_version'])
+
+def write_release_version():
+    """Stamp the data release, called at the end of a build. Returns the new version"""
+    os.makedirs(settings.BUILD_DATA_DIR, exist_ok=True)
+    version = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    # write and rename, so that running processes never read a partial file
+    tmp_file = release_version_file() + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(version)
+    os.replace(tmp_file, release_version_file())
+    _release['version'] = version
+    _release['checked'] = time.time()
+    return version
+
+def get_release_version():
+    """Version of the data release currently in the database, '0' if the data was never stamped"""
+    now = time.time()
+    if _release['version'] is None or now - _release['checked'] > RELEASE_CHECK_INTERVAL:
+        try:
+            with open(release_version_file()) as f:
+                _release['version'] = f.read().strip() or '0'
+        except OSError:
+            _release['version'] = '0'
+        _release['checked'] = now
+    return _release['version']
+
+def get_release_date():
+    version = get_release_version()
+    try:
+        return datetime.datetime.strptime(version, '%Y%m%d%H%M%S').replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+def make_cache_key(key, key_prefix, version):
+    """Cache KEY_FUNCTION, adds the data release to all keys so that a new build invalidates them"""
+    return ':'.join([key_prefix, str(version), get_release_version(), key])
+
+def release_etag(request):
+    # the same URL and the same data release gives the same response (per content type for the API)
+    h = hashlib.md5(request.get_full_path().encode('utf-8'))
+    h.update(request.META.get('HTTP_ACCEPT', '').encode('utf-8'))
+    return quote_etag('{}-{}'.format(get_release_version(), h.hexdigest()))
+
+def release_conditional(view_func):
+    """Marks a view whose response only depends on the URL and the data release.
+    The ReleaseConditionalGetMiddleware answers conditional requests for it with 304"""
+    view_func.release_conditional = True
+    return view_func
+
+def release_conditional_response(request):
+    """Returns a 304 response if the client has the current release of the page, otherwise None"""
+    last_modified = get_release_date()
+    return get_conditional_response(request, etag=release_etag(request),
+        last_modified=last_modified.timestamp() if last_modified else None)
+
+def add_release_headers(request, response):
+    if not response.has_header('ETag'):
+        response['ETag'] = release_etag(request)
+    last_modified = get_release_date()
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ReleaseArrays:
+    """Data of a release built into plain numpy arrays and stored in BUILD_DATA_DIR by a build command.
+    Subclasses set FILENAME and FORMAT_VERSION (increased when the stored arrays change, older files are then ignored)
+    and implement from_database"""
+
+    FILENAME = None
+    FORMAT_VERSION = 1
+
+    def __init__(self, arrays):
+        # dict of numpy arrays
+        self.arrays = arrays
+
+    @classmethod
+    def from_database(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def data_file(cls):
+        return os.sep.join([settings.BUILD_DATA_DIR, cls.FILENAME])
+
+    @classmethod
+    def load(cls, filename=None):
+        """Returns None if the data is not built or of another format version"""
+        try:
+            # read all arrays and close the file, an NpzFile would decompress an array on each access
+            with np.load(filename or cls.data_file(), allow_pickle=False) as npz:
+                arrays = {k: npz[k] for k in npz.files}
+        except (OSError, ValueError):
+            return None
+        if 'version' not in arrays or int(arrays['version']) != cls.FORMAT_VERSION:
+            return None
+        return cls(arrays)
+
+    def save(self, filename=None):
+        filename = filename or self.data_file()
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        f = BytesIO()
+        np.savez_compressed(f, **self.arrays)
+        # written and renamed, so that running processes never read a partial file
+        with open(filename + '.tmp', 'wb') as out:
+            out.write(f.getvalue())
+        os.replace(filename + '.tmp', filename)
+
+    @classmethod
+    def current(cls):
+        """The data of the current release, built from the database if the build command did not store it"""
+        release = get_release_version()
+        if cls not in _release_arrays or _release_arrays[cls][0] != release:
+            data = cls.load()
+            if data is None:
+                data = cls.from_database()
+            _release_arrays[cls] = (release, data)
+        return _release_arrays[cls][1]
@@ -0,0 +1,157 @@
+"""
+On-demand profiling of single requests, started by StatsMiddleware and aggregated by aggregate_profiles.
+
+A request is profiled if its path matches one of PROFILING_URL_PATTERNS, or if it has an X-Profile header equal to
+PROFILING_KEY (so that a logged in session with a real selection can be profiled on production). The mode is
+PROFILING_MODE or the X-Profile-Mode header:
+'sample' - a thread samples the stack of the request every PROFILING_INTERVAL seconds, saved as collapsed stacks
+           (<request id>.collapsed, one 'frame;frame;... count' line per stack, as read by flamegraph.pl/speedscope)
+'cprofile' - cProfile of the request, saved as pstats file (<request id>.pstats)
+Each profile has a <request id>.json with the path, view and duration next to it, in PROFILE_DIR.
+"""
+from django.conf import settings
+
+from collections import Counter
+from datetime import datetime
+
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+
+PROFILING_MODES = ['sample', 'cprofile']
+DEFAULT_INTERVAL = 0.005
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'logs/profiles'))
+
+def profiling_mode(request):
+    """The profiling mode of the request, None if it is not profiled"""
+    key = getattr(settings, 'PROFILING_KEY', '')
+    requested = key and request.META.get('HTTP_X_PROFILE') == key
+    if not requested and not any(re.search(pattern, request.path) for pattern in
+            getattr(settings, 'PROFILING_URL_PATTERNS', [])):
+        return None
+    mode = (request.META.get('HTTP_X_PROFILE_MODE') if requested else None) or getattr(settings, 'PROFILING_MODE',
+        'sample')
+    return mode if mode in PROFILING_MODES else 'sample'
+
+def frame_label(code):
+    filename = os.path.abspath(code.co_filename)
+    base_dir = os.path.abspath(settings.BASE_DIR) + os.sep
+    if filename.startswith(base_dir):
+        filename = filename[len(base_dir):]
+    return '{} ({}:{})'.format(code.co_name, filename, code.co_firstlineno)
+
+def collapse(frame):
+    """The stack of a frame as collapsed stack, outermost frame first"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stack of the calling thread from a second thread"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+
+class RequestProfiler:
+    """Profiles the code run between start and stop, save writes the profile and its metadata"""
+
+    def __init__(self, mode, request_id):
+        self.mode = mode
+        self.request_id = request_id
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+        else:
+            self.profiler = StackSampler(getattr(settings, 'PROFILING_INTERVAL', DEFAULT_INTERVAL))
+        self.start_time = None
+        self.duration = None
+
+    def start(self):
+        self.start_time = time.time()
+        if self.mode == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        self.duration = time.time() - self.start_time
+
+    def save(self, request, status_code=None):
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, self.request_id)
+        if self.mode == 'cprofile':
+            self.profiler.dump_stats(filename + '.pstats')
+        else:
+            self.profiler.save(filename + '.collapsed')
+        meta = {
+            'request_id': self.request_id,
+            'mode': self.mode,
+            'time': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'method': request.method,
+            'path': request.path,
+            'query_string': request.META.get('QUERY_STRING', ''),
+            'view': getattr(request.resolver_match, 'view_name', None) or '-',
+            'status_code': status_code,
+            'duration': round(self.duration, 3),
+        }
+        with open(filename + '.json', 'w') as f:
+            json.dump(meta, f)
+
+
+def load_profiles(directory=None):
+    """Metadata of the saved profiles, oldest first"""
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda p: p['time'])
+
+def read_collapsed(filename):
+    stacks = Counter()
+    with open(filename) as f:
+        for line in f:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            stacks[stack] += int(count)
+    return stacks
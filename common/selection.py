@@ -1,10 +1,25 @@
-﻿from django.conf import settings
+﻿from django.apps import apps
+from django.conf import settings
 
+from common.release import get_release_version
 from protein.models import Species
 from protein.models import ProteinSource
 from residue.models import ResidueNumberingScheme
 
 
+# default selection objects, shared by all requests of a process until the next data release
+_defaults = {'release': None}
+
+def get_default_selection_objects():
+    """Returns the default protein source and numbering scheme"""
+    release = get_release_version()
+    if _defaults['release'] != release:
+        _defaults['protein_source'] = ProteinSource.objects.get(name='SWISSPROT')
+        _defaults['numbering_scheme'] = ResidueNumberingScheme.objects.get(slug=settings.DEFAULT_NUMBERING_SCHEME)
+        _defaults['release'] = release
+    return _defaults['protein_source'], _defaults['numbering_scheme']
+
+
 class SimpleSelection:
     """A class representing the proteins and segments a user has selected. Can be serialized and stored in session"""
     def __init__(self):
@@ -19,13 +34,14 @@ class SimpleSelection:
         self.pref_g_proteins = []
         self.g_proteins = []
 
+        # Default protein source is SWISSPROT
+        ps, gn = get_default_selection_objects()
+
         # annotation
-        ps = ProteinSource.objects.get(name='SWISSPROT') # Default protein source is SWISSPROT
         o = SelectionItem('protein_source', ps)
         self.annotation = [o]
 
         # numbering schemes
-        gn = ResidueNumberingScheme.objects.get(slug=settings.DEFAULT_NUMBERING_SCHEME)
         o = SelectionItem('numbering_schemes', gn)
         self.numbering_schemes = [o]
 
@@ -43,8 +59,15 @@ class SimpleSelection:
 class Selection(SimpleSelection):
     """A class that extends SimpleSelection, and adds methods to process the selection (these methods can not be
         serialized"""
+    selection_types = ['reference', 'targets', 'segments', 'species', 'pref_g_proteins', 'g_proteins', 'annotation',
+        'numbering_schemes']
+
     def importer(self, simple_selection):
         """Imports a SimpleSelection object into Selection"""
+        # the selected objects of each type are fetched together, when the first one is used
+        for selection_type in self.selection_types:
+            SelectionItemGroup(getattr(simple_selection, selection_type, []))
+
         self.reference = simple_selection.reference
         self.targets = simple_selection.targets
         self.segments = simple_selection.segments
@@ -112,7 +135,7 @@ class Selection(SimpleSelection):
         group_id = False
         delete_group = False
         for selection_object in selection:
-            if (selection_object.type == selection_subtype and selection_object.item.id == int(selection_id) and 
+            if (selection_object.type == selection_subtype and selection_object.item_id == int(selection_id) and 
                 'site_residue_group' in selection_object.properties and
                 selection_object.properties['site_residue_group']):
                 group_id = selection_object.properties['site_residue_group']
@@ -120,7 +143,7 @@ class Selection(SimpleSelection):
 
         # loop through selected objects and remove the one that matches the subtype and ID
         for selection_object in selection:
-            if not (selection_object.type == selection_subtype and selection_object.item.id == int(selection_id)):
+            if not (selection_object.type == selection_subtype and selection_object.item_id == int(selection_id)):
                 updated_selection.append(selection_object)
                 
                 # check group ID
@@ -169,15 +192,76 @@ class Selection(SimpleSelection):
 
 
 class SelectionItem:
-    """A wrapper class for selectable objects (protein, family, sequence segment etc.) that adds a type attribute"""
+    """A wrapper class for selectable objects (protein, family, sequence segment etc.) that adds a type attribute.
+    Only the model and ID of the object are serialized, the object is fetched again when it is used"""
     def __init__(self, selection_type, selection_object, properties={}):
         self.type = selection_type
         self.type_title = selection_type.replace('_', ' ').capitalize()
-        self.item = selection_object
         self.properties = properties
+        self.group = None
+        self.set_item(selection_object)
+
+    def set_item(self, selection_object):
+        self._item = selection_object
+        if hasattr(selection_object, '_meta'):
+            self.item_model = selection_object._meta.label
+            self.item_id = selection_object.pk
+        else:
+            self.item_model = self.item_id = None
+
+    @property
+    def item(self):
+        if self._item is None and self.item_model:
+            if self.group:
+                self.group.resolve()
+            else:
+                self._item = apps.get_model(self.item_model).objects.get(pk=self.item_id)
+        return self._item
+
+    def __getstate__(self):
+        state = {'type': self.type, 'properties': self.properties, 'item_model': self.item_model,
+            'item_id': self.item_id}
+        if not self.item_model:
+            state['item'] = self._item
+        return state
+
+    def __setstate__(self, state):
+        self.type = state['type']
+        self.type_title = self.type.replace('_', ' ').capitalize()
+        self.properties = state['properties']
+        self.group = None
+        if 'item_model' in state and state['item_model']:
+            self._item = None
+            self.item_model = state['item_model']
+            self.item_id = state['item_id']
+        else:
+            # selections stored before only IDs were serialized
+            self.set_item(state.get('item'))
 
     def __str__(self):
-        return str(self.__dict__)
+        return str(self.__getstate__())
+
+    def __eq__(self, other):
+        if self.item_model:
+            return (self.type, self.item_model, self.item_id, self.properties) == (other.type, other.item_model,
+                other.item_id, other.properties)
+        return self.type == other.type and self.item == other.item and self.properties == other.properties
+
+
+class SelectionItemGroup:
+    """Fetches the objects of a list of SelectionItems with one query per model"""
+    def __init__(self, selection_items):
+        self.selection_items = selection_items
+        for selection_item in selection_items:
+            selection_item.group = self
 
-    def __eq__(self, other): 
-        return self.__dict__ == other.__dict__
\ No newline at end of file
+    def resolve(self):
+        ids = {}
+        for selection_item in self.selection_items:
+            if selection_item._item is None and selection_item.item_model:
+                ids.setdefault(selection_item.item_model, set()).add(selection_item.item_id)
+        objects = {model: apps.get_model(model).objects.in_bulk(list(model_ids)) for model, model_ids in ids.items()}
+        for selection_item in self.selection_items:
+            if selection_item._item is None and selection_item.item_model:
+                selection_item._item = objects[selection_item.item_model].get(selection_item.item_id)
+            selection_item.group = None
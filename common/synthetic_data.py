@@ -0,0 +1,263 @@
+"""
+Synthetic GPCR data for the benchmarks, created by generate_benchmark_data.
+
+Receptors bench<N>_human of the benchmark class (BENCHMARK_FAMILY), with seven helices of generic numbered residues,
+and structures of those receptors with PDB text, distances, interactions and residue angles. The same seed and sizes
+always create the same sequences, coordinates and contacts. All rows hang off the benchmark family and receptors, so
+clear() removes them without touching other data.
+"""
+from django.db import transaction
+
+from angles.models import ResidueAngle
+from common.models import WebLink, WebResource
+from contactnetwork.models import Distance, InteractingResiduePair, Interaction
+from protein.models import (Protein, ProteinConformation, ProteinFamily, ProteinSegment, ProteinSequenceType,
+    ProteinSource, ProteinState, Species)
+from residue.models import Residue, ResidueGenericNumber, ResidueNumberingScheme
+from structure.models import PdbData, Structure, StructureType
+
+from datetime import date
+
+import numpy as np
+
+
+BENCHMARK_FAMILY = '009'
+ENTRY_NAME_PREFIX = 'bench'
+
+HELICES = ['TM1', 'TM2', 'TM3', 'TM4', 'TM5', 'TM6', 'TM7']
+# sequence numbers left between two helices, the loops are not generated
+LOOP_LENGTH = 10
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+THREE_LETTER = {'A': 'ALA', 'C': 'CYS', 'D': 'ASP', 'E': 'GLU', 'F': 'PHE', 'G': 'GLY', 'H': 'HIS', 'I': 'ILE',
+    'K': 'LYS', 'L': 'LEU', 'M': 'MET', 'N': 'ASN', 'P': 'PRO', 'Q': 'GLN', 'R': 'ARG', 'S': 'SER', 'T': 'THR',
+    'V': 'VAL', 'W': 'TRP', 'Y': 'TYR'}
+
+# backbone and CB atoms of a residue as (radius from the helix axis, angle offset in degrees, rise) around CA
+ATOMS = [('N', 1.6, -28, -0.8), ('CA', 2.3, 0, 0.0), ('C', 1.6, 28, 0.8), ('O', 1.9, 40, 1.9), ('CB', 3.3, 0, 0.0)]
+HELIX_RISE = 1.5
+HELIX_TURN = 100
+BUNDLE_RADIUS = 10.0
+# coordinate noise of the structures of a receptor, in Angstrom
+STRUCTURE_NOISE = 0.3
+
+# the same cutoffs as compute_interactions
+CONTACT_CUTOFF = 6.6
+NUM_SKIP_RESIDUES = 4
+INTERACTION_TYPES = ['van-der-waals', 'hydrophobic', 'polar', 'aromatic', 'ionic']
+
+
+def benchmark_entry_name(i):
+    return '{}{}_human'.format(ENTRY_NAME_PREFIX, i + 1)
+
+def benchmark_pdb_code(i):
+    # 9 is not used as first character of deposited PDB codes yet
+    return '9{:03X}'.format(i)
+
+def helix_labels(residues_per_helix):
+    """Generic numbers of each helix as (helix, [(gpcrdb label, display label)]), centred on x50"""
+    first = 50 - residues_per_helix // 2
+    return [(helix, [('{}x{}'.format(h, p), '{}.{}x{}'.format(h, p, p)) for p in range(first,
+        first + residues_per_helix)]) for h, helix in enumerate(HELICES, 1)]
+
+def sequence_numbers(residues_per_helix):
+    return [1 + h * (residues_per_helix + LOOP_LENGTH) + k for h in range(len(HELICES))
+        for k in range(residues_per_helix)]
+
+def helix_bundle(residues_per_helix):
+    """Coordinates of the atoms of all residues (helices x residues x ATOMS x 3), antiparallel ideal helices on a
+    circle"""
+    coordinates = np.zeros((len(HELICES), residues_per_helix, len(ATOMS), 3))
+    k = np.arange(residues_per_helix)
+    for h in range(len(HELICES)):
+        centre = BUNDLE_RADIUS * np.array([np.cos(2 * np.pi * h / len(HELICES)),
+            np.sin(2 * np.pi * h / len(HELICES))])
+        direction = 1 if h % 2 == 0 else -1
+        for a, (name, radius, offset, rise) in enumerate(ATOMS):
+            theta = np.radians(HELIX_TURN * k + offset)
+            coordinates[h, :, a, 0] = centre[0] + radius * np.cos(theta)
+            coordinates[h, :, a, 1] = centre[1] + radius * np.sin(theta)
+            coordinates[h, :, a, 2] = direction * (HELIX_RISE * (k - residues_per_helix / 2) + rise)
+    return coordinates
+
+def pdb_text(amino_acids, numbers, coordinates, chain='A'):
+    """ATOM records of the residues, coordinates flattened to residues x ATOMS x 3"""
+    lines = []
+    serial = 1
+    for aa, number, residue in zip(amino_acids, numbers, coordinates):
+        for (name, radius, offset, rise), (x, y, z) in zip(ATOMS, residue):
+            if name == 'CB' and aa == 'G':
+                continue
+            lines.append('ATOM  {:5d}  {:<3s} {:3s} {:1s}{:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}          {:>2s}'
+                .format(serial, name, THREE_LETTER[aa], chain, number, x, y, z, 1.0, 0.0, name[0]))
+            serial += 1
+    lines.append('TER')
+    lines.append('END')
+    return '\n'.join(lines) + '\n'
+
+
+def base_objects():
+    """The shared rows the synthetic proteins refer to, created when missing"""
+    parent_family, created = ProteinFamily.objects.get_or_create(slug='000', defaults={'name': 'Parent family'})
+    benchmark_class, created = ProteinFamily.objects.get_or_create(slug=BENCHMARK_FAMILY,
+        defaults={'name': 'Benchmark class', 'parent': parent_family})
+    gpcrdb, created = ResidueNumberingScheme.objects.get_or_create(slug='gpcrdb', parent=None,
+        defaults={'short_name': 'GPCRdb', 'name': 'GPCRdb'})
+    gpcrdba, created = ResidueNumberingScheme.objects.get_or_create(slug='gpcrdba',
+        defaults={'short_name': 'GPCRdb(A)', 'name': 'GPCRdb generic numbers (Class A)', 'parent': gpcrdb})
+    pdb, created = WebResource.objects.get_or_create(slug='pdb',
+        defaults={'name': 'Protein Data Bank', 'url': 'https://www.rcsb.org/structure/$index'})
+    return {
+        'benchmark_class': benchmark_class,
+        'species': Species.objects.get_or_create(latin_name='Homo sapiens', defaults={'common_name': 'Human'})[0],
+        'source': ProteinSource.objects.get_or_create(name='SWISSPROT')[0],
+        'wt': ProteinSequenceType.objects.get_or_create(slug='wt', defaults={'name': 'Wild-type'})[0],
+        'mod': ProteinSequenceType.objects.get_or_create(slug='mod', defaults={'name': 'Modified'})[0],
+        'state': ProteinState.objects.get_or_create(slug='inactive', defaults={'name': 'Inactive'})[0],
+        'structure_type': StructureType.objects.get_or_create(slug='x-ray-diffraction',
+            defaults={'name': 'X-ray diffraction'})[0],
+        'gpcrdb': gpcrdb,
+        'gpcrdba': gpcrdba,
+        'pdb': pdb,
+        'segments': [ProteinSegment.objects.get_or_create(slug=helix, proteinfamily='GPCR',
+            defaults={'name': 'Transmembrane helix ' + helix[2:], 'category': 'helix', 'fully_aligned': True})[0]
+            for helix in HELICES],
+        }
+
+def generic_numbers(base, residues_per_helix):
+    """(segment, generic number, display generic number) of each position, created when missing"""
+    positions = []
+    for segment, (helix, labels) in zip(base['segments'], helix_labels(residues_per_helix)):
+        for label, display_label in labels:
+            gn, created = ResidueGenericNumber.objects.get_or_create(scheme=base['gpcrdb'], label=label,
+                protein_segment=segment)
+            display_gn, created = ResidueGenericNumber.objects.get_or_create(scheme=base['gpcrdba'],
+                label=display_label, protein_segment=segment)
+            positions.append((segment, gn, display_gn))
+    return positions
+
+def create_residues(conformation, amino_acids, numbers, positions):
+    return Residue.objects.bulk_create([Residue(protein_conformation=conformation, protein_segment=segment,
+        generic_number=gn, display_generic_number=display_gn, sequence_number=number, amino_acid=aa)
+        for aa, number, (segment, gn, display_gn) in zip(amino_acids, numbers, positions)])
+
+def create_receptors(count, base, positions, numbers, rng):
+    """Receptors of a common ancestor sequence with 30% of the positions mutated each, so that alignments and
+    signatures have conserved and variable positions"""
+    ancestor = rng.choice(list(AMINO_ACIDS), len(positions))
+    subfamily, created = ProteinFamily.objects.get_or_create(slug=BENCHMARK_FAMILY + '_001_001',
+        defaults={'name': 'Benchmark receptors', 'parent': ProteinFamily.objects.get_or_create(
+            slug=BENCHMARK_FAMILY + '_001', defaults={'name': 'Benchmark', 'parent': base['benchmark_class']})[0]})
+
+    receptors = []
+    for i in range(count):
+        amino_acids = ancestor.copy()
+        mutated = rng.random_sample(len(positions)) < 0.3
+        amino_acids[mutated] = rng.choice(list(AMINO_ACIDS), mutated.sum())
+        entry_name = benchmark_entry_name(i)
+        family, created = ProteinFamily.objects.get_or_create(slug='{}_{:03d}'.format(subfamily.slug, i + 1),
+            defaults={'name': entry_name, 'parent': subfamily})
+        protein = Protein.objects.create(family=family, species=base['species'], source=base['source'],
+            residue_numbering_scheme=base['gpcrdba'], sequence_type=base['wt'], entry_name=entry_name,
+            accession='BENCH{}'.format(i + 1), name='Benchmark receptor {}'.format(i + 1),
+            sequence=''.join(amino_acids))
+        conformation = ProteinConformation.objects.create(protein=protein, state=base['state'])
+        create_residues(conformation, amino_acids, numbers, positions)
+        receptors.append((protein, amino_acids))
+    return receptors
+
+def create_structure(i, receptor, amino_acids, base, positions, numbers, coordinates):
+    pdb_code = benchmark_pdb_code(i)
+    protein = Protein.objects.create(parent=receptor, family=receptor.family, species=receptor.species,
+        source=receptor.source, residue_numbering_scheme=receptor.residue_numbering_scheme,
+        sequence_type=base['mod'], entry_name=pdb_code.lower(), name=pdb_code.lower(), sequence=receptor.sequence)
+    conformation = ProteinConformation.objects.create(protein=protein, state=base['state'])
+    residues = create_residues(conformation, amino_acids, numbers, positions)
+    structure = Structure.objects.create(protein_conformation=conformation, structure_type=base['structure_type'],
+        pdb_code=WebLink.objects.create(web_resource=base['pdb'], index=pdb_code), state=base['state'],
+        preferred_chain='A', resolution=2.5, publication_date=date(2000, 1, 1), pdb_data=PdbData.objects.create(
+        pdb=pdb_text(amino_acids, numbers, coordinates)))
+    return structure, residues
+
+def contacts(structure, residues, ca, numbers, rng):
+    """Distance rows of all residue pairs and interactions of the pairs within CONTACT_CUTOFF, as compute_interactions
+    stores them"""
+    first, second = np.triu_indices(len(residues), k=1)
+    distances = np.linalg.norm(ca[first] - ca[second], axis=1)
+    Distance.objects.bulk_create([Distance(structure=structure, res1=residues[a], res2=residues[b],
+        gn1=residues[a].generic_number.label, gn2=residues[b].generic_number.label,
+        gns_pair='_'.join([residues[a].generic_number.label, residues[b].generic_number.label]),
+        distance=int(d * 100)) for a, b, d in zip(first.tolist(), second.tolist(), distances.tolist())],
+        batch_size=5000)
+
+    numbers = np.array(numbers)
+    in_contact = (distances < CONTACT_CUTOFF) & (np.abs(numbers[first] - numbers[second]) > NUM_SKIP_RESIDUES)
+    pairs = InteractingResiduePair.objects.bulk_create([InteractingResiduePair(referenced_structure=structure,
+        res1=residues[a], res2=residues[b]) for a, b in zip(first[in_contact].tolist(), second[in_contact].tolist())])
+    types = rng.choice(INTERACTION_TYPES, len(pairs))
+    Interaction.objects.bulk_create([Interaction(interacting_pair=pair, interaction_type=t, specific_type=t,
+        atomname_residue1='CA', atomname_residue2='CA') for pair, t in zip(pairs, types.tolist())],
+        batch_size=5000)
+    return len(distances), len(pairs)
+
+def residue_angles(structure, residues, rng):
+    n = len(residues)
+    values = {
+        'a_angle': rng.uniform(-180, 180, n), 'b_angle': rng.uniform(-180, 180, n),
+        'outer_angle': rng.uniform(0, 180, n), 'hse': rng.randint(0, 40, n), 'sasa': rng.uniform(0, 200, n),
+        'rsa': rng.uniform(0, 1, n), 'phi': rng.normal(-57, 10, n), 'psi': rng.normal(-47, 10, n),
+        'tau_angle': rng.uniform(0, 180, n), 'theta': rng.uniform(0, 180, n), 'tau': rng.uniform(0, 180, n),
+        'core_distance': rng.uniform(0, 20, n), 'midplane_distance': rng.uniform(-20, 20, n),
+        'mid_distance': rng.uniform(0, 20, n),
+        }
+    values = {k: v.tolist() for k, v in values.items()}
+    ResidueAngle.objects.bulk_create([ResidueAngle(residue=r, structure=structure, ss_dssp='H', ss_stride='H',
+        **{k: v[j] for k, v in values.items()}) for j, r in enumerate(residues)])
+
+@transaction.atomic
+def generate(receptors, structures, residues_per_helix=24, seed=0):
+    """Creates the receptors and the structures, the latter spread over the receptors.
+    Returns the number of created rows per kind"""
+    rng = np.random.RandomState(seed)
+    base = base_objects()
+    positions = generic_numbers(base, residues_per_helix)
+    numbers = sequence_numbers(residues_per_helix)
+    bundle = helix_bundle(residues_per_helix)
+
+    created_receptors = create_receptors(receptors, base, positions, numbers, rng)
+    counts = {'receptors': len(created_receptors), 'residues': len(created_receptors) * len(positions),
+        'structures': 0, 'distances': 0, 'interactions': 0}
+    for i in range(structures if created_receptors else 0):
+        receptor, amino_acids = created_receptors[i % len(created_receptors)]
+        coordinates = (bundle + rng.normal(0, STRUCTURE_NOISE, bundle.shape)).reshape(len(positions), len(ATOMS), 3)
+        structure, residues = create_structure(i, receptor, amino_acids, base, positions, numbers, coordinates)
+        distances, interactions = contacts(structure, residues, coordinates[:, 1], numbers, rng)
+        residue_angles(structure, residues, rng)
+        counts['structures'] += 1
+        counts['residues'] += len(residues)
+        counts['distances'] += distances
+        counts['interactions'] += interactions
+    return counts
+
+@transaction.atomic
+def clear():
+    """Deletes the synthetic proteins and everything that refers to them"""
+    structures = Structure.objects.filter(protein_conformation__protein__family__slug__startswith=BENCHMARK_FAMILY)
+    web_links = list(structures.values_list('pdb_code_id', flat=True))
+    pdb_data = list(structures.values_list('pdb_data_id', flat=True))
+    # the proteins, residues, structures and contacts go with the families
+    ProteinFamily.objects.filter(slug__startswith=BENCHMARK_FAMILY).delete()
+    WebLink.objects.filter(id__in=web_links).delete()
+    PdbData.objects.filter(id__in=pdb_data).delete()
+
+def benchmark_receptors():
+    return list(Protein.objects.filter(family__slug__startswith=BENCHMARK_FAMILY, sequence_type__slug='wt')
+        .order_by('id'))
+
+def benchmark_pdb_codes(receptors=None):
+    """PDB codes of the synthetic structures, of the given receptors only if set"""
+    structures = Structure.objects.filter(
+        protein_conformation__protein__family__slug__startswith=BENCHMARK_FAMILY)
+    if receptors is not None:
+        structures = structures.filter(protein_conformation__protein__parent__in=receptors)
+    return list(structures.order_by('id').values_list('pdb_code__index', flat=True))
@@ -1,3 +1,157 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 
-# Create your tests here.
+from django.http import Http404
+
+from common import excel, fetch
+from common.fetch import ResponseStore, WebFetcher
+from common.query_profile import QueryRecorder, query_shape
+from common.tools import fetch_from_web_api
+from tools.management.commands.audit_imports import loaded_heavy_modules, profile_startup
+
+import os
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+
+class ImportBudgetTest(SimpleTestCase):
+    """Starting a worker (settings, apps and URLconf) must not import the heavy libraries,
+    the views that need them import them when called. See manage.py audit_imports"""
+
+    def test_no_heavy_modules_at_startup(self):
+        imports, loaded = profile_startup()
+        self.assertEqual(loaded_heavy_modules(loaded), [])
+
+
+class QueryProfileTest(SimpleTestCase):
+    """Statements differing only in their values have the same shape, and are reported when run in a loop"""
+
+    def test_query_shape(self):
+        self.assertEqual(query_shape('SELECT "id" FROM "protein" WHERE "protein"."entry_name" = \'5ht1a_human\''),
+            'SELECT "id" FROM "protein" WHERE "protein"."entry_name" = %s')
+        self.assertEqual(query_shape('SELECT * FROM "residue" WHERE "residue"."id" IN (1, 2, 3) LIMIT 21'),
+            query_shape('SELECT * FROM "residue" WHERE "residue"."id" IN (4) LIMIT 21'))
+
+    def test_repeated(self):
+        recorder = QueryRecorder(capture_stacks=False)
+        execute = lambda sql, params, many, context: None
+        for i in range(6):
+            recorder(execute, 'SELECT * FROM "protein" WHERE "protein"."id" = {}'.format(i), None, False, {})
+        recorder(execute, 'SELECT * FROM "residue"', None, False, {})
+        self.assertEqual(recorder.count, 7)
+        self.assertEqual([r.count for r in recorder.repeated(5)], [6])
+        self.assertEqual(recorder.repeated(6), [])
+
+
+class WebFetcherTest(SimpleTestCase):
+    """Responses are recorded in the response store, and replay mode serves them without using the network"""
+
+    url = 'https://rest.ensembl.org/sequence/id/ENSP00000000001?content-type=application/json'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_fetcher(self, mode, store_dir=None):
+        fetcher = WebFetcher(store_dir=store_dir or self.directory, mode=mode, max_tries=1)
+        fetcher.downloaded = []
+        def request(url):
+            fetcher.downloaded.append(url)
+            return 200, b'{"seq": "MKT"}'
+        fetcher.request = request
+        return fetcher
+
+    def test_replay(self):
+        self.make_fetcher('online').fetch(self.url)
+        ResponseStore(self.directory).put(self.url + '2', 404, b'')
+        replay = self.make_fetcher('replay')
+        self.assertEqual(replay.fetch(self.url), (200, b'{"seq": "MKT"}'))
+        self.assertEqual(replay.fetch(self.url + '2'), (404, b''))
+        self.assertEqual(replay.fetch(self.url + '3'), (None, None))
+        self.assertEqual(replay.fetch(self.url, store=False), (None, None))
+        self.assertEqual(replay.downloaded, [])
+
+    def test_without_store(self):
+        online = self.make_fetcher('online')
+        self.assertEqual(online.fetch(self.url, store=False), (200, b'{"seq": "MKT"}'))
+        self.assertEqual(online.downloaded, [self.url])
+        self.assertIsNone(ResponseStore(self.directory).get(self.url))
+
+    def test_unwritable_store(self):
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+        self.assertEqual(self.make_fetcher('online', path).fetch(self.url), (200, b'{"seq": "MKT"}'))
+
+    def test_fetch_from_web_api(self):
+        ResponseStore(self.directory).put(self.url, 200, b'{"seq": "MKT"}')
+        fetch._fetcher['fetcher'] = None
+        self.addCleanup(fetch._fetcher.update, fetcher=None)
+        with override_settings(WEB_FETCH_MODE='replay', WEB_FETCH_STORE_DIR=self.directory):
+            url = 'https://rest.ensembl.org/sequence/id/$index?content-type=application/json'
+            self.assertEqual(fetch_from_web_api(url, 'ENSP00000000001', ['ensembl', 'isoform']), {'seq': 'MKT'})
+            self.assertFalse(fetch_from_web_api(url, 'ENSP00000000002', ['ensembl', 'isoform']))
+
+
+SHEET_NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+def worksheet_rows(xlsx):
+    """The values of the rows of the first worksheet, as strings"""
+    with zipfile.ZipFile(xlsx) as f:
+        sheet = ET.fromstring(f.read('xl/worksheets/sheet1.xml'))
+    return [[''.join(t.text or '' for t in cell.iter('{%s}t' % SHEET_NS['x'])) or cell.findtext('x:v', '', SHEET_NS)
+        for cell in row.findall('x:c', SHEET_NS)] for row in sheet.iter('{%s}row' % SHEET_NS['x'])]
+
+
+class ExcelExportTest(SimpleTestCase):
+    """Workbooks are written in constant_memory mode, stored exports are downloaded once by their token"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        export_settings = override_settings(EXPORT_DIR=self.directory)
+        export_settings.enable()
+        self.addCleanup(export_settings.disable)
+
+    def write(self, workbook):
+        excel.write_table(workbook.add_worksheet('Residues'), ['Segment', 'GN', 'Residue'],
+            (['TM3', '3x{}'.format(50 + i), 'DRY'[i]] for i in range(3)))
+
+    def read(self, response):
+        with tempfile.TemporaryFile() as f:
+            for chunk in response.streaming_content:
+                f.write(chunk)
+            response.close()
+            return worksheet_rows(f)
+
+    def test_constant_memory_row_order(self):
+        response = excel.excel_response('residues.xlsx', self.write)
+        self.assertEqual(self.read(response), [['Segment', 'GN', 'Residue'], ['TM3', '3x50', 'D'],
+            ['TM3', '3x51', 'R'], ['TM3', '3x52', 'Y']])
+
+    def test_stored_export(self):
+        token = excel.store_excel(self.write)
+        response = excel.stored_excel_response(token, 'residues.xlsx')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="residues.xlsx"')
+        self.assertEqual(self.read(response)[3], ['TM3', '3x52', 'Y'])
+        # downloaded once
+        with self.assertRaises(Http404):
+            excel.stored_excel_response(token, 'residues.xlsx')
+
+    def test_invalid_token(self):
+        open(os.path.join(self.directory, 'settings.xlsx'), 'w').close()
+        for token in ['settings', '../' + 'a' * 32, 'A' * 32, 'a' * 31]:
+            with self.assertRaises(Http404):
+                excel.stored_excel_response(token, 'residues.xlsx')
+
+    def test_expired_export(self):
+        expired = excel.store_excel(self.write)
+        path = os.path.join(self.directory, expired + '.xlsx')
+        mtime = time.time() - excel.EXPORT_MAX_AGE - 1
+        os.utime(path, (mtime, mtime))
+        # removed when the next export is stored
+        token = excel.store_excel(self.write)
+        self.assertEqual(os.listdir(self.directory), [token + '.xlsx'])
+        with self.assertRaises(Http404):
+            excel.stored_excel_response(expired, 'residues.xlsx')
@@ -1,15 +1,12 @@
 from django.conf import settings
-from django.utils.text import slugify
 from django.core.cache import cache
+from django.utils.text import slugify
 
 import os
 import yaml
 import time
 import logging
-import urllib
 from urllib.parse import quote
-from urllib.request import urlopen
-from urllib.error import HTTPError
 import json
 import gzip
 from io import BytesIO
@@ -17,6 +14,8 @@ from string import Template
 from Bio import Entrez, Medline
 import xml.etree.ElementTree as etree 
 
+from common.fetch import get_fetcher
+
 
 
 def save_to_cache(path, file_id, data):
@@ -43,79 +42,59 @@ def create_cache_dirs(path):
         intermediate_path = os.sep.join([intermediate_path, directory])
         os.chmod(intermediate_path, 0o777)
 
-def fetch_from_web_api(url, index, cache_dir=False, xml=False, raw=False):
-    logger = logging.getLogger('build')
+def web_api_url(url, index):
+    return Template(url).substitute(index=quote(str(index), safe=''))
 
-    # slugify the index for the cache filename (some indices have symbols not allowed in file names (e.g. /))
-    index_slug= slugify(index)
-    cache_file_path = '{}/{}'.format('/'.join(cache_dir), index_slug)
-    
-    # try fetching from cache
-    if cache_dir:
-        d = cache.get(cache_file_path)
-        # d = fetch_from_cache(cache_dir, index_slug)
-        if not d is None:
-            logger.info('Fetched {} from cache'.format(cache_file_path))
-            return d
-    
-    # if nothing is found in the cache, use the web API
-    full_url = Template(url).substitute(index=quote(str(index), safe=''))
-    logger.info('Fetching {}'.format(full_url))
-    tries = 0
-    max_tries = 5
-    while tries < max_tries:
-        if tries > 0:
-            logger.warning('Failed fetching {}, retrying'.format(full_url))
-        
+def parse_web_api_response(full_url, body, xml=False, raw=False):
+    if full_url[-2:]=='gz' and xml:
         try:
-            req = urlopen(full_url)
-            if full_url[-2:]=='gz' and xml:
-                try:
-                    buf = BytesIO( req.read())
-                    f = gzip.GzipFile(fileobj=buf)
-                    data = f.read()
-                    d = etree.fromstring(data)
-                except:
-                    return False
-            elif xml:
-                try:
-                    d = etree.fromstring(req.read().decode('UTF-8'))
-                except:
-                    return False
-            elif raw:
-                try:
-                    d = req.read().decode('UTF-8')
-                except:
-                    return False
-            else:
-                d = json.loads(req.read().decode('UTF-8'))
-        except HTTPError as e:
-            tries += 1
-            if e.code == 404:
-                logger.warning('Failed fetching {}, 404 - does not exist'.format(full_url))
-                tries = max_tries #skip more tries
-                return False
-            elif e.code == 400:
-                logger.warning('Failed fetching {}, 400 - does not exist'.format(full_url))
-                tries = max_tries #skip more tries
-                return False
-            else:
-                time.sleep(2)
-        except urllib.error.URLError as e:
-            # Catches 101 network is unreachable -- I think it's auto limiting feature
-            tries +=1 
-            time.sleep(2)
-        else:
-            # save to cache
-            if cache_dir:
-                # save_to_cache(cache_dir, index_slug, d)
-                cache.set(cache_file_path, d, 60*60*24*7) #7 days
-                logger.info('Saved entry for {} in cache'.format(cache_file_path))
+            return etree.fromstring(gzip.GzipFile(fileobj=BytesIO(body)).read())
+        except:
+            return False
+    elif xml:
+        try:
+            return etree.fromstring(body.decode('UTF-8'))
+        except:
+            return False
+    elif raw:
+        try:
+            return body.decode('UTF-8')
+        except:
+            return False
+    else:
+        return json.loads(body.decode('UTF-8'))
+
+def fetch_from_web_api(url, index, cache_dir=False, xml=False, raw=False, store=True):
+    """Fetches url with $index substituted and parses the response as JSON, XML or text. Returns False when it is
+    not available. With a cache_dir the responses are kept in the persistent store of common.fetch (build commands),
+    or with store=False in the Django cache for 7 days (views). Without a cache_dir they are not kept"""
+    logger = logging.getLogger('build')
+
+    full_url = web_api_url(url, index)
+    use_store = store and bool(cache_dir)
+    if cache_dir and not store:
+        # slugify the index for the cache key (some indices have symbols not allowed in file names (e.g. /))
+        cache_key = '{}/{}'.format('/'.join(cache_dir), slugify(index))
+        d = cache.get(cache_key)
+        if d is not None:
+            logger.info('Fetched {} from cache'.format(cache_key))
             return d
-    
-    # give up if the lookup fails 5 times
-    logger.error('Failed fetching {} {} times, giving up'.format(full_url, max_tries))
-    return False
+
+    status, body = get_fetcher().fetch(full_url, store=use_store)
+    if status in (400, 404):
+        logger.warning('Failed fetching {}, {} - does not exist'.format(full_url, status))
+        return False
+    elif status != 200:
+        return False
+    d = parse_web_api_response(full_url, body, xml, raw)
+    if cache_dir and not store and d is not False:
+        cache.set(cache_key, d, 60*60*24*7) #7 days
+    return d
+
+def prefetch_from_web_api(url, indices):
+    """Downloads the responses of url for many indices concurrently into the response store, so that the following
+    fetch_from_web_api calls are served from it"""
+    get_fetcher().fetch_many([web_api_url(url, index) for index in indices])
 
 def fetch_from_entrez(index, cache_dir=False):
     logger = logging.getLogger('build')
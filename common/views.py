@@ -4,21 +4,19 @@ from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.db.models import Case, When
-from django.core.cache import cache
 
 from common.selection import SimpleSelection, Selection, SelectionItem
 from common import definitions
+from common.excel import excel_response, store_excel, stored_excel_response
 from structure.models import Structure, StructureModel, StructureComplexModel
 from protein.models import Protein, ProteinFamily, ProteinSegment, Species, ProteinSource, ProteinSet, ProteinGProtein, ProteinGProteinPair
+from protein.functions import get_family_index
 from residue.models import ResidueGenericNumber, ResidueNumberingScheme, ResidueGenericNumberEquivalent, ResiduePositionSet
 from interaction.forms import PDBform
 from construct.tool import FileUploadForm
 
 import inspect
 from collections import OrderedDict
-from io import BytesIO
-import xlsxwriter, xlrd
-import time
 import json
 
 
@@ -671,19 +669,16 @@ def ToggleFamilyTreeNode(request):
     if simple_selection:
         selection.importer(simple_selection)
 
-    ppf = ProteinFamily.objects.get(pk=node_id)
+    family_index = get_family_index()
+    ppf = family_index.get(pk=node_id)
     if action == 'expand':
-        pfs = ProteinFamily.objects.filter(parent=node_id)
+        pfs = family_index.children[ppf.id]
 
         # species filter
-        species_list = []
-        for species in selection.species:
-            species_list.append(species.item)
+        species_list = [species.item_id for species in selection.species]
 
         # annotation filter
-        protein_source_list = []
-        for protein_source in selection.annotation:
-            protein_source_list.append(protein_source.item)
+        protein_source_list = [protein_source.item_id for protein_source in selection.annotation]
 
         # preferred g proteins filter
         pref_g_proteins_list = []
@@ -696,24 +691,18 @@ def ToggleFamilyTreeNode(request):
         for g_protein in selection.g_proteins:
             g_proteins_list.append(g_protein.item)
 
-        if species_list:
-            ps = Protein.objects.order_by('id').filter(family=ppf,
-                species__in=(species_list),
-                source__in=(protein_source_list)).order_by('source_id', 'id')
-        else:
-            ps = Protein.objects.order_by('id').filter(family=ppf,
-                source__in=(protein_source_list)).order_by('source_id', 'id')
+        # Excluding G protein Alpha subunit protein structure objects, e.g. 3sn6_a
+        protein_ids = family_index.protein_ids(ppf, species=species_list, sources=protein_source_list, tree=True)
+        ps = Protein.objects.filter(pk__in=protein_ids).select_related('source', 'species',
+            'sequence_type').order_by('source_id', 'id')
 
         if pref_g_proteins_list:
             proteins = [x.protein_id for x in ProteinGProteinPair.objects.filter(g_protein__in=g_proteins_list, transduction='primary')]
-            ps = Protein.objects.order_by('id').filter(pk__in=proteins).filter(pk__in=ps)
+            ps = ps.filter(pk__in=proteins).order_by('id')
 
         if g_proteins_list:
             proteins = [x.protein_id for x in ProteinGProteinPair.objects.filter(g_protein__in=g_proteins_list)]
-            ps = Protein.objects.order_by('id').filter(pk__in=proteins).filter(pk__in=ps)
-
-        # Excluding G protein Alpha subunit protein structure objects, e.g. 3sn6_a
-        ps = ps.exclude(accession__isnull=True, family__parent__parent__name='Alpha')
+            ps = ps.filter(pk__in=proteins).order_by('id')
 
         action = 'collapse'
     else:
@@ -1313,27 +1302,23 @@ def ResiduesDownload(request):
 
     simple_selection = request.session.get('selection', False)
 
-    outstream = BytesIO()
-    wb = xlsxwriter.Workbook(outstream, {'in_memory': True})
-    worksheet = wb.add_worksheet()
-    row_count = 0
-
-    for position in simple_selection.segments:
-        if position.type == 'residue':
-            worksheet.write_row(row_count, 0, ['residue', position.item.scheme.slug, position.item.label])
-            row_count += 1
-        elif position.type == 'helix':
-            worksheet.write_row(row_count, 0, ['helix', '', position.item.slug])
-            row_count += 1
-    wb.close()
-    outstream.seek(0)
-    response = HttpResponse(outstream.read(), content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response['Content-Disposition'] = "attachment; filename=segment_selection.xlsx"
-
-    return response
+    def write(workbook):
+        worksheet = workbook.add_worksheet()
+        row_count = 0
+
+        for position in simple_selection.segments:
+            if position.type == 'residue':
+                worksheet.write_row(row_count, 0, ['residue', position.item.scheme.slug, position.item.label])
+                row_count += 1
+            elif position.type == 'helix':
+                worksheet.write_row(row_count, 0, ['helix', '', position.item.slug])
+                row_count += 1
+
+    return excel_response('segment_selection.xlsx', write)
 
 def ResiduesUpload(request):
     """Receives a file containing generic residue positions along with numbering scheme and adds those to the selection."""
+    import xlrd
 
     # get simple selection from session
     simple_selection = request.session.get('selection', False)
@@ -1464,9 +1449,10 @@ def ExportExcelSuggestions(request):
     data = json.loads(data)
 
     #EXCEL SOLUTION
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    token = store_excel(lambda workbook: write_suggestions(workbook, sheets, headers, data))
+    return HttpResponse(token)
 
+def write_suggestions(workbook, sheets, headers, data):
     for name in sheets:
         values = data[name]
         if len(values)==0:
@@ -1490,27 +1476,19 @@ def ExportExcelSuggestions(request):
                 worksheet.write(row, col, c)
                 col += 1
             row += 1
-    workbook.close()
-    output.seek(0)
-    xlsx_data = output.read()
-
-    ts = time.time()
-
-    cache.set(ts,xlsx_data,30)
-    response = HttpResponse(ts)
-    return response
 
 @csrf_exempt
 def ExportExcelModifications(request):
     """Convert json file to excel file"""
-    headers = ['#','type', 'method', 'range', 'info','insert_location','order','from','to','sequence','fixed','extra']
-
     #EXCEL SOLUTION
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    token = store_excel(lambda workbook: write_modifications(workbook, request.POST))
+    return HttpResponse(token)
+
+def write_modifications(workbook, post):
+    headers = ['#','type', 'method', 'range', 'info','insert_location','order','from','to','sequence','fixed','extra']
 
-    if 'd' in request.POST:
-        data = request.POST['d']
+    if 'd' in post:
+        data = post['d']
         data = json.loads(data)
 
         worksheet = workbook.add_worksheet("modifications")
@@ -1536,8 +1514,8 @@ def ExportExcelModifications(request):
                 else:
                     print('No column for '+m)
             row += 1
-    elif 'm' in request.POST:
-        datas = request.POST['m']
+    elif 'm' in post:
+        datas = post['m']
         datas = json.loads(datas)
         worksheet = workbook.add_worksheet("modifications")
         row = 0
@@ -1575,7 +1553,7 @@ def ExportExcelModifications(request):
     # worksheet2.write(0, 0, "sequences")
     row = 0
 
-    sequences = request.POST['s']
+    sequences = post['s']
     sequences = json.loads(sequences)
     for s in sequences:
         # worksheet2.write(row, 0, "Modifications # used")
@@ -1591,7 +1569,7 @@ def ExportExcelModifications(request):
     # worksheet2.write(0, 0, "sequences")
     row = 0
 
-    sequences = request.POST['s']
+    sequences = post['s']
     sequences = json.loads(sequences)
     for s in sequences:
         # worksheet2.write(row, 0, "Modifications # used")
@@ -1603,27 +1581,15 @@ def ExportExcelModifications(request):
         worksheet3.write(row, 0, s[3])
         row += 1
 
-    workbook.close()
-    output.seek(0)
-    xlsx_data = output.read()
-
-    ts = time.time()
-
-    cache.set(ts,xlsx_data,30)
-    response = HttpResponse(ts)
-    return response
-
 def ExportExcelDownload(request, ts, entry_name):
     """Convert json file to excel file"""
-
-    response = HttpResponse(cache.get(ts),content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename='+entry_name+'.xlsx' #% 'mutations'
-
-    return response
+    # ts is the token of the export stored by ExportExcelSuggestions or ExportExcelModifications
+    return stored_excel_response(ts, entry_name+'.xlsx')
 
 @csrf_exempt
 def ImportExcel(request, **response_kwargs):
     """Recieves excel, outputs json"""
+    import xlrd
     o = []
     if request.method == 'POST':
         form = FileUploadForm(data=request.POST, files=request.FILES)
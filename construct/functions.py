@@ -9,7 +9,8 @@ from construct.models import *
 from ligand.models import Ligand, LigandType, LigandRole
 from ligand.functions import get_or_make_ligand
 
-from common.tools import fetch_from_web_api
+from common.fetch import get_fetcher
+from common.tools import fetch_from_web_api, web_api_url
 from urllib.parse import quote
 from string import Template
 from urllib.request import urlopen
@@ -55,6 +56,16 @@ def fetch_pdb_info(pdbname,protein,new_xtal=False, ignore_gasper_annotation=Fals
 
     SIFT_exceptions = {'5GLI':[395,403], '5GLH':[395,401]}
     logger = logging.getLogger('build')
+
+    # download the entry data used below concurrently, the fetch_from_web_api calls then read the response store.
+    # Not the jmol modifications: that legacy endpoint often fails, and failures are not stored, so a prefetch would
+    # only repeat its retries
+    get_fetcher().fetch_many([web_api_url(url, index) for url, index in [
+        ('ftp://ftp.ebi.ac.uk/pub/databases/msd/sifts/xml/$index.xml.gz', pdbname.lower()),
+        ('http://www.ebi.ac.uk/pdbe/api/pdb/entry/experiment/$index', pdbname),
+        ('http://www.ebi.ac.uk/pdbe/api/pdb/entry/ligand_monomers/$index', pdbname),
+        ('http://www.rcsb.org/pdb/rest/das/pdb_uniprot_mapping/alignment?query=$index', pdbname),
+        ]])
     #d = {}
     d = OrderedDict()
     d['construct_crystal'] = {}
@@ -8,17 +8,16 @@ from django import forms
 from construct.models import *
 from structure.models import Structure
 from protein.models import ProteinConformation, Protein, ProteinSegment, ProteinFamily
-from alignment.models import AlignmentConsensus
-from common.definitions import AMINO_ACIDS, AMINO_ACID_GROUPS, STRUCTURAL_RULES, STRUCTURAL_SWITCHES
+from alignment.consensus import ConsensusData, get_consensus
+from residue.functions import get_conformation_generic_numbers, get_conformation_id
+from common.definitions import STRUCTURAL_RULES, STRUCTURAL_SWITCHES
 
 import json
 from collections import OrderedDict
 import re
-import xlrd
 import yaml
 import os
 import time
-import pickle
 
 Alignment = getattr(__import__('common.alignment_' + settings.SITE_NAME, fromlist=['Alignment']), 'Alignment')
 
@@ -26,6 +25,7 @@ class FileUploadForm(forms.Form):
     file_source = forms.FileField()
 
 def parse_excel(path):
+    import xlrd
     workbook = xlrd.open_workbook(path)
     worksheets = workbook.sheet_names()
     d = {}
@@ -1473,59 +1473,22 @@ def cons_strucs(request, slug, **response_kwargs):
 
     level = Protein.objects.filter(entry_name=slug).values_list('family__slug', flat = True).get()
     ##PREPARE TM1 LOOKUP DATA
-    c_proteins = Construct.objects.filter(protein__family__slug__startswith = level.split("_")[0]).all().values_list('protein__pk', flat = True).distinct()
-    xtal_proteins = Protein.objects.filter(pk__in=c_proteins)
-    align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-
-    amino_acids_stats = {}
-    amino_acids_groups_stats = {}
-        
     potentials = cache.get("CD_xtal_"+level.split("_")[0])
 
     if potentials==None:
-
-        a = Alignment()
-
-        a.load_proteins(xtal_proteins)
-
-        a.load_segments(align_segments) #get all segments to make correct diagrams
-
-        # build the alignment data matrix
-        a.build_alignment()
-
-        # calculate consensus sequence + amino acid and feature frequency
-        a.calculate_statistics()
-
-        s_id = 0
-        a_id = 0
-        for ns, segments in a.generic_numbers.items():
-            for s, num in segments.items():
-                for n, dn in num.items():
-                    temp = []
-                    temp2 = []
-                    for i, aa in enumerate(AMINO_ACIDS):
-                        temp.append(a.amino_acid_stats[i][s_id][a_id])
-
-                    for i, aa in enumerate(AMINO_ACID_GROUPS):
-                        temp2.append(a.feature_stats[i][s_id][a_id])
-                    amino_acids_stats[n] = temp
-                    amino_acids_groups_stats[n] = temp2
-                a_id += 1
-            s_id += 1
-
-        potentials = {}
-        for seg, aa_list in a.consensus.items():
-            for gn, aa in aa_list.items():
-                if int(aa[1])>5: #if conservations is >50%
-                    potentials[gn] = [aa[0],aa[1]]
+        c_proteins = Construct.objects.filter(protein__family__slug__startswith = level.split("_")[0]).all().values_list('protein__pk', flat = True).distinct()
+        xtal_proteins = Protein.objects.filter(pk__in=c_proteins)
+        potentials = build_consensus(xtal_proteins).conserved_residues()
         cache.set("CD_xtal_"+level.split("_")[0],potentials,60*60*24)
 
 
-    rs = Residue.objects.filter(protein_conformation__protein__entry_name=slug, generic_number__label__in=list(potentials.keys())).prefetch_related('protein_segment','display_generic_number','generic_number')
+    rs = get_conformation_generic_numbers(get_conformation_id(slug))
 
     results = {}
-    for r in rs:
-        gn = r.generic_number.label
+    for gn in potentials:
+        if gn not in rs:
+            continue
+        r = rs[gn]
         if r.amino_acid!=potentials[gn][0]:
             results[gn] = [r.amino_acid, r.sequence_number,potentials[gn][0],potentials[gn][1]]
     jsondata = json.dumps(results)
@@ -1541,63 +1504,15 @@ def cons_rf(request, slug, **response_kwargs):
 
     level = Protein.objects.filter(entry_name=slug).values_list('family__slug', flat = True).get()
     ##PREPARE TM1 LOOKUP DATA
-    #c_proteins = Construct.objects.filter(protein__family__slug__startswith = level.split("_")[0]).all().values_list('protein__pk', flat = True).distinct()
-    rf_proteins = Protein.objects.filter(family__slug__startswith="_".join(level.split("_")[0:3]), source__name='SWISSPROT',species__common_name='Human')
-    align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-
-    amino_acids_stats = {}
-    amino_acids_groups_stats = {}
-        
+    potentials = get_family_consensus("_".join(level.split("_")[0:3])).conserved_residues()
 
-    print(len(rf_proteins))
-
-    try:
-
-        # Load alignment 
-        a = pickle.loads(AlignmentConsensus.objects.get(slug="_".join(level.split("_")[0:3])).alignment)
-    except:
-        print('failed!')
-        a = Alignment()
-
-        a.load_proteins(rf_proteins)
-
-        a.load_segments(align_segments) #get all segments to make correct diagrams
-
-        # build the alignment data matrix
-        a.build_alignment()
-
-        # calculate consensus sequence + amino acid and feature frequency
-        a.calculate_statistics()
-
-    s_id = 0
-    a_id = 0
-    for ns, segments in a.generic_numbers.items():
-        for s, num in segments.items():
-            for n, dn in num.items():
-                temp = []
-                temp2 = []
-                for i, aa in enumerate(AMINO_ACIDS):
-                    temp.append(a.amino_acid_stats[i][s_id][a_id])
-
-                for i, aa in enumerate(AMINO_ACID_GROUPS):
-                    temp2.append(a.feature_stats[i][s_id][a_id])
-                amino_acids_stats[n] = temp
-                amino_acids_groups_stats[n] = temp2
-            a_id += 1
-        s_id += 1
-
-    potentials = {}
-    for seg, aa_list in a.consensus.items():
-        for gn, aa in aa_list.items():
-            if int(aa[1])>5: #if conservations is >50%
-                potentials[gn] = [aa[0],aa[1]]
-
-
-    rs = Residue.objects.filter(protein_conformation__protein__entry_name=slug, generic_number__label__in=list(potentials.keys())).prefetch_related('protein_segment','display_generic_number','generic_number')
+    rs = get_conformation_generic_numbers(get_conformation_id(slug))
 
     results = {}
-    for r in rs:
-        gn = r.generic_number.label
+    for gn in potentials:
+        if gn not in rs:
+            continue
+        r = rs[gn]
         if r.amino_acid!=potentials[gn][0]:
             results[gn] = [r.amino_acid, r.sequence_number,potentials[gn][0],potentials[gn][1]]
     jsondata = json.dumps(results)
@@ -1613,110 +1528,22 @@ def cons_rf_and_class(request, slug, **response_kwargs):
 
     level = Protein.objects.filter(entry_name=slug).values_list('family__slug', flat = True).get()
     ##PREPARE TM1 LOOKUP DATA
-    #c_proteins = Construct.objects.filter(protein__family__slug__startswith = level.split("_")[0]).all().values_list('protein__pk', flat = True).distinct()
-    rf_proteins = Protein.objects.filter(family__slug__startswith="_".join(level.split("_")[0:3]), source__name='SWISSPROT',species__common_name='Human')
-    align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-
-    amino_acids_stats = {}
-    amino_acids_groups_stats = {}
-        
-    try:
-        # Load alignment 
-        a = pickle.loads(AlignmentConsensus.objects.get(slug="_".join(level.split("_")[0:3])).alignment)
-    except:
-        print('failed!')
-        a = Alignment()
-
-        a.load_proteins(rf_proteins)
-
-        a.load_segments(align_segments) #get all segments to make correct diagrams
-
-        # build the alignment data matrix
-        a.build_alignment()
-
-        # calculate consensus sequence + amino acid and feature frequency
-        a.calculate_statistics()
-
-    s_id = 0
-    a_id = 0
-    for ns, segments in a.generic_numbers.items():
-        for s, num in segments.items():
-            for n, dn in num.items():
-                temp = []
-                temp2 = []
-                for i, aa in enumerate(AMINO_ACIDS):
-                    temp.append(a.amino_acid_stats[i][s_id][a_id])
-
-                for i, aa in enumerate(AMINO_ACID_GROUPS):
-                    temp2.append(a.feature_stats[i][s_id][a_id])
-                amino_acids_stats[n] = temp
-                amino_acids_groups_stats[n] = temp2
-            a_id += 1
-        s_id += 1
-
-    potentials = {}
-    for seg, aa_list in a.consensus.items():
-        for gn, aa in aa_list.items():
-            if int(aa[1])>5: #if conservations is >50%
-                potentials[gn] = [aa[0],aa[1]]
+    potentials = get_family_consensus("_".join(level.split("_")[0:3])).conserved_residues()
 
     potentials2 = cache.get("CD_rfc_"+"_".join(level.split("_")[0:1]))
 
     if potentials2==None:
-        class_proteins = Protein.objects.filter(family__slug__startswith="_".join(level.split("_")[0:1]), source__name='SWISSPROT',species__common_name='Human')
-        align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-
-        amino_acids_stats = {}
-        amino_acids_groups_stats = {}
-            
-        try:
-            # Load alignment 
-            a = pickle.loads(AlignmentConsensus.objects.get(slug="_".join(level.split("_")[0:1])).alignment)
-        except:
-            print('failed!')
-
-            a = Alignment()
-
-            a.load_proteins(class_proteins)
-
-            a.load_segments(align_segments) #get all segments to make correct diagrams
-
-            # build the alignment data matrix
-            a.build_alignment()
-
-            # calculate consensus sequence + amino acid and feature frequency
-            a.calculate_statistics()
-
-        s_id = 0
-        a_id = 0
-        for ns, segments in a.generic_numbers.items():
-            for s, num in segments.items():
-                for n, dn in num.items():
-                    temp = []
-                    temp2 = []
-                    for i, aa in enumerate(AMINO_ACIDS):
-                        temp.append(a.amino_acid_stats[i][s_id][a_id])
-
-                    for i, aa in enumerate(AMINO_ACID_GROUPS):
-                        temp2.append(a.feature_stats[i][s_id][a_id])
-                    amino_acids_stats[n] = temp
-                    amino_acids_groups_stats[n] = temp2
-                a_id += 1
-            s_id += 1
-
-        potentials2 = {}
-        for seg, aa_list in a.consensus.items():
-            for gn, aa in aa_list.items():
-                if int(aa[1])>5: #if conservations is >50%
-                    potentials2[gn] = [aa[0],aa[1]]
+        potentials2 = get_family_consensus("_".join(level.split("_")[0:1])).conserved_residues()
         cache.set("CD_rfc_"+"_".join(level.split("_")[0:1]),potentials2,60*60*24)
 
 
-    rs = Residue.objects.filter(protein_conformation__protein__entry_name=slug, generic_number__label__in=list(potentials.keys())).prefetch_related('protein_segment','display_generic_number','generic_number')
+    rs = get_conformation_generic_numbers(get_conformation_id(slug))
 
     results = {}
-    for r in rs:
-        gn = r.generic_number.label
+    for gn in potentials:
+        if gn not in rs:
+            continue
+        r = rs[gn]
         if r.amino_acid!=potentials[gn][0]:
             if gn in potentials2:
                 results[gn] = [r.amino_acid, r.sequence_number,potentials[gn][0],potentials[gn][1]]
@@ -1732,51 +1559,16 @@ def cons_rm_GP(request, slug, **response_kwargs):
     start_time = time.time()
     level = Protein.objects.filter(entry_name=slug).values_list('family__slug', flat = True).get()
     ##PREPARE TM1 LOOKUP DATA
-    #c_proteins = Construct.objects.filter(protein__family__slug__startswith = level.split("_")[0]).all().values_list('protein__pk', flat = True).distinct()
-    rf_proteins = Protein.objects.filter(family__slug__startswith="_".join(level.split("_")[0:3]), source__name='SWISSPROT',species__common_name='Human')
-    align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-
-    amino_acids_stats = {}
-    amino_acids_groups_stats = {}
-        
-    a = Alignment()
-    a.load_proteins(rf_proteins)
-    a.load_segments(align_segments) #get all segments to make correct diagrams
-    # build the alignment data matrix
-    a.build_alignment()
-    # calculate consensus sequence + amino acid and feature frequency
-    a.calculate_statistics()
-
-    s_id = 0
-    a_id = 0
-    for ns, segments in a.generic_numbers.items():
-        for s, num in segments.items():
-            for n, dn in num.items():
-                temp = []
-                temp2 = []
-                for i, aa in enumerate(AMINO_ACIDS):
-                    temp.append(a.amino_acid_stats[i][s_id][a_id])
-
-                for i, aa in enumerate(AMINO_ACID_GROUPS):
-                    temp2.append(a.feature_stats[i][s_id][a_id])
-                amino_acids_stats[n] = temp
-                amino_acids_groups_stats[n] = temp2
-            a_id += 1
-        s_id += 1
-
-    potentials = {}
-    for seg, aa_list in a.consensus.items():
-        for gn, aa in aa_list.items():
-            if int(aa[1])>5: #if conservations is >50%
-                potentials[gn] = [aa[0],aa[1]]
+    potentials = get_family_consensus("_".join(level.split("_")[0:3])).conserved_residues()
 
-
-    rs = Residue.objects.filter(protein_conformation__protein__entry_name=slug, generic_number__label__in=list(potentials.keys())).prefetch_related('protein_segment','display_generic_number','generic_number')
+    rs = get_conformation_generic_numbers(get_conformation_id(slug))
 
     results = {}
     results2 = {}
-    for r in rs:
-        gn = r.generic_number.label
+    for gn in potentials:
+        if gn not in rs:
+            continue
+        r = rs[gn]
         if r.amino_acid in ['G','P']:
             if r.amino_acid!=potentials[gn][0]:
                 results[gn] = [r.amino_acid, r.sequence_number,potentials[gn][0],potentials[gn][1]]
@@ -1789,56 +1581,29 @@ def cons_rm_GP(request, slug, **response_kwargs):
     print("cons_rm_GP",diff)
     return HttpResponse(jsondata, **response_kwargs)
 
+def build_consensus(proteins):
+    # Align the proteins over the reference segments and collect the consensus statistics
+    align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
+    a = Alignment()
+    a.load_proteins(proteins)
+    a.load_segments(align_segments)
+    a.build_alignment()
+    # calculate consensus sequence + amino acid and feature frequency
+    a.calculate_statistics()
+    return ConsensusData.from_alignment(a)
+
+def get_family_consensus(slug):
+    # Consensus stored by build_consensus_sequences, calculated from the human proteins of the family if it is missing
+    consensus = get_consensus(slug)
+    if consensus is None:
+        print('no saved consensus', slug)
+        proteins = Protein.objects.filter(family__slug__startswith=slug, source__name='SWISSPROT',species__common_name='Human')
+        consensus = build_consensus(proteins)
+    return consensus
+
 def calculate_conservation(proteins = None, slug = None):
     # Return a a dictionary of each generic number and the conserved residue and its frequency
-    # Can either be used on a list of proteins or on a slug. If slug then use the cached alignment object.
-
-    amino_acids_stats = {}
-    amino_acids_groups_stats = {}
-
+    # Can either be used on a list of proteins or on a slug. If slug then use the stored family consensus.
     if slug:
-        try: 
-            # Load alignment 
-            alignment_consensus = AlignmentConsensus.objects.get(slug=slug)
-            if alignment_consensus.gn_consensus:
-                alignment_consensus = pickle.loads(alignment_consensus.gn_consensus)
-                # make sure it has this value, so it's newest version
-                test = alignment_consensus['1x50'][2]
-                return alignment_consensus
-            a = pickle.loads(alignment_consensus.alignment)
-        except: 
-            print('no saved alignment')
-            proteins = Protein.objects.filter(family__slug__startswith=slug, source__name='SWISSPROT',species__common_name='Human')
-            align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-            a = Alignment()
-            a.load_proteins(proteins)
-            a.load_segments(align_segments) 
-            a.build_alignment()
-            # calculate consensus sequence + amino acid and feature frequency
-            a.calculate_statistics()
-            alignment_consensus = None
-    elif proteins:
-        align_segments = ProteinSegment.objects.all().filter(slug__in = list(settings.REFERENCE_POSITIONS.keys())).prefetch_related()
-        a = Alignment()
-        a.load_proteins(proteins)
-        a.load_segments(align_segments) 
-        a.build_alignment()
-        # calculate consensus sequence + amino acid and feature frequency
-        a.calculate_statistics()
-
-    num_proteins = len(a.proteins)
-    # print(a.aa_count)
-    consensus = {}
-    for seg, aa_list in a.consensus.items():
-        for gn, aal in aa_list.items():
-            aa_count_dict = {}
-            for aa, num in a.aa_count[seg][gn].items():
-                if num:
-                    aa_count_dict[aa] = (num,round(num/num_proteins,3))
-            if 'x' in gn: # only takes those GN positions that are actual 1x50 etc
-                consensus[gn] = [aal[0],aal[1],aa_count_dict]
-    if slug and alignment_consensus:
-        alignment_consensus.gn_consensus = pickle.dumps(consensus)
-        alignment_consensus.save()
-
-    return consensus
+        return get_family_consensus(slug).conservation()
+    return build_consensus(proteins).conservation()
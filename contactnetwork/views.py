@@ -32,9 +32,6 @@ from collections import OrderedDict
 import math, statistics
 import cmath
 import numpy as np
-import pandas as pd
-import scipy.cluster.hierarchy as sch
-import scipy.spatial.distance as ssd
 import time
 import hashlib
 import operator
@@ -51,6 +48,67 @@ def get_hash(data):
 
     return hashlib.md5(hash_key.encode('utf-8')).hexdigest()
 
+def gpcrdb_number_comparator(e1, e2):
+    t1 = e1.split('x')
+    t2 = e2.split('x')
+
+    if e1 == e2:
+        return 0
+
+    if t1[0] == t2[0]:
+        if t1[1] < t2[1]:
+            return -1
+        else:
+            return 1
+
+    if t1[0] < t2[0]:
+        return -1
+    else:
+        return 1
+
+def get_class_pair_conservation(class_slug='001'):
+    # amino acid (pair) conservation of a receptor class, used as background in the interaction browser
+    cache_key = 'amino_acid_pair_conservation_{}'.format(class_slug)
+    class_pair_lookup = cache.get(cache_key)
+    if class_pair_lookup==None or len(class_pair_lookup)==0:
+        # Class pair conservation
+        sum_proteins = Protein.objects.filter(family__slug__startswith=class_slug,sequence_type__slug='wt',species__common_name='Human').count()
+        residues = Residue.objects.filter(protein_conformation__protein__family__slug__startswith=class_slug,
+                                          protein_conformation__protein__sequence_type__slug='wt',
+                                          protein_conformation__protein__species__common_name='Human',
+
+                    ).exclude(generic_number=None).values('pk','sequence_number','generic_number__label','amino_acid','protein_conformation__protein__entry_name').all()
+        r_pair_lookup = defaultdict(lambda: defaultdict(lambda: set()))
+        for r in residues:
+            r_pair_lookup[r['generic_number__label']][r['amino_acid']].add(r['protein_conformation__protein__entry_name'])
+        class_pair_lookup = {}
+
+        gen_keys = sorted(r_pair_lookup.keys(), key=functools.cmp_to_key(gpcrdb_number_comparator))
+        for i,gen1 in enumerate(gen_keys):
+            v1 = r_pair_lookup[gen1]
+            temp_score_dict = []
+            for aa, protein in v1.items():
+                temp_score_dict.append([aa,len(protein)/sum_proteins])
+
+            most_freq_aa = sorted(temp_score_dict.copy(), key = lambda x: -x[1])[0]
+            class_pair_lookup[gen1] = most_freq_aa
+            for gen2 in gen_keys[i:]:
+                if gen1 == gen2:
+                    continue
+                v2 = r_pair_lookup[gen2]
+                coord = '{},{}'.format(gen1,gen2)
+                for aa1 in v1.keys():
+                    p1 = v1[aa1]
+                    class_pair_lookup[gen1+aa1] = round(100*len(p1)/sum_proteins)
+                    for aa2 in v2.keys():
+                        pair = '{}{}'.format(aa1,aa2)
+                        p2 = v2[aa2]
+                        p = p1.intersection(p2)
+                        if p:
+                            class_pair_lookup[coord+pair] = round(100*len(p)/sum_proteins)
+        cache.set(cache_key,class_pair_lookup,3600*24*7)
+    return class_pair_lookup
+
 def Clustering(request):
     """
     Show clustering page
@@ -371,23 +429,6 @@ def PdbTableData(request):
 def InteractionBrowserData(request):
 
     start_time = time.time()
-    def gpcrdb_number_comparator(e1, e2):
-            t1 = e1.split('x')
-            t2 = e2.split('x')
-
-            if e1 == e2:
-                return 0
-
-            if t1[0] == t2[0]:
-                if t1[1] < t2[1]:
-                    return -1
-                else:
-                    return 1
-
-            if t1[0] < t2[0]:
-                return -1
-            else:
-                return 1
 
     mode = 'single'
     # PDB files
@@ -490,49 +531,9 @@ def InteractionBrowserData(request):
 
     # data = None
     if data==None:
-        cache_key = 'amino_acid_pair_conservation_{}'.format('001')
         print('Before getting class cache',time.time()-start_time)
-        class_pair_lookup = cache.get(cache_key)
+        class_pair_lookup = get_class_pair_conservation('001')
         print('After getting class cache',time.time()-start_time)
-        # class_pair_lookup=None
-        if class_pair_lookup==None or len(class_pair_lookup)==0:
-            # Class pair conservation
-            sum_proteins = Protein.objects.filter(family__slug__startswith='001',sequence_type__slug='wt',species__common_name='Human').count()
-            residues = Residue.objects.filter(protein_conformation__protein__family__slug__startswith='001',
-                                              protein_conformation__protein__sequence_type__slug='wt',
-                                              protein_conformation__protein__species__common_name='Human',
-
-                        ).exclude(generic_number=None).values('pk','sequence_number','generic_number__label','amino_acid','protein_conformation__protein__entry_name').all()
-            r_pair_lookup = defaultdict(lambda: defaultdict(lambda: set()))
-            for r in residues:
-                r_pair_lookup[r['generic_number__label']][r['amino_acid']].add(r['protein_conformation__protein__entry_name'])
-            class_pair_lookup = {}
-
-            gen_keys = sorted(r_pair_lookup.keys(), key=functools.cmp_to_key(gpcrdb_number_comparator))
-            for i,gen1 in enumerate(gen_keys):
-                v1 = r_pair_lookup[gen1]
-                temp_score_dict = []
-                for aa, protein in v1.items():
-                    temp_score_dict.append([aa,len(protein)/sum_proteins])
-
-                most_freq_aa = sorted(temp_score_dict.copy(), key = lambda x: -x[1])[0]
-                class_pair_lookup[gen1] = most_freq_aa
-                for gen2 in gen_keys[i:]:
-                    if gen1 == gen2:
-                        continue
-                    pairs = {}
-                    v2 = r_pair_lookup[gen2]
-                    coord = '{},{}'.format(gen1,gen2)
-                    for aa1 in v1.keys():
-                        p1 = v1[aa1]
-                        class_pair_lookup[gen1+aa1] = round(100*len(p1)/sum_proteins)
-                        for aa2 in v2.keys():
-                            pair = '{}{}'.format(aa1,aa2)
-                            p2 = v2[aa2]
-                            p = p1.intersection(p2)
-                            if p:
-                                class_pair_lookup[coord+pair] = round(100*len(p)/sum_proteins)
-            cache.set(cache_key,class_pair_lookup,3600*24*7)
 
         # Get the relevant interactions
         interactions = Interaction.objects.filter(
@@ -664,13 +665,11 @@ def InteractionBrowserData(request):
                 r_presence_lookup[r['generic_number__label']].append(r['protein_conformation__protein__entry_name'])
                 segm_lookup[r['generic_number__label']] = r['protein_segment__slug']
 
-            gen_keys = sorted(r_pair_lookup.keys(), key=functools.cmp_to_key(gpcrdb_number_comparator))
             all_pdbs_pairs = {}
             for i,gen1 in enumerate(all_interaction_residues):
                 for gen2 in all_interaction_residues[i:]:
                     if gen1 == gen2:
                         continue
-                    pairs = {}
                     v1 = r_pair_lookup[gen1]
                     v2 = r_pair_lookup[gen2]
                     coord = '{},{}'.format(gen1,gen2)
@@ -1595,23 +1594,6 @@ def InteractionBrowserData(request):
     return JsonResponse(data)
 
 def DistanceDataGroups(request):
-    def gpcrdb_number_comparator(e1, e2):
-            t1 = e1.split('x')
-            t2 = e2.split('x')
-
-            if e1 == e2:
-                return 0
-
-            if t1[0] == t2[0]:
-                if t1[1] < t2[1]:
-                    return -1
-                else:
-                    return 1
-
-            if t1[0] < t2[0]:
-                return -1
-            else:
-                return 1
 
     # PDB files
     try:
@@ -2032,6 +2014,8 @@ def stableResMatrix(pdbs):
     return [distance_matrix, pdbs]
 
 def ClusteringData(request):
+    import scipy.spatial.distance as ssd
+    import scipy.cluster.hierarchy as sch
     # PDB files
     try:
         pdbs = request.GET.get('pdbs').split(',')
@@ -2223,23 +2207,6 @@ def calculateSilhouetteIndex(distance_matrix, a, b):
 
 
 def DistanceData(request):
-    def gpcrdb_number_comparator(e1, e2):
-            t1 = e1.split('x')
-            t2 = e2.split('x')
-
-            if e1 == e2:
-                return 0
-
-            if t1[0] == t2[0]:
-                if t1[1] < t2[1]:
-                    return -1
-                else:
-                    return 1
-
-            if t1[0] < t2[0]:
-                return -1
-            else:
-                return 1
 
     # PDB files
     try:
@@ -2428,23 +2395,6 @@ def DistanceData(request):
 
 # DEPRECATED FUNCTION?
 def InteractionData(request):
-    def gpcrdb_number_comparator(e1, e2):
-            t1 = e1.split('x')
-            t2 = e2.split('x')
-
-            if e1 == e2:
-                return 0
-
-            if t1[0] == t2[0]:
-                if t1[1] < t2[1]:
-                    return -1
-                else:
-                    return 1
-
-            if t1[0] < t2[0]:
-                return -1
-            else:
-                return 1
 
     # PDB files
     try:
@@ -5,6 +5,7 @@ from django.db.models import Count, Max
 from django.core.cache import cache
 from django.views.decorators.cache import cache_page
 
+from common.release import release_conditional
 from drugs.models import Drugs
 from protein.models import Protein, ProteinFamily
 from mutational_landscape.models import NHSPrescribings
@@ -27,6 +28,7 @@ def striphtml(data):
     p = re.compile(r'<.*?>')
     return p.sub('', data)
 
+@release_conditional
 @cache_page(60*60*24*30)
 def drugstatistics(request):
 
@@ -229,6 +231,7 @@ def drugstatistics(request):
 
     return render(request, 'drugstatistics.html', {'drugtypes_approved':drugtypes_approved, 'drugtypes_trials':drugtypes_trials,  'drugtypes_estab':drugtypes_estab,  'drugtypes_not_estab':drugtypes_not_estab, 'drugindications_approved':drugindications_approved, 'drugindications_trials':drugindications_trials, 'drugtargets_approved':drugtargets_approved, 'drugtargets_trials':drugtargets_trials, 'phase_trials':phase_trials, 'phase_trials_inactive': phase_trials_inactive, 'moas_trials':moas_trials, 'moas_approved':moas_approved, 'drugfamilies_approved':drugfamilies_approved, 'drugfamilies_trials':drugfamilies_trials, 'drugClasses_approved':drugClasses_approved, 'drugClasses_trials':drugClasses_trials, 'drugs_over_time':drugs_over_time, 'in_trial':len(in_trial), 'not_targeted':not_targeted})
 
+@release_conditional
 @cache_page(60*60*24*30)
 def drugbrowser(request):
     # Get drugdata from here somehow
@@ -275,6 +278,7 @@ def drugbrowser(request):
 
     return render(request, 'drugbrowser.html', {'drugdata': context})
 
+@release_conditional
 @cache_page(60*60*24*30)
 def drugmapping(request):
     context = dict()
@@ -410,6 +414,7 @@ def drugmapping(request):
 
     return render(request, 'drugmapping.html', {'drugdata':context})
 
+@release_conditional
 @cache_page(60*60*24*15)
 def nhs_drug(request, slug):
 
@@ -439,6 +444,7 @@ def nhs_drug(request, slug):
 
     return render(request, 'nhs.html', {'data':data, 'drug':slug, 'section':list(set(sections))})
 
+@release_conditional
 @cache_page(60*60*24*15)
 def nhs_section(request, slug):
 
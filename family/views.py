@@ -5,7 +5,9 @@ from django.core.cache import cache
 from django.views.decorators.cache import cache_page
 
 from common.diagrams_gpcr import DrawHelixBox, DrawSnakePlot
+from common.release import release_conditional
 
+from protein.functions import get_family_index
 from protein.models import Protein, ProteinFamily, ProteinSegment, ProteinConformation
 from residue.models import Residue,ResidueGenericNumber
 from mutation.models import MutationExperiment
@@ -60,6 +62,7 @@ def linear_gradient(start_hex="#4682B4", finish_hex="#FFB347", n=10):
 
   return color_dict(RGB_list)
 
+@release_conditional
 @cache_page(60 * 60 * 24 * 7)
 def detail(request, slug):
     # get family
@@ -75,9 +78,10 @@ def detail(request, slug):
 
     # number of proteins
     proteins = Protein.objects.filter(family__slug__startswith=pf.slug, sequence_type__slug='wt')
-    no_of_proteins = proteins.count()
-    no_of_human_proteins = Protein.objects.filter(family__slug__startswith=pf.slug, species__id=1,
-        sequence_type__slug='wt').count()
+    family_index = get_family_index()
+    wild_type = [family_index.sequence_type_ids.get('wt')]
+    no_of_proteins = family_index.protein_count(pf, sequence_types=wild_type)
+    no_of_human_proteins = family_index.protein_count(pf, species=[1], sequence_types=wild_type)
     list_proteins = list(proteins.values_list('pk',flat=True))
 
 
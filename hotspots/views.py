@@ -1,12 +1,11 @@
 from django.conf import settings
 from django.shortcuts import render
-from django.db.models import Count, Avg, Min, Max, Q
+from django.db.models import Count, Avg, Min, Max
 from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
 from django.views.decorators.cache import cache_page
 from django.views.generic import TemplateView, View
 
-from interaction.models import ResidueFragmentInteraction
-from mutation.models import MutationExperiment
+from mutation.models import MutationPositionSummary
 from protein.models import Protein, ProteinSegment
 from residue.models import Residue
 from structure.models import Structure
@@ -74,36 +73,25 @@ def getHotspots(request):
     #data["seq_conservation"] = seq_conservation
 
     # MUTATION: obtain ligand mutations >5 fold effect
-    receptor_mutations = MutationExperiment.objects.filter(Q(foldchange__gte = 5) | Q(foldchange__lte = -5), protein__in = class_proteins)\
-                    .exclude(residue__generic_number=None)\
-                    .values("protein__entry_name", "residue__generic_number__label")\
-                    .annotate(unique_mutations=Count("id"))\
-                    .order_by('protein__entry_name', "residue__generic_number__label")
+    # STRUCTURE: Ligand contacts per position per protein (consider also per subfamily/ligand type/class)
+    # both precomputed by build_mutation_summary
+    position_summary = MutationPositionSummary.objects.filter(protein__in=class_proteins)\
+                    .values_list('protein__entry_name', 'generic_number__label', 'foldchange_5_10', 'foldchange_above_10', 'interaction_structures')
 
     mutation_count = {}
-    for entry in list(receptor_mutations):
-        if not entry["protein__entry_name"] in mutation_count:
-            mutation_count[entry["protein__entry_name"]] = {}
-        mutation_count[entry["protein__entry_name"]][entry["residue__generic_number__label"]] = entry["unique_mutations"]
+    contact_count = {}
+    for entry_name, generic_number, foldchange_5_10, foldchange_above_10, interaction_structures in position_summary:
+        if foldchange_5_10 or foldchange_above_10:
+            if not entry_name in mutation_count:
+                mutation_count[entry_name] = {}
+            mutation_count[entry_name][generic_number] = foldchange_5_10 + foldchange_above_10
+        if interaction_structures:
+            if not entry_name in contact_count:
+                contact_count[entry_name] = {}
+            contact_count[entry_name][generic_number] = interaction_structures
 
     #data["mutation_count"] = mutation_count
 
-    # STRUCTURE: Ligand contacts per position per protein (consider also per subfamily/ligand type/class)
-    ligand_interactions = ResidueFragmentInteraction.objects.filter(\
-                structure_ligand_pair__structure__protein_conformation__protein__parent__in=class_proteins)\
-                .exclude(structure_ligand_pair__annotated=False)\
-                .exclude(rotamer__residue__generic_number=None)\
-                .exclude(rotamer__residue__generic_number=None)\
-                .values("rotamer__residue__protein_conformation__protein__parent__entry_name", "rotamer__residue__generic_number__label")\
-                .annotate(unique_contacts=Count("rotamer__structure", distinct=True))\
-                .order_by('rotamer__residue__protein_conformation__protein__parent__entry_name', "rotamer__residue__generic_number__label")
-
-    contact_count = {}
-    for entry in list(ligand_interactions):
-        if not entry["rotamer__residue__protein_conformation__protein__parent__entry_name"] in contact_count:
-            contact_count[entry["rotamer__residue__protein_conformation__protein__parent__entry_name"]] = {}
-        contact_count[entry["rotamer__residue__protein_conformation__protein__parent__entry_name"]][entry["rotamer__residue__generic_number__label"]] = entry["unique_contacts"]
-
     #data["contact_count"] = contact_count
 
     # MISSING: alignment per entry
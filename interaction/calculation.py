@@ -0,0 +1,756 @@
+"""
+Ligand-residue interaction fingerprints of a structure, calculated in-process.
+
+Python 3 port of the former legacy_functions.py script without the module globals and the temporary files: the
+structure is parsed once from the PDB text, and ligands, fragments and interaction complexes are returned as PDB text.
+The tests compare the results with those of the script.
+"""
+from Bio.PDB import PDBParser, PDBIO, Select, Vector
+try:
+    from openbabel import openbabel, pybel
+except ImportError:
+    import openbabel
+    import pybel
+
+from io import StringIO
+from math import degrees
+from urllib.request import urlopen
+
+import numpy as np
+import os
+import re
+import shutil
+import yaml
+
+
+AA = {'ALA': 'A', 'ARG': 'R', 'ASN': 'N', 'ASP': 'D',
+      'CYS': 'C', 'GLN': 'Q', 'GLU': 'E', 'GLY': 'G',
+      'HIS': 'H', 'ILE': 'I', 'LEU': 'L', 'LYS': 'K',
+      'MET': 'M', 'PHE': 'F', 'PRO': 'P', 'SER': 'S',
+      'THR': 'T', 'TRP': 'W', 'TYR': 'Y', 'VAL': 'V'}
+
+NEGATIVE = {'D', 'E'}
+POSITIVE = {'H', 'K', 'R'}
+
+AROMATIC = {'TYR', 'TRP', 'PHE', 'HIS'}
+
+CHARGEDAA = {'ARG', 'LYS', 'ASP', 'GLU'}  # skip ,'HIS'
+
+HYDROPHOBIC_AA = {'A', 'C', 'F', 'I', 'L', 'M', 'P', 'V', 'W', 'Y'}
+
+radius = 5
+hydrophob_radius = 4.5
+ignore_het = ['NA', 'W']  # ignore sodium and water
+
+
+def fetch_pdb(pdbname):
+    url = 'https://files.rcsb.org/download/%s.pdb' % pdbname
+    return urlopen(url).read().decode('utf-8')
+
+
+def read_molecule(pdb):
+    """First molecule of PDB text as a pybel Molecule, None if there is none"""
+    if not pdb.strip():
+        return None
+    try:
+        mol = pybel.readstring('pdb', pdb)
+    except (IOError, OSError):
+        return None
+    return mol if mol.atoms else None
+
+
+def check_unique_ligand_mol(pdb):
+    # keep only the HETATM of the first residue, other copies of the ligand are exported as well
+    tempstr = ''
+    ligandid = 0
+    chainid = 0
+    for line in pdb.splitlines(True):
+        if line.startswith('HETATM'):
+            residue_number = line[22:26]
+            chain = line[21]
+
+            if (residue_number != ligandid and ligandid != 0) or (chain != chainid and chainid != 0):
+                continue
+
+            ligandid = residue_number
+            chainid = chain
+
+        tempstr += line
+    return tempstr
+
+
+def find_ligand_full_names(pdb):
+    d = {}
+    for line in pdb.splitlines():
+        if line.startswith('HETSYN'):
+            # need to fix bad PDB formatting where col4 and col5 are put
+            # together for some reason -- usually seen when the id is +1000
+            m = re.match(r"HETSYN[\s]+([\w]{3})[\s]+(.+)", line)
+            if m:
+                d[m.group(1)] = m.group(2).strip()
+    return d
+
+
+def aromatic_rings(mol):
+    """[atom indices, center, normal, atom types, atom vectors] of the aromatic rings of a pybel Molecule"""
+    ringlist = []
+    for ring in mol.OBMol.GetSSSR():
+        center = Vector(0.0, 0.0, 0.0)
+        members = ring.Size()
+        if ring.IsAromatic():
+            atomlist = []
+            atomnames = []
+            vectorlist = []
+            for atom in mol:
+                if ring.IsMember(atom.OBAtom):
+                    a_vector = Vector(atom.coords)
+                    center += a_vector
+                    atomlist.append(atom.idx)
+                    vectorlist.append(a_vector)
+                    atomnames.append(atom.type)
+            center = center / members
+            normal1 = center - vectorlist[0]
+            normal2 = center - vectorlist[2]
+            normal = Vector(np.cross([normal1[0], normal1[1], normal1[2]], [normal2[0], normal2[1], normal2[2]]))
+            ringlist.append([atomlist, center, normal, atomnames, vectorlist])
+    return ringlist
+
+
+def hydrogen_vectors(atom):
+    return [Vector(neighbor.coords) for neighbor in
+        (pybel.Atom(n) for n in openbabel.OBAtomAtomIter(atom.OBAtom)) if neighbor.type == 'H']
+
+
+class ResidueSelect(Select):
+
+    def __init__(self, residueid):
+        self.residueid = residueid
+
+    def accept_residue(self, residue):
+        return str(residue.get_full_id()[3][1]) == self.residueid
+
+
+class ResnameSelect(Select):
+
+    def __init__(self, resname):
+        self.resname = resname
+
+    def accept_residue(self, residue):
+        return residue.get_resname().strip() == self.resname
+
+
+class ChainSelect(Select):
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    def accept_residue(self, residue):
+        return residue.get_parent().id == self.chain
+
+
+class LigandInteractionCalculation:
+    """Interactions between the ligands (or a peptide chain) and the residues of a structure, as calculated by the
+    legacy script. run() returns {ligand: {'interactions', 'score', 'inchikey', 'smiles', 'prettyname',
+    'pdb'}}, where the interactions hold the PDB text of their fragment and 'pdb' that of the ligand with its
+    binding residues"""
+
+    def __init__(self, pdbname, pdb, peptide=None):
+        self.pdbname = pdbname
+        self.pdb = pdb
+        self.peptide = peptide or None
+        self.structure = PDBParser(QUIET=True).get_structure(pdbname, StringIO(pdb))
+
+        self.hetlist = {}
+        self.hetlist_display = {}
+        self.ligand_atoms = {}
+        self.ligand_charged = {}
+        self.ligandcenter = {}
+        self.ligand_rings = {}
+        self.ligand_donors = {}
+        self.ligand_acceptors = {}
+        self.ligand_pdbs = {}
+        self.results = {}
+        self.summary_results = {}
+        self.new_results = {}
+        self.inchikeys = {}
+        self.smiles = {}
+
+        self._residue_mols = {}
+        self._residue_rings = {}
+        self._residue_donors = {}
+        self._index_pdb_lines()
+
+    def _index_pdb_lines(self):
+        # lines and coordinates of the HETATM and lines of the ATOM records per (residue number, chain),
+        # for cutting out the fragments
+        self.lines = self.pdb.splitlines(True)
+        self.hetatm_lines = []
+        hetatm_coords = []
+        self.residue_lines = {}
+        for i, line in enumerate(self.lines):
+            if line.startswith('HETATM'):
+                self.hetatm_lines.append(i)
+                hetatm_coords.append([float(line[30:38]), float(line[38:46]), float(line[46:54])])
+            elif line.startswith('ATOM'):
+                self.residue_lines.setdefault((line[22:26].strip(), line[21].strip()), []).append(i)
+        self.hetatm_coords = np.array(hetatm_coords, dtype=float).reshape(-1, 3)
+
+    def _hetatm_near(self, vectors):
+        # line numbers of the HETATM records within 0.1 of any of the vectors
+        if not vectors or not len(self.hetatm_lines):
+            return []
+        targets = np.array([v.get_array() for v in vectors], dtype=float)
+        distances = np.linalg.norm(self.hetatm_coords[:, None, :] - targets[None, :, :], axis=2)
+        return [self.hetatm_lines[i] for i in np.flatnonzero((distances < 0.1).any(axis=1))]
+
+    def _hetflag(self, chain, residue):
+        # ligand name of a residue, 'pep' for the peptide chain, None for residues of other chains
+        if self.peptide and chain.id == self.peptide:
+            return 'pep'
+        if self.peptide:
+            return None
+        return residue.get_full_id()[3][0].strip().replace("H_", "").strip()
+
+    def _save(self, select):
+        io = PDBIO()
+        io.set_structure(self.structure)
+        handle = StringIO()
+        io.save(handle, select)
+        return handle.getvalue()
+
+    def run(self):
+        self.hetlist_display = find_ligand_full_names(self.pdb)
+        self.create_ligands()
+        self.build_ligand_info()
+        self.find_interactions()
+        self.analyze_interactions()
+        return self.finish()
+
+    def create_ligands(self):
+        hetflag_done = set()
+        for model in self.structure:
+            for chain in model:
+                for residue in chain:
+                    hetflag = self._hetflag(chain, residue)
+                    if not hetflag or hetflag in ignore_het or hetflag in hetflag_done:
+                        continue
+                    hetflag_done.add(hetflag)
+
+                    if hetflag == 'pep':
+                        ligand_pdb = self._save(ChainSelect(self.peptide))
+                    else:
+                        ligand_pdb = self._save(ResnameSelect(hetflag))
+                    ligand_pdb = check_unique_ligand_mol(ligand_pdb)
+
+                    mol = read_molecule(ligand_pdb)
+                    if mol is None:
+                        continue
+
+                    conversion = openbabel.OBConversion()
+                    conversion.SetInAndOutFormats("pdb", "inchi")
+                    conversion.SetOptions("K", conversion.OUTOPTIONS)
+                    obmol = openbabel.OBMol()
+                    conversion.ReadString(obmol, ligand_pdb)
+                    self.inchikeys[hetflag] = conversion.WriteString(obmol).strip()
+                    self.smiles[hetflag] = mol.write("smi").split("\t")[0]
+
+                    mol.OBMol.AddHydrogens(False, True, 7.4)
+                    self.ligand_pdbs[hetflag] = mol.write("pdb")
+
+    def build_ligand_info(self):
+        count_atom_ligand = {}
+        for model in self.structure:
+            for chain in model:
+                for residue in chain:
+                    hetresname = residue.get_resname()
+                    hetflag = self._hetflag(chain, residue)
+                    if not hetflag or hetflag in ignore_het:
+                        continue
+                    if hetflag in self.hetlist and hetflag != 'pep':
+                        continue
+                    if hetflag not in self.ligand_pdbs:
+                        # This ligand has no molecules
+                        continue
+
+                    if hetflag not in self.hetlist:  # do not recreate for peptides
+                        self.hetlist[hetflag] = []
+                        self.ligand_charged[hetflag] = []
+                        self.ligand_donors[hetflag] = []
+                        self.ligand_acceptors[hetflag] = []
+                        count_atom_ligand[hetflag] = 0
+
+                        mol = read_molecule(self.ligand_pdbs[hetflag])
+                        self.ligand_rings[hetflag] = aromatic_rings(mol)
+
+                        for atom in mol:
+                            if atom.formalcharge != 0:
+                                self.ligand_charged[hetflag].append([atom.type, Vector(atom.coords),
+                                    atom.formalcharge])
+                            if atom.OBAtom.IsCarboxylOxygen():
+                                self.ligand_charged[hetflag].append([atom.type, Vector(atom.coords), -1])
+                            if atom.OBAtom.IsHbondDonor():
+                                self.ligand_donors[hetflag].append([atom.type, Vector(atom.coords),
+                                    hydrogen_vectors(atom)])
+                            if atom.OBAtom.IsHbondAcceptor():
+                                self.ligand_acceptors[hetflag].append([atom.type, Vector(atom.coords)])
+
+                    # ligand centers to skip residues far away
+                    center = Vector(0.0, 0.0, 0.0)
+                    if hetflag in self.ligandcenter:  # the peptide spans several residues
+                        center = self.ligandcenter[hetflag][2]
+
+                    for atom in residue:
+                        atom_vector = atom.get_vector()
+                        center += atom_vector
+                        self.hetlist[hetflag].append([hetresname, atom.name, atom_vector])
+                        self.ligand_atoms.setdefault(hetflag, []).append(
+                            [count_atom_ligand[hetflag], atom_vector, atom.name])
+                        count_atom_ligand[hetflag] += 1
+
+                    self.ligandcenter[hetflag] = [center / count_atom_ligand[hetflag], count_atom_ligand[hetflag],
+                        center]
+
+    def residue_molecule(self, residueid, hydrogens=False):
+        # all residues with this sequence number, as the legacy script
+        key = (residueid, hydrogens)
+        if key not in self._residue_mols:
+            mol = read_molecule(self._save(ResidueSelect(residueid)))
+            if mol is not None and hydrogens:
+                mol.OBMol.AddHydrogens(False, True, 7.4)
+            self._residue_mols[key] = mol
+        return self._residue_mols[key]
+
+    def get_ring_from_aa(self, residueid):
+        if residueid not in self._residue_rings:
+            mol = self.residue_molecule(residueid)
+            self._residue_rings[residueid] = aromatic_rings(mol) if mol is not None else []
+        return self._residue_rings[residueid]
+
+    def get_hydrogen_from_aa(self, residueid):
+        if residueid not in self._residue_donors:
+            donors = []
+            mol = self.residue_molecule(residueid, hydrogens=True)
+            for atom in (mol if mol is not None else []):
+                if atom.OBAtom.IsHbondDonor():
+                    donors.append([atom.type, Vector(atom.coords), hydrogen_vectors(atom),
+                        atom.OBAtom.IsHbondAcceptor()])
+            self._residue_donors[residueid] = donors
+        return self._residue_donors[residueid]
+
+    def fragment_library(self, ligand, atomvector, atomname, residuenr, chain, typeinteraction):
+        """PDB text of the residue and the ligand atom (with its neighbours up to two bonds away)"""
+        listofvectors = []
+        if atomvector is not None:
+            mol = read_molecule(self.ligand_pdbs[ligand])
+            mol.removeh()
+            for atom in mol:
+                if (Vector(atom.coords) - atomvector).norm() > 0.1:
+                    continue
+                listofvectors.append(Vector(atom.coords))
+                for neighbour_atom in openbabel.OBAtomAtomIter(atom.OBAtom):
+                    listofvectors.append(Vector(pybel.Atom(neighbour_atom).coords))
+                    for neighbour_atom2 in openbabel.OBAtomAtomIter(neighbour_atom):
+                        listofvectors.append(Vector(pybel.Atom(neighbour_atom2).coords))
+
+        selected = self._hetatm_near(listofvectors) + self.residue_lines.get((residuenr, chain.strip()), [])
+        fragment = ''.join(self.lines[i] for i in sorted(selected))
+        mol = read_molecule(fragment)
+        return mol.write("pdb") if mol is not None else fragment
+
+    def fragment_library_aromatic(self, ligand, atomvectors, residuenr, chain, ringnr):
+        """PDB text of the residue and the atoms of an aromatic ring of the ligand"""
+        selected = self._hetatm_near(atomvectors) + self.residue_lines.get((residuenr, chain.strip()), [])
+        return ''.join(self.lines[i] for i in sorted(selected))
+
+    def remove_hyd(self, aa, ligand):
+        self.new_results[ligand]['interactions'] = [res for res in self.new_results[ligand]['interactions']
+            if not (res[0] == aa and (res[2] == 'HYD' or res[2] == 'hyd'))]
+
+    def check_other_aromatic(self, aa, ligand, info):
+        templist = []
+        check = True
+        for res in self.new_results[ligand]['interactions']:
+            if res[0] == aa and res[4] == 'aromatic':
+                # if the new aromatic interaction has a center-center distance greater than the old one, keep old.
+                if info['Distance'] > res[6]['Distance']:
+                    templist.append(res)
+                    check = False  # Do not add the new one.
+                else:  # if not, delete the old one, as the new is better.
+                    check = True  # add the new one
+                    continue
+            else:
+                templist.append(res)
+        self.new_results[ligand]['interactions'] = templist
+        return check
+
+    def find_interactions(self):
+        """Loops over the receptor residues and collects the atom pairs within the radius of the ligands"""
+        results, summary_results, new_results = self.results, self.summary_results, self.new_results
+        for model in self.structure:
+            for chain in model:
+                chainid = chain.get_id()
+                if self.peptide and chainid == self.peptide:
+                    continue
+                for residue in chain:
+                    aa_resname = residue.get_resname()
+                    aa_seqid = str(residue.get_full_id()[3][1])
+                    aaname = aa_resname + aa_seqid + chainid
+                    if str(residue.get_full_id()[3][0]).strip():
+                        continue  # residue is a hetnam
+                    if 'CA' not in residue:  # prevent errors
+                        continue
+                    ca = residue['CA'].get_vector()
+
+                    for hetflag, atomlist in self.hetlist.items():
+                        if (ca - self.ligandcenter[hetflag][0]).norm() > self.ligandcenter[hetflag][1]:
+                            continue
+
+                        sum = 0
+                        hydrophobic_count = 0
+                        accesible_check = 0
+
+                        for hetresname, het_atom, het_vector in atomlist:
+                            hydrophobic_check = 1
+                            for atom in residue:
+                                aa_vector = atom.get_vector()
+                                aa_atom = atom.name
+                                aa_atom_type = atom.element
+
+                                d = float((het_vector - aa_vector).norm())
+                                if d < radius:
+                                    if hetflag not in results:
+                                        results[hetflag] = {}
+                                        summary_results[hetflag] = {'score': [], 'hbond': [], 'hbondplus': [],
+                                            'hbond_confirmed': [], 'aromatic': [], 'aromaticff': [],
+                                            'ionaromatic': [], 'aromaticion': [], 'aromaticef': [],
+                                            'aromaticfe': [], 'hydrophobic': [], 'waals': [], 'accessible': []}
+                                        new_results[hetflag] = {'interactions': []}
+                                    if aaname not in results[hetflag]:
+                                        results[hetflag][aaname] = []
+                                    if not (het_atom[0] == 'H' or aa_atom[0] == 'H' or aa_atom_type == 'H'):
+                                        results[hetflag][aaname].append([het_atom, aa_atom, round(d, 2),
+                                            het_vector, aa_vector, aa_seqid, chainid])
+                                        sum += 1
+                                # if both are carbon then we are making a hydrophic interaction
+                                if (het_atom[0] == 'C' and aa_atom[0] == 'C' and d < hydrophob_radius
+                                        and hydrophobic_check):
+                                    hydrophobic_count += 1
+                                    hydrophobic_check = 0
+
+                                if d < 5 and (aa_atom != 'C' and aa_atom != 'O' and aa_atom != 'N'):
+                                    accesible_check = 1
+
+                        if accesible_check:  # if accessible!
+                            summary_results[hetflag]['accessible'].append([aaname])
+                            fragment = self.fragment_library(hetflag, None, '', aa_seqid, chainid, 'access')
+                            new_results[hetflag]['interactions'].append([aaname, fragment, 'acc', 'accessible',
+                                'hidden', ''])
+
+                        if hydrophobic_count > 2 and AA.get(aaname[0:3]) in HYDROPHOBIC_AA:  # min 3 c-c interactions
+                            summary_results[hetflag]['hydrophobic'].append([aaname, hydrophobic_count])
+                            fragment = self.fragment_library(hetflag, None, '', aa_seqid, chainid, 'hydrop')
+                            new_results[hetflag]['interactions'].append([aaname, fragment, 'hyd', 'hydrophobic',
+                                'hydrophobic', ''])
+
+                        if sum > 1 and aa_resname in AROMATIC:
+                            aarings = self.get_ring_from_aa(aa_seqid)
+                            if not aarings:
+                                continue
+                            self.find_aromatic_interactions(hetflag, aaname, aa_seqid, chainid, aarings)
+
+    def find_aromatic_interactions(self, hetflag, aaname, aa_seqid, chainid, aarings):
+        summary_results, new_results = self.summary_results, self.new_results
+        for aaring in aarings:
+            center = aaring[1]
+            count = 0
+            for ring in self.ligand_rings[hetflag]:
+                shortest_center_het_ring_to_res_atom = 10
+                shortest_center_aa_ring_to_het_atom = 10
+                for a in aaring[4]:
+                    shortest_center_het_ring_to_res_atom = min(shortest_center_het_ring_to_res_atom,
+                        float((ring[1] - a).norm()))
+                for a in ring[4]:
+                    shortest_center_aa_ring_to_het_atom = min(shortest_center_aa_ring_to_het_atom,
+                        float((center - a).norm()))
+
+                count += 1
+                angle = Vector.angle(center - ring[1], ring[2])  # aacenter to ring center vs ring normal
+                angle2 = Vector.angle(center - ring[1], aaring[2])  # aacenter to ring center vs AA normal
+                angle3 = Vector.angle(ring[2], aaring[2])  # two normal vectors against eachother
+                angle_degrees = [round(degrees(angle), 1), round(degrees(angle2), 1), round(degrees(angle3), 1)]
+                distance = float((center - ring[1]).norm())
+                info = {'Distance': round(distance, 2),
+                    'ResAtom to center': round(shortest_center_het_ring_to_res_atom, 2),
+                    'LigAtom to center': round(shortest_center_aa_ring_to_het_atom, 2), 'Angles': angle_degrees}
+
+                if distance < 5 and (angle_degrees[2] < 20 or abs(angle_degrees[2] - 180) < 20):  # poseview uses <5
+                    summary_results[hetflag]['aromatic'].append([aaname, count, round(distance, 2), angle_degrees])
+                    interaction = ['aro_ff', 'aromatic (face-to-face)', 'aromatic', 'none']
+                # need to be careful for edge-edge
+                elif ((shortest_center_aa_ring_to_het_atom < 4.5) and abs(angle_degrees[0] - 90) < 30
+                        and abs(angle_degrees[2] - 90) < 30):
+                    summary_results[hetflag]['aromaticfe'].append([aaname, count, round(distance, 2), angle_degrees])
+                    interaction = ['aro_fe_protein', 'aromatic (face-to-edge)', 'aromatic', 'protein']
+                elif ((shortest_center_het_ring_to_res_atom < 4.5) and abs(angle_degrees[1] - 90) < 30
+                        and abs(angle_degrees[2] - 90) < 30):
+                    summary_results[hetflag]['aromaticef'].append([aaname, count, round(distance, 2), angle_degrees])
+                    interaction = ['aro_ef_protein', 'aromatic (edge-to-face)', 'aromatic', 'protein']
+                else:
+                    continue
+
+                fragment = self.fragment_library_aromatic(hetflag, ring[4], aa_seqid, chainid, count)
+                if self.check_other_aromatic(aaname, hetflag, {'Distance': round(distance, 2),
+                        'Angles': angle_degrees}):
+                    new_results[hetflag]['interactions'].append([aaname, fragment] + interaction + [info])
+                    self.remove_hyd(aaname, hetflag)
+
+            for charged in self.ligand_charged[hetflag]:
+                distance = float((center - charged[1]).norm())
+                # needs max 4.2 distance to make aromatic+
+                if distance < 4.2 and charged[2] > 0:
+                    summary_results[hetflag]['aromaticion'].append([aaname, count, round(distance, 2), charged])
+                    new_results[hetflag]['interactions'].append([aaname, '', 'aro_ion_protein',
+                        'aromatic (pi-cation)', 'aromatic', 'protein', {'Distance': round(distance, 2)}])
+                    self.remove_hyd(aaname, hetflag)
+
+    def analyze_interactions(self):
+        """Classifies the close atom pairs of each residue into hydrogen bonds and charged interactions and
+        scores the ligands"""
+        summary_results, new_results = self.summary_results, self.new_results
+        for ligand, result in self.results.items():
+            ligscore = 0
+            for residue, interaction in result.items():
+                sum = 0
+                score = 0
+                hbond = []
+                hbondplus = []
+                type = 'waals'
+                for entry in interaction:
+                    hbondconfirmed = []
+                    if entry[2] <= 3.5:
+                        if entry[0][0] == 'C' or entry[1][0] == 'C':
+                            continue  # If either atom is C then no hydrogen bonding
+
+                        hydrogenmatch = 0
+                        res_is_acceptor = False
+                        res_is_donor = False
+                        for donor in self.get_hydrogen_from_aa(entry[5]):
+                            if (donor[1] - entry[4]).norm() < 0.5:
+                                res_is_acceptor = donor[3]
+                                res_is_donor = True
+                                for hydrogen in donor[2]:
+                                    hydrogenvector = hydrogen - donor[1]
+                                    bindingvector = entry[3] - hydrogen
+                                    angle = round(degrees(Vector.angle(hydrogenvector, bindingvector)), 2)
+                                    distance = round(float(bindingvector.norm()), 2)
+                                    if distance > 2.5 or angle > 60:
+                                        continue
+                                    hydrogenmatch = 1
+                                    hbondconfirmed.append(["D", entry[0], entry[1], angle, distance])
+
+                        found_donor = 0
+                        for donor in self.ligand_donors[ligand]:
+                            if (donor[1] - entry[3]).norm() < 0.5:
+                                found_donor = 1
+                                for hydrogen in donor[2]:
+                                    hydrogenvector = hydrogen - donor[1]
+                                    bindingvector = entry[4] - hydrogen
+                                    angle = round(degrees(Vector.angle(hydrogenvector, bindingvector)), 2)
+                                    distance = round(float(bindingvector.norm()), 2)
+                                    if distance > 2.5 or angle > 60:
+                                        continue
+                                    hydrogenmatch = 1
+                                    hbondconfirmed.append(["A", entry[0], entry[1], angle, distance])
+
+                        found_acceptor = 0
+                        for acceptor in self.ligand_acceptors[ligand]:
+                            if (acceptor[1] - entry[3]).norm() < 0.5:
+                                found_acceptor = 1
+                                if found_donor == 0 and res_is_donor:
+                                    hydrogenmatch = 1
+                                    hbondconfirmed.append(['D'])  # set residue as donor
+
+                        if not found_acceptor and found_donor and res_is_acceptor:
+                            hydrogenmatch = 1
+                            hbondconfirmed.append(['A'])  # set residue as acceptor
+
+                        if found_acceptor and found_donor:
+                            if res_is_donor and not res_is_acceptor:
+                                hydrogenmatch = 1
+                                hbondconfirmed.append(['D'])
+                            elif not res_is_donor and res_is_acceptor:
+                                hydrogenmatch = 1
+                                hbondconfirmed.append(['A'])
+
+                        chargedcheck = 0
+                        charge_value = 0
+                        res_charge_value = 0
+                        doublechargecheck = 0
+                        for charged in self.ligand_charged[ligand]:
+                            if (charged[1] - entry[3]).norm() < 0.5:
+                                chargedcheck = 1
+                                hydrogenmatch = 0  # Replace previous match!
+                                charge_value = charged[2]
+
+                        if residue[0:3] in CHARGEDAA:
+                            # Need to check which atoms, but for now assume charged
+                            if chargedcheck:
+                                doublechargecheck = 1
+                            chargedcheck = 1
+                            hydrogenmatch = 0  # Replace previous match!
+
+                            if AA[residue[0:3]] in POSITIVE:
+                                res_charge_value = 1
+                            elif AA[residue[0:3]] in NEGATIVE:
+                                res_charge_value = -1
+
+                        atoms = [entry[0], entry[1], entry[2]]
+                        if entry[1] == 'N' or entry[1] == 'O':  # backbone connection!
+                            fragment = self.fragment_library(ligand, entry[3], entry[0], entry[5], entry[6],
+                                'HB_backbone')
+                            new_results[ligand]['interactions'].append([residue, fragment, 'polar_backbone',
+                                'polar (hydrogen bond with backbone)', 'polar', 'protein'] + atoms)
+                            self.remove_hyd(residue, ligand)
+                        elif hydrogenmatch:
+                            found = 0
+                            fragment = self.fragment_library(ligand, entry[3], entry[0], entry[5], entry[6], 'HB')
+
+                            for x in summary_results[ligand]['hbond_confirmed']:
+                                if residue == x[0]:
+                                    x[1].extend(hbondconfirmed)
+                                    found = 1
+
+                            if hbondconfirmed[0][0] == "D":
+                                new_results[ligand]['interactions'].append([residue, fragment,
+                                    'polar_donor_protein', 'polar (hydrogen bond)', 'polar', 'protein'] + atoms)
+                                self.remove_hyd(residue, ligand)
+                            if hbondconfirmed[0][0] == "A":
+                                new_results[ligand]['interactions'].append([residue, fragment,
+                                    'polar_acceptor_protein', 'polar (hydrogen bond)', 'polar', 'protein'] + atoms)
+                                self.remove_hyd(residue, ligand)
+
+                            if found == 0:
+                                summary_results[ligand]['hbond_confirmed'].append([residue, hbondconfirmed])
+                            if chargedcheck:
+                                type = 'hbondplus'
+                                hbondplus.append(entry)
+
+                        elif chargedcheck:
+                            type = 'hbondplus'
+                            hbondplus.append(entry)
+                            fragment = self.fragment_library(ligand, entry[3], entry[0], entry[5], entry[6], 'HBC')
+
+                            self.remove_hyd(residue, ligand)
+                            if doublechargecheck:
+                                if res_charge_value > 0:
+                                    interaction = ['polar_double_pos_protein', 'polar (charge-charge)', 'polar', '']
+                                elif res_charge_value < 0:
+                                    interaction = ['polar_double_neg_protein', 'polar (charge-charge)', 'polar', '']
+                                else:
+                                    interaction = None
+                            elif charge_value > 0:
+                                interaction = ['polar_pos_ligand', 'polar (charge-assisted hydrogen bond)', 'polar',
+                                    'ligand']
+                            elif charge_value < 0:
+                                interaction = ['polar_neg_ligand', 'polar (charge-assisted hydrogen bond)', 'polar',
+                                    'ligand']
+                            elif res_charge_value > 0:
+                                interaction = ['polar_pos_protein', 'polar (charge-assisted hydrogen bond)', 'polar',
+                                    'protein']
+                            elif res_charge_value < 0:
+                                interaction = ['polar_neg_protein', 'polar (charge-assisted hydrogen bond)', 'polar',
+                                    'protein']
+                            else:
+                                interaction = ['polar_unknown_protein', 'polar (charge-assisted hydrogen bond)',
+                                    'polar', 'protein']
+                            if interaction:
+                                new_results[ligand]['interactions'].append([residue, fragment] + interaction + atoms)
+
+                        else:
+                            type = 'hbond'
+                            hbond.append(entry)
+                            fragment = self.fragment_library(ligand, entry[3], entry[0], entry[5], entry[6], 'HB')
+                            new_results[ligand]['interactions'].append([residue, fragment, 'polar_unspecified',
+                                'polar (hydrogen bond)', 'polar', ''] + atoms)
+                            self.remove_hyd(residue, ligand)
+                        entry[3] = ''
+
+                    if entry[2] < 4.5:
+                        sum += 1
+                        score += 4.5 - entry[2]
+                score = round(score, 2)
+
+                if type == 'waals' and score > 2:  # mainly no hbond detected
+                    summary_results[ligand]['waals'].append([residue, score, sum])
+                elif type == 'hbond':
+                    summary_results[ligand]['hbond'].append([residue, score, sum, hbond])
+                elif type == 'hbondplus':
+                    summary_results[ligand]['hbondplus'].append([residue, score, sum, hbondplus])
+
+                ligscore += score
+
+            summary_results[ligand]['score'].append([ligscore])
+            new_results[ligand]['score'] = ligscore
+            new_results[ligand]['inchikey'] = self.inchikeys[ligand]
+            new_results[ligand]['smiles'] = self.smiles[ligand]
+            if ligand in self.hetlist_display:
+                new_results[ligand]['prettyname'] = self.hetlist_display[ligand]
+
+    def addresiduestoligand(self, ligand, residuelist):
+        """PDB text of the ligand (without hydrogens) with the binding residues"""
+        residuelist = set(residuelist)
+        inserstr = ''
+        for line in self.lines:
+            if line.startswith('ATOM'):
+                temp = line.split()
+                # need to fix bad PDB formatting where col4 and col5 are put
+                # together for some reason -- usually seen when the id is +1000
+                m = re.match(r"(\w)(\d+)", temp[4])
+                if m:
+                    temp[4] = m.group(1)
+                    temp[5] = m.group(2)
+                if temp[3] + temp[5] + temp[4] in residuelist:
+                    inserstr += line
+
+        tempstr = ''
+        inserted = 0
+        for line in self.ligand_pdbs[ligand].splitlines(True):
+            if line.startswith('ATOM') and line.split()[2] == 'H':
+                continue  # skip hydrogen in model
+            if (line.startswith('CONECT') or line.startswith('MASTER') or line.startswith('END')) and inserted == 0:
+                tempstr += inserstr
+                inserted = 1
+            tempstr += line
+        return tempstr
+
+    def finish(self):
+        for ligand, result in self.summary_results.items():
+            bindingresidues = [entry[0] for type, typelist in result.items() if type not in ('waals', 'score')
+                for entry in typelist]
+            self.new_results[ligand]['pdb'] = self.addresiduestoligand(ligand, bindingresidues)
+        return self.new_results
+
+
+def calculate_interactions(pdbname, pdb=None, peptide=None):
+    """Ligand interactions of a structure from its PDB text (fetched from the RCSB when not given), see
+    LigandInteractionCalculation"""
+    if pdb is None:
+        pdb = fetch_pdb(pdbname)
+    return LigandInteractionCalculation(pdbname, pdb, peptide).run()
+
+
+def write_results(pdbname, results, projectdir):
+    """Writes the results in the layout of the legacy script, <projectdir>/results/<pdbname>/output/ for the
+    interactions (without the fragments) and <projectdir>/results/<pdbname>/interaction/ for the complexes"""
+    directory = os.sep.join([projectdir, 'results', pdbname])
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    for subdirectory in ['output', 'interaction']:
+        os.makedirs(os.sep.join([directory, subdirectory]), exist_ok=True)
+    for ligand, result in results.items():
+        output = {k: v for k, v in result.items() if k != 'pdb'}
+        output['interactions'] = [[i[0], ''] + i[2:] for i in result['interactions']]
+        with open(os.sep.join([directory, 'output', pdbname + '_' + ligand + '.yaml']), 'w') as f:
+            yaml.dump(output, f)
+        with open(os.sep.join([directory, 'interaction', pdbname + '_' + ligand + '.pdb']), 'w') as f:
+            f.write(result['pdb'])
@@ -1,3 +1,50 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from interaction.calculation import LigandInteractionCalculation
+
+import os
+import yaml
+
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+def read_testdata(filename):
+    with open(os.path.join(TESTDATA, filename)) as f:
+        return f.read()
+
+def pdb_records(pdb):
+    # the header lines name the file and the Open Babel version
+    return [line for line in pdb.splitlines() if not line.startswith(('COMPND', 'AUTHOR'))]
+
+
+class LigandInteractionCalculationTest(SimpleTestCase):
+    """The results are those of the legacy interaction script (legacy_functions.py, replaced by interaction.calculation)
+    for the XK2 ligand of 1HVR and the residues around it. 1hvr_xk2_legacy.yaml is the output file of the script
+    without the fragment file names, 1hvr_xk2_legacy_complex.pdb its ligand/residue complex"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = LigandInteractionCalculation('1HVR', read_testdata('1hvr_xk2.pdb')).run()
+        cls.legacy = yaml.safe_load(read_testdata('1hvr_xk2_legacy.yaml'))
+
+    def test_ligands(self):
+        self.assertEqual(list(self.results), ['XK2'])
+
+    def test_interactions(self):
+        result = self.results['XK2']
+        # the fragments are PDB text instead of file names
+        self.assertEqual([[i[0]] + i[2:] for i in result['interactions']],
+            [[i[0]] + i[2:] for i in self.legacy['interactions']])
+        self.assertTrue(all(i[1] for i in result['interactions'] if i[2] != 'aro_ion_protein'))
+
+    def test_score_and_identifiers(self):
+        result = self.results['XK2']
+        self.assertAlmostEqual(result['score'], self.legacy['score'])
+        self.assertEqual(result['inchikey'], self.legacy['inchikey'])
+        self.assertEqual(result['smiles'], self.legacy['smiles'])
+        self.assertNotIn('prettyname', result)
+
+    def test_complex(self):
+        self.assertEqual(pdb_records(self.results['XK2']['pdb']),
+            pdb_records(read_testdata('1hvr_xk2_legacy_complex.pdb')))
@@ -22,25 +22,24 @@ from common.models import WebLink
 from common.diagrams_gpcr import DrawHelixBox, DrawSnakePlot
 from common.selection import SimpleSelection, Selection, SelectionItem
 from common import definitions
+from common.excel import table_excel_response
 from common.views import AbsTargetSelection
 from common.alignment import Alignment
 from protein.models import Protein, ProteinFamily, ProteinGProtein, ProteinGProteinPair
 
 import os
-from os import listdir, devnull, makedirs
+from os import listdir, makedirs
 import yaml
 from operator import itemgetter
 from datetime import datetime
 import re
 import json
 import logging
-from subprocess import call, Popen, DEVNULL
 import urllib
 import collections
 from collections import OrderedDict
-from io import StringIO, BytesIO
+from io import StringIO
 from Bio.PDB import PDBIO, PDBParser
-import xlsxwriter
 
 ######@
 import numpy as np
@@ -368,14 +367,14 @@ def updateall(request):
 
         if check.count() == 0:
             t1 = datetime.now()
-            runcalculation(pdbname)
+            calculation = runcalculation(pdbname)
             t2 = datetime.now()
             delta = t2 - t1
             seconds = delta.total_seconds()
             print("Calculation: Total time " +
                   str(seconds) + " seconds for " + pdbname)
             t1 = datetime.now()
-            results = parsecalculation(pdbname, False)
+            results = parsecalculation(pdbname, False, results=calculation)
             t2 = datetime.now()
             delta = t2 - t1
             seconds = delta.total_seconds()
@@ -392,11 +391,13 @@ def updateall(request):
 
 
 def runcalculation(pdbname, peptide=""):
-    calc_script = os.sep.join(
-        [os.path.dirname(__file__), 'legacy_functions.py'])
-    call(["python", calc_script, "-p", pdbname, "-c", peptide],
-         stdout=open(devnull, 'wb'), stderr=open(devnull, 'wb'))
-    return None
+    """Ligand interactions of a structure, {ligand: output}, see interaction.calculation. Uses the PDB file stored
+    with the structure, and fetches it when the structure is not in the database"""
+    from interaction.calculation import calculate_interactions
+
+    pdb_data = Structure.objects.filter(pdb_code__index=pdbname, pdb_data__isnull=False).values_list(
+        'pdb_data__pdb', flat=True).first()
+    return calculate_interactions(pdbname, pdb_data, peptide)
 
 
 def check_residue(protein, pos, aa):
@@ -416,12 +417,11 @@ def check_residue(protein, pos, aa):
     return residue
 
 
-def extract_fragment_rotamer(f, residue, structure, ligand):
-    if os.path.isfile(f):
-        f_in = open(f, 'r')
+def extract_fragment_rotamer(pdb, residue, structure, ligand):
+    if pdb:
         rotamer_pdb = ''
         fragment_pdb = ''
-        for line in f_in:
+        for line in pdb.splitlines(True):
             if line.startswith('HETATM') or line.startswith('CONECT') or line.startswith('MASTER') or line.startswith('END'):
                 fragment_pdb += line
             elif line.startswith('ATOM'):
@@ -429,7 +429,6 @@ def extract_fragment_rotamer(f, residue, structure, ligand):
             else:
                 fragment_pdb += line
                 rotamer_pdb += line
-        f_in.close()
 
         rotamer_data, created = PdbData.objects.get_or_create(pdb=rotamer_pdb)
         rotamer, created = Rotamer.objects.get_or_create(
@@ -447,10 +446,12 @@ def extract_fragment_rotamer(f, residue, structure, ligand):
 
 
 # consider skipping non hetsym ligands FIXME
-def parsecalculation(pdbname, debug=True, ignore_ligand_preset=False):
+def parsecalculation(pdbname, debug=True, ignore_ligand_preset=False, results=None):
+    """Stores the ligand interactions of a structure (the output of runcalculation, calculated when not given)"""
     logger = logging.getLogger('build')
-    mypath = '/tmp/interactions/results/' + pdbname + '/output'
-    module_dir = '/tmp/interactions'
+    if results is None:
+        results = runcalculation(pdbname)
+    calculation = results
     results = []
     web_resource, created = WebResource.objects.get_or_create(
         slug='pdb', url='http://www.rcsb.org/pdb/explore/explore.do?structureId=$index')
@@ -464,141 +465,118 @@ def parsecalculation(pdbname, debug=True, ignore_ligand_preset=False):
         structure = Structure.objects.get(pdb_code=web_link)
 
         if structure.pdb_data is None:
-            f = module_dir + "/pdbs/" + pdbname + ".pdb"
-            if os.path.isfile(f):
-                pdbdata, created = PdbData.objects.get_or_create(
-                    pdb=open(f, 'r').read())  # does this close the file?
-            else:
-                print('quitting due to no pdb in filesystem')
-                quit()
+            from interaction.calculation import fetch_pdb
+            pdbdata, created = PdbData.objects.get_or_create(pdb=fetch_pdb(pdbname))
             structure.pdb_data = pdbdata
             structure.save()
 
         protein = structure.protein_conformation
 
-        for f in listdir(mypath):
-            if os.path.isfile(os.path.join(mypath, f)):
-                annotated = 0
-                #print(mypath + "/" +f)
-                result = yaml.load(open(mypath + "/" + f, 'rb'))
-                output = result
-                temp = f.replace('.yaml', '').split("_")
-                temp.append([output])
-                temp.append(round(output['score']))
-                temp.append((output['inchikey']).strip())
-                temp.append((output['smiles']).strip())
-
-                results.append(temp)
-
-                if 'prettyname' not in output:
-                    # use hetsyn name if possible, others 3letter
-                    output['prettyname'] = temp[1]
-
-                f = module_dir + "/results/" + pdbname + "/interaction" + \
-                    "/" + pdbname + "_" + temp[1] + ".pdb"
-                if os.path.isfile(f):
-                    pdbdata, created = PdbData.objects.get_or_create(
-                        pdb=open(f, 'r').read())  # does this close the file?
-                    if debug:
-                        print("Found file" + f)
-                else:
-                    print('quitting due to no pdb for fragment in filesystem', f)
-                    quit()
-
-                structureligandinteraction = StructureLigandInteraction.objects.filter(
-                    pdb_reference=temp[1], structure=structure, annotated=True) #, pdb_file=None
-                if structureligandinteraction.exists():  # if the annotated exists
-                    annotated_found = 1
-                    annotated = 1
-                    try:
-                        structureligandinteraction = structureligandinteraction.get()
-                        structureligandinteraction.pdb_file = pdbdata
-                        ligand = structureligandinteraction.ligand
-                        if structureligandinteraction.ligand.properities.inchikey is None:
-                            structureligandinteraction.ligand.properities.inchikey = output['inchikey'].strip()
-                        elif structureligandinteraction.ligand.properities.inchikey != output['inchikey'].strip():
-                            logger.error(
-                                'Ligand/PDB inchikey mismatch (PDB:' + pdbname + ' LIG:' + output['prettyname'] + '): '+structureligandinteraction.ligand.properities.inchikey+' vs '+ output['inchikey'].strip())
-                    except Exception as msg:
-                        print('error with dublication structureligand',temp[1],msg)
-                        break
-                elif StructureLigandInteraction.objects.filter(pdb_reference=temp[1], structure=structure).exists():
-                    try:
-                        structureligandinteraction = StructureLigandInteraction.objects.filter(
-                            pdb_reference=temp[1], structure=structure).get()
-                        structureligandinteraction.pdb_file = pdbdata
-                    except: #already there
-                        structureligandinteraction = StructureLigandInteraction.objects.filter(
-                            pdb_reference=temp[1], structure=structure, pdb_file=pdbdata).get()
-                    ligand = structureligandinteraction.ligand
-                else:  # create ligand and pair
-
-                    ligand = Ligand.objects.filter(
-                        name=output['prettyname'], canonical=True)
-
-                    if ligand.exists():  # if ligand with name (either hetsyn or 3 letter) exists use that.
-                        ligand = ligand.get()
-                    else:  # create it
-                        default_ligand_type = 'N/A'
-                        lt, created = LigandType.objects.get_or_create(slug=slugify(default_ligand_type),
-                                                                       defaults={'name': default_ligand_type})
-
-                        ligand = Ligand()
-                        ligand = ligand.load_from_pubchem(
-                            'inchikey', output['inchikey'].strip(), lt, output['prettyname'])
-                        try:
-                            ligand.save()
-                        except:
-                            #print('ligand save failed, empty ligand?',output['prettyname'])
-                            continue
-
-                    ligandrole, created = LigandRole.objects.get_or_create(
-                        name='unknown', slug='unknown')
-                    structureligandinteraction = StructureLigandInteraction()
-                    structureligandinteraction.ligand = ligand
-                    structureligandinteraction.structure = structure
-                    structureligandinteraction.ligand_role = ligandrole
-                    structureligandinteraction.pdb_file = pdbdata
-                    structureligandinteraction.pdb_reference = temp[1]
-
-                structureligandinteraction.save()
+        for hetflag, output in calculation.items():
+            annotated = 0
+            temp = [pdbname, hetflag]
+            temp.append([output])
+            temp.append(round(output['score']))
+            temp.append((output['inchikey']).strip())
+            temp.append((output['smiles']).strip())
 
-                ResidueFragmentInteraction.objects.filter(structure_ligand_pair=structureligandinteraction).delete()
+            results.append(temp)
 
-                for interaction in output['interactions']:
-                    # print(interaction)
-                    aa = interaction[0]
-                    aa, pos, chain = regexaa(aa)
-                    residue = check_residue(protein, pos, aa)
-                    f = interaction[1]
+            if 'prettyname' not in output:
+                # use hetsyn name if possible, others 3letter
+                output['prettyname'] = temp[1]
 
-                    fragment, rotamer = extract_fragment_rotamer(
-                                    f, residue, structure, ligand)
+            pdbdata, created = PdbData.objects.get_or_create(pdb=output['pdb'])
 
-                    # print(interaction[2],interaction[3],interaction[4],interaction[5])
-                    if fragment!=None:
-                        interaction_type, created = ResidueFragmentInteractionType.objects.get_or_create(
-                                        slug=interaction[2], name=interaction[3], type=interaction[4], direction=interaction[5])
-                        fragment_interaction, created = ResidueFragmentInteraction.objects.get_or_create(
-                                        structure_ligand_pair=structureligandinteraction, interaction_type=interaction_type, fragment=fragment, rotamer=rotamer)
-                #print("Inserted",len(output['interactions']),"interactions","ligand",temp[1],"annotated",annotated)
+            structureligandinteraction = StructureLigandInteraction.objects.filter(
+                pdb_reference=temp[1], structure=structure, annotated=True) #, pdb_file=None
+            if structureligandinteraction.exists():  # if the annotated exists
+                annotated_found = 1
+                annotated = 1
+                try:
+                    structureligandinteraction = structureligandinteraction.get()
+                    structureligandinteraction.pdb_file = pdbdata
+                    ligand = structureligandinteraction.ligand
+                    if structureligandinteraction.ligand.properities.inchikey is None:
+                        structureligandinteraction.ligand.properities.inchikey = output['inchikey'].strip()
+                    elif structureligandinteraction.ligand.properities.inchikey != output['inchikey'].strip():
+                        logger.error(
+                            'Ligand/PDB inchikey mismatch (PDB:' + pdbname + ' LIG:' + output['prettyname'] + '): '+structureligandinteraction.ligand.properities.inchikey+' vs '+ output['inchikey'].strip())
+                except Exception as msg:
+                    print('error with dublication structureligand',temp[1],msg)
+                    break
+            elif StructureLigandInteraction.objects.filter(pdb_reference=temp[1], structure=structure).exists():
+                try:
+                    structureligandinteraction = StructureLigandInteraction.objects.filter(
+                        pdb_reference=temp[1], structure=structure).get()
+                    structureligandinteraction.pdb_file = pdbdata
+                except: #already there
+                    structureligandinteraction = StructureLigandInteraction.objects.filter(
+                        pdb_reference=temp[1], structure=structure, pdb_file=pdbdata).get()
+                ligand = structureligandinteraction.ligand
+            else:  # create ligand and pair
+
+                ligand = Ligand.objects.filter(
+                    name=output['prettyname'], canonical=True)
+
+                if ligand.exists():  # if ligand with name (either hetsyn or 3 letter) exists use that.
+                    ligand = ligand.get()
+                else:  # create it
+                    default_ligand_type = 'N/A'
+                    lt, created = LigandType.objects.get_or_create(slug=slugify(default_ligand_type),
+                                                                   defaults={'name': default_ligand_type})
+
+                    ligand = Ligand()
+                    ligand = ligand.load_from_pubchem(
+                        'inchikey', output['inchikey'].strip(), lt, output['prettyname'])
+                    try:
+                        ligand.save()
+                    except:
+                        #print('ligand save failed, empty ligand?',output['prettyname'])
+                        continue
+
+                ligandrole, created = LigandRole.objects.get_or_create(
+                    name='unknown', slug='unknown')
+                structureligandinteraction = StructureLigandInteraction()
+                structureligandinteraction.ligand = ligand
+                structureligandinteraction.structure = structure
+                structureligandinteraction.ligand_role = ligandrole
+                structureligandinteraction.pdb_file = pdbdata
+                structureligandinteraction.pdb_reference = temp[1]
+
+            structureligandinteraction.save()
+
+            ResidueFragmentInteraction.objects.filter(structure_ligand_pair=structureligandinteraction).delete()
+
+            for interaction in output['interactions']:
+                # print(interaction)
+                aa = interaction[0]
+                aa, pos, chain = regexaa(aa)
+                residue = check_residue(protein, pos, aa)
+
+                fragment, rotamer = extract_fragment_rotamer(
+                                interaction[1], residue, structure, ligand)
+
+                # print(interaction[2],interaction[3],interaction[4],interaction[5])
+                if fragment!=None:
+                    interaction_type, created = ResidueFragmentInteractionType.objects.get_or_create(
+                                    slug=interaction[2], name=interaction[3], type=interaction[4], direction=interaction[5])
+                    fragment_interaction, created = ResidueFragmentInteraction.objects.get_or_create(
+                                    structure_ligand_pair=structureligandinteraction, interaction_type=interaction_type, fragment=fragment, rotamer=rotamer)
+            #print("Inserted",len(output['interactions']),"interactions","ligand",temp[1],"annotated",annotated)
         # if not annotated_found:
         #     print("No interactions for annotated ligand")
 
     else:
         if debug:
             logger.info("Structure not in DB?!??!")
-        for f in listdir(mypath):
-            if os.path.isfile(os.path.join(mypath, f)):
-                result = yaml.load(open(mypath + "/" + f, 'rb'))
-                output = result
-
-                temp = f.replace('.yaml', '').split("_")
-                temp.append([output])
-                temp.append(round(output['score'][0][0]))
-                temp.append((output['inchikey']).strip())
-                temp.append((output['smiles']).strip())
-                results.append(temp)
+        for hetflag, output in calculation.items():
+            temp = [pdbname, hetflag]
+            temp.append([output])
+            temp.append(round(output['score']))
+            temp.append((output['inchikey']).strip())
+            temp.append((output['smiles']).strip())
+            results.append(temp)
 
     results = sorted(results, key=itemgetter(3), reverse=True)
 
@@ -606,10 +584,15 @@ def parsecalculation(pdbname, debug=True, ignore_ligand_preset=False):
 
 
 def runusercalculation(filename, session):
-    calc_script = os.sep.join(
-        [os.path.dirname(__file__), 'legacy_functions.py'])
-    call(["python", calc_script, "-p", filename, "-s", session])
-    return None
+    """Calculates the ligand interactions of an uploaded or fetched PDB file and writes them to the session
+    directory, for parseusercalculation and the downloads"""
+    from interaction.calculation import calculate_interactions, write_results
+
+    module_dir = '/tmp/interactions/' + session
+    with open(module_dir + '/pdbs/' + filename + '.pdb', 'r') as f:
+        results = calculate_interactions(filename, f.read())
+    write_results(filename, results, module_dir)
+    return results
 
 
 # consider skipping non hetsym ligands FIXME
@@ -1086,28 +1069,7 @@ def excel(request, slug, **response_kwargs):
     headers = ['Ligand','Amino Acid','Sequence Number','Generic Number','Segment','Interaction','Interaction Slug']
 
     #EXCEL SOLUTION
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output)
-    worksheet = workbook.add_worksheet()
-
-    col = 0
-    for h in headers:
-        worksheet.write(0, col, h)
-        col += 1
-    row = 1
-    for d in data:
-        col = 0
-        for h in headers:
-            worksheet.write(row, col, d[h])
-            col += 1
-        row += 1
-    workbook.close()
-    output.seek(0)
-    xlsx_data = output.read()
-
-    response = HttpResponse(xlsx_data,content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=Interaction_data_%s.xlsx' % slug
-    return response
+    return table_excel_response('Interaction_data_%s.xlsx' % slug, headers, data)
 
 def ajax(request, slug, **response_kwargs):
 
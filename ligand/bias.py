@@ -0,0 +1,442 @@
+"""
+Bias factors of the curated bias experiments (BiasedExperiment and ExperimentAssay), computed for all assays at once
+by build_bias_data_main_same_family and build_bias_data_main_different_family.
+
+The assays are loaded with one query into columns of numpy arrays. Each tested assay is paired with the reference
+ligand assay of the same publication, receptor and assay setup, and the tested assays of a publication, ligand and
+receptor (and mutation for 'different_family') form one AnalyzedExperiment. The most potent pathway of an experiment
+(order 0) is compared with all others: log bias factor ΔΔlog(Emax/EC50), potency ratio and t factor.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from ligand.models import AnalyzedAssay, AnalyzedExperiment, AnalyzedExperimentSummary, BiasedExperimentVendors, \
+    ExperimentAssay, ExperimentAssayAuthors
+from protein.models import ProteinGProteinPair
+
+from decimal import Decimal
+from string import Template
+
+import json
+import numpy as np
+
+
+# AnalyzedExperiment fields that identify an analyzed experiment of each source
+GROUP_COLUMNS = {
+    'same_family': ['publication', 'ligand', 'receptor'],
+    'different_family': ['publication', 'ligand', 'receptor', 'residue', 'mutation'],
+    }
+
+# column: ExperimentAssay lookup
+ASSAY_COLUMNS = [
+    ('id', 'id'),
+    ('experiment', 'biased_experiment_id'),
+    ('publication', 'biased_experiment__publication_id'),
+    ('ligand', 'biased_experiment__ligand_id'),
+    ('receptor', 'biased_experiment__receptor_id'),
+    ('species', 'biased_experiment__receptor__species__common_name'),
+    ('chembl', 'biased_experiment__chembl'),
+    ('endogenous_ligand', 'biased_experiment__endogenous_ligand_id'),
+    ('residue', 'biased_experiment__residue'),
+    ('mutation', 'biased_experiment__mutation'),
+    ('signalling_protein', 'signalling_protein'),
+    ('family', 'family'),
+    ('cell_line', 'cell_line'),
+    ('assay_type', 'assay_type'),
+    ('assay_measure', 'assay_measure'),
+    ('assay_time_resolved', 'assay_time_resolved'),
+    ('ligand_function', 'ligand_function'),
+    ('quantitive_measure_type', 'quantitive_measure_type'),
+    ('quantitive_activity', 'quantitive_activity'),
+    ('quantitive_unit', 'quantitive_unit'),
+    ('qualitative_activity', 'qualitative_activity'),
+    ('quantitive_efficacy', 'quantitive_efficacy'),
+    ('efficacy_measure_type', 'efficacy_measure_type'),
+    ('efficacy_unit', 'efficacy_unit'),
+    ('bias_reference', 'bias_reference'),
+    ('bias_value', 'bias_value'),
+    ('bias_value_initial', 'bias_value_initial'),
+    ('emax_ligand_reference', 'emax_ligand_reference_id'),
+    ]
+INTEGER_COLUMNS = ['id', 'experiment', 'publication', 'ligand', 'receptor']
+FLOAT_COLUMNS = ['quantitive_activity', 'quantitive_efficacy', 'bias_value', 'bias_value_initial']
+
+# a tested assay and its reference ligand assay are measured in the same setup
+REFERENCE_COLUMNS = ['publication', 'receptor', 'species', 'assay_type', 'signalling_protein', 'cell_line',
+    'assay_measure']
+
+# sort key of the assays without activity, they are the least potent
+NO_ACTIVITY = 999999
+
+# pathways shown per analyzed experiment in the bias browsers
+MAX_PATHWAYS = 5
+
+# AnalyzedAssay fields in the pathways of AnalyzedExperimentSummary
+SUMMARY_ASSAY_FIELDS = ['order_no', 'family', 'signalling_protein', 'cell_line', 'assay_type', 'assay_measure',
+    'assay_time_resolved', 'ligand_function', 'quantitive_measure_type', 'quantitive_activity',
+    'quantitive_activity_initial', 'quantitive_unit', 'qualitative_activity', 'quantitive_efficacy',
+    'efficacy_measure_type', 'efficacy_unit', 'potency', 't_coefficient', 't_value', 't_factor', 'log_bias_factor',
+    'emax_ligand_reference__name']
+
+
+def hashable(column):
+    # NaN is not equal to itself
+    if column.dtype.kind == 'f':
+        return [None if np.isnan(v) else v for v in column.tolist()]
+    return column.tolist()
+
+def factorize(*columns):
+    """Integer codes of the distinct rows of the columns, numbered in order of appearance"""
+    codes = {}
+    return np.array([codes.setdefault(key, len(codes)) for key in zip(*[hashable(c) for c in columns])],
+        dtype=np.int64).reshape(-1)
+
+def lower(column):
+    return np.array([(v or '').lower() for v in column.tolist()], dtype=str)
+
+def rounded(values):
+    """Rounded to one decimal, None where NaN"""
+    return [None if np.isnan(v) else v for v in np.round(values, 1).tolist()]
+
+def activity_value(value):
+    """Activity as stored in AnalyzedAssay, with three significant digits"""
+    if value is None or np.isnan(value):
+        return None
+    return float('%.2E' % Decimal(value))
+
+def nullable(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class AssayTable:
+    """Columns of numpy arrays with one row per assay, nullable values are None (NaN for the float columns)"""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def take(self, rows):
+        return AssayTable({c: v[rows] for c, v in self.columns.items()})
+
+    @classmethod
+    def from_database(cls):
+        """The first assay of each biased experiment, in the order of the publications, receptors and ligands"""
+        rows = list(ExperimentAssay.objects.filter(biased_experiment__isnull=False).order_by(
+            'biased_experiment__publication', 'biased_experiment__receptor', 'biased_experiment__ligand',
+            'biased_experiment', 'id').values_list(*[lookup for column, lookup in ASSAY_COLUMNS]))
+
+        columns = {}
+        for i, (column, lookup) in enumerate(ASSAY_COLUMNS):
+            values = [r[i] for r in rows]
+            if column in INTEGER_COLUMNS:
+                columns[column] = np.array(values, dtype=np.int64)
+            elif column in FLOAT_COLUMNS:
+                columns[column] = np.array([np.nan if v is None else v for v in values], dtype=float)
+            else:
+                columns[column] = np.array(values + [None], dtype=object)[:-1]
+        table = cls(columns)
+        first = np.sort(np.unique(table['experiment'], return_index=True)[1])
+        return table.take(first)
+
+
+class BiasAnalysis:
+    """The tested assays of an AssayTable grouped into analyzed experiments, with their bias factors"""
+
+    def __init__(self, table, group_columns):
+        self.group_columns = group_columns
+
+        references = self.reference_rows(table)
+        tested = np.nonzero(table['bias_reference'] == 'Tested')[0]
+        assays = table.take(tested)
+        reference = references[tested]
+        has_reference = reference >= 0
+        for column in ['quantitive_activity', 'quantitive_efficacy', 'bias_value_initial']:
+            assays.columns['reference_' + column] = np.where(has_reference, table[column][reference], np.nan)
+        for column in ['quantitive_measure_type', 'ligand']:
+            assays.columns['reference_' + column] = np.where(has_reference, table[column][reference], None)
+
+        # identical assays of different experiments are analysed once
+        group = factorize(*[assays[c] for c in group_columns])
+        unique = np.sort(np.unique(factorize(group, *[assays[c] for c in assays.columns
+            if c not in ('id', 'experiment')]), return_index=True)[1])
+        assays, group = assays.take(unique), group[unique]
+
+        # the experiment fields are those of the last experiment of each group
+        self.n_groups = group.max() + 1 if len(group) else 0
+        last = np.full(self.n_groups, -1)
+        np.maximum.at(last, group, np.arange(len(group)))
+
+        # most potent first
+        activity = assays['quantitive_activity']
+        potency_key = np.where(np.isnan(activity) | (activity == 0), NO_ACTIVITY, activity)
+        order = np.lexsort((potency_key, group))
+        self.assays, self.group = assays.take(order), group[order]
+        self.experiment_rows = np.argsort(order)[last] if len(order) else last
+
+        self.order_no, self.pivot = self.rank(self.bias_scores(self.assays), self.group)
+        self.compute_factors()
+
+    @staticmethod
+    def reference_rows(table):
+        """Row of the reference ligand assay of each assay, -1 without one. When a setup has several reference
+        assays the last is used"""
+        setup = factorize(*[table[c] for c in REFERENCE_COLUMNS])
+        is_reference = np.nonzero(table['bias_reference'] == 'Reference')[0]
+        reference = np.full(setup.max() + 1 if len(setup) else 0, -1)
+        np.maximum.at(reference, setup[is_reference], is_reference)
+        return reference[setup]
+
+    @staticmethod
+    def bias_scores(assays):
+        """log(Emax/EC50) of the tested ligand minus that of the reference ligand, the log bias factor of two
+        pathways is the difference of their scores. NaN unless both are EC50 values"""
+        ec50 = (lower(assays['quantitive_measure_type']) == 'ec50') & \
+            (lower(assays['reference_quantitive_measure_type']) == 'ec50')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.log10(assays['quantitive_efficacy'] / assays['quantitive_activity']) - \
+                np.log10(assays['reference_quantitive_efficacy'] / assays['reference_quantitive_activity'])
+        scores[~ec50 | ~np.isfinite(scores)] = np.nan
+        return scores
+
+    @staticmethod
+    def rank(scores, group):
+        """Order numbers of the (group sorted) assays and the row of the pathway of each group all others are
+        compared with. Starting with the most potent, a later pathway with a higher score takes order 0 and the
+        previous one takes its order number"""
+        start = np.searchsorted(group, group)
+        order_no = np.arange(len(group)) - start
+        candidates = np.nonzero((order_no > 0) & ~np.isnan(scores) & ~np.isnan(scores[start]))[0]
+        # sequential within a group, but only over the assays that can take order 0
+        pivots = {}
+        for i in candidates.tolist():
+            g = start[i]
+            p = pivots.get(g, g)
+            if np.round(scores[p] - scores[i], 1) < 0:
+                order_no[p], order_no[i] = order_no[i], 0
+                pivots[g] = i
+        pivot = np.arange(len(group))
+        pivot[list(pivots)] = list(pivots.values())
+        return order_no, pivot[start]
+
+    def compute_factors(self):
+        assays, pivot = self.assays, self.pivot
+        compared = np.arange(len(pivot)) != pivot
+        scores = self.bias_scores(assays)
+        self.log_bias_factor = np.where(compared, scores[pivot] - scores, np.nan)
+
+        activity = assays['quantitive_activity']
+        ratio = np.isin(lower(assays['quantitive_measure_type']), ['ec50', 'ic50']) & (activity != 0) & \
+            (activity[pivot] != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.potency = np.where(compared & ratio, activity / activity[pivot], np.nan)
+
+        bias_value = assays['bias_value']
+        self.t_factor = np.where(compared, bias_value[pivot] - bias_value, np.nan)
+
+    def labs_quantity(self, authors):
+        """Number of other publications of the analyzed experiments with an author in common, authors is
+        {biased experiment: [author]}"""
+        experiments = self.assays['experiment'][self.experiment_rows].tolist()
+        publication = factorize(self.assays['publication'][self.experiment_rows])
+        author_ids = {}
+        incidence = [[author_ids.setdefault(a, len(author_ids)) for a in set(authors.get(e, []))]
+            for e in experiments]
+        group_authors = np.zeros((self.n_groups, len(author_ids)), dtype=np.float32)
+        for g, ids in enumerate(incidence):
+            group_authors[g, ids] = 1
+        n_publications = publication.max() + 1 if self.n_groups else 0
+        publication_authors = np.zeros((n_publications, len(author_ids)), dtype=np.float32)
+        np.maximum.at(publication_authors, publication, group_authors)
+        shared = group_authors.dot(publication_authors.T) > 0
+        shared[np.arange(self.n_groups), publication] = False
+        return shared.sum(axis=1)
+
+    def article_quantity(self):
+        """Number of other analyzed experiments of the ligand and receptor with the same Emax reference ligand
+        that report a log bias factor or a t factor"""
+        reported = (np.isfinite(self.log_bias_factor) | np.isfinite(self.t_factor)) & (self.order_no > 0)
+        has_values = np.bincount(self.group, weights=reported, minlength=self.n_groups) > 0
+        rows = self.experiment_rows
+        key = factorize(self.assays['emax_ligand_reference'][rows], self.assays['ligand'][rows],
+            self.assays['receptor'][rows])
+        return np.bincount(key, weights=has_values)[key].astype(int) - has_values
+
+    def experiment_keys(self):
+        rows = self.experiment_rows
+        return list(zip(*[self.assays[c][rows].tolist() for c in self.group_columns]))
+
+
+def receptor_transducers(receptor_ids):
+    """{receptor: (primary, secondary)}, the names of the G protein families of each transduction concatenated"""
+    transducers = {r: ['', ''] for r in receptor_ids}
+    for receptor, transduction, g_protein in ProteinGProteinPair.objects.filter(protein__in=receptor_ids,
+        transduction__in=['primary', 'secondary']).order_by('id').values_list('protein_id', 'transduction',
+        'g_protein__name'):
+        transducers[receptor][0 if transduction == 'primary' else 1] += str(g_protein)
+    return transducers
+
+def experiment_authors():
+    authors = {}
+    for experiment, author in ExperimentAssayAuthors.objects.values_list('experiment__biased_experiment_id',
+        'author'):
+        authors.setdefault(experiment, []).append(author)
+    return authors
+
+def experiment_vendors():
+    return dict(BiasedExperimentVendors.objects.values_list('experiment_id').annotate(Count('id')))
+
+
+def store_bias_analysis(analysis, source, batch_size=1000):
+    """Creates the AnalyzedExperiments (with their assays) of the analysis that are not stored yet for the source.
+    Returns the number of new experiments"""
+    key_lookups = [c + '_id' if c in INTEGER_COLUMNS else c for c in analysis.group_columns]
+    existing = set(AnalyzedExperiment.objects.filter(source=source).values_list(*key_lookups))
+    new_groups = [g for g, key in enumerate(analysis.experiment_keys()) if key not in existing]
+    if not new_groups:
+        return 0
+
+    # plain Python values, the database adapter does not take numpy scalars
+    columns = {c: v.tolist() for c, v in analysis.assays.columns.items()}
+    rows = analysis.experiment_rows.tolist()
+    transducers = receptor_transducers({columns['receptor'][r] for r in rows})
+    vendors = experiment_vendors()
+    labs = analysis.labs_quantity(experiment_authors()).tolist()
+    articles = analysis.article_quantity().tolist()
+
+    experiments = []
+    for g in new_groups:
+        r = rows[g]
+        primary, secondary = transducers[columns['receptor'][r]]
+        experiment = AnalyzedExperiment(publication_id=columns['publication'][r], ligand_id=columns['ligand'][r],
+            receptor_id=columns['receptor'][r], chembl=columns['chembl'][r], source=source,
+            endogenous_ligand_id=columns['endogenous_ligand'][r], vendor_quantity=vendors.get(
+            columns['experiment'][r], 0), reference_ligand_id=columns['reference_ligand'][r], primary=primary,
+            secondary=secondary, article_quantity=articles[g], labs_quantity=labs[g])
+        if 'residue' in analysis.group_columns:
+            experiment.residue = columns['residue'][r]
+            experiment.mutation = columns['mutation'][r]
+        experiments.append(experiment)
+
+    log_bias_factor = rounded(analysis.log_bias_factor)
+    potency = rounded(analysis.potency)
+    t_factor = rounded(analysis.t_factor)
+    order_no = analysis.order_no.tolist()
+    group_rows = np.split(np.arange(len(analysis.group)), np.nonzero(np.diff(analysis.group))[0] + 1)
+
+    with transaction.atomic():
+        # primary keys are set by bulk_create on PostgreSQL
+        AnalyzedExperiment.objects.bulk_create(experiments, batch_size=batch_size)
+        analyzed_assays = []
+        for experiment, g in zip(experiments, new_groups):
+            for i in group_rows[g].tolist():
+                analyzed_assays.append(AnalyzedAssay(experiment=experiment,
+                    family=columns['family'][i],
+                    order_no=order_no[i],
+                    signalling_protein=columns['signalling_protein'][i],
+                    cell_line=columns['cell_line'][i],
+                    assay_type=columns['assay_type'][i],
+                    assay_measure=columns['assay_measure'][i],
+                    assay_time_resolved=columns['assay_time_resolved'][i],
+                    ligand_function=columns['ligand_function'][i],
+                    quantitive_measure_type=columns['quantitive_measure_type'][i],
+                    quantitive_activity=activity_value(columns['quantitive_activity'][i]),
+                    quantitive_activity_initial=nullable(columns['quantitive_activity'][i]),
+                    quantitive_unit=columns['quantitive_unit'][i],
+                    qualitative_activity=columns['qualitative_activity'][i],
+                    quantitive_efficacy=nullable(columns['quantitive_efficacy'][i]),
+                    efficacy_measure_type=columns['efficacy_measure_type'][i],
+                    efficacy_unit=columns['efficacy_unit'][i],
+                    potency=potency[i],
+                    t_coefficient=nullable(columns['bias_value'][i]),
+                    t_value=nullable(columns['bias_value_initial'][i]),
+                    t_factor=t_factor[i],
+                    log_bias_factor=log_bias_factor[i],
+                    emax_ligand_reference_id=columns['emax_ligand_reference'][i]))
+        AnalyzedAssay.objects.bulk_create(analyzed_assays, batch_size=batch_size)
+    return len(experiments)
+
+def integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def stored_value(value):
+    # the bias factors are stored as text, also as 'None'
+    return None if value in (None, '', 'None') else value
+
+def publication_url(url, index):
+    # the web resource url is a template of the index, as in WebLink.__str__
+    return Template(url).substitute(index=index) if url and index else None
+
+def summarise_bias_data(source, batch_size=1000):
+    """Rebuilds the AnalyzedExperimentSummary rows of the source. Returns the number of rows"""
+    pathways = {}
+    for assay in AnalyzedAssay.objects.filter(experiment__source=source, order_no__lt=MAX_PATHWAYS).order_by(
+        'experiment', 'order_no', 'id').values('experiment_id', *SUMMARY_ASSAY_FIELDS):
+        assay['emax_ligand_reference'] = assay.pop('emax_ligand_reference__name')
+        for field in ['potency', 't_coefficient', 't_value', 't_factor', 'log_bias_factor']:
+            assay[field] = stored_value(assay[field])
+        pathways.setdefault(assay.pop('experiment_id'), []).append(assay)
+
+    summaries = []
+    for e in AnalyzedExperiment.objects.filter(source=source).values('id', 'ligand_id', 'ligand__name',
+        'reference_ligand__name', 'endogenous_ligand__name', 'chembl', 'receptor__entry_name', 'receptor__name',
+        'receptor__species__common_name', 'receptor__family__parent__name',
+        'receptor__family__parent__parent__parent__name', 'publication__web_link__index',
+        'publication__web_link__web_resource__url', 'publication__journal__name', 'publication__year',
+        'publication__authors', 'primary', 'secondary', 'vendor_quantity', 'article_quantity', 'labs_quantity'):
+        assays = pathways.get(e['id'], [])
+        log_bias_factors = []
+        for a in assays:
+            try:
+                log_bias_factors.append(float(a['log_bias_factor']))
+            except (TypeError, ValueError):
+                pass
+        summaries.append(AnalyzedExperimentSummary(experiment_id=e['id'], source=source,
+            receptor_class=(e['receptor__family__parent__parent__parent__name'] or '').replace('Class', '').strip(),
+            receptor_family=e['receptor__family__parent__name'] or '',
+            receptor=e['receptor__entry_name'],
+            receptor_name=e['receptor__name'].split(' ', 1)[0].split('-adrenoceptor', 1)[0].strip(),
+            uniprot=e['receptor__entry_name'].split('_')[0].upper(),
+            species=e['receptor__species__common_name'],
+            ligand_id=e['ligand_id'],
+            ligand_name=e['ligand__name'][:200],
+            reference_ligand_name=e['reference_ligand__name'],
+            endogenous_ligand_name=e['endogenous_ligand__name'],
+            chembl=e['chembl'],
+            publication=e['publication__web_link__index'] or '',
+            publication_url=publication_url(e['publication__web_link__web_resource__url'],
+                e['publication__web_link__index']),
+            journal=e['publication__journal__name'],
+            year=e['publication__year'],
+            authors=e['publication__authors'],
+            primary=(e['primary'] or '').replace('family', '').strip(),
+            secondary=(e['secondary'] or '').replace('family', '').strip(),
+            vendor_quantity=integer(e['vendor_quantity']),
+            article_quantity=integer(e['article_quantity']),
+            labs_quantity=integer(e['labs_quantity']),
+            pathways=len(assays),
+            max_log_bias_factor=max(log_bias_factors) if log_bias_factors else None,
+            families=', '.join(a['family'] or '' for a in assays)[:200],
+            assays=json.dumps(assays)))
+
+    with transaction.atomic():
+        AnalyzedExperimentSummary.objects.filter(source=source).delete()
+        AnalyzedExperimentSummary.objects.bulk_create(summaries, batch_size=batch_size)
+    return len(summaries)
+
+def analyse_bias(source):
+    """Analyses all bias experiments for the source ('same_family' or 'different_family'), stores the new ones and
+    rebuilds the summary of the source. Returns the number of new analyzed experiments"""
+    analysis = BiasAnalysis(AssayTable.from_database(), GROUP_COLUMNS[source])
+    created = store_bias_analysis(analysis, source)
+    summarise_bias_data(source)
+    return created
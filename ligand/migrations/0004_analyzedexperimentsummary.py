@@ -0,0 +1,54 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ligand', '0003_analyzedassay_analyzedexperiment_biasedexperiment_biasedexperimentvendors_biasedpathways_biasedpathw'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assayexperiment',
+            name='pchembl_value',
+            field=models.DecimalField(db_index=True, decimal_places=3, max_digits=9),
+        ),
+        migrations.CreateModel(
+            name='AnalyzedExperimentSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=60)),
+                ('receptor_class', models.CharField(db_index=True, max_length=100)),
+                ('receptor_family', models.CharField(max_length=200)),
+                ('receptor', models.CharField(db_index=True, max_length=100)),
+                ('receptor_name', models.CharField(max_length=200)),
+                ('uniprot', models.CharField(max_length=100)),
+                ('species', models.CharField(max_length=100)),
+                ('ligand_name', models.CharField(db_index=True, max_length=200)),
+                ('reference_ligand_name', models.TextField(null=True)),
+                ('endogenous_ligand_name', models.TextField(null=True)),
+                ('chembl', models.CharField(max_length=60, null=True)),
+                ('publication', models.CharField(db_index=True, max_length=100)),
+                ('publication_url', models.TextField(null=True)),
+                ('journal', models.TextField(null=True)),
+                ('year', models.IntegerField(db_index=True, null=True)),
+                ('authors', models.TextField(null=True)),
+                ('primary', models.CharField(max_length=40, null=True)),
+                ('secondary', models.CharField(max_length=40, null=True)),
+                ('vendor_quantity', models.IntegerField(default=0)),
+                ('article_quantity', models.IntegerField(default=0)),
+                ('labs_quantity', models.IntegerField(default=0)),
+                ('pathways', models.IntegerField(db_index=True, default=0)),
+                ('max_log_bias_factor', models.FloatField(db_index=True, null=True)),
+                ('families', models.CharField(max_length=200)),
+                ('assays', models.TextField()),
+                ('experiment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='ligand.AnalyzedExperiment')),
+                ('ligand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ligand.Ligand')),
+            ],
+            options={
+                'db_table': 'ligand_analyzed_experiment_summary',
+                'index_together': {('source', 'pathways')},
+            },
+        ),
+    ]
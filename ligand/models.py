@@ -318,7 +318,7 @@ class AssayExperiment(models.Model):
     assay = models.ForeignKey('ChemblAssay', on_delete=models.CASCADE)
     assay_type = models.CharField(max_length=10)
     assay_description = models.TextField(max_length=1000)
-    pchembl_value = models.DecimalField(max_digits=9, decimal_places=3)
+    pchembl_value = models.DecimalField(max_digits=9, decimal_places=3, db_index=True)
 
     published_value = models.DecimalField(max_digits=9, decimal_places=3)
     published_relation = models.CharField(max_length=10)
@@ -468,6 +468,42 @@ class AnalyzedAssay(models.Model):
     emax_ligand_reference = models.ForeignKey(Ligand, related_name = 'ExperimentAssay.bias_ligand_reference+',
                                         on_delete = models.CASCADE,
                                         null = True, blank = True)
+
+class AnalyzedExperimentSummary(models.Model):
+    """One flattened row per AnalyzedExperiment for the paged bias browser data, built by the bias builds
+    (ligand.bias.summarise_bias_data)"""
+
+    experiment = models.OneToOneField(AnalyzedExperiment, related_name='summary', on_delete=models.CASCADE)
+    source = models.CharField(max_length=60, db_index=True)
+    receptor_class = models.CharField(max_length=100, db_index=True)
+    receptor_family = models.CharField(max_length=200)
+    receptor = models.CharField(max_length=100, db_index=True) # entry name
+    receptor_name = models.CharField(max_length=200) # IUPHAR
+    uniprot = models.CharField(max_length=100)
+    species = models.CharField(max_length=100)
+    ligand = models.ForeignKey(Ligand, on_delete=models.CASCADE)
+    ligand_name = models.CharField(max_length=200, db_index=True)
+    reference_ligand_name = models.TextField(null=True)
+    endogenous_ligand_name = models.TextField(null=True)
+    chembl = models.CharField(max_length=60, null=True)
+    publication = models.CharField(max_length=100, db_index=True) # DOI or PubMed ID
+    publication_url = models.TextField(null=True)
+    journal = models.TextField(null=True)
+    year = models.IntegerField(null=True, db_index=True)
+    authors = models.TextField(null=True)
+    primary = models.CharField(max_length=40, null=True)
+    secondary = models.CharField(max_length=40, null=True)
+    vendor_quantity = models.IntegerField(default=0)
+    article_quantity = models.IntegerField(default=0)
+    labs_quantity = models.IntegerField(default=0)
+    pathways = models.IntegerField(default=0, db_index=True) # compared pathways (order_no < 5)
+    max_log_bias_factor = models.FloatField(null=True, db_index=True)
+    families = models.CharField(max_length=200) # of the pathways, in order
+    assays = models.TextField() # JSON list of the pathways, in order
+
+    class Meta():
+        db_table = 'ligand_analyzed_experiment_summary'
+        index_together = [('source', 'pathways')]
 #Biased Part - end
 
 #Biased Pathways - start
@@ -1,3 +1,197 @@
-from django.test import TestCase
+from django.contrib.sessions.backends.base import SessionBase
+from django.test import RequestFactory, SimpleTestCase, TestCase
 
-# Create your tests here.
+from common.models import Publication, WebLink, WebResource
+from ligand.bias import (ASSAY_COLUMNS, FLOAT_COLUMNS, GROUP_COLUMNS, INTEGER_COLUMNS, AssayTable, BiasAnalysis,
+    summarise_bias_data)
+from ligand.models import (AnalyzedAssay, AnalyzedExperiment, Ligand, LigandProperities, LigandVendorLink,
+    LigandVendors)
+from ligand.views import BiasBrowserData, BiasVendorBrowser
+from protein.models import Protein, ProteinFamily, ProteinSequenceType, ProteinSource, Species
+
+import json
+import numpy as np
+
+
+def make_table(assays):
+    """AssayTable with the columns AssayTable.from_database loads, assays are dicts of the values that differ from
+    the defaults"""
+    defaults = {c: None for c, lookup in ASSAY_COLUMNS}
+    defaults.update(publication=1, ligand=10, receptor=100, species='Human', assay_type='Signalling',
+        cell_line='HEK293', assay_measure='cAMP', quantitive_measure_type='EC50', bias_reference='Tested',
+        emax_ligand_reference=20)
+    rows = []
+    for i, values in enumerate(assays):
+        row = dict(defaults, id=i + 1, experiment=i + 1)
+        row.update(values)
+        rows.append(row)
+
+    columns = {}
+    for column, lookup in ASSAY_COLUMNS:
+        values = [r[column] for r in rows]
+        if column in INTEGER_COLUMNS:
+            columns[column] = np.array(values, dtype=np.int64)
+        elif column in FLOAT_COLUMNS:
+            columns[column] = np.array([np.nan if v is None else v for v in values], dtype=float)
+        else:
+            columns[column] = np.array(values + [None], dtype=object)[:-1]
+    return AssayTable(columns)
+
+def pathway(pathway, activity, efficacy, reference_activity, bias_value=None, **values):
+    """A tested assay and the reference ligand assay of the same setup"""
+    return [
+        dict(values, signalling_protein=pathway, quantitive_activity=activity, quantitive_efficacy=efficacy,
+            bias_value=bias_value),
+        dict(values, signalling_protein=pathway, quantitive_activity=reference_activity, quantitive_efficacy=100,
+            ligand=20, bias_reference='Reference'),
+        ]
+
+
+class BiasAnalysisTest(SimpleTestCase):
+    """Order numbers and bias factors are those of the per experiment calculation the engine replaced"""
+
+    def setUp(self):
+        # log(Emax/EC50) of the tested minus the reference ligand: gs 0.699, gi 0, arrestin 1
+        self.assays = pathway('gs', 1e-9, 50, 1e-8, 1.5) + pathway('gi', 1e-8, 100, 1e-8, 0.5) + \
+            pathway('arrestin', 1e-7, 100, 1e-6, 2.0)
+
+    def analyse(self, assays, source='same_family'):
+        return BiasAnalysis(make_table(assays), GROUP_COLUMNS[source])
+
+    def test_reference_rows(self):
+        table = make_table(self.assays)
+        self.assertEqual(BiasAnalysis.reference_rows(table).tolist(), [1, 1, 3, 3, 5, 5])
+
+    def test_order_and_factors(self):
+        analysis = self.analyse(self.assays)
+        self.assertEqual(analysis.n_groups, 1)
+        # sorted by potency, the arrestin pathway has the highest score and takes order 0 from gs
+        self.assertEqual(analysis.assays['signalling_protein'].tolist(), ['gs', 'gi', 'arrestin'])
+        self.assertEqual(analysis.order_no.tolist(), [2, 1, 0])
+        np.testing.assert_allclose(analysis.log_bias_factor, [1 - np.log10(5), 1, np.nan])
+        np.testing.assert_allclose(analysis.potency, [0.01, 0.1, np.nan])
+        np.testing.assert_allclose(analysis.t_factor, [0.5, 1.5, np.nan])
+
+    def test_most_potent_first(self):
+        analysis = self.analyse(self.assays[:4])
+        self.assertEqual(analysis.order_no.tolist(), [0, 1])
+        np.testing.assert_allclose(analysis.log_bias_factor, [np.nan, np.log10(5)])
+
+    def test_ec50_only(self):
+        assays = [dict(a, quantitive_measure_type='pEC50') if a['signalling_protein'] == 'gi' else a
+            for a in self.assays]
+        analysis = self.analyse(assays)
+        self.assertEqual(analysis.order_no.tolist(), [2, 1, 0])
+        self.assertTrue(np.isnan(analysis.log_bias_factor[1]))
+        self.assertTrue(np.isnan(analysis.potency[1]))
+
+    def test_groups(self):
+        # a duplicate of an assay in another experiment is analysed once
+        duplicate = dict(self.assays[0], experiment=7)
+        analysis = self.analyse(self.assays + [duplicate])
+        self.assertEqual(analysis.n_groups, 1)
+        self.assertEqual(len(analysis.assays), 3)
+        # mutants are separate experiments when comparing different families
+        mutant = dict(self.assays[0], experiment=8, residue='3x32', mutation='D113A')
+        analysis = self.analyse(self.assays + [mutant], 'different_family')
+        self.assertEqual(analysis.experiment_keys(), [(1, 10, 100, None, None), (1, 10, 100, '3x32', 'D113A')])
+
+    def test_labs_and_articles(self):
+        other_publication = [dict(a, publication=2, experiment=i + 11) for i, a in enumerate(self.assays[:4])]
+        single_pathway = [dict(a, ligand=11, experiment=20) for a in self.assays[:1]]
+        analysis = self.analyse(self.assays + other_publication + single_pathway)
+        self.assertEqual(analysis.n_groups, 3)
+        publications = analysis.assays['publication'][analysis.experiment_rows].tolist()
+        ligands = analysis.assays['ligand'][analysis.experiment_rows].tolist()
+        self.assertEqual(list(zip(publications, ligands)), [(1, 10), (2, 10), (1, 11)])
+
+        # the two publications of ligand 10 report a bias factor
+        self.assertEqual(analysis.article_quantity().tolist(), [1, 1, 0])
+
+        authors = {e: ['Smith', 'Jones'] for e in range(1, 7)}
+        authors.update({e: ['Jones'] for e in range(11, 15)})
+        authors[20] = ['Smith']
+        self.assertEqual(analysis.labs_quantity(authors).tolist(), [1, 1, 0])
+        self.assertEqual(analysis.labs_quantity({}).tolist(), [0, 0, 0])
+
+
+class BiasBrowserDataTest(TestCase):
+    """The bias browser pages are read from the summary rebuilt by summarise_bias_data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        family = None
+        for slug, name in [('001', 'Class A (Rhodopsin)'), ('001_001', 'Aminergic receptors'),
+            ('001_001_001', 'Adrenoceptors'), ('001_001_001_002', 'beta2-adrenoceptor')]:
+            family = ProteinFamily.objects.create(slug=slug, name=name, parent=family)
+        receptor = Protein.objects.create(family=family, species=Species.objects.create(latin_name='Homo sapiens',
+            common_name='Human'), source=ProteinSource.objects.create(name='SWISSPROT'),
+            sequence_type=ProteinSequenceType.objects.create(slug='wt', name='Wild-type'), entry_name='adrb2_human',
+            name='&beta;<sub>2</sub>-adrenoceptor', sequence='MGQPG')
+        doi = WebResource.objects.create(slug='doi', name='DOI', url='https://doi.org/$index')
+
+        for i, (name, pathways, year) in enumerate([('carvedilol', ['Arrestin', 'Gs'], 2007),
+            ('isoprenaline', ['Gs'], 2010), ('salmeterol', ['Gi/Go', 'Arrestin', 'Gs'], 2010)]):
+            ligand = Ligand.objects.create(name=name, canonical=True, properities=LigandProperities.objects.create())
+            publication = Publication.objects.create(web_link=WebLink.objects.create(web_resource=doi,
+                index='10.1000/{}'.format(i)), authors='Smith J', year=year)
+            experiment = AnalyzedExperiment.objects.create(ligand=ligand, publication=publication, receptor=receptor,
+                source='different_family', primary='Gs family', secondary='', vendor_quantity='0',
+                article_quantity='1', labs_quantity='1')
+            for order_no, pathway in enumerate(pathways):
+                AnalyzedAssay.objects.create(experiment=experiment, family=pathway, order_no=order_no,
+                    signalling_protein=pathway.lower(), log_bias_factor=str(order_no) if order_no else 'None')
+        summarise_bias_data('different_family')
+
+    def data(self, **parameters):
+        response = BiasBrowserData(RequestFactory().get('/ligand/biasedbrowser/data', parameters))
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_summary(self):
+        data = self.data(sort='ligand_name')
+        # experiments with fewer than two pathways are not shown
+        self.assertEqual([r['ligand_name'] for r in data['data']], ['carvedilol', 'salmeterol'])
+        row = data['data'][1]
+        self.assertEqual((row['receptor_class'], row['receptor_family'], row['uniprot']), ('A (Rhodopsin)',
+            'Adrenoceptors', 'ADRB2'))
+        self.assertEqual(row['publication_url'], 'https://doi.org/10.1000/2')
+        self.assertEqual(row['families'], 'Gi/Go, Arrestin, Gs')
+        self.assertEqual([a['log_bias_factor'] for a in row['assays']], [None, '1', '2'])
+        self.assertEqual(row['max_log_bias_factor'], 2)
+
+    def test_paging_and_filters(self):
+        data = self.data(sort='-ligand_name', page_size=1, page=2)
+        self.assertEqual((data['total'], data['pages'], data['page']), (2, 2, 2))
+        self.assertEqual([r['ligand_name'] for r in data['data']], ['carvedilol'])
+        self.assertEqual(self.data(min_pathways=1)['total'], 3)
+        self.assertEqual(self.data(min_pathways=3)['total'], 1)
+        self.assertEqual(self.data(year=2010, min_pathways=1)['total'], 2)
+        self.assertEqual(self.data(ligand='salm')['total'], 1)
+        # invalid values fall back to the defaults
+        self.assertEqual(self.data(min_pathways='two', year='recent', sort='name', page_size='all')['total'], 2)
+
+
+class BiasVendorBrowserTest(TestCase):
+    """One set of vendor rows per ligand of the browser, in its order"""
+
+    def test_rows(self):
+        properities = LigandProperities.objects.create()
+        vendor = LigandVendors.objects.create(slug='vendor', name='Vendor')
+        chembl = LigandVendors.objects.create(slug='chembl', name='ChEMBL')
+        for i, v in enumerate([vendor, chembl, vendor]):
+            LigandVendorLink.objects.create(vendor=v, lp=properities, url='https://vendor.com/{}'.format(i),
+                vendor_external_id=str(i), sid=str(i))
+        # ligands sharing their properities
+        first = Ligand.objects.create(name='ligand', canonical=True, properities=properities)
+        second = Ligand.objects.create(name='ligand', canonical=False, properities=properities)
+        other = Ligand.objects.create(name='other', canonical=True, properities=LigandProperities.objects.create())
+
+        request = RequestFactory().get('/ligand/browservendors')
+        request.session = SessionBase()
+        request.session['ids'] = ','.join(str(ligand.pk) for ligand in [second, other, first])
+        view = BiasVendorBrowser()
+        view.request = request
+        rows = view.get_context_data()['data']
+        self.assertEqual([(row['ligand'].pk, row['vendor_id']) for row in rows],
+            [(second.pk, '0'), (second.pk, '2'), (first.pk, '0'), (first.pk, '2')])
+        self.assertNotIn('ids', request.session)
@@ -7,8 +7,10 @@ urlpatterns = [
     url(r'^$', cache_page(3600*24*7)(LigandBrowser.as_view()), name='ligand_browser'),
     url(r'^target/all/(?P<slug>[-\w]+)/$',TargetDetails, name='ligand_target_detail'),
     url(r'^target/compact/(?P<slug>[-\w]+)/$',TargetDetailsCompact, name='ligand_target_detail_compact'),
+    url(r'^target/data/(?P<slug>[-\w]+)/$',TargetDetailsData, name='ligand_target_detail_data'),
     url(r'^targets$',TargetDetails, name='ligand_target_detail'),
     url(r'^targets_compact',TargetDetailsCompact, name='ligand_target_detail_compact'),
+    url(r'^targets_data$',TargetDetailsData, name='ligand_target_detail_data'),
     url(r'^targets_purchasable',TargetPurchasabilityDetails, name='ligand_target_detail_purchasable'),
     url(r'^(?P<ligand_id>[-\w]+)/$',LigandDetails, name='ligand_detail'),
     url(r'^statistics', cache_page(3600*24*7)(LigandStatistics.as_view()), name='ligand_statistics'),
@@ -16,6 +18,7 @@ urlpatterns = [
     url(r'^vendors$', test_link, name='test'),
     url(r'^biasedbrowser$', cache_page(3600*24*7)(BiasBrowser.as_view()), name='bias_browser'),
     url(r'^biasedgbrowser$', cache_page(3600*24*7)(BiasBrowserGSubbtype.as_view()), name='bias_g_browser'),
+    url(r'^biasedbrowser/data$', cache_page(3600*24*7)(BiasBrowserData), name='bias_browser_data'),
 
     # url(r'^biasedbrowser$', BiasBrowser.as_view(), name='bias_browser'),
     # url(r'^biasedgbrowser$', BiasBrowserGSubbtype.as_view(), name='bias_g_browser'),
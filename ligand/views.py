@@ -1,10 +1,13 @@
 from django.db.models import Count, Avg, Min, Max
 from collections import defaultdict
+from django.core.paginator import Paginator
 from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.urls import reverse
 from django.views.generic import TemplateView, View, DetailView
 
 from common.models import ReleaseNotes
+from common.release import release_conditional
 from common.phylogenetic_tree import PhylogeneticTreeGenerator
 from common.selection import Selection, SelectionItem
 from ligand.models import *
@@ -14,6 +17,65 @@ from copy import deepcopy
 import itertools
 import json
 
+
+# vendor link sources that are not vendors
+NON_VENDORS = ['ZINC', 'ChEMBL', 'BindingDB', 'SureChEMBL', 'eMolecules', 'MolPort', 'PubChem']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def paged_data(request, queryset, sort_columns, default_sort):
+    """One page of the queryset and its paging info. The request selects the page with page, page_size and sort
+    (one of sort_columns, prefixed with - for descending order)"""
+    sort = request.GET.get('sort', default_sort)
+    if sort.lstrip('-') not in sort_columns:
+        sort = default_sort
+    try:
+        page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    # ordered by id within equal values, so that the pages do not overlap
+    paginator = Paginator(queryset.order_by(sort, 'id'), page_size)
+    page = paginator.get_page(request.GET.get('page'))
+    info = {'total': paginator.count, 'page': page.number, 'pages': paginator.num_pages, 'page_size': page_size,
+        'sort': sort}
+    return info, list(page.object_list)
+
+def target_assays(request, slug=None):
+    """The ChEMBL assays of the target(s) of the slug or else of the selection, and the target (for display)"""
+    ps = AssayExperiment.objects.none()
+    target = ''
+    if slug:
+        if slug.count('_') == 0 :
+            ps = AssayExperiment.objects.filter(protein__family__parent__parent__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
+        elif slug.count('_') == 1 and len(slug) == 7:
+            ps = AssayExperiment.objects.filter(protein__family__parent__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
+        elif slug.count('_') == 2:
+            ps = AssayExperiment.objects.filter(protein__family__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
+        #elif slug.count('_') == 3:
+        elif slug.count('_') == 1 and len(slug) != 7:
+            ps = AssayExperiment.objects.filter(protein__entry_name = slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
+
+        if slug.count('_') == 1 and len(slug) == 7:
+            target = ProteinFamily.objects.get(slug=slug)
+        else:
+            target = slug
+    else:
+        simple_selection = request.session.get('selection', False)
+        selection = Selection()
+        if simple_selection:
+            selection.importer(simple_selection)
+        if selection.targets != []:
+            prot_ids = [x.item.id for x in selection.targets]
+            ps = AssayExperiment.objects.filter(protein__in=prot_ids, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
+            target = ', '.join([x.item.entry_name for x in selection.targets])
+    return ps, target
+
+def purchasable_properities(properities_ids):
+    """The ids of the ligand properities that can be bought from a vendor"""
+    return set(LigandVendorLink.objects.filter(lp__in=properities_ids).exclude(vendor__name__in=NON_VENDORS
+        ).values_list('lp_id', flat=True))
+
 class LigandBrowser(TemplateView):
     """
     Per target summary of ligands.
@@ -94,37 +156,10 @@ def LigandDetails(request, ligand_id):
 
 
 def TargetDetailsCompact(request, **kwargs):
-    if 'slug' in kwargs:
-        slug = kwargs['slug']
-        if slug.count('_') == 0 :
-            ps = AssayExperiment.objects.filter(protein__family__parent__parent__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-        elif slug.count('_') == 1 and len(slug) == 7:
-            ps = AssayExperiment.objects.filter(protein__family__parent__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-        elif slug.count('_') == 2:
-            ps = AssayExperiment.objects.filter(protein__family__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-        #elif slug.count('_') == 3:
-        elif slug.count('_') == 1 and len(slug) != 7:
-            ps = AssayExperiment.objects.filter(protein__entry_name = slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-
-        if slug.count('_') == 1 and len(slug) == 7:
-            f = ProteinFamily.objects.get(slug=slug)
-        else:
-            f = slug
-
-        context = {
-            'target':f
-            }
-    else:
-        simple_selection = request.session.get('selection', False)
-        selection = Selection()
-        if simple_selection:
-            selection.importer(simple_selection)
-        if selection.targets != []:
-            prot_ids = [x.item.id for x in selection.targets]
-            ps = AssayExperiment.objects.filter(protein__in=prot_ids, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-            context = {
-                'target': ', '.join([x.item.entry_name for x in selection.targets])
-                }
+    ps, target = target_assays(request, kwargs.get('slug'))
+    context = {
+        'target': target
+        }
 
     ps = ps.prefetch_related('protein','ligand__properities__web_links__web_resource','ligand__properities__vendors__vendor')
     d = {}
@@ -143,7 +178,7 @@ def TargetDetailsCompact(request, **kwargs):
         vendors = lig.properities.vendors.all()
         purchasability = 'No'
         for v in vendors:
-            if v.vendor.name not in ['ZINC', 'ChEMBL', 'BindingDB', 'SureChEMBL', 'eMolecules', 'MolPort', 'PubChem']:
+            if v.vendor.name not in NON_VENDORS:
                 purchasability = 'Yes'
 
         for record, vals in records.items():
@@ -186,65 +221,41 @@ def TargetDetailsCompact(request, **kwargs):
     return render(request, 'target_details_compact.html', context)
 
 def TargetDetails(request, **kwargs):
-
-    if 'slug' in kwargs:
-        slug = kwargs['slug']
-        if slug.count('_') == 0 :
-            ps = AssayExperiment.objects.filter(protein__family__parent__parent__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-        elif slug.count('_') == 1 and len(slug) == 7:
-            ps = AssayExperiment.objects.filter(protein__family__parent__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-        elif slug.count('_') == 2:
-            ps = AssayExperiment.objects.filter(protein__family__parent__slug=slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-        #elif slug.count('_') == 3:
-        elif slug.count('_') == 1 and len(slug) != 7:
-            ps = AssayExperiment.objects.filter(protein__entry_name = slug, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-
-        if slug.count('_') == 1 and len(slug) == 7:
-            f = ProteinFamily.objects.get(slug=slug)
-        else:
-            f = slug
-
-        context = {
-            'target':f
-            }
-    else:
-        simple_selection = request.session.get('selection', False)
-        selection = Selection()
-        if simple_selection:
-            selection.importer(simple_selection)
-        if selection.targets != []:
-            prot_ids = [x.item.id for x in selection.targets]
-            ps = AssayExperiment.objects.filter(protein__in=prot_ids, ligand__properities__web_links__web_resource__slug = 'chembl_ligand')
-            context = {
-                'target': ', '.join([x.item.entry_name for x in selection.targets])
-                }
-    ps = ps.values('standard_type',
-                'standard_relation',
-                'standard_value',
-                'assay_description',
-                'assay_type',
-                #'standard_units',
-                'pchembl_value',
-                'ligand__id',
-                'ligand__properities_id',
-                'ligand__properities__web_links__index',
-                #'ligand__properities__vendors__vendor__name',
-                'protein__species__common_name',
-                'protein__entry_name',
-                'ligand__properities__mw',
-                'ligand__properities__logp',
-                'ligand__properities__rotatable_bonds',
-                'ligand__properities__smiles',
-                'ligand__properities__hdon',
-                'ligand__properities__hacc','protein'
-                ).annotate(num_targets = Count('protein__id', distinct=True))
-    for record in ps:
-        record['purchasability'] = 'Yes' if len(LigandVendorLink.objects.filter(lp=record['ligand__properities_id']).exclude(vendor__name__in=['ZINC', 'ChEMBL', 'BindingDB', 'SureChEMBL', 'eMolecules', 'MolPort', 'PubChem'])) > 0 else 'No'
-
-    context['proteins'] = ps
-
+    """The page of the target assays, they are fetched one page at a time from TargetDetailsData"""
+    slug = kwargs.get('slug')
+    ps, target = target_assays(request, slug)
+    context = {
+        'target': target,
+        'data_url': reverse('ligand_target_detail_data', kwargs={'slug': slug} if slug else None),
+        }
     return render(request, 'target_details.html', context)
 
+# assay fields of the target data pages
+TARGET_DATA_FIELDS = ['id', 'standard_type', 'standard_relation', 'standard_value', 'standard_units',
+    'assay_description', 'assay_type', 'pchembl_value', 'ligand__id', 'ligand__name', 'ligand__properities_id',
+    'ligand__properities__web_links__index', 'protein__species__common_name', 'protein__entry_name',
+    'ligand__properities__mw', 'ligand__properities__logp', 'ligand__properities__rotatable_bonds',
+    'ligand__properities__smiles', 'ligand__properities__hdon', 'ligand__properities__hacc']
+# indexed
+TARGET_DATA_SORT_COLUMNS = ['protein', 'ligand', 'pchembl_value']
+
+def TargetDetailsData(request, **kwargs):
+    """The assays of TargetDetails as JSON, one page at a time (see paged_data). ligand and protein (entry name)
+    filter the assays"""
+    ps, target = target_assays(request, kwargs.get('slug'))
+    if request.GET.get('ligand'):
+        ps = ps.filter(ligand__properities__web_links__index=request.GET['ligand'])
+    if request.GET.get('protein'):
+        ps = ps.filter(protein__entry_name=request.GET['protein'])
+
+    data, records = paged_data(request, ps.values(*TARGET_DATA_FIELDS), TARGET_DATA_SORT_COLUMNS, 'protein')
+    purchasable = purchasable_properities({record['ligand__properities_id'] for record in records})
+    for record in records:
+        record['purchasability'] = 'Yes' if record['ligand__properities_id'] in purchasable else 'No'
+    data['target'] = str(target)
+    data['data'] = records
+    return JsonResponse(data)
+
 
 def TargetPurchasabilityDetails(request, **kwargs):
 
@@ -456,23 +467,27 @@ class BiasVendorBrowser(TemplateView):
         datum = self.request.session.get('ids')
 
         self.request.session.modified = True
+        ids = [int(i) for i in datum.split(',')]
+        ligands = Ligand.objects.in_bulk(ids)
+        # ligands can share their properities and so their vendor links
+        links = defaultdict(list)
+        for x in LigandVendorLink.objects.filter(lp__in={ligand.properities_id for ligand in ligands.values()}
+            ).exclude(vendor__name__in=NON_VENDORS).select_related('vendor').order_by('id'):
+            links[x.lp_id].append(x)
         rd = list()
-        for i in datum.split(','):
-            ligand = Ligand.objects.filter(id=int(i))
-            ligand = ligand.get()
-            links = LigandVendorLink.objects.filter(lp=ligand.properities_id).prefetch_related('lp','vendor')
-            for x in links:
-                if x.vendor.name not in ['ZINC', 'ChEMBL', 'BindingDB', 'SureChEMBL', 'eMolecules', 'MolPort', 'PubChem']:
-                    temp = dict()
-                    vendor = LigandVendors.objects.filter(id=x.vendor_id)
-                    vendor = vendor.get()
-                    temp['ligand'] = ligand
-                    temp['url'] = x.url
-                    temp['vendor_id'] = x.vendor_external_id
-                    temp['vendor'] = vendor
-
-                    rd.append(temp)
-            context['data'] = rd
+        # the rows of each ligand in the order of the browser
+        for i in ids:
+            if i not in ligands:
+                continue
+            for x in links[ligands[i].properities_id]:
+                temp = dict()
+                temp['ligand'] = ligands[i]
+                temp['url'] = x.url
+                temp['vendor_id'] = x.vendor_external_id
+                temp['vendor'] = x.vendor
+
+                rd.append(temp)
+        context['data'] = rd
         del self.request.session['ids']
         return context
         # except:
@@ -480,151 +495,67 @@ class BiasVendorBrowser(TemplateView):
 
 '''
 Bias browser between families
-access data from db, fill empty fields with empty parse_children
+the page only holds the table, the analyzed experiments are fetched one page at a time from BiasBrowserData
 '''
 class BiasBrowser(TemplateView):
 
     template_name = 'bias_browser.html'
-    #@cache_page(50000)
-    def get_context_data(self, *args, **kwargs  ):
-
-        content = AnalyzedExperiment.objects.filter(source='different_family').prefetch_related(
-        'analyzed_data', 'ligand','ligand__reference_ligand','reference_ligand',
-        'endogenous_ligand' ,'ligand__properities','receptor','receptor','receptor__family',
-        'receptor__family__parent','receptor__family__parent__parent__parent',
-        'receptor__family__parent__parent','receptor__family', 'receptor__species',
-        'publication', 'publication__web_link', 'publication__web_link__web_resource',
-        'publication__journal', 'ligand__ref_ligand_bias_analyzed',
-        'analyzed_data__emax_ligand_reference')
-        context = dict()
-        prepare_data = self.process_data(content)
-
-        keys = [k for k, v in prepare_data.items() if len(v['biasdata']) < 2]
-        for x in keys:
-            del prepare_data[x]
-
-        self.multply_assay(prepare_data)
-        context.update({'data': prepare_data})
-
+    source = 'different_family'
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        context['source'] = self.source
+        # options of the class filter
+        context['receptor_classes'] = list(AnalyzedExperimentSummary.objects.filter(source=self.source).order_by(
+            'receptor_class').values_list('receptor_class', flat=True).distinct())
         return context
 
-    def process_data(self, content):
-        '''
-        Merge BiasedExperiment with its children
-        and pass it back to loop through dublicates
-        '''
-        rd = dict()
-        increment = 0
-
-        for instance in content:
-            fin_obj = {}
-            fin_obj['main'] = instance
-            temp = dict()
-            doubles = []
-            temp['experiment_id'] = instance.id
-            temp['publication'] = instance.publication
-            temp['ligand'] = instance.ligand
-            temp['source'] = instance.source
-            temp['chembl'] = instance.chembl
-            temp['endogenous_ligand'] = instance.endogenous_ligand
-            temp['vendor_quantity'] = instance.vendor_quantity
-            temp['publication_quantity'] = instance.article_quantity
-            temp['lab_quantity'] = instance.labs_quantity
-            temp['reference_ligand'] = instance.reference_ligand
-            temp['primary'] =   instance.primary.replace('family','').strip()
-            temp['secondary'] = instance.secondary.replace('family','').strip()
-            if instance.receptor:
-                temp['class'] = instance.receptor.family.parent.parent.parent.name.replace('Class','').strip()
-                temp['receptor'] = instance.receptor
-                temp['uniprot'] = instance.receptor.entry_short
-                temp['IUPHAR'] = instance.receptor.name.split(' ', 1)[0].split('-adrenoceptor', 1)[0].strip()
-            else:
-                temp['receptor'] = 'Error appeared'
-            temp['biasdata'] = list()
-            increment_assay = 0
-            for entry in instance.analyzed_data.all():
-                if entry.order_no < 5:
-
-                    temp_dict = dict()
-                    temp_dict['emax_reference_ligand'] = entry.emax_ligand_reference
-                    temp_dict['family'] = entry.family
-                    temp_dict['show_family'] = entry.signalling_protein
-                    temp_dict['signalling_protein'] = entry.signalling_protein
-                    temp_dict['cell_line'] = entry.cell_line
-                    temp_dict['assay_type'] = entry.assay_type
-                    temp_dict['assay_measure'] = entry.assay_measure
-                    temp_dict['assay_time_resolved'] = entry.assay_time_resolved
-                    temp_dict['ligand_function'] = entry.ligand_function
-                    temp_dict['quantitive_measure_type'] = entry.quantitive_measure_type
-                    temp_dict['quantitive_activity'] = entry.quantitive_activity
-                    temp_dict['quantitive_activity_initial'] = entry.quantitive_activity_initial
-                    temp_dict['quantitive_unit'] = entry.quantitive_unit
-                    temp_dict['qualitative_activity'] = entry.qualitative_activity
-                    temp_dict['quantitive_efficacy'] = entry.quantitive_efficacy
-                    temp_dict['efficacy_measure_type'] = entry.efficacy_measure_type
-                    temp_dict['efficacy_unit'] = entry.efficacy_unit
-                    temp_dict['order_no'] =  int(entry.order_no)
-                    temp_dict['t_coefficient'] = entry.t_coefficient
-                    if entry.t_value != None and entry.t_value !='None':
-                        temp_dict['t_value'] = entry.t_value
-                    else:
-                        temp_dict['t_value'] = ''
-
-                    if entry.t_factor != None and entry.t_factor !='None':
-                        temp_dict['t_factor'] = entry.t_factor
-                    else:
-                        temp_dict['t_factor'] = ''
-
-                    if entry.potency != None and entry.potency !='None':
-                        temp_dict['potency'] =  entry.potency
-                    else:
-                        temp_dict['potency'] = ''
-
-                    if entry.log_bias_factor != None and entry.log_bias_factor !='None':
-                        temp_dict['log_bias_factor'] = entry.log_bias_factor
-                    else:
-                        temp_dict['log_bias_factor'] = ''
-
-                    temp_dict['emax_ligand_reference'] = entry.emax_ligand_reference
-
-                    temp['biasdata'].append(temp_dict)
-
-                    doubles.append(temp_dict)
-                    increment_assay+=1
-                else:
-                    continue
-
-            rd[increment] = temp
-            increment+=1
-
-
-        return rd
-
-    def multply_assay(self, data):
-
-        for i in data.items():
-
-            lenght = len(i[1]['biasdata'])
-            for key in range(lenght,5):
-                temp_dict = dict()
-                temp_dict['pathway'] = ''
-                temp_dict['bias'] = ''
-                temp_dict['cell_line'] = ''
-                temp_dict['assay_type'] = ''
-                temp_dict['log_bias_factor'] = ''
-                temp_dict['t_factor'] = ''
-                temp_dict['ligand_function'] = ''
-                temp_dict['order_no'] = lenght
-                i[1]['biasdata'].append(temp_dict)
-                lenght+=1
-            test = sorted(i[1]['biasdata'], key=lambda x: x['order_no'],
-                          reverse=True)
-            i[1]['biasdata'] = test
-
     '''
     End  of Bias Browser
     '''
 
+# filter parameter: AnalyzedExperimentSummary lookup, all on indexed columns
+BIAS_DATA_FILTERS = {
+    'receptor': 'receptor',
+    'class': 'receptor_class',
+    'ligand': 'ligand_name__startswith',
+    'publication': 'publication',
+    }
+# experiments with fewer compared pathways are not shown by default
+BIAS_DATA_MIN_PATHWAYS = 2
+BIAS_DATA_SORT_COLUMNS = ['receptor', 'receptor_class', 'ligand_name', 'publication', 'year', 'pathways',
+    'max_log_bias_factor']
+BIAS_DATA_FIELDS = ['experiment_id', 'receptor_class', 'receptor_family', 'receptor', 'receptor_name', 'uniprot',
+    'species', 'ligand_id', 'ligand_name', 'reference_ligand_name', 'endogenous_ligand_name', 'chembl', 'publication',
+    'publication_url', 'journal', 'year', 'authors', 'primary', 'secondary', 'vendor_quantity', 'article_quantity',
+    'labs_quantity', 'pathways', 'max_log_bias_factor', 'families', 'assays']
+
+@release_conditional
+def BiasBrowserData(request):
+    """The analyzed experiments of the bias browsers as JSON, one page at a time (see paged_data). source selects
+    the browser ('different_family' or 'same_family'), min_pathways (default BIAS_DATA_MIN_PATHWAYS) the experiments
+    with at least that many pathways, year the publication year and BIAS_DATA_FILTERS the others"""
+    summaries = AnalyzedExperimentSummary.objects.filter(source=request.GET.get('source', 'different_family'))
+    try:
+        min_pathways = int(request.GET.get('min_pathways', BIAS_DATA_MIN_PATHWAYS))
+    except ValueError:
+        min_pathways = BIAS_DATA_MIN_PATHWAYS
+    summaries = summaries.filter(pathways__gte=min_pathways)
+    for parameter, lookup in BIAS_DATA_FILTERS.items():
+        if request.GET.get(parameter):
+            summaries = summaries.filter(**{lookup: request.GET[parameter]})
+    # an invalid year does not filter
+    try:
+        summaries = summaries.filter(year=int(request.GET['year']))
+    except (KeyError, ValueError):
+        pass
+
+    data, rows = paged_data(request, summaries.values(*BIAS_DATA_FIELDS), BIAS_DATA_SORT_COLUMNS, 'receptor')
+    for row in rows:
+        row['assays'] = json.loads(row['assays'])
+    data['data'] = rows
+    return JsonResponse(data)
+
 class BiasBrowserGSubbtype(TemplateView):
     template_name = 'bias_browser_g.html'
     #@cache_page(50000)
@@ -1,6 +1,4 @@
 
-import xlrd
-
 import json
 import urllib.request
 #env/bin/python3 -m pip install xlrd
@@ -9,6 +7,7 @@ from mutation.models import *
 from datetime import datetime
 
 def loaddatafromexcel(excelpath):
+	import xlrd
 	workbook = xlrd.open_workbook(excelpath)
 	worksheets = workbook.sheet_names()
 	temp = []
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('protein', '0007_proteingproteinpair_references'),
+        ('residue', '0002_auto_20180504_1417'),
+        ('mutation', '0002_auto_20180117_1457'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MutationCoverage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutations', models.IntegerField(default=0)),
+                ('mutations_annotated', models.IntegerField(default=0)),
+                ('interactions', models.IntegerField(default=0)),
+                ('family', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='protein.ProteinFamily')),
+            ],
+            options={
+                'db_table': 'mutation_coverage',
+            },
+        ),
+        migrations.CreateModel(
+            name='MutationPositionSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutations', models.IntegerField(default=0)),
+                ('mutations_ligand', models.IntegerField(default=0)),
+                ('foldchange_below_2', models.IntegerField(default=0)),
+                ('foldchange_2_5', models.IntegerField(default=0)),
+                ('foldchange_5_10', models.IntegerField(default=0)),
+                ('foldchange_above_10', models.IntegerField(default=0)),
+                ('interactions', models.IntegerField(default=0)),
+                ('interaction_structures', models.IntegerField(default=0)),
+                ('generic_number', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='residue.ResidueGenericNumber')),
+                ('protein', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='protein.Protein')),
+            ],
+            options={
+                'db_table': 'mutation_position_summary',
+                'unique_together': {('protein', 'generic_number')},
+            },
+        ),
+    ]
@@ -278,3 +278,41 @@ class MutationLigandRef(models.Model):
 
     class Meta():
         db_table = 'mutation_ligand_reference'
+
+
+class MutationCoverage(models.Model):
+    """Number of mutations and ligand interactions per receptor family, built by build_mutation_summary"""
+
+    family = models.OneToOneField('protein.ProteinFamily', on_delete=models.CASCADE)
+    mutations = models.IntegerField(default=0)
+    mutations_annotated = models.IntegerField(default=0) # with a functional effect, fold change, qualitative effect or ligand
+    interactions = models.IntegerField(default=0) # annotated ligand interactions, except polar backbone and accessible
+
+    class Meta():
+        db_table = 'mutation_coverage'
+
+
+class MutationPositionSummary(models.Model):
+    """Mutations and ligand interactions per protein and generic number, built by build_mutation_summary"""
+
+    protein = models.ForeignKey('protein.Protein', on_delete=models.CASCADE)
+    generic_number = models.ForeignKey('residue.ResidueGenericNumber', on_delete=models.CASCADE)
+    mutations = models.IntegerField(default=0)
+    mutations_ligand = models.IntegerField(default=0)
+
+    # mutations by absolute fold change, without those that have no fold change
+    foldchange_below_2 = models.IntegerField(default=0)
+    foldchange_2_5 = models.IntegerField(default=0)
+    foldchange_5_10 = models.IntegerField(default=0)
+    foldchange_above_10 = models.IntegerField(default=0)
+
+    # annotated ligand interactions of structures of this protein
+    interactions = models.IntegerField(default=0)
+    interaction_structures = models.IntegerField(default=0)
+
+    def mutations_foldchange_5(self):
+        return self.foldchange_5_10 + self.foldchange_above_10
+
+    class Meta():
+        db_table = 'mutation_position_summary'
+        unique_together = ('protein', 'generic_number')
@@ -12,6 +12,7 @@ from common.views import AbsTargetSelection
 from common.views import AbsSegmentSelection
 from common.diagrams_gpcr import DrawHelixBox, DrawSnakePlot
 from common import definitions
+from common.excel import table_excel_response
 
 from residue.models import Residue,ResidueNumberingScheme, ResidueGenericNumberEquivalent
 from residue.views import ResidueTablesDisplay
@@ -28,11 +29,9 @@ import os
 import copy
 #env/bin/python3 -m pip install xlrd
 import csv
-from io import BytesIO
 import re
 import math
 import urllib
-import xlsxwriter #sudo pip3 install XlsxWriter
 import operator
 
 Alignment = getattr(__import__('common.alignment_' + settings.SITE_NAME, fromlist=['Alignment']), 'Alignment')
@@ -504,28 +503,7 @@ def render_mutations(request, protein = None, family = None, download = None, re
          ] #'added_by',
 
         #EXCEL SOLUTION
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet()
-
-        col = 0
-        for h in headers:
-            worksheet.write(0, col, h)
-            col += 1
-        row = 1
-        for d in data:
-            col = 0
-            for h in headers:
-                worksheet.write(row, col, d[h])
-                col += 1
-            row += 1
-        workbook.close()
-        output.seek(0)
-        xlsx_data = output.read()
-
-        response = HttpResponse(xlsx_data,content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=GPCRdb_mutant_data.xlsx' #% 'mutations'
-        return response
+        return table_excel_response('GPCRdb_mutant_data.xlsx', headers, data)
 
     else:
         return render(request, 'mutation/list.html', {'mutation_tables':mutation_tables,'mutations': mutations, 'HelixBox':HelixBox, 'SnakePlot':SnakePlot, 'data':context['data'],
@@ -734,92 +712,45 @@ def coverage(request):
 
 
     if 1==1:
-        class_interactions = ResidueFragmentInteraction.objects.filter(structure_ligand_pair__annotated=True).prefetch_related(
-            'rotamer__residue__display_generic_number','interaction_type',
-            'structure_ligand_pair__structure__protein_conformation__protein__parent__family',
-            'structure_ligand_pair__ligand__properities',
-            )
-
-        class_mutations = MutationExperiment.objects.all().prefetch_related('protein__family','protein__parent__family','exp_func','residue__display_generic_number','mutation','refs__web_link', 'exp_qual','ligand').order_by('foldchange','exp_qual')
+        # mutation and interaction counts per receptor family, precomputed by build_mutation_summary
+        family_coverage = MutationCoverage.objects.filter(family__slug__startswith="00").values_list(
+            'family__slug', 'mutations', 'mutations_annotated', 'interactions')
 
         generic = {}
 
-        score_copy = {'score': {'a':0,'i':0,'i_weight':0,'m':0,'m_weight':0,'s':0,'s_weight':0} , 'interaction' : {},'mutation': {}}
-
-        dump_interactions = []
-        for i in class_interactions:
-            fid = i.structure_ligand_pair.structure.protein_conformation.protein.parent.family.slug.split("_")
-            interaction_type = i.interaction_type.slug
-            interaction_type_class = i.interaction_type.type
-            if i.rotamer.residue.display_generic_number:
-                dgn = i.rotamer.residue.display_generic_number.label
-            else:
-                dgn = 'N/A'
-            #dump_interactions.append([dgn,i.rotamer.residue.sequence_number, i.rotamer.residue.amino_acid,i.structure_ligand_pair.structure.pdb_code.index,interaction_type,interaction_type_class,i.interaction_type.name,i.structure_ligand_pair.structure.protein_conformation.protein.parent.entry_name])
-            if interaction_type=='polar_backbone':
-                continue
-            if interaction_type=='acc':
-                continue
-            coverage[fid[0]]['interactions'] += 1
-            coverage[fid[0]]['children'][fid[1]]['interactions'] += 1
-            coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['interactions'] += 1
-            coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['interactions'] += 1
-
-            if coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['interactions']==1: #if first time receptor gets a point
-                coverage[fid[0]]['receptor_i'] += 1
-                coverage[fid[0]]['children'][fid[1]]['receptor_i'] += 1
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_i'] += 1
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['receptor_i'] = 1
-
-                coverage[fid[0]]['fraction_i'] = coverage[fid[0]]['receptor_i']/coverage[fid[0]]['receptor_t']
-                coverage[fid[0]]['children'][fid[1]]['fraction_i'] = coverage[fid[0]]['children'][fid[1]]['receptor_i']/coverage[fid[0]]['children'][fid[1]]['receptor_t']
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['fraction_i'] = coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_i']/coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_t']
-
-        # FOR ALEX
-        # print(dump_interactions)
-        # with open('interactions_dump.csv', 'w', newline='') as myfile:
-        #     wr = csv.writer(myfile, quoting=csv.QUOTE_ALL)
-        #     wr.writerows(dump_interactions)
         total_r = 0
         total_r_un = 0 #unannotated
         total_m = 0 #annotated
         total_m_un = 0 #unannotated
-        for m in class_mutations:
-            # break
-            fid = m.protein.family.slug.split("_")
-            total_m_un += 1
-            coverage[fid[0]]['mutations'] += 1
-            coverage[fid[0]]['children'][fid[1]]['mutations'] += 1
-            coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['mutations'] += 1
-            coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['mutations'] += 1
-
-            if coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['mutations']==1: #if first time receptor gets a point
+        for slug, mutations, mutations_annotated, interactions in family_coverage:
+            fid = slug.split("_")
+            try:
+                receptor = coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]
+            except (KeyError, IndexError):
+                continue
+            levels = [coverage[fid[0]], coverage[fid[0]]['children'][fid[1]],
+                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]]
+
+            for key, count in (('interactions', interactions), ('mutations', mutations),
+                    ('mutations_an', mutations_annotated)):
+                for level in levels + [receptor]:
+                    level[key] += count
+
+            for key, count, fraction in (('receptor_i', interactions, 'fraction_i'),
+                    ('receptor_m', mutations, 'fraction_m'), ('receptor_m_an', mutations_annotated, 'fraction_m_an')):
+                if count: #receptor gets a point
+                    if key != 'receptor_m': # not set on the receptor level
+                        receptor[key] = 1
+                    for level in levels:
+                        level[key] += 1
+                        level[fraction] = level[key]/level['receptor_t']
+
+            total_m_un += mutations
+            total_m += mutations_annotated
+            if mutations:
                 total_r_un += 1
-                coverage[fid[0]]['receptor_m'] += 1
-                coverage[fid[0]]['children'][fid[1]]['receptor_m'] += 1
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_m'] += 1
-
-                coverage[fid[0]]['fraction_m'] = coverage[fid[0]]['receptor_m']/coverage[fid[0]]['receptor_t']
-                coverage[fid[0]]['children'][fid[1]]['fraction_m'] = coverage[fid[0]]['children'][fid[1]]['receptor_m']/coverage[fid[0]]['children'][fid[1]]['receptor_t']
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['fraction_m'] = coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_m']/coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_t']
-
-            if m.exp_func is not None or m.foldchange!=0 or m.exp_qual is not None or m.ligand is not None: #if exp with data
-                total_m += 1
-                coverage[fid[0]]['mutations_an'] += 1
-                coverage[fid[0]]['children'][fid[1]]['mutations_an'] += 1
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['mutations_an'] += 1
-                coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['mutations_an'] += 1
-
-                if coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['mutations_an']==1: #if first time receptor gets a point
-                    total_r += 1
-                    coverage[fid[0]]['receptor_m_an'] += 1
-                    coverage[fid[0]]['children'][fid[1]]['receptor_m_an'] += 1
-                    coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_m_an'] += 1
-                    coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['receptor_m_an'] += 1
-
-                    coverage[fid[0]]['fraction_m_an'] = coverage[fid[0]]['receptor_m_an']/coverage[fid[0]]['receptor_t']
-                    coverage[fid[0]]['children'][fid[1]]['fraction_m_an'] = coverage[fid[0]]['children'][fid[1]]['receptor_m_an']/coverage[fid[0]]['children'][fid[1]]['receptor_t']
-                    coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['fraction_m_an'] = coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_m_an']/coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_t']
+            if mutations_annotated:
+                total_r += 1
 
         print("Total R",total_r,"Total M",total_m," <-- annotated || unannotated -->","Total R",total_r_un,"Total M",total_m_un)
         context['totals'] = {'total_r':total_r,'total_r_un':total_r_un, 'total_m':total_m, 'total_m_un':total_m_un}
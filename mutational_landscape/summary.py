@@ -0,0 +1,297 @@
+"""
+Natural variant summaries of the receptors, built from NaturalMutations and PTMs by build_mutational_landscape.
+
+The variant arrays hold one row per natural variant, ordered by receptor and sequence number: the allele data, the
+residue, the functional sites at the residue (a bit per SITE_TYPES entry) and its functional annotation as shown on
+the variant pages. The PTM arrays hold one row per modified residue. From these the variants by type, the rare and
+common missense variants, the putatively functional variants, the variants at functional sites and the allele
+frequency sum and maximum are aggregated per receptor (receptor_*) and per generic number (gn_*). Missing labels are
+stored as '' and missing scores as NaN. Only plain numpy arrays are stored, in BUILD_DATA_DIR.
+"""
+from common.release import ReleaseArrays
+from interaction.models import ResidueFragmentInteraction
+from mutational_landscape.models import NaturalMutations, PTMs
+from residue.models import ResiduePositionSet
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+# increase when the stored arrays change, older data is then rebuilt from the database
+VARIANT_SUMMARY_FORMAT_VERSION = 1
+
+# functional sites in the order of the functional annotation, bit i of the site flags is SITE_TYPES[i]
+SITE_TYPES = ['SodiumPocket', 'MicroSwitch', 'PTM', 'LB', 'GP']
+SITE_RESIDUE_SETS = OrderedDict([('SodiumPocket', 'Sodium ion pocket'), ('MicroSwitch', 'State (micro-)switches'),
+    ('GP', 'G-protein interface')])
+
+# missense variants below this allele frequency are rare, the others common
+RARE_ALLELE_FREQUENCY = 0.001
+
+# missense variants with a SIFT score up to or a PolyPhen score from these are putatively deleterious
+SIFT_DELETERIOUS = 0.05
+POLYPHEN_DELETERIOUS = 0.1
+
+VARIANT_COLUMNS = ['entry_name', 'protein', 'sequence_number', 'orig_amino_acid', 'generic_number',
+    'display_generic_number', 'segment', 'amino_acid', 'type', 'allele_frequency', 'allele_count', 'allele_number',
+    'number_homozygotes', 'sift_score', 'polyphen_score', 'functional_annotation']
+
+AGGREGATES = ['types', 'distinct', 'rare_missense', 'common_missense', 'putative_functional',
+    'site_variants', 'allele_frequency_sum', 'allele_frequency_max']
+
+
+def residue_set_labels(name):
+    """Generic numbers of a residue position set, empty if build_residue_sets did not create it"""
+    return set(ResiduePositionSet.objects.filter(name=name, residue_position__isnull=False).values_list(
+        'residue_position__label', flat=True))
+
+def ligand_interaction_types():
+    """Ligand interaction types of the residues of the receptor structures, by receptor family and sequence number"""
+    interaction_types = {}
+    for family_slug, sequence_number, interaction_type in ResidueFragmentInteraction.objects.filter(
+        structure_ligand_pair__annotated=True, rotamer__residue__generic_number__isnull=False).exclude(
+        interaction_type__type='hidden').order_by('id').values_list(
+        'structure_ligand_pair__structure__protein_conformation__protein__parent__family__slug',
+        'rotamer__residue__sequence_number', 'interaction_type__name'):
+        types = interaction_types.setdefault((family_slug, sequence_number), [])
+        if interaction_type not in types:
+            types.append(interaction_type)
+    return interaction_types
+
+def functional_annotation(sites, modification=None, interaction_types=None):
+    """The functional sites of a residue as shown on the variant pages, '' without any"""
+    annotation = ''
+    for i, site in enumerate(SITE_TYPES):
+        if not sites & (1 << i):
+            continue
+        if site == 'PTM':
+            annotation += 'PTM (' + modification + ') '
+        elif site == 'LB':
+            annotation += 'LB (' + ', '.join(interaction_types) + ') '
+        elif site == 'GP':
+            annotation += 'GP (contact) '
+        else:
+            annotation += site + ' '
+    return annotation
+
+def variant_effect(variant_type, sift_score, polyphen_score):
+    """'deleterious' or 'tolerated' for missense variants by their scores, 'unknown' without scores. Other variants
+    (stop gained, frameshift) are deleterious"""
+    if variant_type != 'missense':
+        return 'deleterious'
+    if sift_score is None or polyphen_score is None:
+        return 'unknown'
+    if sift_score <= SIFT_DELETERIOUS or polyphen_score >= POLYPHEN_DELETERIOUS:
+        return 'deleterious'
+    return 'tolerated'
+
+def nan_to_none(values):
+    return [None if v != v else v for v in values]
+
+
+class VariantSummary(ReleaseArrays):
+    """Natural variants and PTMs of the receptors with their per receptor and per generic number aggregates"""
+
+    FILENAME = 'variant_summary.npz'
+    FORMAT_VERSION = VARIANT_SUMMARY_FORMAT_VERSION
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.receptors = {e: i for i, e in enumerate(arrays['entry_names'].tolist())}
+        self.generic_numbers = {g: i for i, g in enumerate(arrays['generic_numbers'].tolist())}
+        self.types = {t: i for i, t in enumerate(arrays['types'].tolist())}
+
+    @classmethod
+    def from_database(cls):
+        variants = list(NaturalMutations.objects.order_by('protein__entry_name', 'residue__sequence_number',
+            'id').values_list('protein__entry_name', 'protein__name', 'protein__family__slug',
+            'residue__sequence_number', 'residue__amino_acid', 'residue__generic_number__label',
+            'residue__display_generic_number__label', 'residue__protein_segment__slug', 'amino_acid', 'type',
+            'allele_frequency', 'allele_count', 'allele_number', 'number_homozygotes', 'sift_score',
+            'polyphen_score'))
+        ptms = list(PTMs.objects.order_by('protein__entry_name', 'residue__sequence_number', 'id').values_list(
+            'protein__entry_name', 'protein__name', 'protein__family__slug', 'residue__sequence_number',
+            'modification'))
+
+        receptors = OrderedDict((r[0], r[1:]) for r in sorted(set(v[:3] for v in variants) | set(p[:3] for p in ptms)))
+        entry_names = list(receptors)
+        receptor_index = {e: i for i, e in enumerate(entry_names)}
+        generic_numbers = sorted(set(v[5] for v in variants if v[5]))
+        gn_index = {g: i for i, g in enumerate(generic_numbers)}
+        types = sorted(set(v[9] for v in variants), key=lambda t: (t != 'missense', t))
+        type_index = {t: i for i, t in enumerate(types)}
+
+        # a residue with several modifications is annotated with the last one, as on the variant pages
+        modifications = {(p[0], p[3]): p[4] for p in ptms}
+        site_labels = {site: residue_set_labels(name) for site, name in SITE_RESIDUE_SETS.items()}
+        interaction_types = ligand_interaction_types()
+
+        sites = []
+        annotations = []
+        for v in variants:
+            flags = 0
+            for i, site in enumerate(SITE_TYPES):
+                if site == 'PTM':
+                    found = (v[0], v[3]) in modifications
+                elif site == 'LB':
+                    found = (v[2], v[3]) in interaction_types
+                else:
+                    found = v[5] in site_labels[site]
+                if found:
+                    flags |= 1 << i
+            sites.append(flags)
+            annotations.append(functional_annotation(flags, modifications.get((v[0], v[3])),
+                interaction_types.get((v[2], v[3]))))
+
+        arrays = {
+            'version': np.array(VARIANT_SUMMARY_FORMAT_VERSION),
+            'entry_names': np.array(entry_names, dtype=str),
+            'names': np.array([receptors[e][0] for e in entry_names], dtype=str),
+            'family_slugs': np.array([receptors[e][1] for e in entry_names], dtype=str),
+            'generic_numbers': np.array(generic_numbers, dtype=str),
+            'types': np.array(types, dtype=str),
+            'site_types': np.array(SITE_TYPES, dtype=str),
+            'variant_receptor': np.array([receptor_index[v[0]] for v in variants], dtype=np.int32),
+            'variant_gn': np.array([gn_index[v[5]] if v[5] else -1 for v in variants], dtype=np.int32),
+            'variant_type': np.array([type_index[v[9]] for v in variants], dtype=np.int32),
+            'sequence_number': np.array([v[3] for v in variants], dtype=np.int32),
+            'orig_amino_acid': np.array([v[4] for v in variants], dtype=str),
+            'display_generic_number': np.array([v[6] or '' for v in variants], dtype=str),
+            'segment': np.array([v[7] or '' for v in variants], dtype=str),
+            'amino_acid': np.array([v[8] for v in variants], dtype=str),
+            'allele_frequency': np.array([v[10] for v in variants], dtype=float),
+            'allele_count': np.array([v[11] for v in variants], dtype=np.int64),
+            'allele_number': np.array([v[12] for v in variants], dtype=np.int64),
+            'number_homozygotes': np.array([v[13] for v in variants], dtype=np.int64),
+            'sift_score': np.array([np.nan if v[14] is None else v[14] for v in variants], dtype=float),
+            'polyphen_score': np.array([np.nan if v[15] is None else v[15] for v in variants], dtype=float),
+            'sites': np.array(sites, dtype=np.uint8),
+            'functional_annotation': np.array(annotations, dtype=str),
+            'ptm_receptor': np.array([receptor_index[p[0]] for p in ptms], dtype=np.int32),
+            'ptm_sequence_number': np.array([p[3] for p in ptms], dtype=np.int32),
+            'ptm_modification': np.array([p[4] for p in ptms], dtype=str),
+            }
+        return cls.from_arrays(arrays)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """The summary of the variant and PTM arrays, with the per receptor and per generic number aggregates added"""
+        entry_names, generic_numbers = arrays['entry_names'], arrays['generic_numbers']
+        selected = arrays['variant_gn'] >= 0
+        for prefix, keys, size, other, mask in [
+            ('receptor_', arrays['variant_receptor'], len(entry_names), arrays['sequence_number'], None),
+            ('gn_', arrays['variant_gn'], len(generic_numbers), arrays['variant_receptor'], selected)]:
+            for name, values in cls.aggregate(arrays, keys, size, other, mask).items():
+                arrays[prefix + name] = values
+        return cls(arrays)
+
+    @staticmethod
+    def aggregate(arrays, keys, size, other, mask=None):
+        """AGGREGATES of the variants by keys (indices below size), 'distinct' counts the distinct values of other
+        (sequence numbers or receptors) of each key. Only the variants in mask if given"""
+        rows = mask if mask is not None else slice(None)
+        keys = keys[rows]
+        other = other[rows]
+        variant_type = arrays['variant_type'][rows]
+        allele_frequency = arrays['allele_frequency'][rows]
+        types = arrays['types'].tolist()
+        missense = variant_type == types.index('missense') if 'missense' in types else np.zeros(len(keys), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            putative = (arrays['sift_score'][rows] <= SIFT_DELETERIOUS) | \
+                (arrays['polyphen_score'][rows] >= POLYPHEN_DELETERIOUS)
+
+        by_type = np.zeros((size, len(types)), dtype=np.int64)
+        np.add.at(by_type, (keys, variant_type), 1)
+        distinct = np.zeros(size, dtype=np.int64)
+        if len(keys):
+            np.add.at(distinct, np.unique(np.stack([keys, other]), axis=1)[0], 1)
+        frequency_max = np.zeros(size)
+        np.maximum.at(frequency_max, keys, allele_frequency)
+
+        def count(selected):
+            return np.bincount(keys, selected, size).astype(np.int64)
+
+        return OrderedDict([
+            ('types', by_type),
+            ('distinct', distinct),
+            ('rare_missense', count(missense & (allele_frequency < RARE_ALLELE_FREQUENCY))),
+            ('common_missense', count(missense & (allele_frequency >= RARE_ALLELE_FREQUENCY))),
+            ('putative_functional', count(putative)),
+            ('site_variants', count(arrays['sites'][rows] != 0)),
+            ('allele_frequency_sum', np.bincount(keys, allele_frequency, size)),
+            ('allele_frequency_max', frequency_max),
+            ])
+
+    def variant_indices(self, entry_names):
+        """Rows of the variants of the receptors, in the order of the receptors and by sequence number"""
+        receptors = [self.receptors[e] for e in entry_names if e in self.receptors]
+        if not receptors:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.flatnonzero(self.arrays['variant_receptor'] == r) for r in receptors])
+
+    def variants(self, entry_names):
+        """The variants of the receptors as dicts (VARIANT_COLUMNS), missing scores as None"""
+        rows = self.variant_indices(entry_names)
+        receptors = self.arrays['variant_receptor'][rows]
+        gns = self.arrays['variant_gn'][rows]
+        generic_numbers = self.arrays['generic_numbers'].tolist()
+        columns = {
+            'entry_name': self.arrays['entry_names'][receptors].tolist(),
+            'protein': self.arrays['names'][receptors].tolist(),
+            'generic_number': [generic_numbers[g] if g >= 0 else '' for g in gns.tolist()],
+            'type': self.arrays['types'][self.arrays['variant_type'][rows]].tolist(),
+            }
+        for column in VARIANT_COLUMNS:
+            if column not in columns:
+                columns[column] = self.arrays[column][rows].tolist()
+        columns['sift_score'] = nan_to_none(columns['sift_score'])
+        columns['polyphen_score'] = nan_to_none(columns['polyphen_score'])
+        return [dict(zip(VARIANT_COLUMNS, values)) for values in zip(*[columns[c] for c in VARIANT_COLUMNS])]
+
+    def modifications(self, entry_name):
+        """PTMs of a receptor by sequence number, the last one of a residue with several"""
+        if entry_name not in self.receptors:
+            return OrderedDict()
+        rows = np.flatnonzero(self.arrays['ptm_receptor'] == self.receptors[entry_name])
+        return OrderedDict(zip(self.arrays['ptm_sequence_number'][rows].tolist(),
+            self.arrays['ptm_modification'][rows].tolist()))
+
+    def receptor_value(self, entry_name, aggregate):
+        """An aggregate (AGGREGATES) of a receptor, 0 without variants. 'types' is a dict by variant type,
+        'distinct' the number of residues with variants"""
+        return self._value('receptor_', self.receptors.get(entry_name), aggregate)
+
+    def generic_number_value(self, generic_number, aggregate):
+        """An aggregate (AGGREGATES) of a generic number over all receptors, 0 without variants. 'types' is a dict
+        by variant type, 'distinct' the number of receptors with variants at the generic number"""
+        return self._value('gn_', self.generic_numbers.get(generic_number), aggregate)
+
+    def _value(self, prefix, index, aggregate):
+        if aggregate == 'types':
+            if index is None:
+                return OrderedDict((t, 0) for t in self.types)
+            return OrderedDict(zip(self.types, self.arrays[prefix + 'types'][index].tolist()))
+        if index is None:
+            return 0
+        return self.arrays[prefix + aggregate][index].item()
+
+    def totals(self):
+        """Variant counts of all receptors: receptors with missense variants, missense and other variants and rare
+        and common missense variants"""
+        types = self.arrays['receptor_types']
+        missense = types[:, self.types['missense']] if 'missense' in self.types else np.zeros(len(types),
+            dtype=np.int64)
+        return {
+            'receptors_missense': int(np.count_nonzero(missense)),
+            'missense': int(missense.sum()),
+            'other': int(types.sum() - missense.sum()),
+            'rare_missense': int(self.arrays['receptor_rare_missense'].sum()),
+            'common_missense': int(self.arrays['receptor_common_missense'].sum()),
+            }
+
+
+def get_variant_summary():
+    """The VariantSummary of the current data release, built from the database if build_mutational_landscape did not
+    store it"""
+    return VariantSummary.current()
@@ -0,0 +1,121 @@
+from django.test import SimpleTestCase
+
+from mutational_landscape.summary import (SITE_TYPES, VARIANT_SUMMARY_FORMAT_VERSION, VariantSummary,
+    functional_annotation, variant_effect)
+
+import numpy as np
+import os
+import shutil
+import tempfile
+
+
+# entry name, sequence number, generic number, type, allele frequency, sift score, polyphen score, site flags
+VARIANTS = [
+    ('5ht1a_human', 10, '1x50', 'missense', 0.0005, 0.01, 0.5, 0),
+    ('5ht1a_human', 10, '1x50', 'missense', 0.002, 0.2, 0.05, 0b10),
+    ('5ht1a_human', 40, '', 'stop gained', 0.0001, None, None, 0),
+    ('aa2ar_human', 12, '1x50', 'missense', 0.01, None, None, 0b1),
+    ]
+
+def make_summary():
+    entry_names = ['5ht1a_human', 'aa2ar_human']
+    generic_numbers = ['1x50']
+    types = ['missense', 'stop gained']
+    return VariantSummary.from_arrays({
+        'version': np.array(VARIANT_SUMMARY_FORMAT_VERSION),
+        'entry_names': np.array(entry_names),
+        'names': np.array(['5-HT<sub>1A</sub> receptor', 'Adenosine receptor A2a']),
+        'family_slugs': np.array(['001_001_001_001', '001_006_001_001']),
+        'generic_numbers': np.array(generic_numbers),
+        'types': np.array(types),
+        'site_types': np.array(SITE_TYPES),
+        'variant_receptor': np.array([entry_names.index(v[0]) for v in VARIANTS], dtype=np.int32),
+        'variant_gn': np.array([generic_numbers.index(v[2]) if v[2] else -1 for v in VARIANTS], dtype=np.int32),
+        'variant_type': np.array([types.index(v[3]) for v in VARIANTS], dtype=np.int32),
+        'sequence_number': np.array([v[1] for v in VARIANTS], dtype=np.int32),
+        'orig_amino_acid': np.array(['D', 'D', 'W', 'N']),
+        'display_generic_number': np.array(['1.50x50', '1.50x50', '', '1.50x50']),
+        'segment': np.array(['TM1', 'TM1', 'TM2', 'TM1']),
+        'amino_acid': np.array(['N', 'E', '*', 'K']),
+        'allele_frequency': np.array([v[4] for v in VARIANTS]),
+        'allele_count': np.array([1, 5, 1, 20], dtype=np.int64),
+        'allele_number': np.array([2000, 2500, 10000, 2000], dtype=np.int64),
+        'number_homozygotes': np.array([0, 0, 0, 1], dtype=np.int64),
+        'sift_score': np.array([np.nan if v[5] is None else v[5] for v in VARIANTS]),
+        'polyphen_score': np.array([np.nan if v[6] is None else v[6] for v in VARIANTS]),
+        'sites': np.array([v[7] for v in VARIANTS], dtype=np.uint8),
+        'functional_annotation': np.array([functional_annotation(v[7]) for v in VARIANTS]),
+        'ptm_receptor': np.array([0, 0], dtype=np.int32),
+        'ptm_sequence_number': np.array([40, 40], dtype=np.int32),
+        'ptm_modification': np.array(['Phosphorylation', 'Glycosylation']),
+        })
+
+
+class VariantSummaryTest(SimpleTestCase):
+    """The aggregates of the summary are those of counting the variants one by one"""
+
+    def setUp(self):
+        self.summary = make_summary()
+
+    def test_annotation(self):
+        self.assertEqual(functional_annotation(0b10), 'MicroSwitch ')
+        self.assertEqual(functional_annotation(0b1101, 'Phosphorylation', ['hydrophobic', 'polar']),
+            'SodiumPocket PTM (Phosphorylation) LB (hydrophobic, polar) ')
+        self.assertEqual(variant_effect('missense', 0.2, 0.05), 'tolerated')
+        self.assertEqual(variant_effect('missense', 0.01, 0.05), 'deleterious')
+        self.assertEqual(variant_effect('missense', None, 0.05), 'unknown')
+        self.assertEqual(variant_effect('stop gained', None, None), 'deleterious')
+
+    def test_receptor_values(self):
+        for entry_name in ['5ht1a_human', 'aa2ar_human']:
+            variants = [v for v in VARIANTS if v[0] == entry_name]
+            missense = [v for v in variants if v[3] == 'missense']
+            self.assertEqual(self.summary.receptor_value(entry_name, 'types'),
+                {t: len([v for v in variants if v[3] == t]) for t in ['missense', 'stop gained']})
+            self.assertEqual(self.summary.receptor_value(entry_name, 'distinct'), len({v[1] for v in variants}))
+            self.assertEqual(self.summary.receptor_value(entry_name, 'rare_missense'),
+                len([v for v in missense if v[4] < 0.001]))
+            self.assertEqual(self.summary.receptor_value(entry_name, 'common_missense'),
+                len([v for v in missense if v[4] >= 0.001]))
+            self.assertEqual(self.summary.receptor_value(entry_name, 'putative_functional'),
+                len([v for v in variants if v[5] is not None and (v[5] <= 0.05 or v[6] >= 0.1)]))
+            self.assertEqual(self.summary.receptor_value(entry_name, 'site_variants'),
+                len([v for v in variants if v[7]]))
+            self.assertAlmostEqual(self.summary.receptor_value(entry_name, 'allele_frequency_sum'),
+                sum(v[4] for v in variants))
+            self.assertEqual(self.summary.receptor_value(entry_name, 'allele_frequency_max'),
+                max(v[4] for v in variants))
+        self.assertEqual(self.summary.receptor_value('unknown_human', 'rare_missense'), 0)
+
+    def test_generic_number_values(self):
+        self.assertEqual(self.summary.generic_number_value('1x50', 'types'), {'missense': 3, 'stop gained': 0})
+        # receptors with variants at the position
+        self.assertEqual(self.summary.generic_number_value('1x50', 'distinct'), 2)
+        self.assertEqual(self.summary.generic_number_value('1x50', 'site_variants'), 2)
+        self.assertEqual(self.summary.generic_number_value('2x50', 'types'), {'missense': 0, 'stop gained': 0})
+
+    def test_totals(self):
+        self.assertEqual(self.summary.totals(), {'receptors_missense': 2, 'missense': 3, 'other': 1,
+            'rare_missense': 1, 'common_missense': 2})
+
+    def test_variants(self):
+        variants = self.summary.variants(['aa2ar_human', '5ht1a_human'])
+        self.assertEqual([(v['entry_name'], v['sequence_number']) for v in variants],
+            [('aa2ar_human', 12), ('5ht1a_human', 10), ('5ht1a_human', 10), ('5ht1a_human', 40)])
+        self.assertIsNone(variants[0]['sift_score'])
+        self.assertEqual(variants[3]['generic_number'], '')
+        # the last modification of a residue
+        self.assertEqual(self.summary.modifications('5ht1a_human'), {40: 'Glycosylation'})
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'variant_summary.npz')
+        self.assertIsNone(VariantSummary.load(filename))
+        self.summary.save(filename)
+        loaded = VariantSummary.load(filename)
+        # the arrays are read when loaded
+        self.assertIsInstance(loaded.arrays, dict)
+        self.assertEqual(sorted(loaded.arrays), sorted(self.summary.arrays))
+        self.assertEqual(loaded.variants(['5ht1a_human']), self.summary.variants(['5ht1a_human']))
+        self.assertEqual(loaded.totals(), self.summary.totals())
@@ -7,14 +7,15 @@ try:
 except:
     cache_variation = cache
 
-from django.db.models import Count, Min, Sum, Avg, Q
+from django.db.models import Min, Sum, Avg
 from django.views.decorators.cache import cache_page
 
 import hashlib
 
 from protein.models import Protein, ProteinConformation, ProteinAlias, ProteinFamily, Gene, ProteinGProtein, ProteinGProteinPair
-from residue.models import Residue, ResiduePositionSet, ResidueSet
-from mutational_landscape.models import NaturalMutations, CancerMutations, DiseaseMutations, PTMs, NHSPrescribings
+from residue.models import Residue, ResidueSet
+from mutational_landscape.models import CancerMutations, DiseaseMutations, NHSPrescribings
+from mutational_landscape.summary import get_variant_summary, variant_effect
 
 from common.diagrams_gpcr import DrawHelixBox, DrawSnakePlot
 
@@ -28,6 +29,8 @@ from interaction.views import ajax #import x-tal interactions
 
 from common import definitions
 from collections import OrderedDict
+from common.excel import table_excel_response
+from common.release import release_conditional
 from common.views import AbsTargetSelection
 from common.views import AbsSegmentSelection
 from family.views import linear_gradient, color_dict, RGB_to_hex, hex_to_RGB
@@ -35,15 +38,11 @@ from family.views import linear_gradient, color_dict, RGB_to_hex, hex_to_RGB
 import re
 import json
 import numpy as np
-from collections import OrderedDict
 from copy import deepcopy
 
-from io import BytesIO
-import re
 import math
 import unicodedata
 import urllib
-import xlsxwriter #sudo pip3 install XlsxWriter
 import operator
 import string
 
@@ -67,6 +66,9 @@ class TargetSelection(AbsTargetSelection):
     }
     default_species = False
 
+# colors of the missense variants by effect, the others are loss of function variants
+MISSENSE_COLORS = {'deleterious': '#e30e0e', 'tolerated': '#70c070', 'unknown': '#818181'}
+
 #@cache_page(60*60*24*21)
 def render_variants(request, protein=None, family=None, download=None, receptor_class=None, gn=None, aa=None, **response_kwargs):
 
@@ -108,64 +110,8 @@ def render_variants(request, protein=None, family=None, download=None, receptor_
     # Caching results for unique protein sets
     cache_key = "VARIATION_"+hashlib.md5(str(proteins).encode('utf-8')).hexdigest()
     if not cache_variation.has_key(cache_key):
-        NMs = NaturalMutations.objects.filter(Q(protein__in=proteins)).prefetch_related('residue__generic_number','residue__display_generic_number','residue__protein_segment','protein')
-        ptms = PTMs.objects.filter(Q(protein__in=proteins)).prefetch_related('residue')
-        ptms_dict = {}
-
-        ## MICROSWITCHES
-        micro_switches_rset = ResiduePositionSet.objects.get(name="State (micro-)switches")
-        ms_label = []
-        for residue in micro_switches_rset.residue_position.all():
-            ms_label.append(residue.label)
-
-        ms_object = Residue.objects.filter(protein_conformation__protein=proteins[0], generic_number__label__in=ms_label)
-        ms_sequence_numbers = []
-        for ms in ms_object:
-            ms_sequence_numbers.append(ms.sequence_number)
-
-        ## SODIUM POCKET
-        sodium_pocket_rset = ResiduePositionSet.objects.get(name="Sodium ion pocket")
-        sp_label = []
-        for residue in sodium_pocket_rset.residue_position.all():
-            sp_label.append(residue.label)
-
-        sp_object = Residue.objects.filter(protein_conformation__protein=proteins[0], generic_number__label__in=ms_label)
-        sp_sequence_numbers = []
-        for sp in sp_object:
-            sp_sequence_numbers.append(sp.sequence_number)
-
-        for ptm in ptms:
-            ptms_dict[ptm.residue.sequence_number] = ptm.modification
-
-        ## G PROTEIN INTERACTION POSITIONS
-        # THIS SHOULD BE CLASS SPECIFIC (different set)
-        rset = ResiduePositionSet.objects.get(name='G-protein interface')
-        gprotein_generic_set = []
-        for residue in rset.residue_position.all():
-            gprotein_generic_set.append(residue.label)
-
-        ### GET LB INTERACTION DATA
-        # get also ortholog proteins, which might have been crystallised to extract
-        # interaction data also from those
-        if protein:
-            orthologs = Protein.objects.filter(family__slug=proteins[0].family.slug, sequence_type__slug='wt')
-        else:
-            orthologs = Protein.objects.filter(family__slug__startswith=proteins[0].family.slug, sequence_type__slug='wt')
-
-        interactions = ResidueFragmentInteraction.objects.filter(
-            structure_ligand_pair__structure__protein_conformation__protein__parent__in=orthologs, structure_ligand_pair__annotated=True).exclude(interaction_type__type ='hidden').all()
-        interaction_data = {}
-        for interaction in interactions:
-            if interaction.rotamer.residue.generic_number:
-                sequence_number = interaction.rotamer.residue.sequence_number
-                # sequence_number = lookup[interaction.rotamer.residue.generic_number.label]
-                label = interaction.rotamer.residue.generic_number.label
-                aa = interaction.rotamer.residue.amino_acid
-                interactiontype = interaction.interaction_type.name
-                if sequence_number not in interaction_data:
-                    interaction_data[sequence_number] = []
-                if interactiontype not in interaction_data[sequence_number]:
-                    interaction_data[sequence_number].append(interactiontype)
+        # the variants with their functional sites, from the summary of build_mutational_landscape
+        variants = get_variant_summary().variants([p.entry_name for p in proteins])
 
         # Fixes fatal error - in case of receptor family selection (e.g. H1 receptors)
         if target_type == 'family' and len(proteins[0].family.slug) < 15:
@@ -175,50 +121,26 @@ def render_variants(request, protein=None, family=None, download=None, receptor_
             residuelist = Residue.objects.filter(protein_conformation__protein=proteins[0]).prefetch_related('protein_segment', 'display_generic_number', 'generic_number')
 
         jsondata = {}
-        for NM in NMs:
-            functional_annotation = ''
-            SN = NM.residue.sequence_number
-            if NM.residue.generic_number:
-                GN = NM.residue.generic_number.label
-            else:
-                GN = ''
-            if SN in sp_sequence_numbers:
-                functional_annotation += 'SodiumPocket '
-            if SN in ms_sequence_numbers:
-                functional_annotation += 'MicroSwitch '
-            if SN in ptms_dict:
-                functional_annotation += 'PTM (' + ptms_dict[SN] + ') '
-            if SN in interaction_data:
-                functional_annotation += 'LB (' + ', '.join(interaction_data[SN]) + ') '
-            if GN in gprotein_generic_set:
-                functional_annotation += 'GP (contact) '
-
-            ms_type = NM.type
-            if ms_type == 'missense':
-                effect = 'deleterious' if NM.sift_score <= 0.05 or NM.polyphen_score >= 0.1 else 'tolerated'
-                color = '#e30e0e' if NM.sift_score <= 0.05 or NM.polyphen_score >= 0.1 else '#70c070'
-            else:
-                effect = 'deleterious'
-                color = '#575c9d'
+        for v in variants:
+            effect = variant_effect(v['type'], v['sift_score'], v['polyphen_score'])
+            color = MISSENSE_COLORS[effect] if v['type'] == 'missense' else '#575c9d'
             # account for multiple mutations at this position!
-            NM.functional_annotation = functional_annotation
-            # print(NM.functional_annotation)
-            jsondata[SN] = [NM.amino_acid, NM.allele_frequency, NM.allele_count, NM.allele_number, NM.number_homozygotes, NM.type, effect, color, functional_annotation]
+            jsondata[v['sequence_number']] = [v['amino_acid'], v['allele_frequency'], v['allele_count'], v['allele_number'], v['number_homozygotes'], v['type'], effect, color, v['functional_annotation']]
 
 
         natural_mutation_list = {}
         max_snp_pos = 1
-        for NM in NMs:
-            if NM.residue.generic_number:
-                if NM.residue.generic_number.label in natural_mutation_list:
-                    natural_mutation_list[NM.residue.generic_number.label]['val'] += 1
-                    if not str(NM.amino_acid) in natural_mutation_list[NM.residue.generic_number.label]['AA']:
-                        natural_mutation_list[NM.residue.generic_number.label]['AA'] = natural_mutation_list[NM.residue.generic_number.label]['AA'] + str(NM.amino_acid) + ' '
-
-                    if natural_mutation_list[NM.residue.generic_number.label]['val'] > max_snp_pos:
-                        max_snp_pos = natural_mutation_list[NM.residue.generic_number.label]['val']
+        for v in variants:
+            if v['generic_number']:
+                if v['generic_number'] in natural_mutation_list:
+                    natural_mutation_list[v['generic_number']]['val'] += 1
+                    if not str(v['amino_acid']) in natural_mutation_list[v['generic_number']]['AA']:
+                        natural_mutation_list[v['generic_number']]['AA'] = natural_mutation_list[v['generic_number']]['AA'] + str(v['amino_acid']) + ' '
+
+                    if natural_mutation_list[v['generic_number']]['val'] > max_snp_pos:
+                        max_snp_pos = natural_mutation_list[v['generic_number']]['val']
                 else:
-                    natural_mutation_list[NM.residue.generic_number.label] = {'val':1, 'AA': NM.amino_acid + ' '}
+                    natural_mutation_list[v['generic_number']] = {'val':1, 'AA': v['amino_acid'] + ' '}
 
         jsondata_natural_mutations = {}
 
@@ -234,162 +156,49 @@ def render_variants(request, protein=None, family=None, download=None, receptor_
         SnakePlot = DrawSnakePlot(residuelist, "Class A", protein, nobuttons=1)
         HelixBox = DrawHelixBox(residuelist, 'Class A', protein, nobuttons=1)
 
-        cache_data = {'mutations': NMs, 'type': target_type, 'HelixBox': HelixBox, 'SnakePlot': SnakePlot, 'receptor': str(proteins[0].entry_name), 'mutations_pos_list': json.dumps(jsondata), 'natural_mutations_pos_list': json.dumps(jsondata_natural_mutations)}
+        cache_data = {'mutations': variants, 'type': target_type, 'HelixBox': HelixBox, 'SnakePlot': SnakePlot, 'receptor': str(proteins[0].entry_name), 'mutations_pos_list': json.dumps(jsondata), 'natural_mutations_pos_list': json.dumps(jsondata_natural_mutations)}
         cache_variation.set(cache_key, cache_data, 60*60*24*21)
     else:
         cache_data = cache_variation.get(cache_key)
 
     # EXCEL TABLE EXPORT
     if download:
-        data = []
-        for r in cache_data['mutations']:
-            values = r.__dict__
-            complete = {'protein': r.protein.name, 'sequence_number': r.residue.sequence_number, 'orig_amino_acid': r.residue.amino_acid}
-            complete.update(values)
-            data.append(complete)
         headers = ['protein', 'sequence_number', 'orig_amino_acid', 'type', 'amino_acid', 'allele_count', 'allele_number', 'allele_frequency', 'polyphen_score', 'sift_score', 'number_homozygotes', 'functional_annotation']
+        data = [[str(d[h]) for h in headers] for d in cache_data['mutations']]
 
-        # EXCEL SOLUTION
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet()
-
-        col = 0
-        for h in headers:
-            worksheet.write(0, col, h)
-            col += 1
-        row = 1
-        for d in data:
-            col = 0
-            for h in headers:
-                worksheet.write(row, col, str(d[h]))
-                col += 1
-            row += 1
-        workbook.close()
-        output.seek(0)
-        xlsx_data = output.read()
-
-        response = HttpResponse(xlsx_data, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
         if target_type == 'family':
-            response['Content-Disposition'] = 'attachment; filename=' + clean_filename('GPCRdb_' + str(familyname) + '_variant_data.xlsx')  # % 'mutations'
+            filename = clean_filename('GPCRdb_' + str(familyname) + '_variant_data.xlsx')
         else:
-            response['Content-Disposition'] = 'attachment; filename=GPCRdb_' + proteins[0].entry_name + '_variant_data.xlsx'  # % 'mutations'
-        return response
+            filename = 'GPCRdb_' + proteins[0].entry_name + '_variant_data.xlsx'
+        return table_excel_response(filename, headers, data)
 
     return render(request, 'browser.html', cache_data)
 
+@release_conditional
 def ajaxNaturalMutation(request, slug, **response_kwargs):
 
     name_of_cache = 'ajaxNaturalMutation_'+slug
 
-    ptms = PTMs.objects.filter(protein__entry_name=slug).prefetch_related('residue')
-    ptms_dict = {}
-
-    for ptm in ptms:
-        ptms_dict[ptm.residue.sequence_number] = ptm.modification
-
-    ## MICROSWITCHES
-    micro_switches_rset = ResiduePositionSet.objects.get(name="State (micro-)switches")
-    ms_label = []
-    for residue in micro_switches_rset.residue_position.all():
-        ms_label.append(residue.label)
-
-    ms_object = Residue.objects.filter(protein_conformation__protein__entry_name=slug, generic_number__label__in=ms_label)
-    ms_sequence_numbers = []
-    for ms in ms_object:
-        ms_sequence_numbers.append(ms.sequence_number)
-
-    ## SODIUM POCKET
-    sodium_pocket_rset = ResiduePositionSet.objects.get(name="Sodium ion pocket")
-    sp_label = []
-    for residue in sodium_pocket_rset.residue_position.all():
-        sp_label.append(residue.label)
-
-    sp_object = Residue.objects.filter(protein_conformation__protein__entry_name=slug, generic_number__label__in=ms_label)
-    sp_sequence_numbers = []
-    for sp in sp_object:
-        sp_sequence_numbers.append(sp.sequence_number)
-
-    ## G PROTEIN INTERACTION POSITIONS
-    # THIS SHOULD BE CLASS SPECIFIC (different set)
-    rset = ResiduePositionSet.objects.get(name='G-protein interface')
-    gprotein_generic_set = []
-    for residue in rset.residue_position.all():
-        gprotein_generic_set.append(residue.label)
-
-    ### GET LB INTERACTION DATA
-    # get also ortholog proteins, which might have been crystallised to extract
-    # interaction data also from those
-    p = Protein.objects.get(entry_name=slug)
-    orthologs = Protein.objects.filter(family__slug__startswith=p.family.slug, sequence_type__slug='wt')
-
-    interactions = ResidueFragmentInteraction.objects.filter(
-        structure_ligand_pair__structure__protein_conformation__protein__parent__in=orthologs, structure_ligand_pair__annotated=True).exclude(interaction_type__type ='hidden').order_by('rotamer__residue__sequence_number')
-    interaction_data = {}
-    for interaction in interactions:
-        if interaction.rotamer.residue.generic_number:
-            sequence_number = interaction.rotamer.residue.sequence_number
-            # sequence_number = lookup[interaction.rotamer.residue.generic_number.label]
-            label = interaction.rotamer.residue.generic_number.label
-            aa = interaction.rotamer.residue.amino_acid
-            interactiontype = interaction.interaction_type.name
-            if sequence_number not in interaction_data:
-                interaction_data[sequence_number] = []
-            if interactiontype not in interaction_data[sequence_number]:
-                interaction_data[sequence_number].append(interactiontype)
-
     jsondata = cache.get(name_of_cache)
 
     if jsondata == None:
         jsondata = {}
 
-        NMs = NaturalMutations.objects.filter(protein__entry_name=slug).prefetch_related('residue')
-
-        for NM in NMs:
-
-            SN = NM.residue.sequence_number
-            type = NM.type
+        for v in get_variant_summary().variants([slug]):
+            effect = variant_effect(v['type'], v['sift_score'], v['polyphen_score'])
+            color = MISSENSE_COLORS[effect] if v['type'] == 'missense' else '#65368e'
 
-            if type == 'missense':
-                if NM.sift_score != None and NM.polyphen_score != None:
-                    effect = 'deleterious' if NM.sift_score <= 0.05 or NM.polyphen_score >= 0.1 else 'tolerated'
-                    color = '#e30e0e' if NM.sift_score <= 0.05 or NM.polyphen_score >= 0.1 else '#70c070'
-                else:
-                    effect = 'unknown'
-                    color = '#818181'
-            else:
-                effect = 'deleterious'
-                color = '#65368e'
-
-            functional_annotation = ''
-            SN = NM.residue.sequence_number
-            if NM.residue.generic_number:
-                GN = NM.residue.generic_number.label
-            else:
-                GN = ''
-            if SN in sp_sequence_numbers:
-                functional_annotation += 'SodiumPocket '
-            if SN in ms_sequence_numbers:
-                functional_annotation += 'MicroSwitch '
-            if SN in ptms_dict:
-                functional_annotation += 'PTM (' + ptms_dict[SN] + ') '
-            if SN in interaction_data:
-                functional_annotation += 'LB (' + ', '.join(interaction_data[SN]) + ') '
-            if GN in gprotein_generic_set:
-                functional_annotation += 'GP (contact) '
-
-            if functional_annotation == '':
-                functional_annotation = '-'
             # account for multiple mutations at this position!
-            jsondata[SN] = [NM.amino_acid, NM.allele_frequency, NM.allele_count, NM.allele_number, NM.number_homozygotes, NM.type, effect, color, functional_annotation]
+            jsondata[v['sequence_number']] = [v['amino_acid'], v['allele_frequency'], v['allele_count'], v['allele_number'], v['number_homozygotes'], v['type'], effect, color, v['functional_annotation'] or '-']
 
         jsondata = json.dumps(jsondata)
-        response_kwargs['content_type'] = 'application/json'
 
-        cache.set(name_of_cache, jsondata, 20) # 60*60*24*2 two days timeout on cache
+        cache.set(name_of_cache, jsondata, 60*60*24*21) # the cache keys include the data release
 
+    response_kwargs['content_type'] = 'application/json'
     return HttpResponse(jsondata, **response_kwargs)
 
+@release_conditional
 def ajaxPTMs(request, slug, **response_kwargs):
 
     name_of_cache = 'ajaxPTMs_'+slug
@@ -399,20 +208,14 @@ def ajaxPTMs(request, slug, **response_kwargs):
     if jsondata == None:
         jsondata = {}
 
-        NMs = PTMs.objects.filter(protein__entry_name=slug).prefetch_related('residue')
-
-        for NM in NMs:
-
-            SN = NM.residue.sequence_number
-            mod = NM.modification
-
+        for SN, mod in get_variant_summary().modifications(slug).items():
             jsondata[SN] = [mod]
 
         jsondata = json.dumps(jsondata)
-        response_kwargs['content_type'] = 'application/json'
 
-        cache.set(name_of_cache, jsondata, 20) # 60*60*24*2 two days timeout on cache
+        cache.set(name_of_cache, jsondata, 60*60*24*21) # the cache keys include the data release
 
+    response_kwargs['content_type'] = 'application/json'
     return HttpResponse(jsondata, **response_kwargs)
 
 # def ajaxCancerMutation(request, slug, **response_kwargs):
@@ -508,6 +311,7 @@ def mutant_extract(request):
         # jsondata[mutation.residue.sequence_number].append([mutation.foldchange,ligand,qual])
     # print(jsondata)
 
+@release_conditional
 @cache_page(60*60*24*21)
 def statistics(request):
 
@@ -552,19 +356,17 @@ def statistics(request):
             coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['receptor_t'] += 1
             coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['receptor_t'] = 1
     # # POULATE WITH DATA
-    variants_target = Protein.objects.filter(family__slug__startswith="00", entry_name__icontains='_human').values('family_id__slug').annotate(value=Count('naturalmutations__residue_id', distinct = True))
-    protein_lengths = Protein.objects.filter(family__slug__startswith="00", entry_name__icontains='_human').values('family_id__slug','sequence')
-    protein_lengths_dict = {}
-    for i in protein_lengths:
-        protein_lengths_dict[i['family_id__slug']] =  i['sequence']
-    for i in variants_target:
-        # print(i)
-        fid = i['family_id__slug'].split("_")
-        coverage[fid[0]]['number_of_variants'] += i['value']
-        coverage[fid[0]]['children'][fid[1]]['number_of_variants'] += i['value']
-        coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['number_of_variants'] += i['value']
-        coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['number_of_variants'] += i['value']
-        density = float(i['value'])/len(protein_lengths_dict[i['family_id__slug']])
+    summary = get_variant_summary()
+    protein_lengths = Protein.objects.filter(family__slug__startswith="00", entry_name__icontains='_human').values_list('entry_name', 'family__slug', 'sequence')
+    for entry_name, family_slug, sequence in protein_lengths:
+        # residues with variants
+        value = summary.receptor_value(entry_name, 'distinct')
+        fid = family_slug.split("_")
+        coverage[fid[0]]['number_of_variants'] += value
+        coverage[fid[0]]['children'][fid[1]]['number_of_variants'] += value
+        coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['number_of_variants'] += value
+        coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['children'][fid[3]]['number_of_variants'] += value
+        density = float(value)/len(sequence)
         coverage[fid[0]]['density_of_variants'] += round(density,2)
         coverage[fid[0]]['children'][fid[1]]['density_of_variants'] += round(density,2)
         coverage[fid[0]]['children'][fid[1]]['children'][fid[2]]['density_of_variants'] += round(density,2)
@@ -613,56 +415,16 @@ def statistics(request):
     context['tree'] = json.dumps(tree)
 
     ## Overview statistics
-    total_receptors = NaturalMutations.objects.filter(type='missense').values('protein_id').distinct().count()
-    total_mv = len(NaturalMutations.objects.filter(type='missense'))
-    total_lof = len(NaturalMutations.objects.exclude(type='missense'))
-    total_av_rv = round(len(NaturalMutations.objects.filter(type='missense', allele_frequency__lt=0.001))/ total_receptors,1)
-    total_av_cv = round(len(NaturalMutations.objects.filter(type='missense', allele_frequency__gte=0.001))/ total_receptors,1)
+    totals = summary.totals()
+    total_receptors = totals['receptors_missense'] or 1
+    total_mv = totals['missense']
+    total_lof = totals['other']
+    total_av_rv = round(totals['rare_missense'] / total_receptors,1)
+    total_av_cv = round(totals['common_missense'] / total_receptors,1)
     context['stats'] = {'total_mv':total_mv,'total_lof':total_lof,'total_av_rv':total_av_rv, 'total_av_cv':total_av_cv}
 
     return render(request, 'variation_statistics.html', context)
 
-def get_functional_sites(protein):
-
-    ## PTMs
-    ptms = list(PTMs.objects.filter(protein=protein).values_list('residue', flat=True).distinct())
-
-    ## MICROSWITCHES
-    micro_switches_rset = ResiduePositionSet.objects.get(name="State (micro-)switches")
-    ms_label = []
-    for residue in micro_switches_rset.residue_position.all():
-        ms_label.append(residue.label)
-
-    ms_object = list(Residue.objects.filter(protein_conformation__protein=protein, generic_number__label__in=ms_label).values_list('id', flat=True).distinct())
-
-    ## SODIUM POCKET
-    sodium_pocket_rset = ResiduePositionSet.objects.get(name="Sodium ion pocket")
-    sp_label = []
-    for residue in sodium_pocket_rset.residue_position.all():
-        sp_label.append(residue.label)
-    sp_object = list(Residue.objects.filter(protein_conformation__protein=protein, generic_number__label__in=ms_label).values_list('id', flat=True).distinct())
-
-
-    ## G PROTEIN INTERACTION POSITIONS
-    # THIS SHOULD BE CLASS SPECIFIC (different set)
-    rset = ResiduePositionSet.objects.get(name='G-protein interface')
-    gprotein_generic_set = []
-    for residue in rset.residue_position.all():
-        gprotein_generic_set.append(residue.label)
-    GP_object = list(Residue.objects.filter(protein_conformation__protein=protein, generic_number__label__in=gprotein_generic_set).values_list('id', flat=True).distinct())
-
-    ### GET LB INTERACTION DATA
-    ## get also ortholog proteins, which might have been crystallised to extract
-    ## interaction data also from those
-    orthologs = Protein.objects.filter(family__slug__startswith=protein.family.slug, sequence_type__slug='wt').prefetch_related('protein__family')
-    interaction_residues = ResidueFragmentInteraction.objects.filter(
-        structure_ligand_pair__structure__protein_conformation__protein__parent__in=orthologs, structure_ligand_pair__annotated=True).exclude(interaction_type__type ='hidden').values_list('rotamer__residue_id', flat=True).distinct()
-
-    ## Get variants of these known residues:
-    known_function_sites = set(x for l in [GP_object,sp_object,ms_object,ptms,interaction_residues] for x in l)
-    NMs = NaturalMutations.objects.filter(residue_id__in=known_function_sites)
-    return len(NMs)
-
 # Based on https://gist.github.com/wassname/1393c4a57cfcbf03641dbc31886123b8
 def clean_filename(filename, replace=' '):
     char_limit = 255
@@ -680,6 +442,7 @@ def clean_filename(filename, replace=' '):
         print("Warning, filename truncated because it was over {}. Filenames may no longer be unique".format(char_limit))
     return cleaned_filename[:char_limit]
 
+@release_conditional
 @cache_page(60*60*24*21)
 def economicburden(request):
     economic_data = [{'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 29574708, 'x': 'putative-homozygous'}, {'y': 186577951, 'x': 'putative-all variants'}], 'key': 'Analgesics'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 14101883, 'x': 'putative-all variants'}], 'key': 'Antidepressant Drugs'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 10637449, 'x': 'putative-all variants'}], 'key': 'Antihist, Hyposensit & Allergic Emergen'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 6633692, 'x': 'putative-all variants'}], 'key': 'Antispasmod.&Other Drgs Alt.Gut Motility'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 8575714, 'x': 'putative-homozygous'}, {'y': 27008513, 'x': 'putative-all variants'}], 'key': 'Beta-Adrenoceptor Blocking Drugs'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 10108322, 'x': 'known-all variants'}, {'y': 25187489, 'x': 'putative-homozygous'}, {'y': 89224667, 'x': 'putative-all variants'}], 'key': 'Bronchodilators'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 5466184, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 10313279, 'x': 'putative-all variants'}], 'key': 'Drugs For Genito-Urinary Disorders'}, {'values': [{'y': 13015487, 'x': 'known-homozygous'}, {'y': 44334808, 'x': 'known-all variants'}, {'y': 13015487, 'x': 'putative-homozygous'}, {'y': 45130626, 'x': 'putative-all variants'}], 'key': 'Drugs Used In Diabetes'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 12168533, 'x': 'putative-all variants'}], 'key': "Drugs Used In Park'ism/Related Disorders"}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 28670250, 'x': 'putative-all variants'}], 'key': 'Drugs Used In Psychoses & Rel.Disorders'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 11069531, 'x': 'putative-all variants'}], 'key': 'Drugs Used In Substance Dependence'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 8694786, 'x': 'putative-all variants'}], 'key': 'Hypothalamic&Pituitary Hormones&Antioest'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 0, 'x': 'putative-homozygous'}, {'y': 9855456, 'x': 'putative-all variants'}], 'key': 'Sex Hormones & Antag In Malig Disease'}, {'values': [{'y': 0, 'x': 'known-homozygous'}, {'y': 0, 'x': 'known-all variants'}, {'y': 7848808, 'x': 'putative-homozygous'}, {'y': 25446045, 'x': 'putative-all variants'}], 'key': 'Treatment Of Glaucoma'}, {'values': [{'y': 864112, 'x': 'known-homozygous'}, {'y': 6107013, 'x': 'known-all variants'}, {'y': 19047162, 'x': 'putative-homozygous'}, {'y': 15754588, 'x': 'putative-all variants'}], 'key': 'other'}]
@@ -697,8 +460,13 @@ def economicburden(request):
 
     nhs_data = NHSPrescribings.objects.all().values('drugname__name').annotate(Avg('actual_cost'), Avg('items'), Avg('quantity'))
 
+    ## target data
+    drug_targets = {}
+    for drug, entry_name in Protein.objects.filter(drugs__isnull=False).values_list('drugs__name', 'entry_name').distinct():
+        drug_targets.setdefault(drug, []).append(entry_name)
+    summary = get_variant_summary()
+
     drug_data = []
-    temp = {}
     for i in nhs_data:
         ## druginformation
         drugname = i['drugname__name']
@@ -713,19 +481,12 @@ def economicburden(request):
             item_cost = 0
 
         ## get target information
-        protein_targets = Protein.objects.filter(drugs__name=drugname).distinct()
-        targets = [p.entry_name.split('_human')[0].upper() for p in list(protein_targets)]
-
-        known_functional = 0
-        for target in protein_targets:
-            if target.entry_name in temp:
-                known_functional += temp[target.entry_name]
-            else:
-                function_sites = get_functional_sites(target)
-                known_functional += function_sites
-                temp[target.entry_name] = function_sites
-
-        putative_func = len(NaturalMutations.objects.filter(Q(protein__in=protein_targets), Q(sift_score__lte=0.05) | Q(polyphen_score__gte=0.1)).annotate(count_putative_func=Count('id')))
+        protein_targets = drug_targets.get(drugname, [])
+        targets = [entry_name.split('_human')[0].upper() for entry_name in protein_targets]
+
+        # variants at known functional sites and putatively functional (deleterious) variants of the targets
+        known_functional = sum(summary.receptor_value(entry_name, 'site_variants') for entry_name in protein_targets)
+        putative_func = sum(summary.receptor_value(entry_name, 'putative_functional') for entry_name in protein_targets)
 
         jsondata = {'drugname':drugname, 'targets': targets, 'average_cost': average_cost, 'average_quantity': average_quantity, 'average_items':average_items, 'item_cost':item_cost, 'known_func': known_functional, 'putative_func':putative_func, 'section':section}
         drug_data.append(jsondata)
@@ -0,0 +1,284 @@
+from django.core.cache import cache
+
+from common.release import get_release_version
+from protein.models import Protein, ProteinAlias, ProteinFamily, ProteinSequenceType, ProteinSource, Gene
+
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
+
+import re
+
+
+class ProteinFamilyIndex:
+    """The protein family tree held in memory. Families are sorted by slug, so that the descendants of a family
+    follow it directly and can be sliced out by slug range. Proteins are indexed on the family they belong to"""
+
+    def __init__(self):
+        # in id order, the default ordering of ProteinFamily
+        self.families = list(ProteinFamily.objects.all())
+        self.by_id = {f.id: f for f in self.families}
+        self.by_slug = {f.slug: f for f in self.families}
+
+        self.children = {f.id: [] for f in self.families}
+        for f in self.families:
+            if f.parent_id:
+                # populate the foreign key cache, so that family.parent needs no query
+                f.parent = self.by_id[f.parent_id]
+                self.children[f.parent_id].append(f)
+
+        self.slugs = sorted(self.by_slug)
+        self.sorted_families = [self.by_slug[slug] for slug in self.slugs]
+
+        # direct proteins per family as (id, species id, source id, sequence type id, excluded from the selection
+        # tree), ordered as in the selection tree
+        self.proteins = {f.id: [] for f in self.families}
+        for p in Protein.objects.order_by('source_id', 'id').values_list('id', 'family_id', 'species_id',
+                'source_id', 'sequence_type_id', 'accession'):
+            family = self.by_id[p[1]]
+            # G protein alpha subunit structure objects, e.g. 3sn6_a
+            excluded = (p[5] is None and family.parent and family.parent.parent
+                and family.parent.parent.name == 'Alpha')
+            self.proteins[p[1]].append((p[0], p[2], p[3], p[4], bool(excluded)))
+
+        # ids of the protein sources by name and of the sequence types by slug, for the count filters
+        self.source_ids = dict(ProteinSource.objects.values_list('name', 'id'))
+        self.sequence_type_ids = dict(ProteinSequenceType.objects.values_list('slug', 'id'))
+
+        # number of proteins per (species id, source id, sequence type id) in each family including its
+        # descendants, counted on first use
+        self.protein_counts = {}
+
+    def get(self, pk=None, slug=None):
+        """Returns the family with this id or slug, raises ProteinFamily.DoesNotExist like the ORM"""
+        try:
+            if slug is not None:
+                return self.by_slug[slug]
+            return self.by_id[int(pk)]
+        except (KeyError, ValueError):
+            raise ProteinFamily.DoesNotExist
+
+    def descendant_range(self, slug):
+        # slugs consist of fixed width numbers, so descendants sort directly after their ancestor
+        start = bisect_left(self.slugs, slug)
+        return start, bisect_right(self.slugs, slug + '\uffff', lo=start)
+
+    def descendants(self, slug, include_self=False):
+        """Families whose slug starts with the given slug, ordered by slug"""
+        start, end = self.descendant_range(slug)
+        if not include_self and start < end and self.slugs[start] == slug:
+            start += 1
+        return self.sorted_families[start:end]
+
+    def protein_ids(self, family, species=None, sources=None, descendants=False, tree=False):
+        """IDs of the proteins in a family, optionally filtered on species and source IDs.
+        tree leaves out proteins that are not shown in the selection tree"""
+        families = self.descendants(family.slug, include_self=True) if descendants else [family]
+        species = set(species) if species else None
+        sources = set(sources) if sources is not None else None
+        ids = []
+        for f in families:
+            for protein_id, species_id, source_id, sequence_type_id, excluded in self.proteins[f.id]:
+                if species is not None and species_id not in species:
+                    continue
+                if sources is not None and source_id not in sources:
+                    continue
+                if tree and excluded:
+                    continue
+                ids.append(protein_id)
+        return ids
+
+    def protein_count(self, family, species=None, sources=None, sequence_types=None):
+        """Number of proteins in a family and its descendants, optionally filtered on species, source and sequence
+        type IDs"""
+        if family.id not in self.protein_counts:
+            counts = Counter()
+            for f in self.descendants(family.slug, include_self=True):
+                counts.update((p[1], p[2], p[3]) for p in self.proteins[f.id])
+            self.protein_counts[family.id] = counts
+        return sum(count for (species_id, source_id, sequence_type_id), count in self.protein_counts[family.id].items()
+            if (not species or species_id in species) and (sources is None or source_id in sources)
+            and (sequence_types is None or sequence_type_id in sequence_types))
+
+
+_family_index = {'release': None, 'index': None}
+
+def get_family_index():
+    """The ProteinFamilyIndex of the current data release, built on first use in each process"""
+    release = get_release_version()
+    if _family_index['index'] is None or _family_index['release'] != release:
+        _family_index['index'] = ProteinFamilyIndex()
+        _family_index['release'] = release
+    return _family_index['index']
+
+
+def normalize_search_text(text):
+    """Lower case text without HTML tags, as matched by the autocomplete search"""
+    return re.sub('<[^>]+>', '', text or '').lower()
+
+def trigrams(text):
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+def word_starts(text):
+    return [i for i in range(len(text)) if i == 0 or not text[i-1].isalnum()]
+
+def match_rank(text, q):
+    """Rank of q in text: 0 is an exact match, 1 a prefix, 2 the start of a word and 3 any other substring.
+    None when text does not contain q"""
+    position = text.find(q)
+    if position == -1:
+        return None
+    if text == q:
+        return 0
+    if position == 0:
+        return 1
+    while position != -1:
+        if not text[position - 1].isalnum():
+            return 2
+        position = text.find(q, position + 1)
+    return 3
+
+
+SearchProtein = namedtuple('SearchProtein', ['id', 'name', 'entry_name', 'species_id', 'species', 'source_id',
+    'source', 'family_slug'])
+SearchFamily = namedtuple('SearchFamily', ['id', 'name', 'slug'])
+
+
+class SearchIndex:
+    """Normalized search texts of a list of documents with a trigram index for substring queries. The first one
+    and two characters of each word are indexed as well, queries shorter than a trigram match word starts only"""
+
+    def __init__(self):
+        self.texts = [] # (document number, field, text)
+        self.postings = {}
+
+    def add(self, doc, field, text):
+        text = normalize_search_text(text)
+        if not text:
+            return
+        n = len(self.texts)
+        self.texts.append((doc, field, text))
+        keys = trigrams(text)
+        for i in word_starts(text):
+            # prefixed with a space, which normalized words never start with
+            keys.update((' ' + text[i:i+1], ' ' + text[i:i+2]))
+        for key in keys:
+            self.postings.setdefault(key, set()).add(n)
+
+    def search(self, q, fields, exact_fields=()):
+        """Returns {document number: rank} of the documents with a field containing q, ranked by match_rank.
+        Fields in exact_fields only match as a whole"""
+        if len(q) >= 3:
+            candidates = None
+            for trigram in trigrams(q):
+                if trigram not in self.postings:
+                    return {}
+                candidates = self.postings[trigram] if candidates is None else candidates & self.postings[trigram]
+        else:
+            candidates = self.postings.get(' ' + q, ())
+
+        matches = {}
+        for n in candidates:
+            doc, field, text = self.texts[n]
+            if field not in fields:
+                continue
+            rank = match_rank(text, q)
+            if rank is None or (rank > 0 and field in exact_fields) or (rank == 3 and len(q) < 3):
+                continue
+            if rank < matches.get(doc, 4):
+                matches[doc] = rank
+        return matches
+
+
+def get_search_rows():
+    """The rows a ProteinSearchIndex is built from"""
+    return {
+        'proteins': list(Protein.objects.order_by('id').values_list('id', 'name', 'entry_name', 'accession',
+            'species_id', 'species__common_name', 'source_id', 'source__name', 'family__slug', 'family__name')),
+        'aliases': list(ProteinAlias.objects.values_list('protein_id', 'name')),
+        'genes': list(Gene.objects.values_list('proteins__id', 'name')),
+        'families': list(ProteinFamily.objects.order_by('id').values_list('id', 'name', 'slug')),
+    }
+
+
+class ProteinSearchIndex:
+    """Protein names, entry names, family names, accessions, aliases and gene names for the autocomplete search"""
+
+    protein_fields = ('name', 'entry_name', 'family', 'accession', 'alias', 'gene')
+    # accessions are matched as a whole, as P2 would otherwise list every accession starting with it
+    exact_fields = ('accession',)
+
+    def __init__(self, rows):
+        self.proteins = []
+        self.protein_index = SearchIndex()
+        doc = {}
+        for p in rows['proteins']:
+            doc[p[0]] = len(self.proteins)
+            self.proteins.append(SearchProtein(p[0], p[1], p[2], p[4], p[5], p[6], p[7], p[8]))
+            self.protein_index.add(doc[p[0]], 'name', p[1])
+            self.protein_index.add(doc[p[0]], 'entry_name', p[2])
+            self.protein_index.add(doc[p[0]], 'accession', p[3])
+            self.protein_index.add(doc[p[0]], 'family', p[9])
+        for protein_id, name in rows['aliases']:
+            self.protein_index.add(doc[protein_id], 'alias', name)
+        for protein_id, name in rows['genes']:
+            if protein_id in doc:
+                self.protein_index.add(doc[protein_id], 'gene', name)
+
+        self.families = []
+        self.family_index = SearchIndex()
+        for f in rows['families']:
+            self.family_index.add(len(self.families), 'name', f[1])
+            self.families.append(SearchFamily(*f))
+
+    def search_proteins(self, q, fields=protein_fields, species_ids=None, species=None, source_ids=None,
+            source=None, exclude_slug=None, limit=10):
+        """Ranked proteins matching q in any of the fields, optionally filtered on species and source (IDs or names)
+        and excluding a family slug prefix"""
+        q = normalize_search_text(q.strip())
+        if not q:
+            return []
+        matches = []
+        for doc, rank in self.protein_index.search(q, fields, self.exact_fields).items():
+            p = self.proteins[doc]
+            if species_ids is not None and p.species_id not in species_ids:
+                continue
+            if species is not None and p.species != species:
+                continue
+            if source_ids is not None and p.source_id not in source_ids:
+                continue
+            if source is not None and p.source != source:
+                continue
+            if exclude_slug and p.family_slug.startswith(exclude_slug):
+                continue
+            matches.append((rank, p.source != 'SWISSPROT', len(p.name), p.id, p))
+        matches.sort()
+        return [m[-1] for m in matches[:limit]]
+
+    def search_families(self, q, exclude_slug=None, limit=10):
+        q = normalize_search_text(q.strip())
+        if not q:
+            return []
+        matches = []
+        for doc, rank in self.family_index.search(q, ('name',)).items():
+            f = self.families[doc]
+            if f.slug == '000' or (exclude_slug and f.slug.startswith(exclude_slug)):
+                continue
+            matches.append((rank, len(f.name), f.id, f))
+        matches.sort()
+        return [m[-1] for m in matches[:limit]]
+
+
+_search_index = {'release': None, 'index': None}
+
+def get_search_index():
+    """The ProteinSearchIndex of the current data release, built once per process. Its source rows are shared
+    between processes through the cache, so that only the first process (or warm_cache) queries them"""
+    release = get_release_version()
+    if _search_index['index'] is None or _search_index['release'] != release:
+        rows = cache.get('protein_search_rows')
+        if rows is None:
+            rows = get_search_rows()
+            cache.set('protein_search_rows', rows, 60*60*24*30)
+        _search_index['index'] = ProteinSearchIndex(rows)
+        _search_index['release'] = release
+    return _search_index['index']
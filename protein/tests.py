@@ -1,3 +1,77 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from protein.functions import ProteinFamilyIndex, ProteinSearchIndex
+from protein.models import Protein, ProteinFamily, ProteinSequenceType, ProteinSource, Species
+
+
+class ProteinSearchIndexTest(SimpleTestCase):
+    """Autocomplete search on an index built from source rows, no database needed"""
+
+    rows = {
+        'proteins': [
+            (1, '5-HT<sub>1A</sub> receptor', '5ht1a_human', 'P08908', 1, 'Human', 1, 'SWISSPROT', '001_001_001_001',
+                '5-Hydroxytryptamine receptors'),
+            (2, '5-HT<sub>1A</sub> receptor', '5ht1a_mouse', 'Q64264', 2, 'Mouse', 1, 'SWISSPROT', '001_001_001_001',
+                '5-Hydroxytryptamine receptors'),
+            (3, 'Adenosine receptor A2a', 'aa2ar_human', 'P29274', 1, 'Human', 1, 'SWISSPROT', '001_006_001_001',
+                'Adenosine receptors'),
+        ],
+        'aliases': [(3, 'ADORA2A')],
+        'genes': [(1, 'HTR1A'), (None, 'orphan')],
+        'families': [(1, 'Ligand type', '000'), (2, 'Adenosine receptors', '001_006_001')],
+    }
+
+    def setUp(self):
+        self.index = ProteinSearchIndex(self.rows)
+
+    def test_ranking(self):
+        # html is stripped, prefix matches rank before substring matches
+        self.assertEqual([p.id for p in self.index.search_proteins('5-ht1a', species='Human')], [1])
+        self.assertEqual([p.id for p in self.index.search_proteins('receptor', fields=('name',))], [3, 1, 2])
+
+    def test_short_queries(self):
+        self.assertEqual([p.entry_name for p in self.index.search_proteins('ad')], ['aa2ar_human'])
+        # short queries match the start of words only
+        self.assertEqual(self.index.search_proteins('ep', fields=('name',)), [])
+
+    def test_exact_accession(self):
+        self.assertEqual([p.id for p in self.index.search_proteins('p29274')], [3])
+        self.assertEqual(self.index.search_proteins('P2927', fields=('accession',)), [])
+
+    def test_aliases_and_families(self):
+        self.assertEqual([p.id for p in self.index.search_proteins('adora', fields=('alias',))], [3])
+        self.assertEqual([f.slug for f in self.index.search_families('receptors')], ['001_006_001'])
+
+
+class ProteinFamilyIndexTest(TestCase):
+    """The protein counts of the index are those of counting the proteins of a family and its descendants"""
+
+    @classmethod
+    def setUpTestData(cls):
+        root = ProteinFamily.objects.create(slug='000', name='Root')
+        family = ProteinFamily.objects.create(slug='001', name='Class A', parent=root)
+        subfamily = ProteinFamily.objects.create(slug='001_001', name='Aminergic', parent=family)
+        human = Species.objects.create(latin_name='Homo sapiens', common_name='Human')
+        mouse = Species.objects.create(latin_name='Mus musculus', common_name='Mouse')
+        swissprot = ProteinSource.objects.create(name='SWISSPROT')
+        trembl = ProteinSource.objects.create(name='TREMBL')
+        wild_type = ProteinSequenceType.objects.create(slug='wt', name='Wild-type')
+        modified = ProteinSequenceType.objects.create(slug='mod', name='Modified')
+        for i, (f, species, source, sequence_type) in enumerate([(family, human, swissprot, wild_type),
+            (subfamily, human, swissprot, wild_type), (subfamily, mouse, swissprot, wild_type),
+            (subfamily, human, trembl, wild_type), (subfamily, human, swissprot, modified)]):
+            Protein.objects.create(family=f, species=species, source=source, sequence_type=sequence_type,
+                entry_name='protein{}'.format(i), name='protein{}'.format(i), sequence='MAGNS')
+
+    def test_protein_count(self):
+        index = ProteinFamilyIndex()
+        wild_type = [index.sequence_type_ids['wt']]
+        human = Species.objects.get(common_name='Human').pk
+        for family in ProteinFamily.objects.all():
+            proteins = Protein.objects.filter(family__slug__startswith=family.slug)
+            self.assertEqual(index.protein_count(family), proteins.count())
+            self.assertEqual(index.protein_count(family, species=[human], sequence_types=wild_type),
+                proteins.filter(species_id=human, sequence_type__slug='wt').count())
+            self.assertEqual(index.protein_count(family, sources=[index.source_ids['SWISSPROT']]),
+                proteins.filter(source__name='SWISSPROT').count())
+        self.assertEqual(index.protein_count(index.get(slug='001')), 5)
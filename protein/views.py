@@ -1,7 +1,6 @@
 from django.shortcuts import get_object_or_404, render, redirect
 from django.views import generic
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, F, Func, Value
 from django.core.cache import cache
 from django.views.decorators.cache import cache_page
 from django.urls import reverse
@@ -12,6 +11,8 @@ from structure.models import Structure, StructureModel
 from mutation.models import MutationExperiment
 from common.selection import Selection
 from common.views import AbsBrowseSelection
+from common.release import release_conditional
+from protein.functions import get_search_index
 
 import json
 from copy import deepcopy
@@ -27,6 +28,7 @@ class BrowseSelection(AbsBrowseSelection):
     target_input=False
 
 
+@release_conditional
 @cache_page(60 * 60 * 24 * 7)
 def detail(request, slug):
     # get protein
@@ -141,42 +143,37 @@ def SelectionAutocomplete(request):
             selection.importer(simple_selection)
 
         # species filter
-        species_list = []
-        for species in selection.species:
-            species_list.append(species.item)
+        species_list = {species.item_id for species in selection.species}
 
         # annotation filter
-        protein_source_list = []
-        for protein_source in selection.annotation:
-            protein_source_list.append(protein_source.item)
+        protein_source_list = {protein_source.item_id for protein_source in selection.annotation}
+
+        search_index = get_search_index()
 
         # find proteins
         if type_of_selection!='navbar':
-            ps = Protein.objects.filter(Q(name__icontains=q) | Q(entry_name__icontains=q),
-                species__in=(species_list),
-                source__in=(protein_source_list)).exclude(family__slug__startswith=exclusion_slug)[:10]
+            ps = search_index.search_proteins(q, fields=('name', 'entry_name'), species_ids=species_list,
+                source_ids=protein_source_list, exclude_slug=exclusion_slug)
         else:
-            ps = Protein.objects.filter(Q(name__icontains=q) | Q(entry_name__icontains=q) | Q(family__name__icontains=q) | Q(accession=q),
-                species__common_name='Human', source__name='SWISSPROT').exclude(family__slug__startswith=exclusion_slug)[:10]
+            ps = search_index.search_proteins(q, species='Human', source='SWISSPROT', exclude_slug=exclusion_slug)
 
-        # Try matching protein name after stripping html tags
-        if ps.count() == 0:
-            ps = Protein.objects.annotate(filtered=Func(F('name'), Value('<[^>]+>'), Value(''), Value('gi'), function='regexp_replace')).filter(Q(filtered__icontains=q), species__common_name='Human', source__name='SWISSPROT')
+        # Try matching protein name (the index strips html tags) in all families
+        if not ps:
+            ps = search_index.search_proteins(q, fields=('name',), species='Human', source='SWISSPROT')
 
             # If count still 0 try searching for the full thing
-            if ps.count() == 0:
-                ps = Protein.objects.filter(Q(name__icontains=q) | Q(entry_name__icontains=q) | Q(family__name__icontains=q) | Q(accession=q),
-                    source__name='SWISSPROT').exclude(family__slug__startswith=exclusion_slug)[:10]
+            if not ps:
+                ps = search_index.search_proteins(q, source='SWISSPROT', exclude_slug=exclusion_slug)
 
                 # If count still 0 try searching outside of Swissprot
-                if ps.count() == 0:
-                    ps = Protein.objects.filter(Q(name__icontains=q) | Q(entry_name__icontains=q) | Q(family__name__icontains=q) | Q(accession=q)).exclude(family__slug__startswith=exclusion_slug)[:10]
+                if not ps:
+                    ps = search_index.search_proteins(q, exclude_slug=exclusion_slug)
 
 
         for p in ps:
             p_json = {}
             p_json['id'] = p.id
-            p_json['label'] = p.name + " [" + p.species.common_name + "]"
+            p_json['label'] = p.name + " [" + p.species + "]"
             p_json['slug'] = p.entry_name
             p_json['type'] = 'protein'
             p_json['category'] = 'Targets'
@@ -185,14 +182,13 @@ def SelectionAutocomplete(request):
 
         if type_of_selection!='navbar':
             # find protein aliases
-            pas = ProteinAlias.objects.prefetch_related('protein').filter(name__icontains=q,
-                protein__species__in=(species_list),
-                protein__source__in=(protein_source_list)).exclude(protein__family__slug__startswith=exclusion_slug)[:10]
+            pas = search_index.search_proteins(q, fields=('alias',), species_ids=species_list,
+                source_ids=protein_source_list, exclude_slug=exclusion_slug)
             for pa in pas:
                 pa_json = {}
-                pa_json['id'] = pa.protein.id
-                pa_json['label'] = pa.protein.name  + " [" + pa.protein.species.common_name + "]"
-                pa_json['slug'] = pa.protein.entry_name
+                pa_json['id'] = pa.id
+                pa_json['label'] = pa.name  + " [" + pa.species + "]"
+                pa_json['slug'] = pa.entry_name
                 pa_json['type'] = 'protein'
                 pa_json['category'] = 'Targets'
                 if pa_json not in results:
@@ -201,11 +197,7 @@ def SelectionAutocomplete(request):
             # protein families
             if (type_of_selection == 'targets' or type_of_selection == 'browse' or type_of_selection == 'gproteins') and selection_only_receptors!="True":
                 # find protein families
-                pfs = ProteinFamily.objects.filter(name__icontains=q).exclude(slug='000').exclude(slug__startswith=exclusion_slug)[:10]
-
-                # Try matching protein family name after stripping html tags
-                if pfs.count() == 0:
-                    pfs = ProteinFamily.objects.annotate(filtered=Func(F('name'), Value('<[^>]+>'), Value(''), Value('gi'), function='regexp_replace')).filter(filtered__icontains=q).exclude(slug='000').exclude(slug__startswith=exclusion_slug)[:10]
+                pfs = search_index.search_families(q, exclude_slug=exclusion_slug)
 
                 for pf in pfs:
                     pf_json = {}
@@ -456,7 +448,7 @@ def AlignIsoformWildtype(request):
             data['res_correct2'][i] = data['res'][i-gaps]
 
     for e in es[:1]:
-        isoform_info = fetch_from_web_api(url, e, cache_dir)
+        isoform_info = fetch_from_web_api(url, e, cache_dir, store=False)
         if (isoform_info):
             seq = isoform_info['seq']
             # seq_filename = "/tmp/" + e + ".fa"
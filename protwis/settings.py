@@ -64,6 +64,7 @@ MIDDLEWARE = (
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'common.middleware.release.ReleaseConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     # 'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
@@ -98,6 +99,11 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/protwis/media/protwis'
 
 
+# Conditional GET
+# responses under these paths only depend on the URL and the data release (see common.release)
+RELEASE_CONDITIONAL_PREFIXES = ('/services/',)
+
+
 # Serializer
 
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.PickleSerializer'
@@ -195,6 +201,7 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': '/tmp/django_cache',
+        'KEY_FUNCTION': 'common.release.make_cache_key',
         'OPTIONS': {
             'MAX_ENTRIES': 10000000
         }
@@ -202,6 +209,7 @@ CACHES = {
     'alignments': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': '/tmp/django_cache_alignments',
+        'KEY_FUNCTION': 'common.release.make_cache_key',
         'OPTIONS': {
             'MAX_ENTRIES': 1000
         }
@@ -6,6 +6,9 @@ SITE_NAME = 'gpcr' # used for site specific files
 SITE_TITLE = 'GPCRdb' # for display in templates
 DATA_DIR = '/protwis/data/protwis/' + SITE_NAME
 BUILD_CACHE_DIR = DATA_DIR + '/cache'
+WEB_FETCH_MODE = 'online' # 'replay' builds offline from the web API responses stored in BUILD_CACHE_DIR
+BUILD_DATA_DIR = DATA_DIR + '/build_data' # data precomputed at build time
+BENCHMARK_DIR = DATA_DIR + '/benchmarks' # benchmark results and baselines of run_benchmarks
 DEFAULT_NUMBERING_SCHEME = 'gpcrdb'
 DEFAULT_PROTEIN_STATE = 'inactive'
 REFERENCE_POSITIONS = {'TM1': '1x50', 'ICL1': '12x50', 'TM2': '2x50', 'ECL1': '23x50', 'TM3': '3x50', 'ICL2': '34x50',
@@ -18,6 +21,19 @@ GOOGLE_ANALYTICS_KEY = False
 # Display users
 GOOGLE_ANALYTICS_API = False
 
+# SQL statements of each request with their call stacks, see common/query_profile.py
+QUERY_PROFILING = False
+QUERY_REPEAT_LIMIT = 5 # runs of one statement shape from one line above which a request is logged as N+1
+
+# profiling of single requests, see common/request_profile.py and aggregate_profiles
+# e.g. [r'^/contactnetwork/browserdata', r'^/mutations/render'] to profile all interaction browser and mutation
+# requests, or set PROFILING_KEY and send it as X-Profile header to profile one request
+PROFILING_URL_PATTERNS = []
+PROFILING_KEY = ''
+PROFILING_MODE = 'sample' # 'sample' (collapsed stacks) or 'cprofile' (pstats)
+PROFILING_INTERVAL = 0.005 # seconds between two stack samples
+PROFILE_DIR = DATA_DIR + '/profiles'
+
 # Database
 
 DATABASES = {
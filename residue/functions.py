@@ -1,12 +1,15 @@
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Count, Q
 from django.db import IntegrityError
 
-from protein.models import ProteinAnomaly
+from common.release import get_release_version
+from protein.models import ProteinAnomaly, ProteinConformation
 from residue.models import Residue, ResidueGenericNumber, ResidueNumberingScheme, ResidueGenericNumberEquivalent
 
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict, namedtuple
+import numpy as np
 import yaml
 import shlex
 import os
@@ -50,7 +53,7 @@ def create_or_update_residue(protein_conformation, segment, schemes,residue,b_an
 
     # default numbering scheme
     ns = settings.DEFAULT_NUMBERING_SCHEME
-    ns_obj = ResidueNumberingScheme.objects.get(slug=ns)
+    ns_obj = schemes[ns]['obj']
     
     rvalues = {}
     rvalues['protein_segment'] = segment
@@ -135,11 +138,11 @@ def create_or_update_residue(protein_conformation, segment, schemes,residue,b_an
             else:
                 try:
                     argn, created = ResidueGenericNumber.objects.get_or_create(
-                        scheme=ResidueNumberingScheme.objects.get(slug=alt_scheme), label=alt_num,
+                        scheme=schemes[alt_scheme]['obj'], label=alt_num,
                         defaults=rns_defaults)
                 except IntegrityError:
                     argn = ResidueGenericNumber.objects.get(
-                        scheme=ResidueNumberingScheme.objects.get(slug=alt_scheme), label=alt_num)
+                        scheme=schemes[alt_scheme]['obj'], label=alt_num)
                 schemes[alt_scheme]['generic_numbers'][alt_num] = argn
             try:
                 bulk_add_alt.append(argn)
@@ -152,6 +155,118 @@ def create_or_update_residue(protein_conformation, segment, schemes,residue,b_an
     return [bulk_r,bulk_add_alt]
 
 
+class BulkResidueBuilder:
+    ''' Builds the residues of whole protein conformations with a few bulk queries. All generic numbers and
+    equivalents are preloaded, missing ones are created in batches when the collected residues are written.
+    '''
+    def __init__(self, schemes):
+        self.schemes = schemes
+        for scheme in self.schemes.values():
+            scheme['generic_numbers'].update({gn.label: gn for gn in ResidueGenericNumber.objects.filter(
+                scheme=scheme['obj'])})
+        # default generic number of each (scheme, label) equivalent, the pair is unique
+        self.equivalents = {(scheme_id, label): gn_id for gn_id, scheme_id, label in
+            ResidueGenericNumberEquivalent.objects.values_list('default_generic_number_id', 'scheme_id', 'label')}
+        self.residues = []
+
+    def add_residue(self, protein_conformation, segment, residue, b_and_c):
+        ''' Same arguments as create_or_update_residue, the residue is stored until write() is called.
+        '''
+        scheme = protein_conformation.protein.residue_numbering_scheme
+        numbers = residue['numbers']
+        if 'generic_number' in numbers:
+            numbers = format_generic_numbers(scheme, self.schemes, residue['pos'], numbers['generic_number'],
+                numbers['bw'], b_and_c)
+        r = Residue(protein_conformation=protein_conformation, sequence_number=residue['pos'],
+            amino_acid=residue['aa'], protein_segment=segment)
+        self.residues.append((r, scheme, numbers))
+
+    def write(self):
+        ''' Creates the collected residues with their (alternative) generic numbers. Returns the residues.
+        '''
+        ns = settings.DEFAULT_NUMBERING_SCHEME
+
+        # generic numbers that do not exist yet, with the segment of the first residue using them
+        missing = OrderedDict()
+        for r, scheme, numbers in self.residues:
+            labels = []
+            if 'generic_number' in numbers:
+                labels.append((ns, numbers['generic_number']))
+            if 'display_generic_number' in numbers:
+                labels.append((scheme.slug, numbers['display_generic_number']))
+            if 'alternative_generic_numbers' in numbers:
+                labels += list(numbers['alternative_generic_numbers'].items())
+            for scheme_slug, label in labels:
+                if label not in self.schemes[scheme_slug]['generic_numbers']:
+                    missing.setdefault((scheme_slug, label), r.protein_segment)
+        self.create_generic_numbers(missing)
+
+        # the first equivalent of a generic number in a scheme is kept, as get_or_create did
+        equivalent_numbers = {(gn_id, scheme_id) for (scheme_id, label), gn_id in self.equivalents.items()}
+        equivalents = OrderedDict()
+        residue_alternatives = []
+        for r, scheme, numbers in self.residues:
+            if 'generic_number' in numbers:
+                r.generic_number = self.schemes[ns]['generic_numbers'][numbers['generic_number']]
+                if 'equivalent' in numbers and (r.generic_number.pk, scheme.pk) not in equivalent_numbers:
+                    key = (scheme.pk, numbers['equivalent'])
+                    if key in equivalents:
+                        self.equivalent_conflict(key, equivalents[key].default_generic_number_id, r.generic_number)
+                    elif self.equivalents.get(key, r.generic_number.pk) != r.generic_number.pk:
+                        self.equivalent_conflict(key, self.equivalents[key], r.generic_number)
+                    else:
+                        equivalents[key] = ResidueGenericNumberEquivalent(default_generic_number=r.generic_number,
+                            scheme=scheme, label=numbers['equivalent'])
+                        equivalent_numbers.add((r.generic_number.pk, scheme.pk))
+            if 'display_generic_number' in numbers:
+                r.display_generic_number = self.schemes[scheme.slug]['generic_numbers'][
+                    numbers['display_generic_number']]
+            alternatives = []
+            if 'alternative_generic_numbers' in numbers:
+                for alt_scheme, alt_num in numbers['alternative_generic_numbers'].items():
+                    alternatives.append(self.schemes[alt_scheme]['generic_numbers'][alt_num])
+            residue_alternatives.append(alternatives)
+
+        # other build processes may have created some of them, so fetch them all back and check them
+        ResidueGenericNumberEquivalent.objects.bulk_create(equivalents.values(), ignore_conflicts=True)
+        for gn_id, scheme_id, label in ResidueGenericNumberEquivalent.objects.filter(
+            label__in={label for scheme_id, label in equivalents}).values_list('default_generic_number_id',
+            'scheme_id', 'label'):
+            key = (scheme_id, label)
+            if key in equivalents and equivalents[key].default_generic_number_id != gn_id:
+                self.equivalent_conflict(key, gn_id, equivalents[key].default_generic_number)
+            self.equivalents[key] = gn_id
+
+        residues = Residue.objects.bulk_create([r[0] for r in self.residues])
+        ThroughModel = Residue.alternative_generic_numbers.through
+        ThroughModel.objects.bulk_create([ThroughModel(residue_id=r.pk, residuegenericnumber_id=alt.pk)
+            for r, alternatives in zip(residues, residue_alternatives) for alt in alternatives])
+
+        self.residues = []
+        return residues
+
+    def equivalent_conflict(self, key, gn_id, generic_number):
+        ''' An equivalent label of the scheme that is already used by another generic number is not created.
+        '''
+        scheme_id, label = key
+        logger = logging.getLogger('build')
+        logger.error('Generic number equivalent {} (scheme id {}) of {} is already used by generic number id {}'.format(
+            label, scheme_id, generic_number.label, gn_id))
+
+    def create_generic_numbers(self, missing):
+        by_scheme = OrderedDict()
+        for (scheme_slug, label), segment in missing.items():
+            by_scheme.setdefault(scheme_slug, []).append(ResidueGenericNumber(scheme=self.schemes[scheme_slug]['obj'],
+                label=label, protein_segment=segment))
+
+        for scheme_slug, generic_numbers in by_scheme.items():
+            # other build processes may have created some of them, so fetch them all back
+            ResidueGenericNumber.objects.bulk_create(generic_numbers, ignore_conflicts=True)
+            self.schemes[scheme_slug]['generic_numbers'].update({gn.label: gn for gn in
+                ResidueGenericNumber.objects.filter(scheme=self.schemes[scheme_slug]['obj'],
+                label__in=[gn.label for gn in generic_numbers])})
+
+
 def create_or_update_residues_in_segment(protein_conformation, segment, start, aligned_start, end, aligned_end,
     schemes, ref_positions, protein_anomalies, disregard_db_residues):
     logger = logging.getLogger('build')
@@ -179,7 +294,7 @@ def create_or_update_residues_in_segment(protein_conformation, segment, start, a
 
     # default numbering scheme
     ns = settings.DEFAULT_NUMBERING_SCHEME
-    ns_obj = ResidueNumberingScheme.objects.get(slug=ns)
+    ns_obj = schemes[ns]['obj']
     
     created_residues = 0
     for res_num, residue in enumerate(residues_to_update, start=1):
@@ -273,11 +388,11 @@ def create_or_update_residues_in_segment(protein_conformation, segment, start, a
                 else:
                     try:
                         argn, created = ResidueGenericNumber.objects.get_or_create(
-                            scheme=ResidueNumberingScheme.objects.get(slug=alt_scheme), label=alt_num,
+                            scheme=schemes[alt_scheme]['obj'], label=alt_num,
                             defaults=rns_defaults)
                     except IntegrityError:
                         argn = ResidueGenericNumber.objects.get(
-                            scheme=ResidueNumberingScheme.objects.get(slug=alt_scheme), label=alt_num)
+                            scheme=schemes[alt_scheme]['obj'], label=alt_num)
                     schemes[alt_scheme]['generic_numbers'][alt_num] = argn
                 r.alternative_generic_numbers.add(argn)
 
@@ -582,7 +697,206 @@ def ggn(gn):
 def dgn(gn, protein_conformation):
     ''' Converts generic number to display generic number.
     '''
-    scheme = ResidueNumberingScheme.objects.get(slug=protein_conformation.protein.residue_numbering_scheme.slug)
-    convert_gn = ResidueGenericNumberEquivalent.objects.get(label=gn, scheme=scheme).default_generic_number.label
-    return Residue.objects.get(protein_conformation=protein_conformation, generic_number__label=convert_gn).display_generic_number.label
-    
+    equivalents = get_generic_number_equivalents(protein_conformation.protein.residue_numbering_scheme_id)
+    if gn not in equivalents:
+        raise ResidueGenericNumberEquivalent.DoesNotExist('No equivalent of {} in the numbering scheme of {}'.format(
+            gn, protein_conformation))
+    residue = get_conformation_generic_numbers(protein_conformation).get(equivalents[gn])
+    if residue is None or residue.display_generic_number is None:
+        raise Residue.DoesNotExist('No residue with generic number {} in {}'.format(gn, protein_conformation))
+    return residue.display_generic_number
+
+
+# In-memory generic number index, used instead of one query per translated position. It is loaded lazily and
+# dropped when a new data release is stamped (or when reset_generic_number_index is called during a build)
+GenericNumberResidue = namedtuple('GenericNumberResidue', ['sequence_number', 'amino_acid', 'display_generic_number'])
+
+GN_INDEX_MAX_CONFORMATIONS = 2000
+
+_gn_index = {'release': None}
+
+def reset_generic_number_index():
+    _gn_index.update(release=get_release_version(), schemes={}, equivalents={}, entry_names={},
+        conformations=OrderedDict())
+
+def _generic_number_index():
+    if _gn_index['release'] != get_release_version():
+        reset_generic_number_index()
+    return _gn_index
+
+def get_numbering_scheme(slug):
+    ''' Returns the ResidueNumberingScheme object with this slug.
+    '''
+    index = _generic_number_index()
+    if not index['schemes']:
+        index['schemes'] = {s.slug: s for s in ResidueNumberingScheme.objects.all().prefetch_related('parent')}
+    if slug not in index['schemes']:
+        raise ResidueNumberingScheme.DoesNotExist('Numbering scheme {} does not exist'.format(slug))
+    return index['schemes'][slug]
+
+def get_generic_number_equivalents(scheme_id):
+    ''' Returns a dict of generic number labels in a numbering scheme (by id) to the default generic number labels.
+    '''
+    index = _generic_number_index()
+    if scheme_id not in index['equivalents']:
+        index['equivalents'][scheme_id] = dict(ResidueGenericNumberEquivalent.objects.filter(
+            scheme_id=scheme_id).values_list('label', 'default_generic_number__label'))
+    return index['equivalents'][scheme_id]
+
+def get_conformation_id(entry_name):
+    index = _generic_number_index()
+    if not index['entry_names']:
+        index['entry_names'] = dict(ProteinConformation.objects.values_list('protein__entry_name', 'pk'))
+    return index['entry_names'].get(entry_name)
+
+def get_conformation_generic_numbers(protein_conformation):
+    ''' Returns a dict of default generic number labels to GenericNumberResidue tuples for a protein conformation
+    (object or id).
+    '''
+    index = _generic_number_index()
+    pcid = getattr(protein_conformation, 'pk', protein_conformation)
+    conformations = index['conformations']
+    if pcid in conformations:
+        conformations.move_to_end(pcid)
+        return conformations[pcid]
+
+    residues = {}
+    for label, sequence_number, amino_acid, display_label in Residue.objects.filter(protein_conformation_id=pcid,
+        generic_number__isnull=False).values_list('generic_number__label', 'sequence_number', 'amino_acid',
+        'display_generic_number__label'):
+        residues[label] = GenericNumberResidue(sequence_number, amino_acid, display_label)
+
+    conformations[pcid] = residues
+    if len(conformations) > GN_INDEX_MAX_CONFORMATIONS:
+        conformations.popitem(last=False)
+    return residues
+
+def translate_generic_numbers(gns, protein_conformation, scheme_id=None):
+    ''' Bulk version of dgn. Translates generic numbers in a numbering scheme (default: that of the protein) to
+    residues of the protein conformation. Returns an OrderedDict of generic number to GenericNumberResidue, or None
+    when the position is not present.
+    '''
+    if scheme_id is None:
+        scheme_id = protein_conformation.protein.residue_numbering_scheme_id
+    equivalents = get_generic_number_equivalents(scheme_id)
+    residues = get_conformation_generic_numbers(protein_conformation)
+    translated = OrderedDict()
+    for gn in gns:
+        translated[gn] = residues.get(equivalents.get(gn))
+    return translated
+
+
+# Cross-scheme numbering tables. The label of a default generic number in another numbering scheme depends on the
+# class and on the bulges and constrictions of the receptor, so the labels are collected per class from the
+# alternative generic numbers of its residues. The label most receptors share is stored once, others with their
+# receptors
+class NumberingTable:
+    """Labels of the default generic numbers of a receptor class (family slug, e.g. 001) in all numbering schemes"""
+
+    def __init__(self, class_slug):
+        self.class_slug = class_slug
+        # {generic number: {scheme slug: (label of most receptors or None, {other label: protein ids})}}
+        self.labels = {}
+        self.build()
+
+    def build(self):
+        in_class = Q(residue__protein_conformation__protein__family__slug__startswith=self.class_slug)
+        alternatives = Residue.alternative_generic_numbers.through.objects.filter(in_class,
+            residue__generic_number__isnull=False).order_by()
+
+        receptors = dict(Residue.objects.filter(
+            protein_conformation__protein__family__slug__startswith=self.class_slug, generic_number__isnull=False
+            ).values_list('generic_number__label').annotate(
+            Count('protein_conformation__protein', distinct=True)).order_by())
+
+        counts = defaultdict(dict)
+        for gn, scheme, label, count in alternatives.values_list('residue__generic_number__label',
+            'residuegenericnumber__scheme__slug', 'residuegenericnumber__label').annotate(
+            Count('residue__protein_conformation__protein', distinct=True)):
+            counts[(gn, scheme)][label] = count
+
+        exceptions = set()
+        for (gn, scheme), labels in counts.items():
+            if sum(labels.values()) < receptors.get(gn, 0):
+                # some receptors have no label in this scheme, all labels are stored with their receptors
+                default = None
+            else:
+                default = max(sorted(labels), key=labels.get)
+            self.labels.setdefault(gn, {})[scheme] = (default, {l: set() for l in labels if l != default})
+            exceptions.update((gn, scheme, l) for l in labels if l != default)
+
+        if exceptions:
+            for gn, scheme, label, protein_id in alternatives.filter(
+                residue__generic_number__label__in={e[0] for e in exceptions},
+                residuegenericnumber__label__in={e[2] for e in exceptions}).values_list(
+                'residue__generic_number__label', 'residuegenericnumber__scheme__slug', 'residuegenericnumber__label',
+                'residue__protein_conformation__protein_id'):
+                if (gn, scheme, label) in exceptions:
+                    self.labels[gn][scheme][1][label].add(protein_id)
+
+    def label(self, generic_number, scheme_slug, protein_id):
+        """Label of the generic number in the scheme for a receptor of the class, None if there is none"""
+        default, others = self.labels.get(generic_number, {}).get(scheme_slug, (None, {}))
+        for label, protein_ids in others.items():
+            if protein_id in protein_ids:
+                return label
+        return default
+
+    def selection_labels(self, generic_number, scheme_slug, protein_ids):
+        """Labels of the generic number in the scheme for a set of receptors of the class"""
+        default, others = self.labels.get(generic_number, {}).get(scheme_slug, (None, {}))
+        labels = [l for l, ids in sorted(others.items()) if not protein_ids.isdisjoint(ids)]
+        if default is not None and protein_ids.difference(*others.values()):
+            labels.insert(0, default)
+        return labels
+
+
+_numbering_tables = {'release': None, 'tables': {}}
+
+def get_numbering_table(class_slug):
+    """The NumberingTable of a receptor class. Shared between processes through the cache, so that only the first
+    process (or warm_cache) builds it"""
+    release = get_release_version()
+    if _numbering_tables['release'] != release:
+        _numbering_tables.update(release=release, tables={})
+    tables = _numbering_tables['tables']
+    if class_slug not in tables:
+        cache_key = 'numbering_table_{}'.format(class_slug)
+        table = cache.get(cache_key)
+        if table is None:
+            table = NumberingTable(class_slug)
+            cache.set(cache_key, table, 60*60*24*30)
+        tables[class_slug] = table
+    return tables[class_slug]
+
+
+ResidueMatrix = namedtuple('ResidueMatrix', ['segments', 'generic_numbers', 'amino_acids', 'sequence_numbers'])
+
+def get_residue_matrix(protein_ids, segment_slugs=None):
+    """ Residues of proteins at the default generic numbers, in one query. Returns the segment and the generic number
+    of each position (sorted by segment slug and label) and proteins x positions arrays of the amino acids ('' where
+    a protein has no residue) and the sequence numbers (0 where it has none). segment_slugs limits the positions.
+    """
+    residues = Residue.objects.filter(protein_conformation__protein_id__in=protein_ids, generic_number__isnull=False,
+        protein_segment__isnull=False)
+    if segment_slugs is not None:
+        residues = residues.filter(protein_segment__slug__in=segment_slugs)
+    rows = list(residues.values_list('protein_conformation__protein_id', 'protein_segment__slug',
+        'generic_number__label', 'amino_acid', 'sequence_number').order_by())
+
+    proteins = {protein_id: i for i, protein_id in enumerate(dict.fromkeys(protein_ids))}
+    positions = sorted({(r[1], r[2]) for r in rows})
+    position_index = {position: i for i, position in enumerate(positions)}
+
+    amino_acids = np.full((len(proteins), len(positions)), '', dtype='<U1')
+    sequence_numbers = np.zeros((len(proteins), len(positions)), dtype=int)
+    if rows:
+        protein_rows = np.array([proteins[r[0]] for r in rows])
+        columns = np.array([position_index[(r[1], r[2])] for r in rows])
+        amino_acids[protein_rows, columns] = [r[3] for r in rows]
+        sequence_numbers[protein_rows, columns] = [r[4] for r in rows]
+
+    # one row per requested protein, also when a protein is requested twice
+    order = [proteins[protein_id] for protein_id in protein_ids]
+    return ResidueMatrix(np.array([p[0] for p in positions], dtype=str), np.array([p[1] for p in positions],
+        dtype=str), amino_acids[order], sequence_numbers[order])
@@ -1,3 +1,154 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import ResidueExtendedSerializer, ResidueSerializer
+from api.views import ResiduesExtendedList, ResiduesList
+from common.query_profile import QueryBudgetMixin
+from protein.models import (Protein, ProteinConformation, ProteinFamily, ProteinSegment, ProteinSequenceType,
+    ProteinSource, ProteinState, Species)
+from residue import functions
+from residue.functions import BulkResidueBuilder, get_numbering_table, get_residue_matrix
+from residue.models import Residue, ResidueGenericNumber, ResidueGenericNumberEquivalent, ResidueNumberingScheme
+
+import json
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResidueMatrixTest(QueryBudgetMixin, TestCase):
+    """The numbering tables and the residue matrix give the same residues and labels as reading them residue by
+    residue, the way the residue table and the residues API did"""
+
+    @classmethod
+    def setUpTestData(cls):
+        gpcrdb = ResidueNumberingScheme.objects.create(slug='gpcrdb', short_name='GPCRdb', name='GPCRdb')
+        gpcrdba = ResidueNumberingScheme.objects.create(slug='gpcrdba', short_name='GPCRdb(A)', name='GPCRdb class A',
+            parent=gpcrdb)
+        bw = ResidueNumberingScheme.objects.create(slug='bw', short_name='BW', name='Ballesteros-Weinstein')
+        tm1 = ProteinSegment.objects.create(slug='TM1', name='Transmembrane helix 1', category='helix',
+            proteinfamily='GPCR')
+        tm2 = ProteinSegment.objects.create(slug='TM2', name='Transmembrane helix 2', category='helix',
+            proteinfamily='GPCR')
+        icl1 = ProteinSegment.objects.create(slug='ICL1', name='Intracellular loop 1', category='loop',
+            proteinfamily='GPCR')
+
+        root = ProteinFamily.objects.create(slug='000', name='Root')
+        family = ProteinFamily.objects.create(slug='001_001_001_001', name='Receptors', parent=root)
+        species = Species.objects.create(latin_name='Homo sapiens', common_name='Human')
+        source = ProteinSource.objects.create(name='SWISSPROT')
+        sequence_type = ProteinSequenceType.objects.create(slug='wt', name='Wild-type')
+        state = ProteinState.objects.create(slug='active', name='Active')
+
+        def gn(scheme, label, segment=tm1):
+            return ResidueGenericNumber.objects.get_or_create(scheme=scheme, label=label, protein_segment=segment)[0]
+
+        cls.proteins = []
+        # the second receptor has a bulge in TM1: 1x51 is 1.52 in BW
+        for entry_name, bulge in [('rec1_human', False), ('rec2_human', True), ('rec3_human', False)]:
+            protein = Protein.objects.create(family=family, species=species, source=source, sequence_type=sequence_type,
+                residue_numbering_scheme=bw, entry_name=entry_name, name=entry_name, sequence='MAGNS')
+            conformation = ProteinConformation.objects.create(protein=protein, state=state)
+            positions = [(tm1, '1x50', '1.50', 'N'), (tm1, '1x51', '1.52' if bulge else '1.51', 'V'),
+                (tm2, '2x50', '2.50', 'D')]
+            if entry_name == 'rec3_human':
+                # no residue at 1x51
+                positions.pop(1)
+            for sequence_number, (segment, label, bw_label, amino_acid) in enumerate(positions, start=1):
+                residue = Residue.objects.create(protein_conformation=conformation, protein_segment=segment,
+                    generic_number=gn(gpcrdb, label, segment), display_generic_number=gn(gpcrdba,
+                    label.replace('x', '.') + 'x' + label.split('x')[1], segment), sequence_number=sequence_number,
+                    amino_acid=amino_acid)
+                residue.alternative_generic_numbers.add(gn(gpcrdb, label, segment), gn(bw, bw_label, segment))
+            # a loop residue without generic number
+            Residue.objects.create(protein_conformation=conformation, protein_segment=icl1, sequence_number=10,
+                amino_acid='K')
+            cls.proteins.append(protein)
+
+    def setUp(self):
+        functions._numbering_tables.update(release=None, tables={})
+
+    def test_residue_matrix(self):
+        protein_ids = [p.pk for p in self.proteins]
+        matrix = get_residue_matrix(protein_ids)
+        expected = {}
+        for residue in Residue.objects.filter(generic_number__isnull=False):
+            expected[(residue.protein_conformation.protein_id, residue.protein_segment.slug,
+                residue.generic_number.label)] = str(residue)
+        result = {}
+        for i, protein_id in enumerate(protein_ids):
+            for j, (segment, label) in enumerate(zip(matrix.segments, matrix.generic_numbers)):
+                if matrix.sequence_numbers[i, j]:
+                    result[(protein_id, segment, label)] = matrix.amino_acids[i, j] + str(matrix.sequence_numbers[i, j])
+        self.assertEqual(result, expected)
+        self.assertEqual(list(matrix.generic_numbers), ['1x50', '1x51', '2x50'])
+
+        tm2 = get_residue_matrix(protein_ids[:1] * 2, ['TM2'])
+        self.assertEqual(tm2.amino_acids.tolist(), [['D'], ['D']])
+
+    def test_numbering_table(self):
+        table = get_numbering_table('001')
+        rec1, rec2 = [p.pk for p in self.proteins[:2]]
+        for residue in Residue.objects.filter(generic_number__isnull=False):
+            protein_id = residue.protein_conformation.protein_id
+            for alternative in residue.alternative_generic_numbers.all():
+                self.assertEqual(table.label(residue.generic_number.label, alternative.scheme.slug, protein_id),
+                    alternative.label)
+        self.assertEqual(table.selection_labels('1x51', 'bw', {rec1, rec2}), ['1.51', '1.52'])
+        self.assertEqual(table.selection_labels('1x51', 'bw', {rec2}), ['1.52'])
+
+    def test_residues_api(self):
+        factory = APIRequestFactory()
+        for view, serializer in [(ResiduesList, ResidueSerializer), (ResiduesExtendedList, ResidueExtendedSerializer)]:
+            for protein in self.proteins:
+                request = factory.get('/services/residues/{}/'.format(protein.entry_name))
+                response = view.as_view()(request, entry_name=protein.entry_name)
+                expected = serializer(Residue.objects.filter(protein_conformation__protein=protein), many=True).data
+                self.assertEqual(self.normalise(response.data), self.normalise(expected))
+        response = ResiduesList.as_view()(factory.get('/services/residues/none/'), entry_name='none')
+        self.assertEqual(response.data, [])
+
+    def test_residues_api_queries(self):
+        # a fixed number of queries, not one per residue (the numbering table is built on the first request)
+        for url in ['/services/residues/rec1_human/', '/services/residues/extended/rec2_human/']:
+            self.assertQueryBudget(url, 10)
+
+    @staticmethod
+    def normalise(data):
+        # the order of the alternative generic numbers was not defined
+        data = json.loads(json.dumps(data))
+        for residue in data:
+            if 'alternative_generic_numbers' in residue:
+                residue['alternative_generic_numbers'].sort(key=lambda x: x['scheme'])
+        return data
+
+
+class BulkResidueBuilderTest(TestCase):
+    """Equivalents are created once per generic number and scheme, clashing labels are logged and not created"""
+
+    def test_equivalents(self):
+        gpcrdb = ResidueNumberingScheme.objects.create(slug='gpcrdb', short_name='GPCRdb', name='GPCRdb')
+        bw = ResidueNumberingScheme.objects.create(slug='bw', short_name='BW', name='Ballesteros-Weinstein')
+        tm1 = ProteinSegment.objects.create(slug='TM1', name='Transmembrane helix 1', category='helix',
+            proteinfamily='GPCR')
+        family = ProteinFamily.objects.create(slug='001', name='Receptors')
+        protein = Protein.objects.create(family=family, species=Species.objects.create(latin_name='Homo sapiens',
+            common_name='Human'), source=ProteinSource.objects.create(name='SWISSPROT'),
+            sequence_type=ProteinSequenceType.objects.create(slug='wt', name='Wild-type'),
+            residue_numbering_scheme=bw, entry_name='rec1_human', name='rec1_human', sequence='MAGNS')
+        conformation = ProteinConformation.objects.create(protein=protein,
+            state=ProteinState.objects.create(slug='active', name='Active'))
+
+        with override_settings(DEFAULT_NUMBERING_SCHEME='gpcrdb'):
+            builder = BulkResidueBuilder({s.slug: {'obj': s, 'generic_numbers': {}} for s in [gpcrdb, bw]})
+            # the second equivalent of 1x50 is ignored, 1x51 can not use the label of 1x50
+            for sequence_number, label, equivalent in [(1, '1x50', '1.50'), (2, '1x50', '1.49'), (3, '1x51', '1.50'),
+                (4, '1x52', '1.52')]:
+                builder.residues.append((Residue(protein_conformation=conformation, sequence_number=sequence_number,
+                    amino_acid='A', protein_segment=tm1), bw, {'generic_number': label, 'equivalent': equivalent}))
+            with self.assertLogs('build', 'ERROR') as logs:
+                residues = builder.write()
+        self.assertEqual(len(residues), 4)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('1x51', logs.output[0])
+        self.assertEqual(sorted(ResidueGenericNumberEquivalent.objects.values_list('default_generic_number__label',
+            'label')), [('1x50', '1.50'), ('1x52', '1.52')])
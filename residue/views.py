@@ -7,6 +7,7 @@ from django.views.generic import TemplateView
 
 from common.views import AbsTargetSelection
 from common.definitions import FULL_AMINO_ACIDS, STRUCTURAL_RULES, STRUCTURAL_SWITCHES
+from common.excel import excel_response, write_table
 from common.selection import Selection
 Alignment = getattr(__import__(
     'common.alignment_' + settings.SITE_NAME,
@@ -22,10 +23,12 @@ from interaction.models import ResidueFragmentInteraction
 from mutation.models import MutationExperiment
 from mutational_landscape.models import NaturalMutations, CancerMutations, DiseaseMutations, PTMs, NHSPrescribings
 from protein.models import ProteinSegment, Protein, ProteinGProtein, ProteinGProteinPair
-from residue.models import Residue,ResidueNumberingScheme, ResiduePositionSet, ResidueSet
+from residue.functions import get_numbering_table, get_residue_matrix
+from residue.models import ResiduePositionSet, ResidueSet
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 
+import numpy as np
 import re
 import time
 
@@ -59,6 +62,82 @@ class ResidueTablesSelection(AbsTargetSelection):
         }
 
 
+def get_residue_table(simple_selection):
+    """
+    Builds the residue numbering table of a selection (proteins and numbering schemes) from the numbering tables of
+    the receptor classes and the residue matrix of the proteins. Rows are the helix positions of each segment: the
+    labels in the selected schemes followed by the residue of each protein ('-' where it has none).
+    """
+    # local protein list
+    proteins = []
+
+    # flatten the selection into individual proteins
+    for target in simple_selection.targets:
+        if target.type == 'protein':
+            proteins.append(target.item)
+        elif target.type == 'family':
+            # species filter
+            species_list = []
+            for species in simple_selection.species:
+                species_list.append(species.item)
+
+            # annotation filter
+            protein_source_list = []
+            for protein_source in simple_selection.annotation:
+                protein_source_list.append(protein_source.item)
+
+            if species_list:
+                family_proteins = Protein.objects.filter(family__slug__startswith=target.item.slug,
+                    species__in=(species_list),
+                    source__in=(protein_source_list)).select_related('residue_numbering_scheme', 'species')
+            else:
+                family_proteins = Protein.objects.filter(family__slug__startswith=target.item.slug,
+                    source__in=(protein_source_list)).select_related('residue_numbering_scheme', 'species')
+
+            for fp in family_proteins:
+                proteins.append(fp)
+
+    # get the selection from session
+    selection = Selection()
+    if simple_selection:
+         selection.importer(simple_selection)
+    # extract numbering schemes
+    numbering_schemes = [x.item for x in selection.numbering_schemes]
+
+    # get the helices (TMs only at first)
+    segments = ProteinSegment.objects.filter(category='helix', proteinfamily='GPCR')
+
+    # the receptors of each class, labelled from the numbering table of their class
+    protein_ids = [x.pk for x in proteins]
+    class_proteins = defaultdict(set)
+    for protein_id, family_slug in Protein.objects.filter(pk__in=protein_ids).values_list('pk', 'family__slug'):
+        class_proteins[family_slug[:3]].add(protein_id)
+    numbering_tables = {c: get_numbering_table(c) for c in class_proteins}
+
+    matrix = get_residue_matrix(protein_ids, [x.slug for x in segments])
+    present = matrix.sequence_numbers > 0
+    residues = np.where(present, np.char.add(matrix.amino_acids, matrix.sequence_numbers.astype(str)), '-')
+
+    data = OrderedDict()
+    for segment in segments:
+        data[segment.slug] = []
+        for i in np.flatnonzero(matrix.segments == segment.slug):
+            gn = str(matrix.generic_numbers[i])
+            present_ids = {protein_ids[j] for j in np.flatnonzero(present[:, i])}
+            row = []
+            for scheme in numbering_schemes:
+                if scheme.slug == settings.DEFAULT_NUMBERING_SCHEME:
+                    row.append(gn)
+                    continue
+                labels = []
+                for class_slug, class_ids in class_proteins.items():
+                    labels += numbering_tables[class_slug].selection_labels(gn, scheme.slug, class_ids & present_ids)
+                row.append(' '.join(OrderedDict.fromkeys(labels)) or '-')
+            data[segment.slug].append(row + residues[:, i].tolist())
+
+    return {'proteins': proteins, 'numbering_schemes': numbering_schemes, 'segments': segments, 'data': data}
+
+
 class ResidueTablesDisplay(TemplateView):
     """
     A class rendering the residue numbering table.
@@ -73,121 +152,51 @@ class ResidueTablesDisplay(TemplateView):
 
         # get the user selection from session
         simple_selection = self.request.session.get('selection', False)
-
-         # local protein list
-        proteins = []
-
-        # flatten the selection into individual proteins
-        for target in simple_selection.targets:
-            if target.type == 'protein':
-                proteins.append(target.item)
-            elif target.type == 'family':
-                # species filter
-                species_list = []
-                for species in simple_selection.species:
-                    species_list.append(species.item)
-
-                # annotation filter
-                protein_source_list = []
-                for protein_source in simple_selection.annotation:
-                    protein_source_list.append(protein_source.item)
-
-                if species_list:
-                    family_proteins = Protein.objects.filter(family__slug__startswith=target.item.slug,
-                        species__in=(species_list),
-                        source__in=(protein_source_list)).select_related('residue_numbering_scheme', 'species')
-                else:
-                    family_proteins = Protein.objects.filter(family__slug__startswith=target.item.slug,
-                        source__in=(protein_source_list)).select_related('residue_numbering_scheme', 'species')
-
-                for fp in family_proteins:
-                    proteins.append(fp)
-
-            longest_name = 0
-            species_list = {}
-            for protein in proteins:
-                if protein.species.common_name not in species_list:
-                    if len(protein.species.common_name)>10 and len(protein.species.common_name.split())>1:
-                        name = protein.species.common_name.split()[0][0]+". "+" ".join(protein.species.common_name.split()[1:])
-                        if len(" ".join(protein.species.common_name.split()[1:]))>11:
-                            name = protein.species.common_name.split()[0][0]+". "+" ".join(protein.species.common_name.split()[1:])[:8]+".."
-                    else:
-                        name = protein.species.common_name
-                    species_list[protein.species.common_name] = name
+        table = get_residue_table(simple_selection)
+        proteins = table['proteins']
+        numbering_schemes = table['numbering_schemes']
+
+        longest_name = 0
+        species_list = {}
+        for protein in proteins:
+            if protein.species.common_name not in species_list:
+                if len(protein.species.common_name)>10 and len(protein.species.common_name.split())>1:
+                    name = protein.species.common_name.split()[0][0]+". "+" ".join(protein.species.common_name.split()[1:])
+                    if len(" ".join(protein.species.common_name.split()[1:]))>11:
+                        name = protein.species.common_name.split()[0][0]+". "+" ".join(protein.species.common_name.split()[1:])[:8]+".."
                 else:
-                    name = species_list[protein.species.common_name]
-
-                if len(re.sub('<[^>]*>', '', protein.name)+" "+name)>longest_name:
-                    longest_name = len(re.sub('<[^>]*>', '', protein.name)+" "+name)
-
-        # get the selection from session
-        selection = Selection()
-        if simple_selection:
-             selection.importer(simple_selection)
-        # # extract numbering schemes and proteins
-        numbering_schemes = [x.item for x in selection.numbering_schemes]
-
-        # # get the helices (TMs only at first)
-        segments = ProteinSegment.objects.filter(category='helix', proteinfamily='GPCR')
-
-        if ResidueNumberingScheme.objects.get(slug=settings.DEFAULT_NUMBERING_SCHEME) in numbering_schemes:
-            default_scheme = ResidueNumberingScheme.objects.get(slug=settings.DEFAULT_NUMBERING_SCHEME)
-        else:
-            default_scheme = numbering_schemes[0]
-
-        # prepare the dictionary
-        # each helix has a dictionary of positions
-        # default_generic_number or first scheme on the list is the key
-        # value is a dictionary of other gn positions and residues from selected proteins
-        data = OrderedDict()
-        for segment in segments:
-            data[segment.slug] = OrderedDict()
-            residues = Residue.objects.filter(protein_segment=segment, protein_conformation__protein__in=proteins).prefetch_related('protein_conformation__protein', 'protein_conformation__state', 'protein_segment',
-                'generic_number__scheme', 'display_generic_number__scheme', 'alternative_generic_numbers__scheme')
-            for scheme in numbering_schemes:
-                if scheme == default_scheme and scheme.slug == settings.DEFAULT_NUMBERING_SCHEME:
-                    for pos in list(set([x.generic_number.label for x in residues if x.protein_segment == segment])):
-                        data[segment.slug][pos] = {scheme.slug : pos, 'seq' : ['-']*len(proteins)}
-                elif scheme == default_scheme:
-                    for pos in list(set([x.generic_number.label for x in residues if x.protein_segment == segment])):
-                            data[segment.slug][pos] = {scheme.slug : pos, 'seq' : ['-']*len(proteins)}
-
-            for residue in residues:
-                alternatives = residue.alternative_generic_numbers.all()
-                pos = residue.generic_number
-                for alternative in alternatives:
-                    scheme = alternative.scheme
-                    if default_scheme.slug == settings.DEFAULT_NUMBERING_SCHEME:
-                        pos = residue.generic_number
-                        if scheme == pos.scheme:
-                            data[segment.slug][pos.label]['seq'][proteins.index(residue.protein_conformation.protein)] = str(residue)
-                        else:
-                            if scheme.slug not in data[segment.slug][pos.label].keys():
-                                data[segment.slug][pos.label][scheme.slug] = alternative.label
-                            if alternative.label not in data[segment.slug][pos.label][scheme.slug]:
-                                data[segment.slug][pos.label][scheme.slug] += " "+alternative.label
-                            data[segment.slug][pos.label]['seq'][proteins.index(residue.protein_conformation.protein)] = str(residue)
-                    else:
-                        if scheme.slug not in data[segment.slug][pos.label].keys():
-                            data[segment.slug][pos.label][scheme.slug] = alternative.label
-                        if alternative.label not in data[segment.slug][pos.label][scheme.slug]:
-                            data[segment.slug][pos.label][scheme.slug] += " "+alternative.label
-                        data[segment.slug][pos.label]['seq'][proteins.index(residue.protein_conformation.protein)] = str(residue)
-
-        # Preparing the dictionary of list of lists. Dealing with tripple nested dictionary in django templates is a nightmare
-        flattened_data = OrderedDict.fromkeys([x.slug for x in segments], [])
-
-        for s in iter(flattened_data):
-            flattened_data[s] = [[data[s][x][y.slug] for y in numbering_schemes]+data[s][x]['seq'] for x in sorted(data[s])]
+                    name = protein.species.common_name
+                species_list[protein.species.common_name] = name
+            else:
+                name = species_list[protein.species.common_name]
+
+            if len(re.sub('<[^>]*>', '', protein.name)+" "+name)>longest_name:
+                longest_name = len(re.sub('<[^>]*>', '', protein.name)+" "+name)
 
         context['header'] = zip([x.short_name for x in numbering_schemes] + [x.name+" "+species_list[x.species.common_name] for x in proteins], [x.name for x in numbering_schemes] + [x.name for x in proteins],[x.name for x in numbering_schemes] + [x.entry_name for x in proteins])
-        context['segments'] = [x.slug for x in segments]
-        context['data'] = flattened_data
+        context['segments'] = [x.slug for x in table['segments']]
+        context['data'] = table['data']
         context['number_of_schemes'] = len(numbering_schemes)
         context['longest_name'] = {'div' : longest_name*2, 'height': longest_name*2+80}
 
         return context
 
+def residue_table_excel(request):
+    """
+    Excel download of the residue numbering table.
+    """
+    table = get_residue_table(request.session.get('selection', False))
+    headers = ['Segment'] + [x.short_name for x in table['numbering_schemes']] + [x.entry_name for x in
+        table['proteins']]
+    rows = ([segment] + data_row for segment, segment_rows in table['data'].items()
+        for data_row in segment_rows)
+
+    def write(workbook):
+        write_table(workbook.add_worksheet('Residue table'), headers, rows,
+            header_format=workbook.add_format({'bold': True}))
+
+    return excel_response('GPCRdb_residue_table.xlsx', write)
+
 class ResidueFunctionBrowser(TemplateView):
     """
     Per generic position summary of functional information
@@ -21,7 +21,6 @@ from copy import deepcopy
 import numpy as np
 from operator import itemgetter
 import re
-from scipy.stats import t
 import time
 
 class SequenceSignature:
@@ -509,6 +508,7 @@ class SequenceSignature:
         Calculates the Z-scales (Z1-Z5) difference between two protein sets for each GN residue position
         Generates the full difference matrix and calculates the relevance (P-value) for each z-scale & position combination.
         """
+        from scipy.stats import t
         # Prepare zscales for both sets
         self.aln_pos.calculate_zscales()
         self.aln_neg.calculate_zscales()
@@ -710,7 +710,7 @@ class SequenceSignature:
             data {string} -- data type to save to workshet: 'alignment' or 'features' frequencies
         """
 
-        props = AMINO_ACID_GROUP_NAMES.values()
+        props = list(AMINO_ACID_GROUP_NAMES.values())
         worksheet = workbook.add_worksheet(worksheet_name)
 
         if aln == 'positive':
@@ -730,50 +730,8 @@ class SequenceSignature:
         numbering_schemes = self.common_schemes
         generic_numbers_set = self.common_gn
 
-        # First column, numbering schemes
-        for row, scheme in enumerate(numbering_schemes):
-            # worksheet.write(1 + 3*row, 0, scheme[1])
-            worksheet.write(1 + 3 * row, 0, 'Residue number')
-            worksheet.write(2 + 3 * row, 0, 'Sequence-based ({})'.format(scheme[2]))
-            worksheet.write(3 + 3*row, 0, 'Structure-based (GPCRdb)')
-
-        # First column, stats
-        if data == 'features':
-            for offset, prop in enumerate(props):
-                worksheet.write(1 + 3 * len(numbering_schemes) + offset, 0, prop)
-            if aln == 'signature':
-                worksheet.write(
-                    1 + 3 * len(numbering_schemes) + len(props),
-                    0,
-                    'Signature consensus'
-                    )
-            else:
-                worksheet.write(
-                    1 + 3 * len(numbering_schemes) + len(props),
-                    0,
-                    'Prop/AA consensus'
-                    )
-            worksheet.write(
-                2 + 3 * len(numbering_schemes) + len(props),
-                0,
-                'Length'
-            )
-        # First column, protein list (for alignment) and line for consensus sequence
-        else:
-            for offset, prot in enumerate(alignment.proteins):
-                worksheet.write(
-                    1 + 3 * len(numbering_schemes) + offset,
-                    0,
-                    prot.protein.entry_name
-                )
-            worksheet.write(
-                1 + 3 * len(numbering_schemes) + len(alignment.proteins),
-                0,
-                'Seq consensus'
-                )
-
-        # Second column and on
-        # Segments
+        # The rows are written from top to bottom, as constant_memory workbooks require
+        # Segments, from the second column on
         offset = 0
         for segment in generic_numbers_set[numbering_schemes[0][0]].keys():
             worksheet.merge_range(
@@ -785,45 +743,24 @@ class SequenceSignature:
             )
             offset += len(generic_numbers_set[numbering_schemes[0][0]][segment])
 
-        # Generic numbers
-        # for row, item in enumerate(generic_numbers_set.items()):
-        for row, item in enumerate(numbering_schemes):
-            scheme = item[0]
-            offset = 1
-            for _, gn_list in generic_numbers_set[scheme].items():
-                for col, gn_pair in enumerate(gn_list.items()):
-                    try:
-                        tm, bw, gpcrdb = re.split('\.|x', strip_html_tags(gn_pair[1]))
-                    except:
-                        tm, bw, gpcrdb = ('', '', '')
-                    worksheet.write(
-                        1 + 3 * row,
-                        col + offset,
-                        tm
-                    )
-                    worksheet.write(
-                        2 + 3 * row,
-                        col + offset,
-                        bw
-                    )
-                    worksheet.write(
-                        3 + 3*row,
-                        col + offset,
-                        gpcrdb
-                    )
-                offset += len(gn_list.items())
+        # Numbering schemes and generic numbers
+        for row, scheme in enumerate(numbering_schemes):
+            gn_parts = excel_generic_numbers(generic_numbers_set[scheme[0]])
+            worksheet.write_row(1 + 3 * row, 0, ['Residue number'] + [x[0] for x in gn_parts])
+            worksheet.write_row(2 + 3 * row, 0, ['Sequence-based ({})'.format(scheme[2])] + [x[1] for x in gn_parts])
+            worksheet.write_row(3 + 3 * row, 0, ['Structure-based (GPCRdb)'] + [x[2] for x in gn_parts])
 
         # Stats
         if data == 'features':
             offset = 1 + 3 * len(numbering_schemes)
 
-            for row, prop in enumerate(data_block):
+            for row, prop in enumerate(props):
+                worksheet.write(offset + row, 0, prop)
+                if row >= len(data_block):
+                    continue
                 col_offset = 0
-                for segment in prop:
+                for segment in data_block[row]:
                     for col, freq in enumerate(segment):
-                        # if aln == 'signature':
-                        #     cell_format = workbook.add_format(get_format_props(freq[1] if freq[0] != 0 else 5))
-                        # else:
                         if aln == 'signature':
                             cell_format = workbook.add_format(get_format_props(freq[1]))
                         else:
@@ -836,6 +773,13 @@ class SequenceSignature:
                             cell_format
                         )
                     col_offset += len(segment)
+
+            #Property group
+            worksheet.write(
+                offset + len(props),
+                0,
+                'Signature consensus' if aln == 'signature' else 'Prop/AA consensus'
+                )
             col_offset = 0
             for segment, cons_feat in feat_consensus.items():
                 for col, chunk in enumerate(cons_feat):
@@ -843,24 +787,38 @@ class SequenceSignature:
                         cell_format = workbook.add_format(get_format_props(feat=chunk[-1].replace('\u03b1', 'a')))
                     else:
                         cell_format = workbook.add_format(get_format_props(feat=chunk[0].replace('\u03b1', 'a')))
-                    #Property group
                     worksheet.write(
                         offset + len(AMINO_ACID_GROUPS),
                         1 + col + col_offset,
                         chunk[0],
                         cell_format
                     )
-                    #Length of prop
+                col_offset += len(cons_feat)
+
+            #Length of prop
+            worksheet.write(
+                1 + offset + len(props),
+                0,
+                'Length'
+            )
+            col_offset = 0
+            for segment, cons_feat in feat_consensus.items():
+                for col, chunk in enumerate(cons_feat):
                     worksheet.write(
                         1 + offset + len(AMINO_ACID_GROUPS),
                         1 + col + col_offset,
                         chunk[4],
                     )
+                col_offset += len(cons_feat)
+
+            #Percentages
+            col_offset = 0
+            for segment, cons_feat in feat_consensus.items():
+                for col, chunk in enumerate(cons_feat):
                     if aln == 'signature':
                         cell_format = workbook.add_format(get_format_props(int(chunk[2]/20)+5))
                     else:
                         cell_format = workbook.add_format(get_format_props(int(chunk[2]/10))) #if chunk[2] != 0 else get_format_props(-1))
-                    #Percentages
                     worksheet.write(
                         2 + offset + len(AMINO_ACID_GROUPS),
                         1 + col + col_offset,
@@ -868,11 +826,16 @@ class SequenceSignature:
                         cell_format
                     )
                 col_offset += len(cons_feat)
-        # Alignment
+        # Alignment, a row per protein and a line for the consensus sequence
         else:
             offset = 1 + 3 * len(alignment.numbering_schemes)
 
             for row, data in enumerate(alignment.proteins):
+                worksheet.write(
+                    offset + row,
+                    0,
+                    data.protein.entry_name
+                )
                 col_offset = 0
                 for segment, sequence in data.alignment.items():
                     for col, res in enumerate(sequence):
@@ -886,6 +849,11 @@ class SequenceSignature:
                     col_offset += len(sequence)
             # Consensus sequence
             row = 1 + 3 * len(alignment.numbering_schemes) + len(alignment.proteins)
+            worksheet.write(
+                row,
+                0,
+                'Seq consensus'
+                )
             col_offset = 0
             for segment, sequence in alignment.consensus.items():
                 for col, data in enumerate(sequence.items()):
@@ -897,6 +865,11 @@ class SequenceSignature:
                         res[0],
                         cell_format
                     )
+                col_offset += len(sequence.items())
+            col_offset = 0
+            for segment, sequence in alignment.consensus.items():
+                for col, data in enumerate(sequence.items()):
+                    res = data[1]
                     cell_format = workbook.add_format(get_format_props(res[1]))
                     worksheet.write(
                         row + 1,
@@ -904,7 +877,6 @@ class SequenceSignature:
                         res[2],
                         cell_format
                     )
-
                 col_offset += len(sequence.items())
 
     def per_gn_signature_excel(self, workbook, worksheet_name='SignByCol'):
@@ -1292,25 +1264,51 @@ class SignatureMatch():
             consensus_match[segment] = tmp
         return (prot_score/100, prot_score/self.norm*100, consensus_match)
 
+def excel_generic_numbers(generic_numbers):
+    """The helix, sequence-based and structure-based parts of the generic numbers of all segments, in order"""
+    parts = []
+    for _, gn_list in generic_numbers.items():
+        for gn_pair in gn_list.items():
+            try:
+                tm, bw, gpcrdb = re.split('\.|x', strip_html_tags(gn_pair[1]))
+            except:
+                tm, bw, gpcrdb = ('', '', '')
+            parts.append((tm, bw, gpcrdb))
+    return parts
+
+def write_protein_scores(workbook, worksheet, row, scores, signatures):
+    """A row per protein with its score and its residues at the signature positions"""
+    for protein, score in scores.items():
+        worksheet.write_row(
+            row,
+            0,
+            [
+                protein.protein.entry_name,
+                protein.protein.name,
+                protein.protein.family.parent.name,
+                protein.protein.family.parent.parent.name,
+                score[1],
+            ]
+        )
+        col_offset = 0
+        for segment, data in signatures[protein].items():
+            for col, res in enumerate(data):
+                cell_format = workbook.add_format({'bg_color': res[3],})
+                worksheet.write(
+                    row,
+                    5 + col + col_offset,
+                    res[4],
+                    cell_format
+                )
+            col_offset += len(data)
+        row += 1
+
 def signature_score_excel(workbook, scores, protein_signatures, signature_filtered, relevant_gn, relevant_segments, numbering_schemes, scores_positive=None, scores_negative=None, signatures_positive=None, signatures_negative=None):
 
     worksheet = workbook.add_worksheet('scored_proteins')
     #wrap = workbook.add_format({'text_wrap': True})
 
-
-    # First column, numbering schemes
-    for row, scheme in enumerate(numbering_schemes):
-        worksheet.write(1 + 3 * row, 4, 'Residue number')
-        worksheet.write(2 + 3 * row, 4, 'Sequence-based ({})'.format(scheme[2]))
-        worksheet.write(3 + 3*row, 4, 'Structure-based (GPCRdb)')
-    worksheet.write(2 + 3 * len(numbering_schemes), 0, 'UniProt')
-    worksheet.write(2 + 3 * len(numbering_schemes), 1, 'Receptor name (IUPHAR)')
-    worksheet.write(2 + 3 * len(numbering_schemes) ,2, 'Receptor family')
-    worksheet.write(2 + 3 * len(numbering_schemes) ,3, 'Ligand class')
-    # Score header
-    worksheet.write(2 + 3 * len(numbering_schemes), 4, 'Score')
-    #worksheet.write(1, 3, 'Normalized score')
-
+    # The rows are written from top to bottom, as constant_memory workbooks require
     offset = 0
     # Segments
     for segment, resi in relevant_segments.items():
@@ -1323,33 +1321,12 @@ def signature_score_excel(workbook, scores, protein_signatures, signature_filter
         )
         offset += len(resi)
 
-    # Generic numbers
-    # for row, item in enumerate(generic_numbers_set.items()):
+    # Numbering schemes and generic numbers
     for row, item in enumerate(numbering_schemes):
-        scheme = item[0]
-        offset = 1
-        for _, gn_list in relevant_gn[scheme].items():
-            for col, gn_pair in enumerate(gn_list.items()):
-                try:
-                    tm, bw, gpcrdb = re.split('\.|x', strip_html_tags(gn_pair[1]))
-                except:
-                    tm, bw, gpcrdb = ('', '', '')
-                worksheet.write(
-                    1 + 3 * row,
-                    4 + col + offset,
-                    tm
-                )
-                worksheet.write(
-                    2 + 3 * row,
-                    4 + col + offset,
-                    bw
-                )
-                worksheet.write(
-                    3 + 3*row,
-                    4 + col + offset,
-                    gpcrdb
-                )
-            offset += len(gn_list.items())
+        gn_parts = excel_generic_numbers(relevant_gn[item[0]])
+        worksheet.write_row(1 + 3 * row, 4, ['Residue number'] + [x[0] for x in gn_parts])
+        worksheet.write_row(2 + 3 * row, 4, ['Sequence-based ({})'.format(item[2])] + [x[1] for x in gn_parts])
+        worksheet.write_row(3 + 3 * row, 4, ['Structure-based (GPCRdb)'] + [x[2] for x in gn_parts])
 
     # Line for sequence signature
     worksheet.write(
@@ -1365,6 +1342,15 @@ def signature_score_excel(workbook, scores, protein_signatures, signature_filter
                 5 + col + col_offset,
                 chunk[0]
             )
+        col_offset += len(cons_feat)
+
+    # Score header and signature percentages
+    worksheet.write_row(2 + 3 * len(numbering_schemes), 0, ['UniProt', 'Receptor name (IUPHAR)', 'Receptor family',
+        'Ligand class', 'Score'])
+    #worksheet.write(1, 3, 'Normalized score')
+    col_offset = 0
+    for segment, cons_feat in signature_filtered.items():
+        for col, chunk in enumerate(cons_feat):
             cell_format = workbook.add_format(get_format_props(int(chunk[2]/20)+5))
             worksheet.write(
                 2 + 3 * len(numbering_schemes),
@@ -1374,54 +1360,8 @@ def signature_score_excel(workbook, scores, protein_signatures, signature_filter
             )
         col_offset += len(cons_feat)
 
-
-
     # Score lines
-    row_offset = 0
-    for protein, score in scores.items():
-        worksheet.write(
-            3 + 3 * len(numbering_schemes) + row_offset,
-            0,
-            protein.protein.entry_name,
-        )
-        worksheet.write(
-            3 + 3 * len(numbering_schemes) + row_offset,
-            1,
-            protein.protein.name
-        )
-        worksheet.write(
-            3 + 3 * len(numbering_schemes) + row_offset,
-            2,
-            protein.protein.family.parent.name,
-        )
-        worksheet.write(
-            3 + 3 * len(numbering_schemes) + row_offset,
-            3,
-            protein.protein.family.parent.parent.name,
-        )
-        # worksheet.write(
-        #     3 + 3 * len(numbering_schemes) + row_offset,
-        #     2,
-        #     score[0],
-        # )
-        worksheet.write(
-            3 + 3 * len(numbering_schemes) + row_offset,
-            4,
-            score[1],
-        )
-        col_offset = 0
-        for segment, data in protein_signatures[protein].items():
-            for col, res in enumerate(data):
-                cell_format = workbook.add_format({'bg_color': res[3],})
-                worksheet.write(
-                    3 + 3 * len(numbering_schemes) + row_offset,
-                    5 + col + col_offset,
-                    res[4],
-                    cell_format
-                )
-            col_offset += len(data)
-        row_offset += 1
-
+    write_protein_scores(workbook, worksheet, 3 + 3 * len(numbering_schemes), scores, protein_signatures)
 
     static_offset = 3 + 3 * len(numbering_schemes) + len(protein_signatures.items())
     #Scores for positive set (if specified)
@@ -1432,55 +1372,9 @@ def signature_score_excel(workbook, scores, protein_signatures, signature_filter
             'Protein set 1'
         )
         static_offset += 1
-
-        row_offset = 0
-        for protein, score in scores_positive.items():
-            worksheet.write(
-                static_offset + row_offset,
-                0,
-                protein.protein.entry_name,
-            )
-            worksheet.write(
-                static_offset + row_offset,
-                1,
-                protein.protein.name
-            )
-            worksheet.write(
-                static_offset + row_offset,
-                2,
-                protein.protein.family.parent.name,
-            )
-            worksheet.write(
-                static_offset + row_offset,
-                3,
-                protein.protein.family.parent.parent.name,
-            )
-            # worksheet.write(
-            #     3 + 3 * len(numbering_schemes) + row_offset,
-            #     2,
-            #     score[0],
-            # )
-            worksheet.write(
-                static_offset + row_offset,
-                4,
-                score[1],
-            )
-            col_offset = 0
-            for segment, data in signatures_positive[protein].items():
-                for col, res in enumerate(data):
-                    cell_format = workbook.add_format({'bg_color': res[3],})
-                    worksheet.write(
-                        static_offset + row_offset,
-                        5 + col + col_offset,
-                        res[4],
-                        cell_format
-                    )
-                col_offset += len(data)
-            row_offset += 1
+        write_protein_scores(workbook, worksheet, static_offset, scores_positive, signatures_positive)
         static_offset += len(scores_positive.items())
 
-
-
     #Scores for negative set (if specified)
     if scores_negative:
         worksheet.write(
@@ -1489,48 +1383,4 @@ def signature_score_excel(workbook, scores, protein_signatures, signature_filter
             'Protein set 2'
         )
         static_offset += 1
-
-        row_offset = 0
-        for protein, score in scores_negative.items():
-            worksheet.write(
-                static_offset + row_offset,
-                0,
-                protein.protein.entry_name,
-            )
-            worksheet.write(
-                static_offset + row_offset,
-                1,
-                protein.protein.name
-            )
-            worksheet.write(
-                static_offset + row_offset,
-                2,
-                protein.protein.family.parent.name,
-            )
-            worksheet.write(
-                static_offset + row_offset,
-                3,
-                protein.protein.family.parent.parent.name,
-            )
-            # worksheet.write(
-            #     3 + 3 * len(numbering_schemes) + row_offset,
-            #     2,
-            #     score[0],
-            # )
-            worksheet.write(
-                static_offset + row_offset,
-                4,
-                score[1],
-            )
-            col_offset = 0
-            for segment, data in signatures_negative[protein].items():
-                for col, res in enumerate(data):
-                    cell_format = workbook.add_format({'bg_color': res[3],})
-                    worksheet.write(
-                        static_offset + row_offset,
-                        5 + col + col_offset,
-                        res[4],
-                        cell_format
-                    )
-                col_offset += len(data)
-            row_offset += 1
+        write_protein_scores(workbook, worksheet, static_offset, scores_negative, signatures_negative)
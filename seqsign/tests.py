@@ -0,0 +1,151 @@
+from django.test import SimpleTestCase
+
+from common.definitions import AMINO_ACID_GROUP_NAMES
+from seqsign.sequence_signature import SequenceSignature, signature_score_excel
+
+from collections import OrderedDict
+import json
+import os
+
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+SCHEMES = [('gpcrdba', 'GPCRdb(A)', 'BW'), ('gpcrdbb', 'GPCRdb(B)', 'Wootten')]
+GENERIC_NUMBERS = OrderedDict([
+    ('gpcrdba', OrderedDict([
+        ('TM3', OrderedDict([('3x49', '3.49x49'), ('3x50', '<b>3.50</b>x50')])),
+        ('ICL2', OrderedDict([('34x50', '34.50x50')])),
+        ])),
+    ('gpcrdbb', OrderedDict([
+        ('TM3', OrderedDict([('3x49', '3.52x49'), ('3x50', '3.53x50')])),
+        ('ICL2', OrderedDict([('34x50', '-')])),
+        ])),
+    ])
+SEGMENTS = OrderedDict([('TM3', 2), ('ICL2', 1)])
+
+
+class Record:
+    """The attributes of a model instance, hashable as the proteins are the keys of the scores"""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def segment_data(values):
+    """Splits the values of the three positions into the segments"""
+    values = iter(values)
+    return OrderedDict((segment, [next(values) for _ in range(length)]) for segment, length in SEGMENTS.items())
+
+def protein(entry_name, name='', family='', ligand_class=''):
+    parent = Record(name=family, parent=Record(name=ligand_class))
+    return Record(protein=Record(entry_name=entry_name, name=name, family=Record(parent=parent)))
+
+def alignment(sequences):
+    proteins = []
+    for entry_name, sequence in sequences.items():
+        aligned = protein(entry_name)
+        aligned.alignment = segment_data([(None, None, aa) for aa in sequence])
+        proteins.append(aligned)
+    consensus = OrderedDict((segment, OrderedDict(('{}x{}'.format(segment, col), data) for col, data in
+        enumerate(column))) for segment, column in segment_data([('D', 9, 90), ('R', 7, 75), ('-', 2, 20)]).items())
+    return Record(proteins=proteins, consensus=consensus, numbering_schemes=SCHEMES,
+        feature_stats=feature_stats(2))
+
+def feature_stats(offset):
+    return [list(segment_data([(10.0 * row + col, (row + col + offset) % 11) for col in range(3)]).values())
+        for row in range(len(AMINO_ACID_GROUP_NAMES))]
+
+def consensus(percentages):
+    # feature, name, percentage, frequency, length and feature code
+    return segment_data([('HY', 'Hydrophobic', percent, 0, 3, 'HY') for percent in percentages])
+
+def sequence_signature():
+    signature = SequenceSignature.__new__(SequenceSignature)
+    signature.common_schemes = SCHEMES
+    signature.common_gn = GENERIC_NUMBERS
+    signature.aln_pos = alignment(OrderedDict([('adrb2_human', 'DRY'), ('adrb1_human', 'ERY')]))
+    signature.aln_neg = alignment(OrderedDict([('oprm_mouse', 'DRH')]))
+    signature.features_consensus_pos = consensus([90, 80, 30])
+    signature.features_consensus_neg = consensus([70, 0, 100])
+    signature.features_frequency_diff_display = [[[(freq, freq_class - 1) for freq, freq_class in segment]
+        for segment in row] for row in feature_stats(0)]
+    signature.signature = consensus([100, -40, 0])
+    return signature
+
+
+class RecordingWorksheet:
+    """Keeps the cells as the last write left them and the order of the written rows"""
+
+    def __init__(self):
+        self.cells = {}
+        self.merged = []
+        self.rows = []
+
+    def write(self, row, col, value, cell_format=None):
+        self.rows.append(row)
+        self.cells['{},{}'.format(row, col)] = [value, cell_format]
+
+    def write_row(self, row, col, values, cell_format=None):
+        for offset, value in enumerate(values):
+            self.write(row, col + offset, value, cell_format)
+
+    def merge_range(self, first_row, first_col, last_row, last_col, value, cell_format=None):
+        self.rows.append(first_row)
+        self.merged.append([first_row, first_col, last_row, last_col, value])
+
+
+class RecordingWorkbook:
+
+    def __init__(self):
+        self.worksheets = OrderedDict()
+
+    def add_worksheet(self, name):
+        self.worksheets[name] = RecordingWorksheet()
+        return self.worksheets[name]
+
+    def add_format(self, properties):
+        return properties
+
+
+class SignatureExcelTest(SimpleTestCase):
+    """The worksheets are written row by row for constant_memory workbooks. The cells must be those of the
+    worksheets written before, signature_excel_cells.json holds the cells written then for the fixtures above"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(os.path.join(TESTDATA, 'signature_excel_cells.json')) as f:
+            cls.expected = json.load(f)
+
+    def assertWorksheet(self, worksheet, name):
+        self.assertEqual(worksheet.rows, sorted(worksheet.rows))
+        # JSON has lists for the tuples
+        cells, merged = json.loads(json.dumps([worksheet.cells, worksheet.merged]))
+        self.assertEqual(cells, self.expected[name]['cells'])
+        self.assertEqual(merged, self.expected[name]['merged'])
+
+    def test_prepare_excel_worksheet(self):
+        signature = sequence_signature()
+        workbook = RecordingWorkbook()
+        for aln in ['positive', 'negative', 'signature']:
+            for data in ['alignment', 'features']:
+                if aln == 'signature' and data == 'alignment':
+                    continue
+                name = '{}_{}'.format(aln, data)
+                signature.prepare_excel_worksheet(workbook, name, aln, data)
+                self.assertWorksheet(workbook.worksheets[name], name)
+
+    def test_signature_score_excel(self):
+        proteins = [protein('adrb2_human', 'β2-adrenoceptor', 'Adrenoceptors', 'Aminergic receptors'),
+            protein('oprm_mouse', 'μ receptor', 'Opioid receptors', 'Peptide receptors'),
+            protein('drd2_human', 'D2 receptor', 'Dopamine receptors', 'Aminergic receptors')]
+        scores = OrderedDict([(proteins[0], (12, 85.5)), (proteins[1], (3, 20.0))])
+        signatures = {p: segment_data([(None, None, None, color, aa) for aa, color in
+            zip(sequence, ['#ffffff', '#93d050', '#ff0000'])]) for p, sequence in zip(proteins, ['DRY', 'DRH', 'ERY'])}
+        relevant_segments = OrderedDict((segment, list(range(length))) for segment, length in SEGMENTS.items())
+        workbook = RecordingWorkbook()
+        signature_score_excel(workbook, scores, signatures, consensus([100, -40, 0]), GENERIC_NUMBERS,
+            relevant_segments, SCHEMES, scores_positive=OrderedDict([(proteins[2], (10, 70.0))]),
+            scores_negative=OrderedDict([(proteins[1], (3, 20.0))]), signatures_positive=signatures,
+            signatures_negative=signatures)
+        self.assertWorksheet(workbook.worksheets['scored_proteins'], 'scored_proteins')
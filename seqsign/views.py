@@ -1,20 +1,18 @@
 from django.shortcuts import render, redirect
 from django.conf import settings
-from django.http import HttpResponse
 
 
 from alignment.functions import get_proteins_from_selection
 from common.selection import Selection
 from common.views import AbsTargetSelection
 from common.views import AbsSegmentSelection
+from common.excel import excel_response
 from seqsign.sequence_signature import SequenceSignature, SignatureMatch, signature_score_excel
 
 Alignment = getattr(__import__('common.alignment_' + settings.SITE_NAME, fromlist=['Alignment']), 'Alignment')
 
 from collections import OrderedDict
 from copy import deepcopy
-from io import BytesIO
-import xlsxwriter
 
 
 class PosTargetSelection(AbsTargetSelection):
@@ -163,55 +161,45 @@ def render_signature_excel(request):
     # calculate the signture
     signature.calculate_signature()
 
-    outstream = BytesIO()
-    # wb = xlsxwriter.Workbook('excel_test.xlsx', {'in_memory': False})
-    wb = xlsxwriter.Workbook(outstream, {'in_memory': True})
-    # Feature stats for signature
-    signature.prepare_excel_worksheet(
-        wb,
-        'signature_properties',
-        'signature',
-        'features'
-    )
-    # Feature stats for positive group alignment
-    signature.prepare_excel_worksheet(
-        wb,
-        'protein_set1_properties',
-        'positive',
-        'features'
-    )
-    # Positive group alignment
-    signature.prepare_excel_worksheet(
-        wb,
-        'protein_set1_aln',
-        'positive',
-        'alignment'
-    )
-    # Feature stats for negative group alignment
-    signature.prepare_excel_worksheet(
-        wb,
-        'protein_set2_properties',
-        'negative',
-        'features'
-    )
-    # Negative group alignment
-    signature.prepare_excel_worksheet(
-        wb,
-        'protein_set2_aln',
-        'negative',
-        'alignment'
-    )
-    signature.per_gn_signature_excel(wb)
-
-    wb.close()
-    outstream.seek(0)
-    response = HttpResponse(
-        outstream.read(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    def write(wb):
+        # Feature stats for signature
+        signature.prepare_excel_worksheet(
+            wb,
+            'signature_properties',
+            'signature',
+            'features'
         )
-    response['Content-Disposition'] = "attachment; filename=sequence_signature.xlsx"
+        # Feature stats for positive group alignment
+        signature.prepare_excel_worksheet(
+            wb,
+            'protein_set1_properties',
+            'positive',
+            'features'
+        )
+        # Positive group alignment
+        signature.prepare_excel_worksheet(
+            wb,
+            'protein_set1_aln',
+            'positive',
+            'alignment'
+        )
+        # Feature stats for negative group alignment
+        signature.prepare_excel_worksheet(
+            wb,
+            'protein_set2_properties',
+            'negative',
+            'features'
+        )
+        # Negative group alignment
+        signature.prepare_excel_worksheet(
+            wb,
+            'protein_set2_aln',
+            'negative',
+            'alignment'
+        )
+        signature.per_gn_signature_excel(wb)
 
-    return response
+    return excel_response('sequence_signature.xlsx', write)
 
 def render_signature_match_scores(request, cutoff):
 
@@ -257,10 +245,7 @@ def render_signature_match_excel(request):
 
     scores_data = request.session.get('signature_match', False)
 
-    outstream = BytesIO()
-    wb = xlsxwriter.Workbook(outstream, {'in_memory': True})
-
-    signature_score_excel(
+    return excel_response('sequence_signature_protein_scores.xlsx', lambda wb: signature_score_excel(
         wb,
         scores_data['scores'],
         scores_data['protein_signatures'],
@@ -272,14 +257,4 @@ def render_signature_match_excel(request):
         scores_data['scores_neg'],
         scores_data['signatures_pos'],
         scores_data['signatures_neg'],
-
-    )
-    wb.close()
-    outstream.seek(0)
-    response = HttpResponse(
-        outstream.read(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    response['Content-Disposition'] = "attachment; filename=sequence_signature_protein_scores.xlsx"
-
-    return response
+    ))
@@ -0,0 +1,177 @@
+"""
+Coupling matrix of the receptors and G proteins, built from ProteinGProteinPair by build_coupling_matrix.
+
+The arrays hold receptors x G protein families x sources the transduction labels (GuideToPharma) and the best
+log(Emax/EC50) of the family (Aska), and receptors x G protein subunits x sources the log(Emax/EC50) of each
+subunit. Missing labels are '' and missing values NaN. Only plain numpy arrays are stored, in BUILD_DATA_DIR.
+"""
+from common.release import ReleaseArrays
+from protein.models import Protein, ProteinFamily, ProteinGProteinPair
+
+from collections import OrderedDict
+from decimal import Decimal
+
+import numpy as np
+
+
+# increase when the stored arrays change, older data is then rebuilt from the database
+COUPLING_FORMAT_VERSION = 1
+
+SOURCES = ['GuideToPharma', 'Aska']
+
+# G protein families and subunits in the order of the coupling tables, others are added after them
+G_PROTEIN_FAMILIES = ['Gs', 'Gi/Go', 'Gq/G11', 'G12/G13']
+G_PROTEIN_SUBUNITS = OrderedDict([('Gs', ['gnas2', 'gnal']), ('Gi/Go', ['gnai1', 'gnai3', 'gnao', 'gnaz']),
+    ('Gq/G11', ['gnaq', 'gna14', 'gna15']), ('G12/G13', ['gna12', 'gna13'])])
+
+# best log(Emax/EC50) above which a family is a primary or a secondary transducer
+THRESHOLD_PRIMARY = -0.1
+THRESHOLD_SECONDARY = -1
+
+
+def table_order(names, ordered):
+    return sorted(names, key=lambda x: (ordered.index(x) if x in ordered else len(ordered), x))
+
+def display_value(value):
+    """log(Emax/EC50) as shown in the coupling tables, rounded to two decimals"""
+    value = Decimal('{:.2f}'.format(value))
+    if value == 0:
+        return 0.00
+    return value
+
+def coupling_level(best):
+    """'primary', 'secondary' or 'no coupling' for the best log(Emax/EC50) of a family. As in the coupling tables,
+    the value rounded to two decimals is compared to the thresholds"""
+    best = display_value(best)
+    if best > THRESHOLD_PRIMARY:
+        return 'primary'
+    elif best > THRESHOLD_SECONDARY:
+        return 'secondary'
+    return 'no coupling'
+
+def entry_short(entry_name):
+    return entry_name.split('_')[0].upper()
+
+
+class CouplingMatrix(ReleaseArrays):
+    """Transduction labels and log(Emax/EC50) values of all receptors with couplings and all human wild type
+    GPCRs, the latter first"""
+
+    # arrays with one row per receptor
+    RECEPTOR_ARRAYS = ['entry_names', 'names', 'family_slugs', 'class_names', 'human_wt', 'transduction', 'best',
+        'log_rai']
+
+    FILENAME = 'coupling_matrix.npz'
+    FORMAT_VERSION = COUPLING_FORMAT_VERSION
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.receptors = {e: i for i, e in enumerate(arrays['entry_names'].tolist())}
+        self.families = {f: i for i, f in enumerate(arrays['families'].tolist())}
+        self.subunits = {s: i for i, s in enumerate(arrays['subunits'].tolist())}
+        self.sources = {s: i for i, s in enumerate(arrays['sources'].tolist())}
+
+    @classmethod
+    def from_database(cls):
+        receptors = OrderedDict()
+        class_names = dict(ProteinFamily.objects.filter(slug__regex=r'^[0-9]{3}$').values_list('slug', 'name'))
+        for entry_name, name, family_slug in Protein.objects.filter(sequence_type__slug='wt',
+            family__slug__startswith='00', species__common_name='Human').values_list('entry_name', 'name',
+            'family__slug'):
+            receptors[entry_name] = (name, family_slug, True)
+
+        pairs = list(ProteinGProteinPair.objects.filter(source__in=SOURCES).values_list('protein__entry_name',
+            'protein__name', 'protein__family__slug', 'g_protein__name', 'g_protein_subunit__entry_name', 'source',
+            'transduction', 'log_rai_mean'))
+        for entry_name, name, family_slug in sorted(set(p[:3] for p in pairs if p[0] not in receptors)):
+            receptors[entry_name] = (name, family_slug, False)
+
+        families = table_order({p[3].replace(' family', '') for p in pairs}, G_PROTEIN_FAMILIES)
+        g_protein_names = {p[3].replace(' family', ''): p[3] for p in pairs}
+        ordered_subunits = [s for subunits in G_PROTEIN_SUBUNITS.values() for s in subunits]
+        subunits = table_order({p[4].replace('_human', '') for p in pairs if p[4]}, ordered_subunits)
+
+        matrix = cls({
+            'version': np.array(COUPLING_FORMAT_VERSION),
+            'entry_names': np.array(list(receptors), dtype=str),
+            'names': np.array([r[0] for r in receptors.values()], dtype=str),
+            'family_slugs': np.array([r[1] for r in receptors.values()], dtype=str),
+            'class_names': np.array([class_names.get(r[1][:3], '') for r in receptors.values()], dtype=str),
+            'human_wt': np.array([r[2] for r in receptors.values()], dtype=bool),
+            'families': np.array(families, dtype=str),
+            'g_protein_names': np.array([g_protein_names[f] for f in families], dtype=str),
+            'subunits': np.array(subunits, dtype=str),
+            'sources': np.array(SOURCES, dtype=str),
+            })
+        transduction = np.full((len(receptors), len(families), len(SOURCES)), '', dtype=object)
+        best = np.full((len(receptors), len(families), len(SOURCES)), np.nan)
+        log_rai = np.full((len(receptors), len(subunits), len(SOURCES)), np.nan)
+
+        for entry_name, name, family_slug, g_protein, subunit, source, t, m in pairs:
+            r = matrix.receptors[entry_name]
+            f = matrix.families[g_protein.replace(' family', '')]
+            s = matrix.sources[source]
+            if t:
+                transduction[r, f, s] = t
+            elif m is not None:
+                best[r, f, s] = np.fmax(best[r, f, s], m)
+                if subunit:
+                    log_rai[r, matrix.subunits[subunit.replace('_human', '')], s] = m
+
+        matrix.arrays['transduction'] = transduction.astype(str)
+        matrix.arrays['best'] = best
+        matrix.arrays['log_rai'] = log_rai
+        return matrix
+
+    def levels(self, source):
+        """Coupling of each receptor (rows) to each G protein family (columns) in a source: the transduction label
+        or, from the best log(Emax/EC50), 'primary', 'secondary' or 'no coupling'. '' without data"""
+        if source not in self.sources:
+            return np.full((len(self.receptors), len(self.families)), '', dtype='<U11')
+        s = self.sources[source]
+        best = self.arrays['best'][:, :, s]
+        levels = np.full(best.shape, '', dtype='<U11')
+        for index in zip(*np.nonzero(~np.isnan(best))):
+            levels[index] = coupling_level(best[index])
+        transduction = self.arrays['transduction'][:, :, s]
+        return np.where(transduction != '', transduction, levels)
+
+    def merged_levels(self, no_coupling=True):
+        """The strongest coupling of each receptor to each G protein family in all sources, 'no coupling' is
+        only included when no_coupling is set"""
+        levels = np.stack([self.levels(source) for source in self.sources])
+        merged = np.full(levels.shape[1:], '', dtype='<U11')
+        for level in (['no coupling'] if no_coupling else []) + ['secondary', 'primary']:
+            merged[(levels == level).any(axis=0)] = level
+        return merged
+
+    def subunit_values(self, source):
+        """log(Emax/EC50) of each receptor (rows) for each G protein subunit (columns) in a source, NaN without
+        data"""
+        return self.arrays['log_rai'][:, :, self.sources[source]]
+
+    def merge_orthologs(self):
+        """CouplingMatrix of the human wild type receptors, with the couplings of the receptors sharing their entry
+        name before the species (e.g. adrb2_mouse for adrb2_human) merged in, as the coupling tables show them. The
+        highest log(Emax/EC50) is kept, and the transduction label of the human receptor over those of the others"""
+        human = np.flatnonzero(self.arrays['human_wt'])
+        arrays = {k: self.arrays[k] for k in self.arrays}
+        for k in self.RECEPTOR_ARRAYS:
+            arrays[k] = arrays[k][human]
+        rows = {entry_short(e): i for i, e in enumerate(arrays['entry_names'].tolist())}
+
+        for r in np.flatnonzero(~self.arrays['human_wt']):
+            i = rows.get(entry_short(str(self.arrays['entry_names'][r])))
+            if i is None:
+                continue
+            transduction = arrays['transduction'][i]
+            arrays['transduction'][i] = np.where(transduction != '', transduction, self.arrays['transduction'][r])
+            arrays['best'][i] = np.fmax(arrays['best'][i], self.arrays['best'][r])
+            arrays['log_rai'][i] = np.fmax(arrays['log_rai'][i], self.arrays['log_rai'][r])
+        return CouplingMatrix(arrays)
+
+
+def get_coupling_matrix():
+    """The CouplingMatrix of the current data release, built from the database if build_coupling_matrix did not
+    run"""
+    return CouplingMatrix.current()
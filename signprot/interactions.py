@@ -1,5 +1,4 @@
 import json
-import re
 import time
 from itertools import chain
 import string
@@ -8,8 +7,9 @@ import random
 from collections import Counter
 
 from residue.models import ResidueGenericNumberEquivalent
+from signprot.couplings import G_PROTEIN_FAMILIES, get_coupling_matrix
 from signprot.models import SignprotComplex
-from protein.models import Protein, ProteinSegment, ProteinFamily, ProteinGProteinPair
+from protein.models import ProteinSegment, ProteinFamily
 from common.definitions import *
 
 from django.core.exceptions import ObjectDoesNotExist
@@ -219,13 +219,7 @@ def prepare_signature_match(signature_match):
     gprots = ['Gs','Gi/Go','Gq/G11','G12/G13']
     class_coupling = 'coupling '
 
-    coupling_data = prepare_coupling_data_container()
-    coupling_data = fill_coupling_data_container(coupling_data)
-    coupling_data = process_coupling_data(coupling_data)
-    
-    coupling_data_dict = {}
-    for e in coupling_data:
-        coupling_data_dict[e['rec_obj'].entry_name] = e
+    coupling_data_dict = get_coupling_data()
 
     out = {}
     for elem in signature_match["scores"].items():
@@ -327,220 +321,19 @@ def prepare_signature_match(signature_match):
     return out
 
 
-def prepare_coupling_data_container():
-    class_names = {}
-    data = {}
-
-    complex_objs = SignprotComplex.objects.prefetch_related('structure__protein_conformation__protein').values_list('structure__protein_conformation__protein__parent_id', flat=True)
-    proteins = (
-        Protein.objects.filter(
-            sequence_type__slug="wt",
-            family__slug__startswith="00",
-            species__common_name="Human")
-        # .exclude(id__in=complex_objs)
-        .prefetch_related("family")
-    )
-
-    for p in proteins:
-        p_class = p.family.slug.split("_")[0]
-        if p_class not in class_names:
-            class_names[p_class] = re.sub(
-                r"\([^)]*\)", "", p.family.parent.parent.parent.name
-            )
-        p_class_name = class_names[p_class].strip()
-
-        data[p.entry_short()] = {
-            "class": p_class_name,
-            "pretty": p.short()[:15],
-            "GuideToPharma": {},
-            "Aska": {},
-            "rec_class": p.get_protein_class(),
-            "rec_obj": p,
-            "rec_pdb": p.entry_short(),
-        }
-
-    return data
-
-
-def fill_coupling_data_container(data, sources=["GuideToPharma", "Aska"]):
-    threshold_primary = -0.1
-    threshold_secondary = -1
-
-    distinct_g_families = []
-    distinct_g_subunit_families = {}
-    distinct_sources = sources
-
-    couplings = ProteinGProteinPair.objects.all().prefetch_related(
-        "protein", "g_protein_subunit", "g_protein"
-    )
-
-    for c in couplings:
-        p = c.protein.entry_short()
-        s = c.source
-        t = c.transduction
-        m = c.log_rai_mean
-        gf = c.g_protein.name
-        # print(gf)
-        gf = gf.replace(" family", "")
-
-        if s not in distinct_sources:
-            continue
-
-        if gf not in distinct_g_families:
-            distinct_g_families.append(gf)
-            distinct_g_subunit_families[gf] = []
-
-        if c.g_protein_subunit:
-            g = c.g_protein_subunit.entry_name
-            g = g.replace("_human", "")
-            # print("g",g)
-            if g not in distinct_g_subunit_families[gf]:
-                distinct_g_subunit_families[gf].append(g)
-                distinct_g_subunit_families[gf] = sorted(
-                    distinct_g_subunit_families[gf]
-                )
-
-        if s not in data[p]:
-            data[p][s] = {}
-
-        if gf not in data[p][s]:
-            data[p][s][gf] = {}
-
-        # If transduction in GuideToPharma data
-        if t:
-            data[p][s][gf] = t
-        else:
-            if "subunits" not in data[p][s][gf]:
-                data[p][s][gf] = {"subunits": {}, "best": -2.00}
-            data[p][s][gf]["subunits"][g] = round(Decimal(m), 2)
-            if round(Decimal(m), 2) == -0.00:
-                data[p][s][gf]["subunits"][g] = 0.00
-            # get the lowest number into 'best'
-            if m > data[p][s][gf]["best"]:
-                data[p][s][gf]["best"] = round(Decimal(m), 2)
-
+def get_coupling_data():
+    """Coupling of the human wild type GPCRs to the G protein families in each source and merged, from the coupling
+    matrix. {entry name: {'coupling': {source: {family: level}}, source: {family: coupled}}}"""
+    matrix = get_coupling_matrix().merge_orthologs()
+    levels = {source: matrix.levels(source) for source in ['GuideToPharma', 'Aska']}
+    levels['Merged'] = matrix.merged_levels()
 
+    data = {}
+    for r in range(len(matrix.receptors)):
+        e = {'coupling': {}}
+        for source, source_levels in levels.items():
+            e['coupling'][source] = {gf: str(source_levels[r, f]) for gf, f in matrix.families.items()
+                if source_levels[r, f]}
+            e[source] = {gf: gf in e['coupling'][source] for gf in G_PROTEIN_FAMILIES}
+        data[str(matrix.arrays['entry_names'][r])] = e
     return data
-
-
-def process_coupling_data(data):
-    res = []
-
-    for entry in data.keys():
-        i = data[entry]
-
-        e = {}
-
-        c_gtop = extract_coupling_bool(i, "GuideToPharma")
-        p_gtop = extract_coupling_primary(i["GuideToPharma"])
-
-        c_aska = extract_coupling_bool(i, "Aska")
-        p_aska = extract_coupling_primary(c_aska[1])
-
-        c_merg = extract_coupling_bool(i, "Merged")
-        p_merg = extract_coupling_primary(c_merg[1])
-        
-        e['coupling'] = {}
-        e["GuideToPharma"] = {}
-        e["Aska"] = {}
-        e["Merged"] = {}
-
-        e["rec_class"] = i["rec_class"]
-        e["rec_obj"] = i["rec_obj"]
-        e["key"] = entry
-        
-        e["coupling"]["GuideToPharma"] = i["GuideToPharma"]
-        e["coupling"]["Aska"] = c_aska[1]
-        e["coupling"]["Merged"] = c_merg[1]
-        
-        e["GuideToPharma"]["Gi/Go"] = c_gtop["Gi/Go"]
-        e["GuideToPharma"]["Gs"] = c_gtop["Gs"]
-        e["GuideToPharma"]["Gq/G11"] = c_gtop["Gq/G11"]
-        e["GuideToPharma"]["G12/G13"] = c_gtop["G12/G13"]
-        
-        e["Aska"]["Gi/Go"] = c_aska[0]["Gi/Go"]
-        e["Aska"]["Gs"] = c_aska[0]["Gs"]
-        e["Aska"]["Gq/G11"] = c_aska[0]["Gq/G11"]
-        e["Aska"]["G12/G13"] = c_aska[0]["G12/G13"]
-        
-        e["Merged"]["Gi/Go"] = c_merg[0]["Gi/Go"]
-        e["Merged"]["Gs"] = c_merg[0]["Gs"]
-        e["Merged"]["Gq/G11"] = c_merg[0]["Gq/G11"]
-        e["Merged"]["G12/G13"] = c_merg[0]["G12/G13"]
-
-        e["GuideToPharma"]["gprot"] = p_gtop
-        e["Aska"]["gprot"] = p_aska
-        e["Merged"]["gprot"] = p_merg
-
-        res.append(e)
-
-    return res
-
-
-def extract_coupling_bool(gp, source):
-    distinct_g_families = ['Gs','Gi/Go', 'Gq/G11', 'G12/G13', ]
-    distinct_g_subunit_families = OrderedDict([('Gs',['gnas2','gnal']), ('Gi/Go',['gnai1', 'gnai3', 'gnao', 'gnaz']), ('Gq/G11',['gnaq', 'gna14', 'gna15']), ('G12/G13',['gna12', 'gna13'])])
-    threshold_primary = -0.1
-    threshold_secondary = -1
-
-    if source == 'GuideToPharma':
-        gp = gp[source]
-        c = {"Gi/Go": False, "Gs": False, "Gq/G11": False, "G12/G13": False}
-        for key in c:
-            if key in gp:
-                c[key] = True
-        return c
-
-    elif source == 'Aska':
-        gp = gp[source]
-        c = {"Gi/Go": False, "Gs": False, "Gq/G11": False, "G12/G13": False}
-        c_levels = {}
-
-        for gf in distinct_g_families:
-            if gf in gp:
-                if gp[gf]['best']>threshold_primary:
-                    c[gf] = True
-                    c_levels[gf] = "primary"
-                elif gp[gf]['best']>threshold_secondary:
-                    c[gf] = True
-                    c_levels[gf] = "secondary"
-                else:
-                    c[gf] = True
-                    c_levels[gf] = "no coupling"
-        return (c, c_levels)
-
-    elif source == 'Merged':
-        c = {"Gi/Go": False, "Gs": False, "Gq/G11": False, "G12/G13": False}
-        c_levels = {}
-        v = gp
-
-        for gf in distinct_g_families:
-            values = []
-            if 'GuideToPharma' in v and gf in v['GuideToPharma']:
-                values.append(v['GuideToPharma'][gf])
-            if 'Aska' in v and gf in v['Aska']:
-                best = v['Aska'][gf]['best']
-                if best > threshold_primary:
-                    values.append('primary')
-                elif best > threshold_secondary:
-                    values.append('secondary')
-                else:
-                    values.append("no coupling")
-            if 'primary' in values:
-                c[gf] = True
-                c_levels[gf] = "primary"
-            elif 'secondary' in values:
-                c[gf] = True
-                c_levels[gf] = "secondary"
-            elif 'no coupling' in values:
-                c[gf] = True
-                c_levels[gf] = "no coupling"
-
-        return (c, c_levels)
-
-def extract_coupling_primary(gp):
-    p = []
-    for key in gp:
-        if gp[key] == "primary":
-            p.append(key)
-    return p
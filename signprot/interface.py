@@ -0,0 +1,115 @@
+"""
+Receptor - signalling protein interface of the complex structures, built by build_complex_interactions.
+
+One row per interacting receptor residue / signalling protein residue pair, with its interaction types sorted by
+INTERACTION_TYPE_ORDER. Only plain numpy arrays are stored, in BUILD_DATA_DIR, and missing labels are stored as ''.
+"""
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import F, Q
+
+from common.release import ReleaseArrays
+from contactnetwork.models import InteractingResiduePair
+from residue.models import Residue
+from signprot.models import SignprotComplex
+
+import json
+import numpy as np
+
+
+# increase when the stored arrays change, older data is then rebuilt from the database
+INTERFACE_FORMAT_VERSION = 1
+
+INTERACTION_TYPE_ORDER = ['ionic', 'aromatic', 'polar', 'hydrophobic', 'van-der-waals']
+
+COLUMNS = ['int_id', 'int_ty', 'pdb_id', 'conf_id', 'gprot', 'entry_name', 'rec_aa', 'rec_pos', 'rec_gn', 'sig_aa',
+    'sig_pos', 'sig_gn']
+INTEGER_COLUMNS = ['int_id', 'conf_id', 'rec_pos', 'sig_pos']
+STRING_COLUMNS = ['pdb_id', 'gprot', 'entry_name', 'rec_aa', 'rec_gn', 'sig_aa', 'sig_gn']
+NULLABLE_COLUMNS = ['gprot', 'entry_name', 'rec_gn', 'sig_gn']
+
+
+def sort_interaction_types(interaction_types):
+    # types that are not in INTERACTION_TYPE_ORDER go last
+    return sorted(interaction_types, key=lambda x: (INTERACTION_TYPE_ORDER.index(x)
+        if x in INTERACTION_TYPE_ORDER else len(INTERACTION_TYPE_ORDER), x))
+
+
+class InterfaceDataset(ReleaseArrays):
+    """Contacts of the receptors and the signalling proteins in the complex structures"""
+
+    FILENAME = 'interface_dataset.npz'
+    FORMAT_VERSION = INTERFACE_FORMAT_VERSION
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self._rows = None
+        self._json = None
+
+    @classmethod
+    def from_database(cls):
+        # correct receptor entry names - the ones with '_a' appended
+        complex_objs = SignprotComplex.objects.values_list('structure_id',
+            'structure__protein_conformation__protein__entry_name', 'alpha')
+        complex_names = [entry_name + '_' + alpha.lower() for structure_id, entry_name, alpha in complex_objs]
+        complex_struc_ids = [structure_id for structure_id, entry_name, alpha in complex_objs]
+
+        # the signal protein residues of the complexes
+        prot_residues = Residue.objects.filter(
+            protein_conformation__protein__entry_name__in=complex_names).values_list('id', flat=True)
+
+        interactions = InteractingResiduePair.objects.filter(
+            Q(res1__in=prot_residues) | Q(res2__in=prot_residues),
+            referenced_structure__in=complex_struc_ids
+        ).exclude(
+            Q(res1__in=prot_residues) & Q(res2__in=prot_residues)
+        ).order_by(
+            'res1__generic_number__label',
+            'res2__generic_number__label'
+        ).values(
+            int_id=F('id'),
+            int_ty=ArrayAgg('interaction__interaction_type', distinct=True),
+            pdb_id=F('referenced_structure__pdb_code__index'),
+            conf_id=F('referenced_structure__protein_conformation_id'),
+            gprot=F('referenced_structure__signprot_complex__protein__entry_name'),
+            entry_name=F('referenced_structure__protein_conformation__protein__parent__entry_name'),
+            rec_aa=F('res1__amino_acid'),
+            rec_pos=F('res1__sequence_number'),
+            rec_gn=F('res1__generic_number__label'),
+            sig_aa=F('res2__amino_acid'),
+            sig_pos=F('res2__sequence_number'),
+            sig_gn=F('res2__generic_number__label'),
+        )
+        interactions = list(interactions)
+
+        arrays = {'version': np.array(INTERFACE_FORMAT_VERSION)}
+        for column in INTEGER_COLUMNS:
+            arrays[column] = np.array([i[column] for i in interactions], dtype=np.int64)
+        for column in STRING_COLUMNS:
+            arrays[column] = np.array([i[column] or '' for i in interactions], dtype=str)
+        arrays['int_ty'] = np.array([','.join(sort_interaction_types(i['int_ty'])) for i in interactions], dtype=str)
+        return cls(arrays)
+
+    def conf_ids(self):
+        """Protein conformations of the complex structures with interface contacts"""
+        return sorted(set(self.arrays['conf_id'].tolist()))
+
+    def rows(self):
+        """The contacts as dicts, interaction types as sorted lists and missing labels as None"""
+        if self._rows is None:
+            columns = {c: self.arrays[c].tolist() for c in INTEGER_COLUMNS + STRING_COLUMNS}
+            for c in NULLABLE_COLUMNS:
+                columns[c] = [v or None for v in columns[c]]
+            columns['int_ty'] = [t.split(',') if t else [] for t in self.arrays['int_ty'].tolist()]
+            self._rows = [dict(zip(COLUMNS, values)) for values in zip(*[columns[c] for c in COLUMNS])]
+        return self._rows
+
+    def rows_json(self):
+        if self._json is None:
+            self._json = json.dumps(self.rows())
+        return self._json
+
+
+def get_interface_dataset():
+    """The InterfaceDataset of the current data release, built from the database if build_complex_interactions
+    did not store it"""
+    return InterfaceDataset.current()
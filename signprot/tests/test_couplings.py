@@ -0,0 +1,61 @@
+import numpy as np
+
+from signprot.couplings import COUPLING_FORMAT_VERSION, CouplingMatrix, coupling_level
+
+
+def make_matrix():
+    """adrb2_human and adrb2_mouse couple to Gs, only the mouse receptor was measured for Gi/Go"""
+    nan = np.nan
+    return CouplingMatrix({
+        'version': np.array(COUPLING_FORMAT_VERSION),
+        'entry_names': np.array(['adrb2_human', 'hrh1_human', 'adrb2_mouse']),
+        'names': np.array(['&beta;<sub>2</sub>-adrenoceptor', 'H<sub>1</sub> receptor', 'beta2']),
+        'family_slugs': np.array(['001_001_001_002', '001_002_001_001', '001_001_001_002']),
+        'class_names': np.array(['Class A (Rhodopsin)'] * 3),
+        'human_wt': np.array([True, True, False]),
+        'families': np.array(['Gs', 'Gi/Go']),
+        'g_protein_names': np.array(['Gs family', 'Gi/Go family']),
+        'subunits': np.array(['gnas2', 'gnai1']),
+        'sources': np.array(['GuideToPharma', 'Aska']),
+        # receptors x families x sources
+        'transduction': np.array([[['primary', ''], ['', '']], [['', ''], ['', '']], [['secondary', ''], ['', '']]]),
+        'best': np.array([[[nan, -0.5], [nan, nan]], [[nan, -0.096], [nan, -1.2]], [[nan, -0.2], [nan, -0.8]]]),
+        # receptors x subunits x sources
+        'log_rai': np.array([[[nan, -0.5], [nan, nan]], [[nan, -0.096], [nan, -1.2]], [[nan, -0.2], [nan, -0.8]]]),
+    })
+
+
+def test_coupling_level():
+    # the values are rounded to two decimals as shown in the table before they are compared
+    assert coupling_level(-0.096) == 'primary'
+    assert coupling_level(-0.104) == 'primary'
+    assert coupling_level(-0.106) == 'secondary'
+    assert coupling_level(-0.996) == 'no coupling'
+    assert coupling_level(-2.5) == 'no coupling'
+
+
+def test_levels():
+    matrix = make_matrix()
+    assert matrix.levels('GuideToPharma').tolist() == [['primary', ''], ['', ''], ['secondary', '']]
+    assert matrix.levels('Aska').tolist() == [['secondary', ''], ['primary', 'no coupling'], ['secondary', 'secondary']]
+    assert matrix.merged_levels().tolist() == [['primary', ''], ['primary', 'no coupling'], ['secondary', 'secondary']]
+    assert matrix.merged_levels(no_coupling=False)[1].tolist() == ['primary', '']
+
+
+def test_merge_orthologs():
+    merged = make_matrix().merge_orthologs()
+    assert list(merged.receptors) == ['adrb2_human', 'hrh1_human']
+    # the human label is kept, the highest value of the orthologs is used
+    assert merged.levels('GuideToPharma')[0].tolist() == ['primary', '']
+    assert merged.levels('Aska')[0].tolist() == ['secondary', 'secondary']
+    assert merged.subunit_values('Aska')[0].tolist() == [-0.2, -0.8]
+    assert merged.levels('Aska')[1].tolist() == ['primary', 'no coupling']
+
+
+def test_save_and_load(tmpdir):
+    matrix = make_matrix()
+    filename = str(tmpdir.join('coupling_matrix.npz'))
+    matrix.save(filename)
+    loaded = CouplingMatrix.load(filename)
+    assert loaded.receptors == matrix.receptors
+    assert loaded.levels('Aska').tolist() == matrix.levels('Aska').tolist()
@@ -0,0 +1,63 @@
+import numpy as np
+
+from signprot.interface import (INTEGER_COLUMNS, INTERFACE_FORMAT_VERSION, STRING_COLUMNS, InterfaceDataset,
+    sort_interaction_types)
+
+
+# int_id, int_ty, pdb_id, conf_id, gprot, entry_name, rec_aa, rec_pos, rec_gn, sig_aa, sig_pos, sig_gn
+ROWS = [
+    (1, ['polar', 'ionic'], '3SN6', 10, 'gnas2_human', 'adrb2_human', 'R', 131, '3x50', 'Y', 391, 'G.H5.23'),
+    (2, ['van-der-waals', 'hydrophobic', 'aromatic'], '3SN6', 10, 'gnas2_human', 'adrb2_human', 'A', 134, '3x53',
+        'L', 393, 'G.H5.25'),
+    (3, ['hydrophobic'], '6DDE', 20, None, 'oprm_mouse', 'K', 271, None, 'F', 354, None),
+    ]
+
+
+def make_dataset():
+    columns = ['int_id', 'int_ty', 'pdb_id', 'conf_id', 'gprot', 'entry_name', 'rec_aa', 'rec_pos', 'rec_gn',
+        'sig_aa', 'sig_pos', 'sig_gn']
+    rows = [dict(zip(columns, row)) for row in ROWS]
+    arrays = {'version': np.array(INTERFACE_FORMAT_VERSION)}
+    for column in INTEGER_COLUMNS:
+        arrays[column] = np.array([r[column] for r in rows], dtype=np.int64)
+    for column in STRING_COLUMNS:
+        arrays[column] = np.array([r[column] or '' for r in rows], dtype=str)
+    arrays['int_ty'] = np.array([','.join(sort_interaction_types(r['int_ty'])) for r in rows], dtype=str)
+    return InterfaceDataset(arrays)
+
+
+def test_sort_interaction_types():
+    assert sort_interaction_types(['van-der-waals', 'polar', 'ionic']) == ['ionic', 'polar', 'van-der-waals']
+    # unknown types go last, by name
+    assert sort_interaction_types(['unknown', 'hydrophobic', 'other']) == ['hydrophobic', 'other', 'unknown']
+
+
+def test_rows():
+    dataset = make_dataset()
+    rows = dataset.rows()
+    assert [r['int_ty'] for r in rows] == [['ionic', 'polar'], ['aromatic', 'hydrophobic', 'van-der-waals'],
+        ['hydrophobic']]
+    assert rows[0]['rec_gn'] == '3x50' and rows[0]['rec_pos'] == 131
+    # missing labels are None again
+    assert (rows[2]['gprot'], rows[2]['rec_gn'], rows[2]['sig_gn']) == (None, None, None)
+    assert dataset.conf_ids() == [10, 20]
+
+
+def test_save_and_load(tmpdir):
+    dataset = make_dataset()
+    filename = str(tmpdir.join('interface_dataset.npz'))
+    assert InterfaceDataset.load(filename) is None
+    dataset.save(filename)
+    loaded = InterfaceDataset.load(filename)
+    # the arrays are read when loaded, the file is closed
+    assert isinstance(loaded.arrays, dict)
+    assert loaded.rows() == dataset.rows()
+    assert loaded.rows_json() == dataset.rows_json()
+
+
+def test_load_other_version(tmpdir):
+    dataset = make_dataset()
+    dataset.arrays['version'] = np.array(INTERFACE_FORMAT_VERSION + 1)
+    filename = str(tmpdir.join('interface_dataset.npz'))
+    dataset.save(filename)
+    assert InterfaceDataset.load(filename) is None
@@ -5,13 +5,12 @@ from django.core.cache import cache
 from django.db.models import F
 from django.db.models import Q
 from django.views.decorators.cache import cache_page
-from django.contrib.postgres.aggregates import ArrayAgg
 
-from protein.models import Protein, ProteinConformation, ProteinAlias, ProteinSegment, ProteinFamily, Gene, ProteinGProtein, ProteinGProteinPair
+from protein.functions import get_family_index
+from protein.models import Protein, ProteinConformation, ProteinAlias, ProteinSegment, ProteinFamily, Gene, ProteinGProteinPair
 from residue.models import Residue, ResiduePositionSet, ResidueGenericNumberEquivalent
 
 from structure.models import Structure
-from contactnetwork.models import InteractingResiduePair, Interaction
 from mutation.models import MutationExperiment
 from common.selection import Selection
 from common.diagrams_gpcr import DrawSnakePlot
@@ -21,6 +20,9 @@ from common.definitions import AMINO_ACIDS, AMINO_ACID_GROUPS, AMINO_ACID_GROUP_
 
 from seqsign.sequence_signature import SignatureMatch
 from seqsign.sequence_signature import SequenceSignature
+from signprot.couplings import (G_PROTEIN_FAMILIES, G_PROTEIN_SUBUNITS, THRESHOLD_SECONDARY, display_value,
+    get_coupling_matrix)
+from signprot.interface import get_interface_dataset
 from signprot.models import SignprotStructure, SignprotBarcode, SignprotInteractions, SignprotComplex
 from signprot.interactions import (
     get_entry_names,
@@ -37,8 +39,10 @@ from common import definitions
 from collections import OrderedDict
 from collections import Counter
 from common.views import AbsTargetSelection
+from common.release import release_conditional
 
 import json
+import numpy as np
 import re
 import time
 import pickle
@@ -46,7 +50,6 @@ from itertools import chain
 import requests
 
 from django.core.exceptions import ObjectDoesNotExist
-from decimal import Decimal
 
 
 class BrowseSelection(AbsTargetSelection):
@@ -82,170 +85,85 @@ class BrowseSelection(AbsTargetSelection):
     except Exception as e:
         pass
 
-#@cache_page(60*60*24*2) # 2 days caching
+@release_conditional
+@cache_page(60*60*24*2)
 def GProtein(request, dataset = "GuideToPharma"):
 
-    name_of_cache = 'gprotein_statistics_{}'.format(dataset)
-
-    context = cache.get(name_of_cache)
-    if context==None:
-
-        context = OrderedDict()
-        i=0
-        gproteins = ProteinGProtein.objects.all().prefetch_related('proteingproteinpair_set')
-        slugs = ['001','002','004','005']
-        slug_translate = {'001':"ClassA", '002':"ClassB1",'004':"ClassC", '005':"ClassF"}
-        selectivitydata = {}
-        for slug in slugs:
-            jsondata = {}
-            for gp in gproteins:
-                # ps = gp.proteingproteinpair_set.all()
-                ps = gp.proteingproteinpair_set.filter(protein__family__slug__startswith=slug, source=dataset).prefetch_related('protein')
-                # print(ps,len(ps))
-                if ps:
-                    jsondata[str(gp)] = []
-                    for p in ps:
-                        if dataset=="Aska" and p.log_rai_mean<-1:
-                            continue
-                        if str(p.protein.entry_name).split('_')[0].upper() not in selectivitydata:
-                            selectivitydata[str(p.protein.entry_name).split('_')[0].upper()] = []
-                        selectivitydata[str(p.protein.entry_name).split('_')[0].upper()].append(str(gp))
-                        # print(p.protein.family.parent.parent.parent)
-                        jsondata[str(gp)].append(str(p.protein.entry_name)+'\n')
-
-                    jsondata[str(gp)] = ''.join(jsondata[str(gp)])
-
-            context[slug_translate[slug]] = jsondata
-
-        context["selectivitydata"] = selectivitydata
-
-
-    cache.set(name_of_cache, context, 60*60*24*2) #two days timeout on cache
+    context = OrderedDict()
+    slugs = ['001','002','004','005']
+    slug_translate = {'001':"ClassA", '002':"ClassB1",'004':"ClassC", '005':"ClassF"}
+
+    matrix = get_coupling_matrix()
+    entry_names = matrix.arrays['entry_names'].tolist()
+    g_protein_names = matrix.arrays['g_protein_names'].tolist()
+    family_slugs = matrix.arrays['family_slugs']
+    levels = matrix.levels(dataset)
+    coupled = levels != ''
+    if dataset == "Aska":
+        # as GProtein statistics, couplings below the secondary threshold are not listed
+        with np.errstate(invalid='ignore'):
+            listed = coupled & ~(matrix.arrays['best'][:, :, matrix.sources['Aska']] < THRESHOLD_SECONDARY)
+    else:
+        listed = coupled
+
+    selectivitydata = {}
+    for slug in slugs:
+        jsondata = {}
+        in_class = np.char.startswith(family_slugs, slug)
+        for f, gp in enumerate(g_protein_names):
+            if not coupled[in_class, f].any():
+                continue
+            jsondata[gp] = []
+            for r in np.flatnonzero(in_class & listed[:, f]):
+                entry_short = entry_names[r].split('_')[0].upper()
+                if entry_short not in selectivitydata:
+                    selectivitydata[entry_short] = []
+                selectivitydata[entry_short].append(gp)
+                jsondata[gp].append(entry_names[r]+'\n')
+            jsondata[gp] = ''.join(jsondata[gp])
+
+        context[slug_translate[slug]] = jsondata
+
+    context["selectivitydata"] = selectivitydata
 
     return render(request, 'signprot/gprotein.html', context)
 
-#@cache_page(60*60*24*2) # 2 days caching
+@release_conditional
+@cache_page(60*60*24*2)
 def Couplings(request):
 
     context = OrderedDict()
 
-    threshold_primary = -0.1
-    threshold_secondary = -1
-
-
-    proteins = Protein.objects.filter(sequence_type__slug='wt',family__slug__startswith='00',species__common_name='Human').all().prefetch_related('family')
-    data = {}
-    class_names = {}
-    for p in proteins:
-        p_class = p.family.slug.split('_')[0]
-        if p_class not in class_names:
-            class_names[p_class] =  re.sub(r'\([^)]*\)', '', p.family.parent.parent.parent.name)
-        p_class_name = class_names[p_class].strip()
-        data[p.entry_short()] = {'class':p_class_name,'pretty':p.short()[:15],'GuideToPharma':{},'Aska':{}}
-
-    distinct_g_families = []
-    distinct_g_subunit_families = {}
-    distinct_sources = ['GuideToPharma','Aska']
-
-    couplings = ProteinGProteinPair.objects.all().prefetch_related('protein','g_protein_subunit','g_protein')
-    for c in couplings:
-        p = c.protein.entry_short()
-        s = c.source
-        t = c.transduction
-        m = c.log_rai_mean
-        gf = c.g_protein.name
-        # print(gf)
-        gf = gf.replace(" family","")
-
-        if gf not in distinct_g_families:
-            distinct_g_families.append(gf)
-            distinct_g_subunit_families[gf] = []
-
-        if c.g_protein_subunit:
-            g = c.g_protein_subunit.entry_name
-            g = g.replace("_human","")
-            # print("g",g)
-            if g not in distinct_g_subunit_families[gf]:
-                distinct_g_subunit_families[gf].append(g)
-                distinct_g_subunit_families[gf] = sorted(distinct_g_subunit_families[gf])
-
-        if s not in data[p]:
-            data[p][s] = {}
-
-        if gf not in data[p][s]:
-            data[p][s][gf] = {}
-
-        # If transduction in GuideToPharma data
-        if t:
-            data[p][s][gf] = t
-        else:
-            if 'subunits' not in data[p][s][gf]:
-                data[p][s][gf] = {'subunits':{},'best':-2.00}
-            data[p][s][gf]['subunits'][g] = round(Decimal(m),2)
-            if round(Decimal(m),2)== -0.00:
-                data[p][s][gf]['subunits'][g] = 0.00
-            # get the lowest number into 'best'
-            if m>data[p][s][gf]['best']:
-                data[p][s][gf]['best'] = round(Decimal(m),2)
-
-    fd = {} #final data
+    # the couplings of the orthologs are shown with the human receptor
+    matrix = get_coupling_matrix().merge_orthologs()
+    gtop = matrix.levels('GuideToPharma')
+    aska = matrix.levels('Aska')
+    merged = matrix.merged_levels(no_coupling=False)
+    aska_values = matrix.subunit_values('Aska')
 
-    distinct_g_families = sorted(distinct_g_families)
-    distinct_g_families = ['Gs','Gi/Go', 'Gq/G11', 'G12/G13', ]
-    distinct_g_subunit_families = OrderedDict([('Gs',['gnas2','gnal']), ('Gi/Go',['gnai1', 'gnai3', 'gnao', 'gnaz']), ('Gq/G11',['gnaq', 'gna14', 'gna15']), ('G12/G13',['gna12', 'gna13'])])
+    distinct_g_families = G_PROTEIN_FAMILIES
+    distinct_g_subunit_families = G_PROTEIN_SUBUNITS
+    families = [matrix.families.get(gf) for gf in distinct_g_families]
+    subunits = [(matrix.families.get(gf), matrix.subunits.get(sf)) for gf, sfs in distinct_g_subunit_families.items()
+        for sf in sfs]
 
-    for p,v in data.items():
-        fd[p] = [v['class'],p,v['pretty']]
+    fd = {} #final data
+    for r in range(len(matrix.receptors)):
+        p = matrix.arrays['entry_names'][r].split('_')[0].upper()
+        pretty = matrix.arrays['names'][r].replace(" receptor","").replace("-adrenoceptor","")[:15]
+        fd[p] = [re.sub(r'\([^)]*\)', '', matrix.arrays['class_names'][r]).strip(), p, pretty]
 
-        s = 'GuideToPharma'
         #Merge
-        for gf in distinct_g_families:
-            values = []
-            if 'GuideToPharma' in v and gf in v['GuideToPharma']:
-                values.append(v['GuideToPharma'][gf])
-            if 'Aska' in v and gf in v['Aska']:
-                best = v['Aska'][gf]['best']
-                if best > threshold_primary:
-                    values.append('primary')
-                elif best > threshold_secondary:
-                    values.append('secondary')
-            if 'primary' in values:
-                fd[p].append('primary')
-            elif 'secondary' in values:
-                fd[p].append('secondary')
-            else:
-                fd[p].append('')
-
-        s = 'GuideToPharma'
-        #First loop over GuideToPharma
-        for gf in distinct_g_families:
-            if gf in v[s]:
-                fd[p].append(v[s][gf])
-            else:
+        fd[p] += [merged[r, f] if f is not None else '' for f in families]
+        #GuideToPharma
+        fd[p] += [gtop[r, f] if f is not None else '' for f in families]
+        #Aska, the subunit values are shown for the families with Aska data
+        fd[p] += [aska[r, f].replace('no coupling', 'No coupling') if f is not None else '' for f in families]
+        for f, u in subunits:
+            if f is None or u is None or aska[r, f] == '' or np.isnan(aska_values[r, u]):
                 fd[p].append("")
-
-        s = 'Aska'
-        for gf in distinct_g_families:
-            if gf in v[s]:
-                if v[s][gf]['best']>threshold_primary:
-                    fd[p].append("primary")
-                elif v[s][gf]['best']>threshold_secondary:
-                    fd[p].append("secondary")
-                else:
-                    fd[p].append("No coupling")
             else:
-                fd[p].append("")
-
-        for gf,sfs in distinct_g_subunit_families.items():
-            for sf in sfs:
-                if gf in v[s]:
-                    if sf in v[s][gf]['subunits']:
-                        fd[p].append(v[s][gf]['subunits'][sf])
-                    else:
-                        fd[p].append("")
-                else:
-                    fd[p].append("")
-
+                fd[p].append(display_value(aska_values[r, u]))
 
     context['data'] = fd
     context['distinct_gf'] = distinct_g_families
@@ -253,6 +171,7 @@ def Couplings(request):
 
     return render(request, 'signprot/browser.html', context)
 
+@release_conditional
 @cache_page(60*60*24*2)
 def familyDetail(request, slug):
     # get family
@@ -268,9 +187,10 @@ def familyDetail(request, slug):
 
     # number of proteins
     proteins = Protein.objects.filter(family__slug__startswith=pf.slug, sequence_type__slug='wt')
-    no_of_proteins = proteins.count()
-    no_of_human_proteins = Protein.objects.filter(family__slug__startswith=pf.slug, species__id=1,
-        sequence_type__slug='wt').count()
+    family_index = get_family_index()
+    wild_type = [family_index.sequence_type_ids.get('wt')]
+    no_of_proteins = family_index.protein_count(pf, sequence_types=wild_type)
+    no_of_human_proteins = family_index.protein_count(pf, species=[1], sequence_types=wild_type)
     list_proteins = list(proteins.values_list('pk',flat=True))
 
     # get structures of this family
@@ -611,90 +531,10 @@ def signprotdetail(request, slug):
     return render(request, 'signprot/signprot_details.html', context)
 
 
-def sort_a_by_b(a, b, remove_invalid=False):
-    '''Sort one list based on the order of elements from another list'''
-    # https://stackoverflow.com/q/12814667    
-    # a = ['alpha_mock', 'van-der-waals', 'ionic']
-    # b = ['ionic', 'aromatic', 'hydrophobic', 'polar', 'van-der-waals', 'alpha_mock']
-    # sort_a_by_b(a,b) -> ['ionic', 'van-der-waals', 'alpha_mock']
-    if remove_invalid:
-        a = [a_elem for a_elem in a if a_elem in b]
-    return sorted(a, key=lambda x: b.index(x))
-
-
-def interface_dataset():
-    # correct receptor entry names - the ones with '_a' appended
-    complex_objs = SignprotComplex.objects.prefetch_related('structure__protein_conformation__protein')
-    complex_names = [complex_obj.structure.protein_conformation.protein.entry_name + '_' + complex_obj.alpha.lower() for complex_obj in complex_objs]
-    complex_struc_ids = [co.structure_id for co in complex_objs]
-    # protein conformations for those
-    prot_conf = ProteinConformation.objects.filter(protein__entry_name__in=complex_names).values_list('id', flat=True)
-
-    interaction_sort_order = [
-        "ionic",
-        "aromatic",
-        "polar",
-        "hydrophobic",
-        "van-der-waals",    
-    ]
-
-    # getting all the signal protein residues for those protein conformations
-    prot_residues = Residue.objects.filter(
-        protein_conformation__in=prot_conf
-    ).values_list('id', flat=True)
-
-    interactions = InteractingResiduePair.objects.filter(
-        Q(res1__in=prot_residues) | Q(res2__in=prot_residues),
-        referenced_structure__in=complex_struc_ids
-    ).exclude(
-        Q(res1__in=prot_residues) & Q(res2__in=prot_residues)
-    ).prefetch_related(
-        'interaction__interaction_type',
-        'referenced_structure__pdb_code__index',
-        'referenced_structure__signprot_complex__protein__entry_name',
-        'referenced_structure__protein_conformation__protein__parent__entry_name',
-        'res1__amino_acid',
-        'res1__sequence_number',
-        'res1__generic_number__label',
-        'res2__amino_acid',
-        'res2__sequence_number',
-        'res2__generic_number__label',
-    ).order_by(
-        'res1__generic_number__label',
-        'res2__generic_number__label'
-    ).values(
-        int_id=F('id'),
-        int_ty=ArrayAgg(
-            'interaction__interaction_type',
-            distinct=True,
-            # ordering=interaction_sort_order
-        ),
-
-        pdb_id=F('referenced_structure__pdb_code__index'),
-        conf_id=F('referenced_structure__protein_conformation_id'),
-        gprot=F('referenced_structure__signprot_complex__protein__entry_name'),
-        entry_name=F('referenced_structure__protein_conformation__protein__parent__entry_name'),
-
-        rec_aa=F('res1__amino_acid'),
-        rec_pos=F('res1__sequence_number'),
-        rec_gn=F('res1__generic_number__label'),
-
-        sig_aa=F('res2__amino_acid'),
-        sig_pos=F('res2__sequence_number'),
-        sig_gn=F('res2__generic_number__label')
-    )
-
-    conf_ids = set()
-    for i in interactions:
-            i['int_ty'] = sort_a_by_b(i['int_ty'], interaction_sort_order)
-            conf_ids.update([i['conf_id']])
-
-    return list(conf_ids), list(interactions)
-
-
 # @cache_page(60*60*24*2)
 def InteractionMatrix(request):
-    prot_conf_ids, dataset = interface_dataset()
+    dataset = get_interface_dataset()
+    prot_conf_ids = dataset.conf_ids()
 
     gprotein_order = ProteinSegment.objects.filter(proteinfamily='Alpha').values('id', 'slug')
     receptor_order = ['N', '1', '12', '2', '23', '3', '34', '4', '45', '5', '56', '6', '67', '7', '78', '8', 'C']
@@ -748,7 +588,7 @@ def InteractionMatrix(request):
             )
 
     context = {
-        'interactions': json.dumps(dataset),
+        'interactions': dataset.rows_json(),
         'interactions_metadata': json.dumps(complex_info),
         'non_interactions': json.dumps(list(remaining_residues)),
         'gprot': json.dumps(list(gprotein_order)),
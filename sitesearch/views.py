@@ -17,7 +17,6 @@ from residue.models import ResidueGenericNumberEquivalent
 import os
 from collections import OrderedDict
 from io import BytesIO
-import xlsxwriter, xlrd
 
 
 class TargetSelection(AbsTargetSelection):
@@ -126,6 +125,7 @@ class SegmentSelectionPdb(SegmentSelection):
 
 def site_download(request):
 
+    import xlsxwriter
     simple_selection = request.session.get('selection', False)
     outstream = BytesIO()
     wb = xlsxwriter.Workbook(outstream, {'in_memory': True})
@@ -150,6 +150,7 @@ def site_download(request):
 
 def site_upload(request):
     
+    import xlrd
     # get simple selection from session
     simple_selection = request.session.get('selection', False)
     
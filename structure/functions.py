@@ -303,11 +303,15 @@ class CASelector(object):
         tmp_ref = []
         tmp_alt = []
 
+        # atoms are matched on their B-factors, which hold the generic numbers
+        alt_atoms = OrderedDict()
+        for alt_at in self.alt_atoms[alt_id]:
+            alt_atoms.setdefault(alt_at.get_bfactor(), []).append(alt_at)
+
         for ref_at in self.ref_atoms:
-            for alt_at in self.alt_atoms[alt_id]:
-                if ref_at.get_bfactor() == alt_at.get_bfactor():
-                    tmp_ref.append(ref_at)
-                    tmp_alt.append(alt_at)
+            for alt_at in alt_atoms.get(ref_at.get_bfactor(), []):
+                tmp_ref.append(ref_at)
+                tmp_alt.append(alt_at)
 
         if len(tmp_ref) != len(tmp_alt):
             return ([], [])
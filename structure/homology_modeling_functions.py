@@ -2,7 +2,7 @@ from django.conf import settings
 
 from protein.models import Protein, ProteinConformation, ProteinAnomaly, ProteinState, ProteinSegment
 from residue.models import Residue
-from residue.functions import dgn, ggn
+from residue.functions import ggn, translate_generic_numbers
 from structure.models import *
 from structure.functions import HSExposureCB, PdbStateIdentifier, StructureSeqNumOverwrite, update_template_source, compare_and_update_template_source
 from common.alignment import AlignedReferenceTemplate, GProteinAlignment
@@ -91,9 +91,11 @@ class GPCRDBParsingPDB(object):
     def gn_comparer(self, gn1, gn2, protein_conformation):
         '''
         '''
-        res1 = Residue.objects.get(protein_conformation=protein_conformation, display_generic_number__label=dgn(gn1,protein_conformation))
-        res2 = Residue.objects.get(protein_conformation=protein_conformation, display_generic_number__label=dgn(gn2,protein_conformation))
-        return res1.sequence_number-res2.sequence_number
+        residues = translate_generic_numbers([gn1, gn2], protein_conformation)
+        if None in residues.values():
+            raise Residue.DoesNotExist('No residue with generic number {} or {} in {}'.format(gn1, gn2,
+                protein_conformation))
+        return residues[gn1].sequence_number-residues[gn2].sequence_number
             
     def gn_indecer(self, gn, delimiter, direction):
         ''' Get an upstream or downstream generic number from reference generic number.
@@ -123,11 +125,16 @@ class GPCRDBParsingPDB(object):
         '''
         output = OrderedDict()
         atoms_list = []
+        residues = translate_generic_numbers([gn for gn in generic_numbers if 'x' in str(gn)],
+            structure.protein_conformation)
         for gn in generic_numbers:
             rotamer=None
-            if 'x' in str(gn):      
+            if 'x' in str(gn):
+                if residues[gn] is None or residues[gn].display_generic_number is None:
+                    raise Residue.DoesNotExist('No residue with generic number {} in {}'.format(gn,
+                        structure.protein_conformation))
                 rotamer = list(Rotamer.objects.filter(structure__protein_conformation=structure.protein_conformation, 
-                        residue__display_generic_number__label=dgn(gn,structure.protein_conformation), 
+                        residue__display_generic_number__label=residues[gn].display_generic_number, 
                         structure__preferred_chain=structure.preferred_chain))
             else:
                 rotamer = list(Rotamer.objects.filter(structure__protein_conformation=structure.protein_conformation, 
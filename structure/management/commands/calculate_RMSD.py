@@ -289,18 +289,25 @@ class Validation():
 
     def calc_RMSD(self, list1, list2, TM_keys=None):
         ''' Calculates RMSD between two atoms lists. The two lists have to have the same length. 
+            TM_keys limits the atoms superposed on to these residue numbers or (residue number, atom name) pairs,
+            as returned by create_lists().
         '''
-        superpose = sp.RotamerSuperpose(list1, list2, TM_keys)
-        print(list1)
-        print(list2)
-        print(TM_keys)
-        list2 = superpose.run()
-        array1, array2 = np.array([0,0,0]), np.array([0,0,0])
-        for a1, a2 in zip(list1, list2):
-            array1 = np.vstack((array1, list(a1.get_coord())))
-            array2 = np.vstack((array2, list(a2.get_coord())))
-        print(array1.shape,array2.shape)
-        rmsd = np.sqrt(sum(sum((array1[1:]-array2[1:])**2))/array1[1:].shape[0])
+        array1 = np.array([a.get_coord() for a in list1], dtype=float)
+        array2 = np.array([a.get_coord() for a in list2], dtype=float)
+        # superposed on the backbone atoms (of the TM_keys residues), as RotamerSuperpose
+        if TM_keys is not None:
+            TM_keys = set(TM_keys)
+        backbone = []
+        for a in list1:
+            num = a.get_parent().get_id()[1]
+            backbone.append(a.get_name() in ['N','CA','C','O'] and (TM_keys is None or num in TM_keys or
+                (num, a.get_id()) in TM_keys))
+        backbone = np.array(backbone, dtype=bool)
+        if backbone.sum() < 3:
+            raise ValueError('Cannot superpose on {} backbone atoms, at least 3 are needed'.format(backbone.sum()))
+        rotations, translations, rms = sp.kabsch(array1, array2[None], backbone[None])
+        array2 = array2.dot(rotations[0]) + translations[0]
+        rmsd = np.sqrt(((array1-array2)**2).sum()/array1.shape[0])
         return rmsd
         
         
\ No newline at end of file
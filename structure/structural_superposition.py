@@ -13,6 +13,63 @@ from structure.models import Structure
 from interaction.models import ResidueFragmentInteraction
 
 logger = logging.getLogger("protwis")
+
+#==============================================================================  
+def kabsch(reference, mobile, mask=None):
+    ''' Batched least squares superposition (Kabsch algorithm) of coordinate sets onto a reference.
+
+        @param reference: array (n, 3), or (m, n, 3) for a different reference per set \n
+        @param mobile: array (m, n, 3) of the coordinate sets to superpose \n
+        @param mask: boolean array (m, n) of the positions present in each set, all positions if None \n
+        Returns rotations (m, 3, 3), translations (m, 3) and RMSDs (m,) in the Biopython convention,
+        i.e. coord.dot(rotation) + translation. Sets with less than 3 positions get the identity and a nan RMSD.
+    '''
+    reference = np.asarray(reference, dtype=float)
+    mobile = np.asarray(mobile, dtype=float)
+    if reference.ndim == 2:
+        reference = np.broadcast_to(reference, mobile.shape)
+    if mask is None:
+        mask = np.ones(mobile.shape[:2], dtype=bool)
+    weights = mask.astype(float)
+    counts = weights.sum(axis=1)
+    valid = counts >= 3
+    counts[~valid] = 1
+
+    ref_centroids = np.einsum('mn,mnk->mk', weights, reference) / counts[:, None]
+    mob_centroids = np.einsum('mn,mnk->mk', weights, mobile) / counts[:, None]
+    ref_centered = (reference - ref_centroids[:, None]) * weights[..., None]
+    mob_centered = (mobile - mob_centroids[:, None]) * weights[..., None]
+
+    # covariance matrices and their SVDs in one go, the sign correction avoids reflections
+    u, s, vt = np.linalg.svd(np.einsum('mni,mnj->mij', mob_centered, ref_centered))
+    u[:, :, 2] *= np.sign(np.linalg.det(np.matmul(u, vt)))[:, None]
+    rotations = np.matmul(u, vt)
+    rotations[~valid] = np.eye(3)
+    translations = ref_centroids - np.einsum('mk,mkj->mj', mob_centroids, rotations)
+    translations[~valid] = 0
+
+    diff = (np.matmul(mobile, rotations) + translations[:, None] - reference) * weights[..., None]
+    rms = np.sqrt((diff ** 2).sum(axis=(1, 2)) / counts)
+    rms[~valid] = np.nan
+    return rotations, translations, rms
+
+def rmsd_matrix(coords, mask=None):
+    ''' All-vs-all RMSD after optimal superposition of each pair on the positions present in both.
+
+        @param coords: array (m, n, 3) \n
+        @param mask: boolean array (m, n) of the positions present in each set, all positions if None
+    '''
+    coords = np.asarray(coords, dtype=float)
+    if mask is None:
+        mask = np.ones(coords.shape[:2], dtype=bool)
+    matrix = np.zeros((len(coords), len(coords)))
+    # one batch per row, keeps the memory linear in the number of sets
+    for i in range(len(coords) - 1):
+        rms = kabsch(coords[i], coords[i+1:], mask[i] & mask[i+1:])[2]
+        matrix[i, i+1:] = rms
+        matrix[i+1:, i] = rms
+    return matrix
+
 #==============================================================================  
 class ProteinSuperpose(object):
   
@@ -42,22 +99,73 @@ class ProteinSuperpose(object):
             except Exception as e:
                 logger.warning("Can't parse the file {!s}\n{!s}".format(alt_id, e))
         self.selector = CASelector(self.selection, self.ref_struct, self.alt_structs)
+        self.rotations = None
+        self.translations = None
+        self.rms = None
+
+    def get_coordinate_arrays (self):
+        ''' CA coordinates of the selected generic numbers (stored as CA B-factors) in the reference, (n, 3),
+            the same positions in the alternative structures, (m, n, 3), and a mask (m, n) of the positions
+            present in each alternative structure.
+        '''
+        positions = OrderedDict()
+        ref_coords = []
+        for atom in self.selector.get_ref_atoms():
+            if atom.get_bfactor() not in positions:
+                positions[atom.get_bfactor()] = len(positions)
+                ref_coords.append(atom.get_coord())
+
+        coords = np.zeros((len(self.alt_structs), len(positions), 3))
+        mask = np.zeros((len(self.alt_structs), len(positions)), dtype=bool)
+        for i, alt_struct in enumerate(self.alt_structs):
+            for atom in self.selector.alt_atoms.get(alt_struct.id, []):
+                j = positions.get(atom.get_bfactor())
+                if j is not None and not mask[i, j]:
+                    coords[i, j] = atom.get_coord()
+                    mask[i, j] = True
+        return np.array(ref_coords, dtype=float).reshape(-1, 3), coords, mask
+
+    def superpose (self):
+        ''' Calculates the transformations of all alternative structures onto the reference without moving any atoms.
+        '''
+        ref_coords, coords, mask = self.get_coordinate_arrays()
+        self.rotations, self.translations, self.rms = kabsch(ref_coords, coords, mask)
+        for alt_struct, rms in zip(self.alt_structs, self.rms):
+            if np.isnan(rms):
+                logger.error("Failed to superpose structures {} and {}\nNot enough common atoms".format(self.ref_struct.id, alt_struct.id))
+            else:
+                logger.info("RMS(reference, model {!s}) = {:f}".format(alt_struct.id, rms))
+        return self.rms
+
+    def apply (self):
+        ''' Writes the transformed coordinates to the atoms of the alternative structures.
+        '''
+        for alt_struct, rotation, translation, rms in zip(self.alt_structs, self.rotations, self.translations, self.rms):
+            if np.isnan(rms):
+                continue
+            atoms = list(alt_struct.get_atoms())
+            if not atoms:
+                continue
+            new_coords = np.array([atom.get_coord() for atom in atoms], dtype=float).dot(rotation) + translation
+            for atom, coord in zip(atoms, new_coords.astype('f')):
+                atom.set_coord(coord)
+
+    def get_rmsd_matrix (self):
+        ''' All-vs-all RMSD matrix of the reference (first row) and the alternative structures on the selected atoms.
+        '''
+        ref_coords, coords, mask = self.get_coordinate_arrays()
+        all_coords = np.concatenate([ref_coords[None], coords])
+        all_mask = np.concatenate([np.ones((1, len(ref_coords)), dtype=bool), mask])
+        return rmsd_matrix(all_coords, all_mask)
 
     def run (self):
     
         if self.alt_structs == []:
             logger.error("No structures to align!")
             return []
-    
-        super_imposer = Superimposer()
-        for alt_struct in self.alt_structs:
-            try:
-                ref, alt = self.selector.get_consensus_atom_sets(alt_struct.id)
-                super_imposer.set_atoms(ref, alt)
-                super_imposer.apply(alt_struct.get_atoms())
-                logger.info("RMS(reference, model {!s}) = {:f}".format(alt_struct.id, super_imposer.rms))
-            except Exception as msg:
-                logger.error("Failed to superpose structures {} and {}\n{}".format(self.ref_struct.id, alt_struct.id, msg))
+
+        self.superpose()
+        self.apply()
 
         return self.alt_structs
 
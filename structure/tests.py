@@ -1,3 +1,86 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from Bio.PDB import Superimposer
+from Bio.PDB.Atom import Atom
+from Bio.PDB.Residue import Residue
+import numpy as np
+
+from structure.management.commands.calculate_RMSD import Validation
+from structure.structural_superposition import kabsch, rmsd_matrix
+
+
+def rotation_matrix(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+def make_atoms(coords, names=('N', 'CA', 'C', 'O', 'CB')):
+    atoms = []
+    for i, coord in enumerate(coords):
+        number = i // len(names) + 1
+        if i % len(names) == 0:
+            residue = Residue((' ', number, ' '), 'ALA', '')
+        name = names[i % len(names)]
+        atom = Atom(name, np.array(coord, dtype='f'), 0.0, 1.0, ' ', name, i + 1, name[0])
+        residue.add(atom)
+        atoms.append(atom)
+    return atoms
+
+
+class KabschTest(SimpleTestCase):
+    """The batched Kabsch superposition gives the same result as the Biopython Superimposer it replaced"""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.reference = rng.uniform(-10, 10, (20, 3))
+        self.rotation = rotation_matrix(0.7)
+        self.translation = np.array([1.0, -2.0, 3.0])
+        noise = rng.normal(0, 0.3, (20, 3))
+        self.mobile = (self.reference + noise - self.translation).dot(self.rotation.T)
+
+    def test_superimposer(self):
+        rotations, translations, rms = kabsch(self.reference, self.mobile[None])
+        sup = Superimposer()
+        sup.set_atoms(make_atoms(self.reference), make_atoms(self.mobile))
+        rotation, translation = sup.rotran
+        self.assertAlmostEqual(rms[0], sup.rms, places=4)
+        np.testing.assert_allclose(rotations[0], rotation, atol=1e-4)
+        np.testing.assert_allclose(translations[0], translation, atol=1e-3)
+
+    def test_mask(self):
+        mobile = self.mobile.copy()
+        mobile[:5] = 100
+        mask = np.ones((1, 20), dtype=bool)
+        mask[0, :5] = False
+        rms = kabsch(self.reference, mobile[None], mask)[2]
+        self.assertAlmostEqual(rms[0], kabsch(self.reference[5:], self.mobile[None, 5:])[2][0])
+        # less than three positions can not be superposed
+        self.assertTrue(np.isnan(kabsch(self.reference, mobile[None], mask & (np.arange(20) < 7))[2][0]))
+
+    def test_rmsd_matrix(self):
+        matrix = rmsd_matrix(np.stack([self.reference, self.mobile, self.reference]))
+        self.assertAlmostEqual(matrix[0, 2], 0)
+        self.assertAlmostEqual(matrix[0, 1], matrix[1, 0])
+        self.assertAlmostEqual(matrix[0, 1], kabsch(self.reference, self.mobile[None])[2][0])
+
+
+class CalcRMSDTest(SimpleTestCase):
+    """calculate_RMSD superposes on the backbone atoms of the TM_keys before measuring all atoms"""
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.coords = rng.uniform(-10, 10, (25, 3))
+        self.moved = (self.coords - [4.0, 0.5, -1.0]).dot(rotation_matrix(1.2).T)
+        self.validation = Validation()
+
+    def test_superposed(self):
+        atoms1, atoms2 = make_atoms(self.coords), make_atoms(self.moved)
+        keys = [(a.get_parent().get_id()[1], a.get_id()) for a in atoms1]
+        self.assertAlmostEqual(self.validation.calc_RMSD(atoms1, atoms2, keys), 0, places=4)
+        self.assertAlmostEqual(self.validation.calc_RMSD(atoms1, atoms2), 0, places=4)
+        # residue numbers select the same atoms
+        self.assertAlmostEqual(self.validation.calc_RMSD(atoms1, atoms2, [1, 2, 3]), 0, places=4)
+
+    def test_no_common_atoms(self):
+        atoms1, atoms2 = make_atoms(self.coords), make_atoms(self.moved)
+        with self.assertRaises(ValueError):
+            self.validation.calc_RMSD(atoms1, atoms2, [(99, 'CA')])
@@ -40,7 +40,6 @@ from io import StringIO, BytesIO
 from collections import OrderedDict
 from Bio.PDB import PDBIO, PDBParser
 from operator import itemgetter
-import xlsxwriter
 
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand
+
+from common.request_profile import load_profiles, profile_dir, read_collapsed
+
+from collections import Counter, defaultdict
+from io import StringIO
+
+import os
+import pstats
+import statistics
+
+
+def frame_times(stacks):
+    """Samples of each frame, with the frame on top of the stack (self) and anywhere in it (inclusive)"""
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return own, inclusive
+
+
+class Command(BaseCommand):
+    help = 'Summarises the request profiles of StatsMiddleware by view, with the hottest functions of each view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view',
+            action='append',
+            dest='views',
+            help='Only this view name (e.g. mutation:render), can be repeated')
+        parser.add_argument('--since',
+            action='store',
+            dest='since',
+            help='Only profiles from this date (YYYY-MM-DD) on')
+        parser.add_argument('-n', '--top',
+            type=int,
+            action='store',
+            dest='top',
+            default=20,
+            help='Number of functions to list per view')
+        parser.add_argument('-o', '--output',
+            action='store',
+            dest='output',
+            help='Write the merged collapsed stacks and pstats of each view to this directory')
+
+    def handle(self, *args, **options):
+        directory = profile_dir()
+        profiles = [p for p in load_profiles(directory) if (not options['views'] or p['view'] in options['views'])
+            and (not options['since'] or p['time'] >= options['since'])]
+        if not profiles:
+            self.stdout.write('No profiles in {}'.format(directory))
+            return
+
+        views = defaultdict(list)
+        for profile in profiles:
+            views[profile['view']].append(profile)
+
+        self.stdout.write('{:<50} {:>8} {:>10} {:>10}'.format('view', 'requests', 'median s', 'max s'))
+        for view, view_profiles in sorted(views.items(), key=lambda v: -sum(p['duration'] for p in v[1])):
+            durations = [p['duration'] for p in view_profiles]
+            self.stdout.write('{:<50} {:>8} {:>10.2f} {:>10.2f}'.format(view, len(view_profiles),
+                statistics.median(durations), max(durations)))
+
+        if options['output']:
+            os.makedirs(options['output'], exist_ok=True)
+
+        for view, view_profiles in views.items():
+            filename = os.path.join(options['output'] or '', view.replace(':', '_'))
+            stacks = Counter()
+            stats = None
+            for profile in view_profiles:
+                base = os.path.join(directory, profile['request_id'])
+                if profile['mode'] == 'cprofile' and os.path.exists(base + '.pstats'):
+                    if stats is None:
+                        stats = pstats.Stats(base + '.pstats', stream=StringIO())
+                    else:
+                        stats.add(base + '.pstats')
+                elif os.path.exists(base + '.collapsed'):
+                    stacks.update(read_collapsed(base + '.collapsed'))
+
+            if stacks:
+                total = sum(stacks.values())
+                own, inclusive = frame_times(stacks)
+                self.stdout.write('\n{} - {} samples, top functions by own samples (own %, inclusive %)'.format(view,
+                    total))
+                for frame, count in own.most_common(options['top']):
+                    self.stdout.write('{:>6.1%} {:>6.1%}  {}'.format(count / total, inclusive[frame] / total, frame))
+                if options['output']:
+                    with open(filename + '.collapsed', 'w') as f:
+                        for stack, count in stacks.most_common():
+                            f.write('{} {}\n'.format(stack, count))
+
+            if stats is not None:
+                self.stdout.write('\n{} - cProfile, top functions by cumulative time'.format(view))
+                stats.stream = StringIO()
+                stats.sort_stats('cumulative').print_stats(options['top'])
+                self.stdout.write(stats.stream.getvalue())
+                if options['output']:
+                    stats.dump_stats(filename + '.pstats')
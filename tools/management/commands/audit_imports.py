@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from collections import defaultdict
+
+import json
+import os
+import subprocess
+import sys
+
+
+# scientific and export libraries that only the views using them should import
+HEAVY_MODULES = ['sklearn', 'freesasa', 'scipy', 'pandas', 'matplotlib', 'xlsxwriter', 'xlrd', 'Bio.SubsMat', 'openbabel']
+
+# what a web worker does before serving the first request
+STARTUP_SCRIPT = '''
+import json, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def profile_startup():
+    """Runs the startup in a fresh interpreter with -X importtime.
+    Returns the imported modules as (module, self microseconds, cumulative microseconds, nesting level)
+    and the names of all loaded modules"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'protwis.settings'))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT], cwd=settings.BASE_DIR,
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode:
+        raise CommandError('Startup failed:\n{}'.format(process.stderr[-2000:]))
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # one space after the separator and two more per nesting level
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), level))
+    loaded = json.loads(process.stdout.strip().splitlines()[-1])
+    return imports, loaded
+
+def loaded_heavy_modules(loaded):
+    return [m for m in HEAVY_MODULES if m in loaded]
+
+
+class Command(BaseCommand):
+    help = 'Reports the import cost of the modules loaded when a worker starts (settings, apps and URLconf)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--top',
+            type=int,
+            action='store',
+            dest='top',
+            default=25,
+            help='Number of modules and packages to list')
+
+    def handle(self, *args, **options):
+        imports, loaded = profile_startup()
+
+        # imports directly triggered by the startup script
+        top_level = [i for i in imports if i[3] == 0]
+        total = sum(i[2] for i in top_level)
+        self.stdout.write('Startup imports {} modules in {:.0f} ms\n'.format(len(imports), total / 1000))
+
+        self.stdout.write('Slowest modules (cumulative ms, self ms)')
+        for name, self_us, cumulative_us, level in sorted(imports, key=lambda x: -x[2])[:options['top']]:
+            self.stdout.write('{:>9.1f} {:>9.1f}  {}'.format(cumulative_us / 1000, self_us / 1000, name))
+
+        packages = defaultdict(int)
+        for name, self_us, cumulative_us, level in imports:
+            packages[name.split('.')[0]] += self_us
+        self.stdout.write('\nSlowest packages (self ms)')
+        for name, self_us in sorted(packages.items(), key=lambda x: -x[1])[:options['top']]:
+            self.stdout.write('{:>9.1f}  {}'.format(self_us / 1000, name))
+
+        heavy = loaded_heavy_modules(loaded)
+        if heavy:
+            self.stdout.write(self.style.WARNING('\nHeavy modules imported at startup: {}'.format(', '.join(heavy))))
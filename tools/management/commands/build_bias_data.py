@@ -103,30 +103,15 @@ class Command(BaseBuild):
                     continue
             except:
                 continue
-            num_rows = worksheet.nrows - 1
-            num_cells = worksheet.ncols - 1
-            curr_row = 0 #skip first, otherwise -1
-            while curr_row < num_rows:
-                curr_row += 1
-                row = worksheet.row(curr_row)
-                curr_cell = -1
-                temprow = []
-                if not old and worksheet.cell_value(curr_row, 1) == '': #if empty reference
+            for curr_row in range(1, worksheet.nrows): #skip first
+                # whole rows at once instead of cell by cell
+                temprow = worksheet.row_values(curr_row)
+                if not old and temprow[1] == '': #if empty reference
                     continue
-                elif old and worksheet.cell_value(curr_row, 0) == '': #if empty reference
+                elif old and temprow[0] == '': #if empty reference
                     continue
-                while curr_cell < num_cells:
-                    curr_cell += 1
-                    cell_type = worksheet.cell_type(curr_row, curr_cell)
-                    cell_value = worksheet.cell_value(curr_row, curr_cell)
-
-                    # fix wrong spaced cells
-                    if cell_value==" ":
-                        cell_value = ""
-
-                    temprow.append(cell_value)
-                temp.append(temprow)
-                #if curr_row>10: break
+                # fix wrong spaced cells
+                temp.append(['' if cell_value == " " else cell_value for cell_value in temprow])
         return [temp, old]
 
     def analyse_rows(self,rows,source_file, old):
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.core.management import call_command
 from django.conf import settings
 from django.db import connection
+from signprot.interface import InterfaceDataset
 from signprot.models import SignprotComplex
 
 from contactnetwork.cube import *
@@ -18,3 +19,8 @@ class Command(BaseCommand):
 
         for pdb in SignprotComplex.objects.values_list('structure__pdb_code__index', flat=True):
             compute_interactions(pdb, True)
+
+        # the receptor - signalling protein contacts used by the interaction matrix
+        dataset = InterfaceDataset.from_database()
+        dataset.save()
+        self.logger.info('Stored the interface dataset, {} contacts'.format(len(dataset.arrays['int_id'])))
@@ -20,8 +20,9 @@ import numpy as np
 import scipy.stats as stats
 
 from collections import OrderedDict
-from sklearn.decomposition import PCA
-from numpy.core.umath_tests import inner1d
+
+from angles.functions import AxisPCA, a_angles, atom_coordinates, axis_distances, axis_line, b_angles, \
+    backbone_angles, bond_angles, chain_half_sphere_exposure, pseudo_cb
 
 
 from multiprocessing import Queue, Process, Value, Lock
@@ -181,65 +182,11 @@ class Command(BaseCommand):
                 if not subenty.id in slist[0]: entity.detach_child(subenty.id)
                 elif slist[1:]: recurse(subenty, slist[1:])
 
-        def cal_pseudo_CB(r):
-            """
-            Calculate pseudo CB for Glycin
-            from Bio pdb faq
-            """
-            a =r['CA'].get_vector()
-            n = r['N'].get_vector() - a
-            c = r['C'].get_vector() - a
-            rot = pdb.rotaxis(-np.pi*120.0/180.0, c)
-            b = n.left_multiply(rot) + a
-            return b.get_array()
-
-        def pca_line(pca,h, r=0):
-            """
-            Calculate the pca for h and return the first pc transformed back to
-            the original coordinate system
-            """
-            if ((not r) if pca.fit_transform(h)[0][0] < 0 else r):
-                return pca.inverse_transform(np.asarray([[0,0,0],[1,0,0]]))
-            else:return pca.inverse_transform(np.asarray([[0,0,0],[-1,0,0]]))
-
-        def calc_angle(b,c):
-            """
-            Calculate the angle between c, b and the orthogonal projection of b
-            to the x axis.
-            """
-            ba = -b
-            bc = c + ba
-            ba[:,0] = 0
-            #return np.degrees(np.arccos(inner1d(ba, bc) / (np.linalg.norm(ba,axis=1) * np.linalg.norm(bc,axis=1))))
-
-            # Alternative and clockwise angle implementation - angles left/right different value
-            ba = ba[:,1:3]
-            bc = bc[:,1:3]
-            return np.degrees(np.arctan2(ba[:,0]*bc[:,1]-ba[:,1]*bc[:,0], inner1d(ba, bc)))
-
-        def ca_cb_calc(ca,cb,pca):
-            """
-            Calculate the angles between ca, cb and center axis
-            """
-            return calc_angle(pca.transform(ca),pca.transform(cb))
-
-        def ca_distance_calc(ca,pca):
+        def value(x):
             """
-            Calculate the smallest distance between the ca and the center axis
+            NaN (undefined angle) to None
             """
-            return np.sqrt(np.sum(np.power(pca.transform(ca)[:,1:],2), axis = 1))
-
-        def axes_calc(h,p,pca):
-            """
-            Calculate the orthogonal projection of the CA to the helix axis
-            which is moved to the mean of three consecutive amino acids
-            """
-            a = (np.roll(np.vstack((h,h[0])),1,axis=0)[:-1] + h + np.roll(np.vstack((h,h[-1])),-1,axis=0)[:-1])/3
-            b = p.transform(h)
-            b[:,1:] = p.transform(a)[:,1:]
-            b = p.inverse_transform(b)
-
-            return calc_angle(pca.transform(b),pca.transform(h))
+            return None if np.isnan(x) else float(x)
 
         def set_bfactor(chain,angles):
             """
@@ -369,11 +316,6 @@ class Command(BaseCommand):
                 ##################### Angles/dihedrals residues #######################
 
                 polychain = [ residue for residue in pchain if Bio.PDB.Polypeptide.is_aa(residue) and "CA" in residue]
-                poly = Bio.PDB.Polypeptide.Polypeptide(polychain)
-                poly.get_phi_psi_list() # backbone dihedrals
-
-                #poly.get_theta_list() # angle three consecutive Ca atoms
-                #poly.get_tau_list() # dihedral four consecutive Ca atoms
 
                 # TODO: extend with Chi1-5?
                 # https://gist.github.com/lennax/0f5f65ddbfa278713f58
@@ -382,41 +324,19 @@ class Command(BaseCommand):
 
                 ### clean the structure to solely the 7TM bundle
                 recurse(structure, [[0], preferred_chain, db_set])
-                poly.get_theta_list() # angle three consecutive Ca atoms
-                poly.get_tau_list() # dihedral four consecutive Ca atoms
-                dihedrals = {}
-                for r in poly:
-                  angle_list = ["PHI", "PSI", "THETA", "TAU", "SS_DSSP", "SS_STRIDE"]
-                  for angle in angle_list:
-                      if angle not in r.xtra:
-                          r.xtra[angle] = None
-
-                  # Add outer angle
-                  outer = None
-                  try:
-                      angle_atoms = [r[a].get_vector() for a in ['N','CA', outerAtom[r.resname]]]
 
-                      # use pseudo CB placement when glycine
-                      if r.resname == 'GLY':
-                          angle_atoms[2] = Bio.PDB.vectors.Vector(*cal_pseudo_CB(r))
+                # backbone, outer (N-CA-outer atom) and tau (N-CA-C) angles of all residues at once
+                n, ca, c = [atom_coordinates(polychain, atom) for atom in ['N', 'CA', 'C']]
+                phi, psi, theta, tau, tau_angles = backbone_angles(n, ca, c)
+                outer_atoms = atom_coordinates(polychain, [outerAtom.get(r.resname) for r in polychain])
+                # use pseudo CB placement when glycine
+                glycines = np.array([r.resname == 'GLY' for r in polychain], dtype=bool)
+                outer_atoms[glycines] = pseudo_cb(n[glycines], ca[glycines], c[glycines])
+                outer = bond_angles(n, ca, outer_atoms)
 
-                      outer = Bio.PDB.calc_angle(*angle_atoms)
-                  except Exception as e:
-#                      print(pdb_code, " - OUTER ANGLE ERROR - ", e)
-                      outer = None
-
-                  # Add tau (N-Ca-C) backbone angle (in addition to the tau dihedral)
-                  tau_angles = None
-                  try:
-                      angle_atoms = [r[a].get_vector() for a in ['N','CA', 'C']]
-
-                      tau_angles = Bio.PDB.calc_angle(*angle_atoms)
-                  except Exception as e:
-#                      print(pdb_code, " - TAU ANGLE ERROR - ", e)
-                      tau_angles = None
-
-
-                  dihedrals[r.id[1]] = [r.xtra["PHI"], r.xtra["PSI"], r.xtra["THETA"], r.xtra["TAU"], r.xtra["SS_DSSP"], r.xtra["SS_STRIDE"], outer, tau_angles]
+                dihedrals = {}
+                for i, r in enumerate(polychain):
+                  dihedrals[r.id[1]] = [value(phi[i]), value(psi[i]), value(theta[i]), value(tau[i]), r.xtra.get("SS_DSSP"), r.xtra.get("SS_STRIDE"), value(outer[i]), value(tau_angles[i])]
 
                 # Extra: remove hydrogens from structure (e.g. 5VRA)
                 for residue in structure[0][preferred_chain]:
@@ -425,18 +345,24 @@ class Command(BaseCommand):
 
                 ### AXES through each of the TMs and the TM bundle (center axis)
                 hres_list = [np.asarray([pchain[r]["CA"].get_coord() for r in sl], dtype=float) for sl in db_tmlist]
-                h_cb_list = [np.asarray([pchain[r]["CB"].get_coord() if "CB" in pchain[r] else cal_pseudo_CB(pchain[r]) for r in sl], dtype=float) for sl in db_tmlist]
+                h_cb_list = []
+                for sl in db_tmlist:
+                    residues = [pchain[r] for r in sl]
+                    cb = atom_coordinates(residues, 'CB')
+                    missing = np.isnan(cb[:,0])
+                    cb[missing] = pseudo_cb(atom_coordinates(residues, 'N'), atom_coordinates(residues, 'CA'), atom_coordinates(residues, 'C'))[missing]
+                    h_cb_list.append(cb)
 
                 # fast and fancy way to take the average of N consecutive elements
                 N = 3
                 hres_three = np.asarray([sum([h[i:-(len(h) % N) or None:N] for i in range(N)])/N for h in hres_list])
 
                 ### PCA - determine axis through center + each transmembrane helix
-                helix_pcas = [PCA() for i in range(7)]
-                helix_pca_vectors = [pca_line(helix_pcas[i], h,i%2) for i,h in enumerate(hres_three)]
+                helix_pcas = [AxisPCA() for i in range(7)]
+                helix_pca_vectors = [axis_line(helix_pcas[i], h,i%2) for i,h in enumerate(hres_three)]
 
                 # Calculate PCA based on the upper (extracellular) half of the GPCR (more stable, except class B)
-                pca = PCA()
+                pca = AxisPCA()
                 pos_list = []
                 if extra_pca:
                     minlength = 100
@@ -454,9 +380,9 @@ class Command(BaseCommand):
                             h = np.flip(h, 0)
 
                         if len(h)>minlength+2:
-                            pos_list.append(pca_line(PCA(), h[2:minlength+2]))
+                            pos_list.append(axis_line(AxisPCA(), h[2:minlength+2]))
                         else:
-                            pos_list.append(pca_line(PCA(), h[0:minlength]))
+                            pos_list.append(axis_line(AxisPCA(), h[0:minlength]))
 
 
                     # create fake coordinates along each helix PCA to create center PCA
@@ -470,10 +396,10 @@ class Command(BaseCommand):
                             line_points.append(start+i*vector)
 
                         coord_list.append(line_points)
-                    center_vector = pca_line(pca, np.vstack(coord_list))
+                    center_vector = axis_line(pca, np.vstack(coord_list))
                 else:
                     # Less robust with differing TM lengths
-                    center_vector = pca_line( pca, np.vstack(hres_three))
+                    center_vector = axis_line( pca, np.vstack(hres_three))
 
                 # DEBUG print arrow for PyMol
                 # a = [str(i) for i in center_vector[0]]
@@ -517,7 +443,7 @@ class Command(BaseCommand):
                 for i,h in enumerate(hres_three):
                     if i%2: # reverse directionality of even helices (TM2, TM4, TM6)
                         h = np.flip(h, 0)
-                    posb_list.append(pca_line(PCA(), h))
+                    posb_list.append(axis_line(AxisPCA(), h))
 
 
                 # NOTE: Slight variations between the mid membrane residues can have a strong affect on the plane
@@ -562,10 +488,10 @@ class Command(BaseCommand):
                     plane_normal = plane_normal / np.linalg.norm(plane_normal)
 
                     # calculate distances to the mid of membrane plane
-                    mid_membrane_distances = np.round([ np.dot(ca - membrane_point[0], plane_normal[0]) for helix in hres_list for ca in helix ],3)
+                    mid_membrane_distances = np.round((np.vstack(hres_list) - membrane_point[0]).dot(plane_normal[0]),3)
 
                     # calculate distances to the midpoint
-                    midpoint_distances = np.round([ np.linalg.norm(membrane_point[0]-ca) for helix in hres_list for ca in helix ],3)
+                    midpoint_distances = np.round(np.linalg.norm(np.vstack(hres_list) - membrane_point[0], axis=1),3)
 
 
                 # TM6 tilt with respect to 7TM bundle axis and plane through 6x44
@@ -573,9 +499,9 @@ class Command(BaseCommand):
                 #     # Take the average of N consecutive elements
                 #     tm6_lower_three = sum([lower_tm6[i:-(len(lower_tm6) % N) or None:N] for i in range(N)])/N
                 #     if len(tm6_lower_three) > 2:
-                #         tm6_pca_vector = pca_line(PCA(), tm6_lower_three, 1)
+                #         tm6_pca_vector = axis_line(AxisPCA(), tm6_lower_three, 1)
                 #     else:
-                #         tm6_pca_vector = pca_line(PCA(), lower_tm6, 1)
+                #         tm6_pca_vector = axis_line(AxisPCA(), lower_tm6, 1)
                 #
                 #     # 1. Find intersect of membrane mid with 7TM axis (project point to plane)
                 #     membrane_mid_pca = pca.transform([membrane_mid])
@@ -646,7 +572,7 @@ class Command(BaseCommand):
                 #         if i%2: # reverse directionality of even helices (TM2, TM4, TM6)
                 #             h = np.flip(h, 0)
                 #
-                #         posb_list.append(pca_line(PCA(), h))
+                #         posb_list.append(axis_line(AxisPCA(), h))
                 #
                 #     points = []
                 #     for i in range(7): # TM number - 1
@@ -699,16 +625,16 @@ class Command(BaseCommand):
 #                      # Take the average of N consecutive elements of TM2
 #                      tm2_lower_three = sum([lower_tm2[i:-(len(lower_tm2) % N) or None:N] for i in range(N)])/N
 #                      if len(tm2_lower_three) > 2:
-#                          tm2_pca_vector = pca_line(PCA(), tm2_lower_three, 1)
+#                          tm2_pca_vector = axis_line(AxisPCA(), tm2_lower_three, 1)
 #                      else:
-#                          tm2_pca_vector = pca_line(PCA(), lower_tm2, 1)
+#                          tm2_pca_vector = axis_line(AxisPCA(), lower_tm2, 1)
 #
 #                      # Take the average of N consecutive elements of TM6
 #                      tm6_lower_three = sum([lower_tm6[i:-(len(lower_tm6) % N) or None:N] for i in range(N)])/N
 #                      if len(tm6_lower_three) > 2:
-#                          tm6_pca_vector = pca_line(PCA(), tm6_lower_three, 1)
+#                          tm6_pca_vector = axis_line(AxisPCA(), tm6_lower_three, 1)
 #                      else:
-#                          tm6_pca_vector = pca_line(PCA(), lower_tm6, 1)
+#                          tm6_pca_vector = axis_line(AxisPCA(), lower_tm6, 1)
 #
 #                      membrane_mid_pca = pca.transform([membrane_mid])
 #                      membrane_mid_pca[0,1:3] = 0 # project onto the same axis
@@ -766,16 +692,16 @@ class Command(BaseCommand):
                 #      # Take the average of N consecutive elements of TM2
                 #      tm2_lower_three = sum([lower_tm2[i:-(len(lower_tm2) % N) or None:N] for i in range(N)])/N
                 #      if len(tm2_lower_three) > 2:
-                #          tm2_pca_vector = pca_line(PCA(), tm2_lower_three, 1)
+                #          tm2_pca_vector = axis_line(AxisPCA(), tm2_lower_three, 1)
                 #      else:
-                #          tm2_pca_vector = pca_line(PCA(), lower_tm2, 1)
+                #          tm2_pca_vector = axis_line(AxisPCA(), lower_tm2, 1)
                 #
                 #      # Take the average of N consecutive elements of TM6
                 #      tm6_lower_three = sum([lower_tm6[i:-(len(lower_tm6) % N) or None:N] for i in range(N)])/N
                 #      if len(tm6_lower_three) > 2:
-                #          tm6_pca_vector = pca_line(PCA(), tm6_lower_three, 1)
+                #          tm6_pca_vector = axis_line(AxisPCA(), tm6_lower_three, 1)
                 #      else:
-                #          tm6_pca_vector = pca_line(PCA(), lower_tm6, 1)
+                #          tm6_pca_vector = axis_line(AxisPCA(), lower_tm6, 1)
                 #
                 #      # angle between these vectors
                 #      tm6_angle = np.arccos(np.clip(np.dot(tm6_pca_vector[1]-tm6_pca_vector[0], tm2_pca_vector[1]-tm2_pca_vector[0]), -1.0, 1.0))
@@ -791,9 +717,9 @@ class Command(BaseCommand):
                 #     # Take the average of N consecutive elements
                 #     tm6_lower_three = sum([lower_tm6[i:-(len(lower_tm6) % N) or None:N] for i in range(N)])/N
                 #     if len(tm6_lower_three) > 2:
-                #         tm6_pca_vector = pca_line(PCA(), tm6_lower_three, 1)
+                #         tm6_pca_vector = axis_line(AxisPCA(), tm6_lower_three, 1)
                 #     else:
-                #         tm6_pca_vector = pca_line(PCA(), lower_tm6, 1)
+                #         tm6_pca_vector = axis_line(AxisPCA(), lower_tm6, 1)
                 #
                 #     # 1. Find intersect of membrane mid with 7TM axis (project point to plane)
                 #     membrane_mid_pca = pca.transform([membrane_mid])
@@ -841,9 +767,9 @@ class Command(BaseCommand):
                 #     # Take the average of N consecutive elements
                 #     tm6_lower_three = sum([lower_tm6[i:-(len(lower_tm6) % N) or None:N] for i in range(N)])/N
                 #     if len(tm6_lower_three) > 2:
-                #         tm6_pca_vector = pca_line(PCA(), tm6_lower_three, 1)
+                #         tm6_pca_vector = axis_line(AxisPCA(), tm6_lower_three, 1)
                 #     else:
-                #         tm6_pca_vector = pca_line(PCA(), lower_tm6, 1)
+                #         tm6_pca_vector = axis_line(AxisPCA(), lower_tm6, 1)
                 #
                 #     # Calculate angle between vectors
                 #     tm6_angle = np.arccos(np.clip(np.dot(tm6_pca_vector[1]-tm6_pca_vector[0], center_vector[1]-center_vector[0]), -1.0, 1.0))
@@ -854,7 +780,7 @@ class Command(BaseCommand):
                 #     print("pseudoatom cen_tm6, pos=[{},{},{}]".format(cen_tm6[0],cen_tm6[1],cen_tm6[2]))
                 #
                 #     # Check distance - closer to axis - negative angle - further away - positive angle
-                #     tm6_inward = ca_distance_calc(np.asarray([tm6_pca_vector[1]]),pca) - ca_distance_calc(np.asarray([tm6_pca_vector[0]]),pca)
+                #     tm6_inward = axis_distances(np.asarray([tm6_pca_vector[1]]),pca) - axis_distances(np.asarray([tm6_pca_vector[0]]),pca)
                 #     print(np.degrees(tm6_angle))
                 #
                 #     if tm6_inward < 0:
@@ -872,13 +798,13 @@ class Command(BaseCommand):
 
                 ### ANGLES
                 # Center axis to helix axis to CA
-                a_angle = np.concatenate([axes_calc(h,p,pca) for h,p in zip(hres_list,helix_pcas)]).round(3)
+                a_angle = np.concatenate([a_angles(h,p,pca) for h,p in zip(hres_list,helix_pcas)]).round(3)
 
                 # Center axis to CA to CB
-                b_angle = np.concatenate([ca_cb_calc(ca,cb,pca) for ca,cb in zip(hres_list,h_cb_list)]).round(3)
+                b_angle = np.concatenate([b_angles(ca,cb,pca) for ca,cb in zip(hres_list,h_cb_list)]).round(3)
 
                 # Distance from center axis to CA
-                core_distance = np.concatenate([ca_distance_calc(ca,pca) for ca in hres_list]).round(3)
+                core_distance = np.concatenate([axis_distances(ca,pca) for ca in hres_list]).round(3)
 
                 ### freeSASA (only for TM bundle)
                 # SASA calculations - results per atom
@@ -908,10 +834,9 @@ class Command(BaseCommand):
                         rsa_list[i] = 100
 
                 ### Half-sphere exposure (HSE)
-                hse = pdb.HSExposure.HSExposureCB(structure[0][preferred_chain])
-
-                # x[1] contains HSE - 0 outer half, 1 - inner half, 2 - ?
-                hselist = dict([ (x[0].id[1], x[1][0]) if x[1][0] > 0 else (x[0].id[1], 0) for x in hse ])
+                # HSE-up (outer half) and HSE-down (inner half) per residue
+                hse = chain_half_sphere_exposure(structure[0][preferred_chain])
+                hselist = {residue_id: max(up, 0) for residue_id, (up, down) in hse.items()}
 
                 # Few checks
                 if len(pchain) != len(a_angle):
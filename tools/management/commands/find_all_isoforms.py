@@ -3,7 +3,7 @@ from django.core.management import call_command
 from django.conf import settings
 from django.db import connection
 from protein.models import *
-from common.tools import fetch_from_web_api
+from common.tools import fetch_from_web_api, prefetch_from_web_api
 from Bio import pairwise2
 
 import time
@@ -78,6 +78,9 @@ class Command(BaseCommand):
                         gene_to_ensembl[p.entry_name] = ensembl_gene_id
                         #print("E_ID: " +ensembl_gene_id)
                         ensembl_transcripts = fetch_from_web_api(url_ensembl, ensembl_gene_id, cache_dir_transcripts)
+                        # download the sequences of the protein coding isoforms concurrently
+                        prefetch_from_web_api(url_ensembl_seq, [t['Translation']['id'] for t in
+                            ensembl_transcripts['Transcript'] if not t['is_canonical'] and t['biotype']=='protein_coding'])
                         for t in ensembl_transcripts['Transcript']:
                             display_name = t['display_name']
                             is_canonical = t['is_canonical']
@@ -3,7 +3,7 @@ from django.core.management import call_command
 from django.conf import settings
 from django.db import connection
 from protein.models import *
-from common.tools import fetch_from_web_api
+from common.tools import fetch_from_web_api, prefetch_from_web_api
 from Bio import pairwise2
 
 from structure.functions import BlastSearch
@@ -217,6 +217,8 @@ class Command(BaseCommand):
         missing_sequences = 0
         total_lmb_sequences = 0
         sequences_lookup = defaultdict(list)
+        # download the transcript sequences concurrently, the loop below reads them from the response store
+        prefetch_from_web_api(url_ensembl_seq, [t for ts in lmb_data.values() for t in ts])
         for p,ts in lmb_data.items():
             seq = Protein.objects.get(entry_name=p).sequence
             sequences_lookup[seq].append([p,p])
@@ -296,6 +298,7 @@ class Command(BaseCommand):
             alternative_ids_uniprot = self.find_ensembl_id_by_uniprot(uniprot)
             # print(alternative_ids_uniprot)
             ensembl_gene_id = []
+            prefetch_from_web_api(url_gene, [gene for gene in genes if gene])
             for gene in genes:
                 if not gene:
                     continue
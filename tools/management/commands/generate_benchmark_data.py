@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from common.synthetic_data import clear, generate
+
+
+class Command(BaseCommand):
+    help = 'Creates the synthetic receptors and structures of run_benchmarks, replacing earlier synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--receptors',
+            type=int,
+            action='store',
+            dest='receptors',
+            default=50,
+            help='Number of receptors')
+        parser.add_argument('--structures',
+            type=int,
+            action='store',
+            dest='structures',
+            default=20,
+            help='Number of structures, spread over the receptors')
+        parser.add_argument('--residues-per-helix',
+            type=int,
+            action='store',
+            dest='residues_per_helix',
+            default=24,
+            help='Generic numbered residues of each of the seven helices')
+        parser.add_argument('--seed',
+            type=int,
+            action='store',
+            dest='seed',
+            default=0,
+            help='Seed of the random sequences, coordinates and contacts')
+        parser.add_argument('--clear',
+            action='store_true',
+            dest='clear',
+            default=False,
+            help='Only remove the synthetic data')
+        parser.add_argument('--force',
+            action='store_true',
+            dest='force',
+            default=False,
+            help='Also write to databases without "bench" in their name')
+
+    def handle(self, *args, **options):
+        database = connection.settings_dict['NAME']
+        if 'bench' not in database and not options['force']:
+            raise CommandError('Database {} is not a benchmark database, use --force to write to it'.format(database))
+
+        clear()
+        if options['clear']:
+            self.stdout.write('Removed the synthetic data from {}'.format(database))
+            return
+
+        counts = generate(options['receptors'], options['structures'], options['residues_per_helix'],
+            options['seed'])
+        self.stdout.write('Created {receptors} receptors, {structures} structures, {residues} residues, '
+            '{distances} distances and {interactions} interactions'.format(**counts))
@@ -5,7 +5,7 @@ from django.db import connection
 from django.db.models import Q
 from django.template.loader import render_to_string
 from protein.models import *
-from common.tools import fetch_from_web_api
+from common.tools import fetch_from_web_api, prefetch_from_web_api
 from Bio import pairwise2
 
 import time
@@ -43,6 +43,9 @@ class Command(BaseCommand):
 
         dump = {}
 
+        # download the isoform sequences concurrently, the loop below reads them from the response store
+        prefetch_from_web_api(url, [e for i in isoforms[1:] for e in i[3].split(", ")])
+
         for c, i in enumerate(isoforms[1:]):
             
             p = '{}_human'.format(i[0].lower())
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from common.benchmarks import (BENCHMARKS, DEFAULT_TOLERANCE, append_history, current_commit, load_baseline,
+    plot_scaling, regressions, result_key, run_benchmarks, save_baseline, write_scaling_csv)
+from common.synthetic_data import benchmark_receptors
+
+
+class Command(BaseCommand):
+    help = 'Times the hot paths on the data of generate_benchmark_data and compares them with the baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--sizes',
+            action='store',
+            dest='sizes',
+            default='10',
+            help='Comma separated numbers of receptors to run the benchmarks on, e.g. 5,10,20,50')
+        parser.add_argument('-b', '--benchmark',
+            action='append',
+            dest='benchmarks',
+            choices=list(BENCHMARKS),
+            help='Benchmark to run, can be repeated (default: all)')
+        parser.add_argument('-r', '--repeat',
+            type=int,
+            action='store',
+            dest='repeat',
+            default=5,
+            help='Timed runs of each benchmark, the median is reported')
+        parser.add_argument('--save-baseline',
+            action='store_true',
+            dest='save_baseline',
+            default=False,
+            help='Store the results as baseline of later runs')
+        parser.add_argument('--tolerance',
+            type=float,
+            action='store',
+            dest='tolerance',
+            default=DEFAULT_TOLERANCE,
+            help='Slowdown over the baseline, as fraction, that fails the run')
+        parser.add_argument('--csv',
+            action='store',
+            dest='csv',
+            help='Write the results to this CSV file')
+        parser.add_argument('--plot',
+            action='store',
+            dest='plot',
+            help='Plot the scaling curves by number of receptors to this image file')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(s) for s in options['sizes'].split(',')})
+        except ValueError:
+            raise CommandError('--sizes takes comma separated numbers')
+        available = len(benchmark_receptors())
+        if not available:
+            raise CommandError('No synthetic data, run generate_benchmark_data first')
+        if sizes[-1] > available:
+            raise CommandError('Only {} synthetic receptors, generate more for size {}'.format(available, sizes[-1]))
+
+        commit = current_commit()
+        baseline = load_baseline()
+        results = run_benchmarks(sizes, options['benchmarks'], options['repeat'])
+        append_history(results, commit)
+
+        self.stdout.write('Commit {}'.format(commit or 'unknown'))
+        self.stdout.write('{:<40} {:>5} {:>10} {:>10} {:>8} {:>10}'.format('benchmark', 'N', 'median ms', 'min ms',
+            'queries', 'baseline'))
+        for r in results:
+            base = baseline.get(result_key(r))
+            change = '{:+.0%}'.format(r['median'] / base['median'] - 1) if base else '-'
+            self.stdout.write('{:<40} {:>5} {:>10.1f} {:>10.1f} {:>8} {:>10}'.format(r['benchmark'], r['size'],
+                r['median'] * 1000, r['min'] * 1000, r['queries'], change))
+
+        if options['csv']:
+            write_scaling_csv(results, options['csv'])
+        if options['plot']:
+            plot_scaling(results, options['plot'])
+
+        if options['save_baseline']:
+            save_baseline(results)
+            self.stdout.write('Saved the baseline')
+            return
+
+        slower = regressions(results, baseline, options['tolerance'])
+        for result, base in slower:
+            self.stdout.write(self.style.ERROR('{}: {:.1f} ms and {} queries, baseline {:.1f} ms and {} queries'
+                .format(result_key(result), result['median'] * 1000, result['queries'], base['median'] * 1000,
+                base['queries'])))
+        if slower:
+            raise CommandError('{} benchmarks regressed'.format(len(slower)))